@@ -25,6 +25,10 @@ def create_app(config_name=None):
     # Initialize extensions
     db.init_app(app)
     
+    # Track data versions for conditional requests and derived data
+    from app.models.version import register_version_listeners
+    register_version_listeners()
+    
     # Create database tables
     with app.app_context():
         db.create_all()
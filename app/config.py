@@ -3,6 +3,15 @@ import os
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-key-for-development'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # AVERAGE, FIFO, LIFO, HIFO or SPECIFIC
+    COST_BASIS_METHOD = os.environ.get('COST_BASIS_METHOD', 'AVERAGE').upper()
+    # Fetch missing benchmark history on a background thread
+    ETF_HISTORY_PREFETCH = True
+    # Cached dashboard stats are served this long (seconds) before a background refresh
+    STATS_FRESHNESS_SECONDS = 300
+    STATS_BACKGROUND_REFRESH = True
+    # Run CSV imports as background jobs polled through /api/import-jobs/<job_id>
+    IMPORT_BACKGROUND_JOBS = True
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -10,6 +19,9 @@ class DevelopmentConfig(Config):
 
 class TestingConfig(Config):
     TESTING = True
+    ETF_HISTORY_PREFETCH = False
+    STATS_BACKGROUND_REFRESH = False
+    IMPORT_BACKGROUND_JOBS = False
     SQLALCHEMY_DATABASE_URI = 'sqlite:///mystocktrackerapp-test.db'
 
 class ProductionConfig(Config):
@@ -23,4 +23,14 @@ class PortfolioCache(db.Model):
     
     def set_data(self, data):
         """Set cached data from Python object"""
-        self.cache_data = json.dumps(data, default=str)
\ No newline at end of file
+        self.cache_data = json.dumps(data, default=str)
+    
+    def get_chart_data(self):
+        """Get cached chart data, expanding the compact storage form"""
+        from app.util.chart_codec import decode_chart_data
+        return decode_chart_data(self.get_data())
+    
+    def set_chart_data(self, chart_data):
+        """Set cached chart data, stored in the compact form"""
+        from app.util.chart_codec import encode_chart_data
+        self.set_data(encode_chart_data(chart_data))
\ No newline at end of file
@@ -3,6 +3,19 @@ from datetime import datetime
 import uuid
 
 
+# Same-day ordering of cash flows: dividends, deposits, purchases, then sales
+CASH_FLOW_PRIORITY = {
+    'DIVIDEND': 1,
+    'DEPOSIT': 2,
+    'PURCHASE': 3,
+    'SALE': 4
+}
+
+
+def _flow_priority(context):
+    return CASH_FLOW_PRIORITY.get(context.get_current_parameters()['flow_type'], 99)
+
+
 class CashFlow(db.Model):
     __tablename__ = 'cash_flows'
     
@@ -13,11 +26,14 @@ class CashFlow(db.Model):
     amount = db.Column(db.Float, nullable=False)
     description = db.Column(db.Text)
     running_balance = db.Column(db.Float, nullable=False)
+    # Stored so flows can be ordered and paged by (date, sort_priority, id) in SQL
+    sort_priority = db.Column(db.Integer, nullable=False, default=_flow_priority)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Indexes for performance
     __table_args__ = (
         db.Index('idx_cash_flows_portfolio_date', 'portfolio_id', 'date'),
+        db.Index('idx_cash_flows_portfolio_order', 'portfolio_id', 'date', 'sort_priority', 'id'),
     )
 
 
@@ -30,11 +46,14 @@ class IRRCalculation(db.Model):
     total_invested = db.Column(db.Float, nullable=False)
     current_value = db.Column(db.Float, nullable=False)
     calculation_date = db.Column(db.Date, nullable=False)
+    # Month-end history rows: 'inception' or a trailing window such as '1y'; NULL for point calculations
+    horizon = db.Column(db.String(20), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Index for latest calculation queries
     __table_args__ = (
         db.Index('idx_irr_calculations_portfolio_date', 'portfolio_id', 'calculation_date'),
+        db.Index('idx_irr_calculations_portfolio_horizon_date', 'portfolio_id', 'horizon', 'calculation_date'),
     )
 
 
@@ -48,6 +67,13 @@ class ETFComparison(db.Model):
     current_shares = db.Column(db.Float, nullable=False, default=0.0)
     current_value = db.Column(db.Float, nullable=False, default=0.0)
     irr_value = db.Column(db.Float, nullable=True)
+    dividends_received = db.Column(db.Float, nullable=False, default=0.0)
+    # Latest ETF dividend and close the stored flows and value account for
+    last_dividend_date = db.Column(db.Date, nullable=True)
+    price_date = db.Column(db.Date, nullable=True)
+    current_price = db.Column(db.Float, nullable=True)
+    # Earliest flow priced without stored history; rebuilt from once history covers it
+    estimated_from = db.Column(db.Date, nullable=True)
     last_updated = db.Column(db.DateTime, default=datetime.utcnow)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -65,7 +91,7 @@ class ETFCashFlow(db.Model):
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     etf_comparison_id = db.Column(db.String(36), db.ForeignKey('etf_comparisons.id'), nullable=False)
     date = db.Column(db.Date, nullable=False)
-    flow_type = db.Column(db.String(20), nullable=False)  # DEPOSIT, PURCHASE, DIVIDEND, REINVEST
+    flow_type = db.Column(db.String(20), nullable=False)  # PURCHASE, DIVIDEND, REINVEST
     amount = db.Column(db.Float, nullable=False)
     shares = db.Column(db.Float, nullable=True)  # Shares bought/sold
     price_per_share = db.Column(db.Float, nullable=True)
@@ -13,7 +13,7 @@ class Portfolio(db.Model):
     creation_date = db.Column(db.DateTime, default=datetime.utcnow)
     last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    # Cash flow synchronization
+    # Legacy cash flow sync hash; sync now compares data versions (derived_data_state)
     cash_flow_data_hash = db.Column(db.String(64))
     
     # Relationships
@@ -52,4 +52,23 @@ class CashBalance(db.Model):
     
     portfolio_id = db.Column(db.String(36), db.ForeignKey('portfolios.id'), primary_key=True)
     balance = db.Column(db.Float, nullable=False, default=0.0)
-    last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
\ No newline at end of file
+    last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class PortfolioBenchmark(db.Model):
+    __tablename__ = 'portfolio_benchmarks'
+    
+    portfolio_id = db.Column(db.String(36), db.ForeignKey('portfolios.id'), primary_key=True)
+    ticker = db.Column(db.String(10), primary_key=True)
+    position = db.Column(db.Integer, nullable=False, default=0)  # Display order
+
+
+class Position(db.Model):
+    __tablename__ = 'positions'
+    
+    portfolio_id = db.Column(db.String(36), db.ForeignKey('portfolios.id'), primary_key=True)
+    ticker = db.Column(db.String(10), primary_key=True)
+    shares = db.Column(db.Float, nullable=False, default=0.0)
+    cost_basis = db.Column(db.Float, nullable=False, default=0.0)  # Cost of the shares still held
+    realized_pnl = db.Column(db.Float, nullable=False, default=0.0)
+    first_buy = db.Column(db.Date)
+    last_trade = db.Column(db.Date)
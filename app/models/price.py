@@ -10,4 +10,13 @@ class PriceHistory(db.Model):
     close_price = db.Column(db.Float, nullable=False)
     is_intraday = db.Column(db.Boolean, nullable=False, default=False)
     price_timestamp = db.Column(db.DateTime, nullable=False)
-    last_updated = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    last_updated = db.Column(db.DateTime, default=datetime.utcnow)
+
+class EtfDividend(db.Model):
+    """ETF distributions per share, stored so comparisons never fetch them in a request"""
+    __tablename__ = 'etf_dividends'
+
+    ticker = db.Column(db.String(10), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    dividend = db.Column(db.Float, nullable=False)
+    last_updated = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,180 @@
+"""
+Data version counters used to tell when derived data is out of date.
+"""
+from app import db
+from datetime import datetime
+from sqlalchemy import case, event, inspect, insert, or_, update
+from sqlalchemy.orm import Session
+
+# Scope used for the shared price history counter
+PRICE_SCOPE = 'prices'
+
+
+class DataVersion(db.Model):
+    """Counter bumped every time the source data for a scope changes"""
+    __tablename__ = 'data_versions'
+
+    scope = db.Column(db.String(64), primary_key=True)  # Portfolio ID or PRICE_SCOPE
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class DerivedDataState(db.Model):
+    """Data version a derived artifact (positions, cash flows, ...) was last built from"""
+    __tablename__ = 'derived_data_state'
+
+    portfolio_id = db.Column(db.String(36), primary_key=True)
+    artifact = db.Column(db.String(50), primary_key=True)
+    source_version = db.Column(db.Integer, nullable=False, default=0)
+    # Earliest transaction or dividend date changed since the artifact was built
+    changed_from = db.Column(db.Date, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+def _changed_scopes(session):
+    """Collect the scopes touched by the objects in a flush"""
+    from app.models.portfolio import StockTransaction, Dividend, CashBalance, PortfolioBenchmark
+    from app.models.price import PriceHistory
+
+    scopes = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (StockTransaction, Dividend, CashBalance, PortfolioBenchmark)):
+            if obj.portfolio_id:
+                scopes.add(obj.portfolio_id)
+        elif isinstance(obj, PriceHistory):
+            scopes.add(PRICE_SCOPE)
+    return scopes
+
+
+def _changed_dates(session):
+    """Earliest transaction or dividend date touched per portfolio in a flush"""
+    from app.models.portfolio import StockTransaction, Dividend
+
+    modified = [obj for obj in session.dirty if session.is_modified(obj)]
+    earliest = {}
+    for obj in list(session.new) + modified + list(session.deleted):
+        if isinstance(obj, StockTransaction):
+            attr = 'date'
+        elif isinstance(obj, Dividend):
+            attr = 'payment_date'
+        else:
+            continue
+        if not obj.portfolio_id:
+            continue
+
+        # An edited date affects flows from whichever of the old and new dates is earlier
+        dates = [getattr(obj, attr)] + list(inspect(obj).attrs[attr].history.deleted or ())
+        dates = [d for d in dates if d is not None]
+        if dates and (obj.portfolio_id not in earliest or min(dates) < earliest[obj.portfolio_id]):
+            earliest[obj.portfolio_id] = min(dates)
+    return earliest
+
+
+def mark_changed_from(connection, earliest):
+    """Lower each portfolio's changed_from on its derived artifacts to the given dates"""
+    table = DerivedDataState.__table__
+
+    for portfolio_id, changed_date in earliest.items():
+        connection.execute(
+            update(table).where(table.c.portfolio_id == portfolio_id).values(
+                changed_from=case(
+                    (or_(table.c.changed_from.is_(None), table.c.changed_from > changed_date), changed_date),
+                    else_=table.c.changed_from
+                )
+            )
+        )
+
+
+def _upsert_statement(dialect_name, scope, now):
+    """Build an atomic increment-or-create statement for the dialect"""
+    table = DataVersion.__table__
+
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+
+    stmt = dialect_insert(table).values(scope=scope, version=1, updated_at=now)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.scope],
+        set_={'version': table.c.version + 1, 'updated_at': now}
+    )
+
+
+def bump_versions(connection, scopes):
+    """Increment the version counter for each scope"""
+    table = DataVersion.__table__
+    now = datetime.utcnow()
+
+    for scope in scopes:
+        stmt = _upsert_statement(connection.dialect.name, scope, now)
+        if stmt is not None:
+            connection.execute(stmt)
+            continue
+
+        result = connection.execute(
+            update(table).where(table.c.scope == scope).values(version=table.c.version + 1, updated_at=now)
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(table).values(scope=scope, version=1, updated_at=now))
+
+
+def _after_flush(session, flush_context):
+    _record_changes(session, _changed_scopes(session), _changed_dates(session))
+
+
+def record_bulk_write(session, earliest):
+    """
+    Record transactions or dividends written with Core insert statements.
+
+    Bulk inserts bypass the unit of work, so the flush listener never sees
+    them. This bumps the same versions and lowers the same changed_from
+    markers a flush of those rows would have.
+
+    Args:
+        session: Session the rows were written in
+        earliest (dict): Earliest written date per portfolio ID
+    """
+    _record_changes(session, set(earliest), earliest)
+
+
+def _record_changes(session, scopes, earliest):
+    if scopes:
+        bump_versions(session.connection(), scopes)
+        session.info.setdefault('changed_scopes', set()).update(scopes)
+
+    if earliest:
+        mark_changed_from(session.connection(), earliest)
+
+    if scopes:
+        # Cash flows and comparisons derived earlier in this request are no longer current
+        from app.services.cash_flow_context import invalidate_cash_flow_contexts
+        invalidate_cash_flow_contexts(None if PRICE_SCOPE in scopes else scopes)
+
+    if PRICE_SCOPE in scopes:
+        # Prices read earlier in this request are no longer current
+        from app.services.price_snapshot import invalidate_price_snapshot
+        invalidate_price_snapshot()
+
+
+def _after_commit(session):
+    scopes = session.info.pop('changed_scopes', set())
+    if scopes - {PRICE_SCOPE}:
+        # Cached transaction queries would otherwise be served under the new version
+        from app.util.query_cache import clear_query_cache
+        clear_query_cache()
+
+
+def _after_rollback(session):
+    session.info.pop('changed_scopes', None)
+
+
+def register_version_listeners():
+    """Bump data versions whenever transactions, dividends, cash, benchmarks or prices are flushed"""
+    for name, listener in (('after_flush', _after_flush),
+                           ('after_commit', _after_commit),
+                           ('after_rollback', _after_rollback)):
+        if not event.contains(Session, name, listener):
+            event.listen(Session, name, listener)
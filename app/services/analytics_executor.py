@@ -0,0 +1,83 @@
+import os
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class AnalyticsExecutor:
+    """
+    Runs CPU-heavy analytics kernels in a process pool.
+
+    Chart valuation and IRR solving hold the GIL for the whole computation, which
+    stalls every other request served by the same gunicorn worker. Kernels from
+    app.util.calculators only take plain arrays, so they can be shipped to a
+    separate process while the request thread waits without holding the GIL.
+    Small problems are run inline because pickling them costs more than solving.
+    """
+
+    def __init__(self):
+        self.max_workers = int(os.environ.get('ANALYTICS_WORKERS', min(2, os.cpu_count() or 1)))
+        self.offload_threshold = int(os.environ.get('ANALYTICS_OFFLOAD_THRESHOLD', 5000))
+        self.timeout = int(os.environ.get('ANALYTICS_TIMEOUT', 60))  # Seconds to wait on a worker
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        """Create the process pool on first use"""
+        with self._lock:
+            if self._pool is None:
+                # Spawn instead of fork so workers never inherit locks held by request threads
+                context = multiprocessing.get_context('spawn')
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+                logger.info(f"Started analytics process pool with {self.max_workers} workers")
+            return self._pool
+
+    def should_offload(self, size):
+        """Check if a problem of this size is worth sending to the pool"""
+        return self.max_workers > 0 and size >= self.offload_threshold
+
+    def run(self, kernel, *args, size=0):
+        """
+        Run a kernel, in the process pool when the problem is large enough.
+
+        Args:
+            kernel: Module-level function from app.util.calculators
+            *args: Plain array/scalar arguments for the kernel
+            size (int): Rough problem size used to decide on offloading
+
+        Returns:
+            The kernel result
+        """
+        if not self.should_offload(size):
+            return kernel(*args)
+
+        try:
+            future = self._get_pool().submit(kernel, *args)
+            return future.result(timeout=self.timeout)
+        except BrokenProcessPool as e:
+            logger.error(f"Analytics pool broken, running {kernel.__name__} inline: {e}")
+            self._reset_pool()
+        except Exception as e:
+            logger.error(f"Analytics pool failed for {kernel.__name__}, running inline: {e}")
+
+        return kernel(*args)
+
+    def _reset_pool(self):
+        """Drop a broken pool so the next call starts a fresh one"""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        self._reset_pool()
+
+
+# Global instance
+analytics_executor = AnalyticsExecutor()
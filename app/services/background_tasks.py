@@ -2,9 +2,14 @@ import threading
 import time
 import asyncio
 import logging
-from datetime import datetime, timedelta
+import csv
+import os
+import tempfile
+import uuid
+from datetime import date, datetime, timedelta
 from app.services.price_service import PriceService
 from app.services.portfolio_service import PortfolioService
+from app.services.benchmark_service import BenchmarkService
 from app import db
 
 # Configure logging
@@ -26,7 +31,7 @@ class BackgroundPriceUpdater:
         """Queue price updates for a portfolio's holdings"""
         try:
             holdings = self.portfolio_service.get_current_holdings(portfolio_id)
-            tickers = list(holdings.keys()) + ['VOO', 'QQQ']  # Include ETFs
+            tickers = BenchmarkService().get_price_tickers(portfolio_id, holdings)  # Include benchmark ETFs
             
             self.update_queue = list(set(tickers))  # Remove duplicates
             self.progress = {
@@ -421,7 +426,7 @@ class BackgroundChartGenerator:
                     cache_type='chart_data',
                     market_date=market_date
                 )
-                cache.set_data(chart_data)
+                cache.set_chart_data(chart_data)
                 
                 db.session.add(cache)
                 db.session.commit()
@@ -443,6 +448,398 @@ class BackgroundChartGenerator:
         return self.chart_data.get(portfolio_id)
 
 
+class BackgroundHistoryPrefetcher:
+    """
+    Fetch missing daily closes off the request path.
+
+    Benchmark comparisons read ETF history from PriceHistory only. When a
+    purchase date is not covered, the range is queued here and fetched with
+    one batch download on a background thread, so dashboard requests never
+    wait on per-transaction API calls. ETF dividends are refreshed the same
+    way, at most once per new close.
+    """
+    
+    def __init__(self):
+        self.price_service = PriceService()
+        self.in_flight = set()
+        self.dividends_checked = {}
+        self.lock = threading.Lock()
+    
+    def prefetch(self, tickers, start_date, end_date):
+        """Queue a history fetch for tickers over a date range (non-blocking)"""
+        from flask import current_app
+        
+        # Tests fetch synchronously with fetch_history instead
+        if not current_app.config.get('ETF_HISTORY_PREFETCH', not current_app.testing):
+            return False
+        
+        key = (tuple(sorted(tickers)), start_date, end_date)
+        with self.lock:
+            if key in self.in_flight:
+                return False
+            self.in_flight.add(key)
+        
+        app = current_app._get_current_object()
+        threading.Thread(target=self._run_prefetch, args=(app, key), daemon=True).start()
+        return True
+    
+    def _run_prefetch(self, app, key):
+        tickers, start_date, end_date = key
+        try:
+            with app.app_context():
+                self.fetch_history(list(tickers), start_date, end_date)
+        except Exception as e:
+            logger.error(f"Error prefetching history for {tickers}: {e}")
+        finally:
+            with self.lock:
+                self.in_flight.discard(key)
+    
+    def fetch_history(self, tickers, start_date, end_date):
+        """Download daily closes and store the ones not cached yet; returns the number stored"""
+        import pandas as pd
+        from app.models.price import PriceHistory
+        
+        frames = self.price_service.batch_fetch_prices(
+            tickers, start_date=start_date, end_date=end_date + timedelta(days=1)
+        )
+        
+        existing = set(db.session.query(PriceHistory.ticker, PriceHistory.date).filter(
+            PriceHistory.ticker.in_(tickers),
+            PriceHistory.date >= start_date,
+            PriceHistory.date <= end_date
+        ).all())
+        
+        now = datetime.now()
+        new_records = []
+        for ticker, frame in frames.items():
+            if frame is None or frame.empty or 'Close' not in frame:
+                continue
+            for index, close_price in frame['Close'].items():
+                price_date = index.date()
+                if pd.isna(close_price) or (ticker, price_date) in existing:
+                    continue
+                existing.add((ticker, price_date))
+                new_records.append(PriceHistory(
+                    ticker=ticker,
+                    date=price_date,
+                    close_price=float(close_price),
+                    is_intraday=False,
+                    price_timestamp=now,
+                    last_updated=now
+                ))
+        
+        if new_records:
+            try:
+                db.session.add_all(new_records)
+                db.session.commit()
+            except Exception as e:
+                logger.error(f"Error storing prefetched history: {e}")
+                db.session.rollback()
+                return 0
+        
+        logger.info(f"Prefetched {len(new_records)} closes for {tickers} from {start_date} to {end_date}")
+        return len(new_records)
+    
+    def prefetch_dividends(self, ticker, as_of):
+        """Queue a dividend refresh for an ETF, once per latest close date (non-blocking)"""
+        from flask import current_app
+        
+        # Tests fetch synchronously with fetch_dividends instead
+        if not current_app.config.get('ETF_HISTORY_PREFETCH', not current_app.testing):
+            return False
+        
+        key = ('dividends', ticker, as_of)
+        with self.lock:
+            if key in self.in_flight or self.dividends_checked.get(ticker) == as_of:
+                return False
+            self.in_flight.add(key)
+        
+        app = current_app._get_current_object()
+        threading.Thread(target=self._run_dividend_fetch, args=(app, key), daemon=True).start()
+        return True
+    
+    def _run_dividend_fetch(self, app, key):
+        _, ticker, as_of = key
+        try:
+            with app.app_context():
+                self.fetch_dividends(ticker)
+            with self.lock:
+                self.dividends_checked[ticker] = as_of
+        except Exception as e:
+            logger.error(f"Error prefetching dividends for {ticker}: {e}")
+        finally:
+            with self.lock:
+                self.in_flight.discard(key)
+    
+    def fetch_dividends(self, ticker):
+        """Download an ETF's dividends and store the ones not cached yet; returns the number stored"""
+        from app.models.price import EtfDividend
+        from app.services.etf_comparison_service import ETFComparisonService
+        
+        dividends = ETFComparisonService().get_etf_dividends(ticker, date.min)
+        existing = {row.date for row in db.session.query(EtfDividend.date).filter(EtfDividend.ticker == ticker)}
+        
+        now = datetime.now()
+        new_records = []
+        for div_date, per_share in dividends:
+            if div_date in existing:
+                continue
+            existing.add(div_date)
+            new_records.append(EtfDividend(ticker=ticker, date=div_date, dividend=per_share, last_updated=now))
+        
+        if new_records:
+            try:
+                db.session.add_all(new_records)
+                db.session.commit()
+            except Exception as e:
+                logger.error(f"Error storing prefetched dividends: {e}")
+                db.session.rollback()
+                return 0
+        
+        logger.info(f"Prefetched {len(new_records)} dividends for {ticker}")
+        return len(new_records)
+
+
+class BackgroundStatsRefresher:
+    """
+    Recompute cached dashboard stats off the request path.
+
+    The dashboard serves the last cached stats immediately; once they are
+    past their freshness budget it asks for a refresh here. At most one
+    recompute per portfolio runs at a time, however many requests see the
+    stale entry meanwhile.
+    """
+    
+    def __init__(self):
+        self.in_flight = set()
+        self.lock = threading.Lock()
+    
+    def refresh(self, portfolio_id):
+        """Queue a stats recompute for a portfolio (non-blocking); False if not queued"""
+        from flask import current_app
+        
+        # Tests recompute synchronously with recompute instead
+        if not current_app.config.get('STATS_BACKGROUND_REFRESH', not current_app.testing):
+            return False
+        
+        with self.lock:
+            if portfolio_id in self.in_flight:
+                return False
+            self.in_flight.add(portfolio_id)
+        
+        app = current_app._get_current_object()
+        threading.Thread(target=self._run_refresh, args=(app, portfolio_id), daemon=True).start()
+        return True
+    
+    def _run_refresh(self, app, portfolio_id):
+        try:
+            with app.app_context():
+                self.recompute(portfolio_id)
+        except Exception as e:
+            logger.error(f"Error refreshing stats for portfolio {portfolio_id}: {e}")
+        finally:
+            with self.lock:
+                self.in_flight.discard(portfolio_id)
+    
+    def recompute(self, portfolio_id):
+        """Compute and cache a portfolio's dashboard stats; returns them (None if no portfolio)"""
+        from app.services.data_version_service import DataVersionService
+        from app.views.main import calculate_minimal_portfolio_stats, cache_portfolio_stats, get_last_market_date
+        
+        portfolio_service = PortfolioService()
+        portfolio = portfolio_service.get_portfolio(portfolio_id)
+        if not portfolio:
+            return None
+        
+        # Read the version first so a concurrent edit leaves the entry outdated, not mislabelled
+        data_version = DataVersionService().get_portfolio_version(portfolio_id)
+        stats = calculate_minimal_portfolio_stats(portfolio, portfolio_service, PriceService())
+        if stats.get('current_value'):
+            cache_portfolio_stats(portfolio_id, get_last_market_date(), stats, data_version)
+        
+        logger.info(f"Refreshed cached stats for portfolio {portfolio_id}")
+        return stats
+
+
+class BackgroundImportRunner:
+    """
+    Run CSV imports as background jobs with progress reporting.
+
+    The upload is saved to a temporary file and the request returns with a
+    job id straight away. A worker thread streams the file through the
+    batched DataLoader import, recording rows read, rows imported and failed
+    rows after every batch, then recomputes the portfolio's cash flows,
+    dashboard stats and chart once, so the first page load after a large
+    import does not pay for it. Jobs are kept in this process's memory, like
+    chart generation progress.
+    """
+    
+    # Failed row messages kept per job; failed_count has the full number
+    MAX_ERRORS = 500
+    # Finished jobs are forgotten after this long
+    RETENTION = timedelta(hours=1)
+    
+    def __init__(self):
+        self.jobs = {}
+        self.lock = threading.Lock()
+    
+    def submit(self, portfolio_id, import_type, upload):
+        """
+        Save an uploaded CSV file and start importing it.
+        
+        Args:
+            portfolio_id (str): Portfolio to import into
+            import_type (str): 'transactions' or 'dividends'
+            upload (FileStorage): Uploaded CSV file
+        
+        Returns:
+            dict: Job status, as returned by get_job
+        """
+        from flask import current_app
+        
+        fd, path = tempfile.mkstemp(prefix='import_', suffix='.csv')
+        os.close(fd)
+        upload.save(path)
+        
+        job = {
+            'id': str(uuid.uuid4()),
+            'portfolio_id': portfolio_id,
+            'import_type': import_type,
+            'status': 'queued',
+            'total_rows': None,
+            'rows_processed': 0,
+            'imported_count': 0,
+            'failed_count': 0,
+            'errors': [],
+            'error': None,
+            'refresh_error': None,
+            'created_at': datetime.utcnow(),
+            'completed_at': None
+        }
+        with self.lock:
+            self._prune()
+            self.jobs[job['id']] = job
+        
+        # Tests import synchronously with run_job instead
+        if current_app.config.get('IMPORT_BACKGROUND_JOBS', not current_app.testing):
+            app = current_app._get_current_object()
+            threading.Thread(target=self._run_job, args=(app, job['id'], path), daemon=True).start()
+        else:
+            self.run_job(job['id'], path)
+        
+        return self.get_job(job['id'])
+    
+    def _run_job(self, app, job_id, path):
+        with app.app_context():
+            self.run_job(job_id, path)
+    
+    def run_job(self, job_id, path):
+        """Import a saved CSV file, refresh the portfolio's derived data and remove the file"""
+        from app.services.data_loader import DataLoader
+        
+        job = self.jobs[job_id]
+        portfolio_id = job['portfolio_id']
+        data_loader = DataLoader()
+        if job['import_type'] == 'dividends':
+            import_rows = data_loader.import_dividends_from_csv
+        else:
+            import_rows = data_loader.import_transactions_from_csv
+        
+        try:
+            job['status'] = 'running'
+            job['total_rows'] = self._count_rows(path)
+            
+            # utf-8-sig drops the BOM spreadsheet exports start with
+            with open(path, encoding='utf-8-sig', newline='') as csv_file:
+                imported_count = import_rows(
+                    portfolio_id,
+                    csv.DictReader(csv_file),
+                    progress=lambda rows_read, imported, failed_rows: self._record_progress(
+                        job, rows_read, imported, failed_rows
+                    )
+                )
+            job['imported_count'] = imported_count
+            
+            if imported_count:
+                job['status'] = 'refreshing'
+                try:
+                    self.refresh_derived_data(portfolio_id)
+                except Exception as e:
+                    # The import is committed; pages recompute what is missing on load
+                    logger.error(f"Error refreshing derived data after import into portfolio {portfolio_id}: {e}")
+                    db.session.rollback()
+                    job['refresh_error'] = str(e)
+            
+            job['status'] = 'completed'
+            logger.info(f"Import job {job_id} completed: {imported_count} {job['import_type']} imported, {job['failed_count']} rows failed")
+        except Exception as e:
+            logger.error(f"Error running import job {job_id} for portfolio {portfolio_id}: {e}")
+            db.session.rollback()
+            job['status'] = 'error'
+            job['error'] = str(e)
+        finally:
+            job['completed_at'] = datetime.utcnow()
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.error(f"Error removing import file {path}: {e}")
+    
+    def refresh_derived_data(self, portfolio_id):
+        """Sync cash flows and recompute dashboard stats and chart data for a portfolio once"""
+        from app.services.cash_flow_sync_service import CashFlowSyncService
+        from app.views.main import generate_simplified_chart_data, cache_chart_data, get_last_market_date
+        
+        CashFlowSyncService().ensure_cash_flows_current(portfolio_id)
+        stats_refresher.recompute(portfolio_id)
+        
+        chart_data = generate_simplified_chart_data(portfolio_id, PortfolioService(), PriceService())
+        cache_chart_data(portfolio_id, get_last_market_date(), chart_data)
+        # Replace chart data generated before the import
+        chart_generator.chart_data[portfolio_id] = chart_data
+    
+    def get_job(self, job_id):
+        """Get a JSON-serializable snapshot of a job's status (None if unknown)"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            snapshot = dict(job, errors=list(job['errors']))
+        
+        total_rows = snapshot['total_rows']
+        if snapshot['status'] in ('refreshing', 'completed'):
+            snapshot['percent_complete'] = 100
+        elif total_rows:
+            snapshot['percent_complete'] = min(round(100 * snapshot['rows_processed'] / total_rows), 100)
+        else:
+            snapshot['percent_complete'] = 0
+        
+        for key in ('created_at', 'completed_at'):
+            if snapshot[key] is not None:
+                snapshot[key] = snapshot[key].isoformat()
+        return snapshot
+    
+    def _record_progress(self, job, rows_read, imported, failed_rows):
+        with self.lock:
+            job['rows_processed'] = rows_read
+            job['imported_count'] = imported
+            job['failed_count'] = len(failed_rows)
+            job['errors'] = failed_rows[:self.MAX_ERRORS]
+    
+    def _count_rows(self, path):
+        """Data rows in a CSV file, counted the way csv.DictReader reads them"""
+        with open(path, encoding='utf-8-sig', newline='') as csv_file:
+            return max(sum(1 for row in csv.reader(csv_file) if row) - 1, 0)
+    
+    def _prune(self):
+        cutoff = datetime.utcnow() - self.RETENTION
+        for job_id in [job_id for job_id, job in self.jobs.items()
+                       if job['completed_at'] is not None and job['completed_at'] < cutoff]:
+            del self.jobs[job_id]
+
+
 # Global instances
 background_updater = BackgroundPriceUpdater()
 chart_generator = BackgroundChartGenerator()
+history_prefetcher = BackgroundHistoryPrefetcher()
+stats_refresher = BackgroundStatsRefresher()
+import_runner = BackgroundImportRunner()
@@ -0,0 +1,92 @@
+import re
+import logging
+from app import db
+from app.models.portfolio import PortfolioBenchmark
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Benchmarks used for portfolios that have not chosen their own
+DEFAULT_BENCHMARKS = ['VOO', 'QQQ']
+
+# Tickers are stored in String(10) columns, like transaction tickers
+MAX_TICKER_LENGTH = PortfolioBenchmark.__table__.c.ticker.type.length
+TICKER_PATTERN = re.compile(r'^[A-Z0-9^][A-Z0-9.\-=^]*$')
+
+
+def benchmark_key(ticker):
+    """Key prefix used for a benchmark in stats and chart payloads (e.g. 'voo')"""
+    return re.sub(r'[^a-z0-9]+', '_', ticker.lower())
+
+
+class BenchmarkService:
+    """Service to manage the benchmark tickers a portfolio is compared against"""
+
+    def get_benchmarks(self, portfolio_id):
+        """Get the ordered benchmark tickers for a portfolio"""
+        try:
+            rows = PortfolioBenchmark.query.filter_by(portfolio_id=portfolio_id).order_by(
+                PortfolioBenchmark.position.asc()
+            ).all()
+        except Exception as e:
+            # Comparisons should still render against the defaults
+            logger.error(f"Error loading benchmarks for portfolio {portfolio_id}: {e}")
+            return list(DEFAULT_BENCHMARKS)
+
+        if not rows:
+            return list(DEFAULT_BENCHMARKS)
+
+        return [row.ticker for row in rows]
+
+    def get_benchmarks_for_portfolios(self, portfolio_ids):
+        """Get {portfolio_id: benchmark tickers} for many portfolios in one query"""
+        benchmarks = {portfolio_id: [] for portfolio_id in portfolio_ids}
+        try:
+            rows = PortfolioBenchmark.query.filter(
+                PortfolioBenchmark.portfolio_id.in_(portfolio_ids)
+            ).order_by(PortfolioBenchmark.portfolio_id, PortfolioBenchmark.position.asc()).all()
+        except Exception as e:
+            logger.error(f"Error loading benchmarks for {len(portfolio_ids)} portfolios: {e}")
+            rows = []
+
+        for row in rows:
+            benchmarks[row.portfolio_id].append(row.ticker)
+
+        return {
+            portfolio_id: tickers or list(DEFAULT_BENCHMARKS)
+            for portfolio_id, tickers in benchmarks.items()
+        }
+
+    def set_benchmarks(self, portfolio_id, tickers):
+        """Replace the benchmark tickers for a portfolio"""
+        cleaned = []
+        for ticker in tickers:
+            ticker = ticker.strip().upper()
+            if not ticker:
+                continue
+            if len(ticker) > MAX_TICKER_LENGTH or not TICKER_PATTERN.match(ticker):
+                raise ValueError(f"Invalid benchmark ticker: {ticker}")
+            if ticker not in cleaned:
+                cleaned.append(ticker)
+
+        if not cleaned:
+            raise ValueError("At least one benchmark is required")
+
+        PortfolioBenchmark.query.filter_by(portfolio_id=portfolio_id).delete()
+        for position, ticker in enumerate(cleaned):
+            db.session.add(PortfolioBenchmark(
+                portfolio_id=portfolio_id,
+                ticker=ticker,
+                position=position
+            ))
+        db.session.commit()
+
+        return cleaned
+
+    def get_price_tickers(self, portfolio_id, holdings):
+        """Get the tickers whose prices must be refreshed for a portfolio"""
+        tickers = list(holdings)
+        for ticker in self.get_benchmarks(portfolio_id):
+            if ticker not in tickers:
+                tickers.append(ticker)
+        return tickers
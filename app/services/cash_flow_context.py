@@ -0,0 +1,94 @@
+from flask import g, has_request_context
+from app.models.cash_flow import CashFlow
+
+
+class CashFlowContext:
+    """
+    Cash flow data of one portfolio, shared by everything a request renders.
+
+    The stored flows are synced at most once and the portfolio's deposits are
+    loaded once for every ETF comparison. Each comparison and the portfolio
+    summary are then built at most once, so a page showing the portfolio next
+    to several benchmarks does not redo the same work per comparison.
+    """
+
+    def __init__(self, portfolio_id):
+        self.portfolio_id = portfolio_id
+        self._synced = False
+        self._deposits = None
+        self._comparisons = {}
+        self._portfolio_summary = None
+
+    def ensure_current(self):
+        """Sync the stored cash flows with the portfolio once per context"""
+        if not self._synced:
+            from app.services.cash_flow_sync_service import CashFlowSyncService
+            CashFlowSyncService().ensure_cash_flows_current(self.portfolio_id)
+            self._synced = True
+        return self
+
+    def deposits(self, from_date=None):
+        """Stored deposits on or after from_date (all when None), loaded once"""
+        if self._deposits is None:
+            self.ensure_current()
+            rows = CashFlow.query.filter_by(
+                portfolio_id=self.portfolio_id, flow_type='DEPOSIT'
+            ).with_entities(CashFlow.date, CashFlow.amount).order_by(CashFlow.date.asc()).all()
+            self._deposits = [
+                {'date': flow_date, 'amount': amount, 'flow_type': 'DEPOSIT'}
+                for flow_date, amount in rows
+            ]
+
+        if from_date is None:
+            return list(self._deposits)
+        return [deposit for deposit in self._deposits if deposit['date'] >= from_date]
+
+    def comparison(self, etf_ticker, load):
+        """
+        The ETF comparison for a ticker, loaded with load(portfolio_id, etf_ticker)
+        the first time it is asked for.
+        """
+        if etf_ticker not in self._comparisons:
+            self._comparisons[etf_ticker] = load(self.portfolio_id, etf_ticker)
+        return self._comparisons[etf_ticker]
+
+    def portfolio_summary(self):
+        """Portfolio totals and IRR from the synced stored flows"""
+        if self._portfolio_summary is None:
+            from app.services.irr_calculation_service import IRRCalculationService
+            self.ensure_current()
+            self._portfolio_summary = IRRCalculationService().get_portfolio_summary(self.portfolio_id)
+        return self._portfolio_summary
+
+
+def get_cash_flow_context(portfolio_id):
+    """
+    Get the cash flow context of a portfolio for the current request.
+
+    Contexts are memoized on flask.g for the lifetime of a request. Outside a
+    request (background jobs, CLI) a fresh context is returned each call.
+    """
+    if not has_request_context():
+        return CashFlowContext(portfolio_id)
+
+    contexts = g.get('cash_flow_contexts')
+    if contexts is None:
+        contexts = g.cash_flow_contexts = {}
+    if portfolio_id not in contexts:
+        contexts[portfolio_id] = CashFlowContext(portfolio_id)
+    return contexts[portfolio_id]
+
+
+def invalidate_cash_flow_contexts(portfolio_ids=None):
+    """Drop the request's contexts for the given portfolios (all when None) after their data is written"""
+    if not has_request_context():
+        return
+
+    contexts = g.get('cash_flow_contexts')
+    if not contexts:
+        return
+    if portfolio_ids is None:
+        contexts.clear()
+    else:
+        for portfolio_id in portfolio_ids:
+            contexts.pop(portfolio_id, None)
@@ -1,8 +1,16 @@
 from app import db
 from app.models.portfolio import Portfolio, StockTransaction, Dividend
-from app.models.cash_flow import CashFlow
+from app.models.cash_flow import CashFlow, CASH_FLOW_PRIORITY
 from datetime import date
 from collections import defaultdict
+from sqlalchemy import and_, func, insert, or_
+from app.util.csv_stream import EXPORT_BATCH_SIZE
+import base64
+
+
+# Rows per cash flows page, and the most a client may ask for
+CASH_FLOW_PAGE_SIZE = 100
+MAX_CASH_FLOW_PAGE_SIZE = 500
 
 
 class CashFlowService:
@@ -13,6 +21,15 @@ class CashFlowService:
         transactions = StockTransaction.query.filter_by(portfolio_id=portfolio_id).all()
         dividends = Dividend.query.filter_by(portfolio_id=portfolio_id).all()
         
+        return self.build_cash_flows(transactions, dividends)
+    
+    def build_cash_flows(self, transactions, dividends, opening_balance=0.00):
+        """
+        Build cash flows from already loaded transactions and dividends of one portfolio.
+        
+        opening_balance is the cash on hand before the first event, so a suffix of
+        the history can be rebuilt from the balance left by the flows before it.
+        """
         if not transactions and not dividends:
             return []
         
@@ -40,11 +57,11 @@ class CashFlowService:
         
         # Generate cash flows
         cash_flows = []
-        running_balance = 0.00
+        running_balance = opening_balance
         daily_purchases = defaultdict(float)  # Track purchases by date for deposit inference
         
         # First pass: calculate required deposits by date
-        temp_balance = 0.00
+        temp_balance = opening_balance
         for event in all_events:
             if event['type'] == 'transaction':
                 transaction = event['data']
@@ -120,16 +137,8 @@ class CashFlowService:
                     'running_balance': running_balance
                 })
         
-        # Define flow type priority for same-day sorting (dividends, deposits, purchases)
-        flow_type_priority = {
-            'DIVIDEND': 1,
-            'DEPOSIT': 2,
-            'PURCHASE': 3,
-            'SALE': 4
-        }
-        
         # Sort cash flows by date and then by flow type priority
-        cash_flows.sort(key=lambda cf: (cf['date'], flow_type_priority.get(cf['flow_type'], 99)))
+        cash_flows.sort(key=lambda cf: (cf['date'], CASH_FLOW_PRIORITY.get(cf['flow_type'], 99)))
         
         return cash_flows
     
@@ -138,37 +147,169 @@ class CashFlowService:
         # Clear existing cash flows for this portfolio
         CashFlow.query.filter_by(portfolio_id=portfolio_id).delete()
         
-        # Save new cash flows
-        for flow_data in cash_flows:
-            cash_flow = CashFlow(
-                portfolio_id=portfolio_id,
-                date=flow_data['date'],
-                flow_type=flow_data['flow_type'],
-                amount=flow_data['amount'],
-                description=flow_data['description'],
-                running_balance=flow_data['running_balance']
-            )
-            db.session.add(cash_flow)
+        self._insert_cash_flows(portfolio_id, cash_flows)
         
         db.session.commit()
         return len(cash_flows)
     
+    def regenerate_from(self, portfolio_id, from_date):
+        """
+        Rebuild only the cash flows on or after from_date (caller commits).
+        
+        Flows before from_date cannot depend on later events, and their amounts
+        sum to the balance the rebuilt suffix starts from, so only transactions
+        and dividends from from_date on are read and only their flows rewritten.
+        
+        Returns:
+            int: Number of flows written
+        """
+        opening_balance = db.session.query(func.coalesce(func.sum(CashFlow.amount), 0.0)).filter(
+            CashFlow.portfolio_id == portfolio_id,
+            CashFlow.date < from_date
+        ).scalar()
+        
+        transactions = StockTransaction.query.filter(
+            StockTransaction.portfolio_id == portfolio_id,
+            StockTransaction.date >= from_date
+        ).all()
+        dividends = Dividend.query.filter(
+            Dividend.portfolio_id == portfolio_id,
+            Dividend.payment_date >= from_date
+        ).all()
+        
+        cash_flows = self.build_cash_flows(transactions, dividends, opening_balance=opening_balance)
+        
+        CashFlow.query.filter(
+            CashFlow.portfolio_id == portfolio_id,
+            CashFlow.date >= from_date
+        ).delete(synchronize_session=False)
+        self._insert_cash_flows(portfolio_id, cash_flows)
+        
+        return len(cash_flows)
+    
+    def _insert_cash_flows(self, portfolio_id, cash_flows):
+        """Insert flows with one executemany instead of one ORM object per row"""
+        if not cash_flows:
+            return
+        
+        db.session.execute(insert(CashFlow), [
+            {
+                'portfolio_id': portfolio_id,
+                'date': flow_data['date'],
+                'flow_type': flow_data['flow_type'],
+                'amount': flow_data['amount'],
+                'description': flow_data['description'],
+                'running_balance': flow_data['running_balance']
+            }
+            for flow_data in cash_flows
+        ])
+    
     def get_cash_flows(self, portfolio_id):
-        """Get saved cash flows for a portfolio"""
-        # Define flow type priority for same-day sorting (dividends, deposits, purchases)
-        flow_type_priority = {
-            'DIVIDEND': 1,
-            'DEPOSIT': 2,
-            'PURCHASE': 3,
-            'SALE': 4
-        }
+        """Get saved cash flows for a portfolio, by date and then flow type priority"""
+        return self._ordered(CashFlow.query.filter_by(portfolio_id=portfolio_id)).all()
+    
+    def get_cash_flow_page(self, portfolio_id, cursor=None, limit=CASH_FLOW_PAGE_SIZE,
+                           flow_types=None, start_date=None, end_date=None):
+        """
+        Get one page of saved cash flows with keyset pagination.
         
-        # Get all cash flows
-        cash_flows = CashFlow.query.filter_by(
-            portfolio_id=portfolio_id
-        ).order_by(CashFlow.date.asc()).all()
+        Pages follow (date, sort_priority, id), so each page is one index range
+        scan starting after the last row of the previous page, however deep it is.
+        Flow type and date filters are applied in SQL.
         
-        # Sort cash flows by date and then by flow type priority
-        cash_flows.sort(key=lambda cf: (cf.date, flow_type_priority.get(cf.flow_type, 99)))
+        Args:
+            portfolio_id (str): Portfolio to page through
+            cursor (str): next_cursor of the previous page (None for the first page)
+            limit (int): Rows per page, capped at MAX_CASH_FLOW_PAGE_SIZE
+            flow_types (list): Only these flow types (all if empty)
+            start_date (date): Only flows on or after this date
+            end_date (date): Only flows on or before this date
+        
+        Returns:
+            dict: cash_flows, next_cursor (None on the last page) and page totals
+        
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        limit = max(1, min(int(limit), MAX_CASH_FLOW_PAGE_SIZE))
+        
+        query = self._filtered(portfolio_id, flow_types, start_date, end_date)
+        if cursor:
+            after_date, after_priority, after_id = self.decode_cursor(cursor)
+            query = query.filter(or_(
+                CashFlow.date > after_date,
+                and_(CashFlow.date == after_date, CashFlow.sort_priority > after_priority),
+                and_(CashFlow.date == after_date, CashFlow.sort_priority == after_priority, CashFlow.id > after_id)
+            ))
         
-        return cash_flows
\ No newline at end of file
+        # One extra row tells whether another page follows
+        rows = self._ordered(query).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        return {
+            'cash_flows': rows,
+            'next_cursor': self.encode_cursor(rows[-1]) if has_more else None,
+            'totals': self._page_totals(rows)
+        }
+    
+    def iter_cash_flow_rows(self, portfolio_id, flow_types=None, start_date=None, end_date=None,
+                            batch_size=EXPORT_BATCH_SIZE):
+        """
+        Saved flows as (date, flow_type, description, amount, running_balance)
+        tuples in page order, read batch_size rows at a time for exports.
+        """
+        query = self._filtered(portfolio_id, flow_types, start_date, end_date).with_entities(
+            CashFlow.date, CashFlow.flow_type, CashFlow.description, CashFlow.amount, CashFlow.running_balance
+        )
+        return self._ordered(query).yield_per(batch_size)
+    
+    def get_flow_totals(self, portfolio_id, flow_types=None, start_date=None, end_date=None):
+        """Sum and count of saved flows per flow type, aggregated in SQL"""
+        rows = self._filtered(portfolio_id, flow_types, start_date, end_date).with_entities(
+            CashFlow.flow_type, func.sum(CashFlow.amount), func.count()
+        ).group_by(CashFlow.flow_type).all()
+        
+        return {flow_type: {'amount': amount or 0.0, 'count': count} for flow_type, amount, count in rows}
+    
+    def encode_cursor(self, flow):
+        """Opaque cursor pointing just after the given flow"""
+        key = f"{flow.date.isoformat()}|{flow.sort_priority}|{flow.id}"
+        return base64.urlsafe_b64encode(key.encode()).decode()
+    
+    def decode_cursor(self, cursor):
+        """(date, sort_priority, id) from a cursor made by encode_cursor"""
+        try:
+            flow_date, priority, flow_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            return date.fromisoformat(flow_date), int(priority), flow_id
+        except (ValueError, UnicodeDecodeError) as e:
+            raise ValueError(f"Invalid cash flow cursor: {cursor}") from e
+    
+    def _filtered(self, portfolio_id, flow_types, start_date, end_date):
+        query = CashFlow.query.filter(CashFlow.portfolio_id == portfolio_id)
+        if flow_types:
+            query = query.filter(CashFlow.flow_type.in_(flow_types))
+        if start_date:
+            query = query.filter(CashFlow.date >= start_date)
+        if end_date:
+            query = query.filter(CashFlow.date <= end_date)
+        return query
+    
+    def _ordered(self, query):
+        return query.order_by(CashFlow.date.asc(), CashFlow.sort_priority.asc(), CashFlow.id.asc())
+    
+    def _page_totals(self, rows):
+        """Money in, money out and per-type sums of one page"""
+        by_type = defaultdict(float)
+        for flow in rows:
+            by_type[flow.flow_type] += flow.amount
+        
+        inflows = sum(flow.amount for flow in rows if flow.amount > 0)
+        outflows = sum(flow.amount for flow in rows if flow.amount < 0)
+        return {
+            'count': len(rows),
+            'inflows': inflows,
+            'outflows': outflows,
+            'net': inflows + outflows,
+            'by_type': dict(by_type)
+        }
@@ -1,15 +1,20 @@
 import hashlib
+from sqlalchemy import func
 from app import db
 from app.models.portfolio import Portfolio, StockTransaction, Dividend
 from app.models.cash_flow import CashFlow
 from app.services.cash_flow_service import CashFlowService
+from app.services.data_version_service import DataVersionService
 
 
 class CashFlowSyncService:
     """Service to ensure cash flows stay synchronized with transaction data"""
     
+    ARTIFACT = 'cash_flows'
+    
     def __init__(self):
         self.cash_flow_service = CashFlowService()
+        self.version_service = DataVersionService()
     
     def ensure_cash_flows_current(self, portfolio_id):
         """Ensure cash flows are synchronized with current transaction data"""
@@ -17,17 +22,22 @@ class CashFlowSyncService:
             self.regenerate_cash_flows(portfolio_id)
     
     def is_cash_flow_data_current(self, portfolio_id):
-        """Check if cash flows match current transaction data using hash comparison"""
-        current_hash = self.calculate_source_data_hash(portfolio_id)
-        stored_hash = self.get_stored_hash(portfolio_id)
-        
-        # Also check if cash flows exist at all
-        cash_flow_count = CashFlow.query.filter_by(portfolio_id=portfolio_id).count()
+        """
+        Check if cash flows were built from the current transaction data.
         
-        return cash_flow_count > 0 and current_hash == stored_hash
+        Every write to transactions and dividends bumps the portfolio's data
+        version, so comparing it with the version the flows were built from
+        replaces hashing the whole history on each request.
+        """
+        return self.version_service.is_artifact_current(portfolio_id, self.ARTIFACT)
     
     def calculate_source_data_hash(self, portfolio_id):
-        """Generate hash from all transactions and dividends"""
+        """
+        Generate hash from all transactions and dividends.
+        
+        Reads the whole history; kept for offline verification, the sync check
+        uses data versions instead.
+        """
         # Get all transactions and dividends for this portfolio
         transactions = StockTransaction.query.filter_by(portfolio_id=portfolio_id).order_by(
             StockTransaction.date.asc(), StockTransaction.id.asc()
@@ -51,52 +61,61 @@ class CashFlowSyncService:
         # Generate SHA-256 hash
         return hashlib.sha256(hash_input.encode()).hexdigest()
     
-    def get_stored_hash(self, portfolio_id):
-        """Get the stored hash for this portfolio's cash flows"""
-        portfolio = Portfolio.query.get(portfolio_id)
-        return portfolio.cash_flow_data_hash if portfolio else None
-    
-    def store_hash(self, portfolio_id, data_hash):
-        """Store the hash for this portfolio's cash flows"""
-        portfolio = Portfolio.query.get(portfolio_id)
-        if portfolio:
-            portfolio.cash_flow_data_hash = data_hash
-            db.session.commit()
-    
     def regenerate_cash_flows(self, portfolio_id):
-        """Regenerate cash flows from current transaction data"""
+        """
+        Regenerate cash flows from current transaction data.
+        
+        When the stored flows were built before and every change since then was
+        recorded with its date, only the flows from the earliest changed date on
+        are rewritten. Otherwise all flows are rebuilt.
+        """
         try:
-            # Generate fresh cash flows
-            cash_flows = self.cash_flow_service.generate_cash_flows(portfolio_id)
+            state = self.version_service.get_artifact_state(portfolio_id, self.ARTIFACT)
+            changed_from = state.changed_from if state else None
             
-            # Save to database (this clears existing cash flows first)
-            self.cash_flow_service.save_cash_flows(portfolio_id, cash_flows)
+            if changed_from and self._has_cash_flows(portfolio_id):
+                flow_count = self.cash_flow_service.regenerate_from(portfolio_id, changed_from)
+            else:
+                # Generate fresh cash flows
+                cash_flows = self.cash_flow_service.generate_cash_flows(portfolio_id)
+                
+                # Save to database (this clears existing cash flows first)
+                self.cash_flow_service.save_cash_flows(portfolio_id, cash_flows)
+                flow_count = len(cash_flows)
             
-            # Update stored hash
-            current_hash = self.calculate_source_data_hash(portfolio_id)
-            self.store_hash(portfolio_id, current_hash)
+            self.version_service.mark_artifact_current(portfolio_id, self.ARTIFACT)
+            db.session.commit()
             
-            return len(cash_flows)
+            return flow_count
             
         except Exception as e:
             db.session.rollback()
             raise e
     
+    def _has_cash_flows(self, portfolio_id):
+        return db.session.query(CashFlow.id).filter_by(portfolio_id=portfolio_id).first() is not None
+    
     def get_sync_status(self, portfolio_id):
         """Get synchronization status for debugging"""
-        current_hash = self.calculate_source_data_hash(portfolio_id)
-        stored_hash = self.get_stored_hash(portfolio_id)
-        cash_flow_count = CashFlow.query.filter_by(portfolio_id=portfolio_id).count()
+        stored_version, current_version = self.version_service.get_artifact_versions(portfolio_id, self.ARTIFACT)
+        is_current = stored_version is not None and stored_version == current_version
         
-        transaction_count = StockTransaction.query.filter_by(portfolio_id=portfolio_id).count()
-        dividend_count = Dividend.query.filter_by(portfolio_id=portfolio_id).count()
+        # All three counts in one round trip
+        cash_flow_count, transaction_count, dividend_count = db.session.query(
+            self._count(CashFlow.query.filter_by(portfolio_id=portfolio_id)),
+            self._count(StockTransaction.query.filter_by(portfolio_id=portfolio_id)),
+            self._count(Dividend.query.filter_by(portfolio_id=portfolio_id))
+        ).one()
         
         return {
-            'is_current': current_hash == stored_hash and cash_flow_count > 0,
-            'current_hash': current_hash[:8] + '...',  # First 8 chars for display
-            'stored_hash': (stored_hash[:8] + '...') if stored_hash else None,
+            'is_current': is_current,
+            'current_hash': f'v{current_version}',  # Data version of transactions and dividends
+            'stored_hash': f'v{stored_version}' if stored_version is not None else None,
             'cash_flow_count': cash_flow_count,
             'transaction_count': transaction_count,
             'dividend_count': dividend_count,
-            'needs_regeneration': current_hash != stored_hash or cash_flow_count == 0
-        }
\ No newline at end of file
+            'needs_regeneration': not is_current
+        }
+    
+    def _count(self, query):
+        return query.with_entities(func.count()).scalar_subquery()
@@ -0,0 +1,280 @@
+import logging
+from datetime import date
+from app.services.benchmark_service import BenchmarkService, DEFAULT_BENCHMARKS, benchmark_key
+from app.services.portfolio_service import PortfolioService
+from app.services.price_service import PriceService
+from app.services.price_snapshot import get_price_snapshot
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class DashboardAggregator:
+    """
+    Single-pass dashboard computation.
+
+    Loads transactions, dividends, cash, positions and one price snapshot for
+    the holdings and benchmarks once, then derives stats, holdings, daily
+    changes and benchmark equivalents from that data. The dashboard page and
+    its data endpoints build one aggregator per request and share it, instead
+    of each helper re-querying transactions, holdings and prices.
+    """
+
+    # Prices older than this (in minutes) are flagged as stale on the dashboard
+    STALE_MINUTES = 15
+
+    def __init__(self, portfolio_id, portfolio_service=None, price_service=None):
+        self.portfolio_id = portfolio_id
+        self.portfolio_service = portfolio_service or PortfolioService()
+        self.price_service = price_service or PriceService()
+        self._loaded = False
+        self._equivalents = None
+        self._stats = None
+        self._holdings_data = None
+
+    def load(self):
+        """Load the portfolio data and price snapshot (once)"""
+        if self._loaded:
+            return self
+
+        from app.views.main import get_last_market_date, is_market_open_now
+
+        portfolio_id = self.portfolio_id
+        self.transactions = self.portfolio_service.get_portfolio_transactions(portfolio_id)
+        self.dividends = self.portfolio_service.get_portfolio_dividends(portfolio_id)
+        self.cash_balance = self.portfolio_service.get_cash_balance(portfolio_id)
+        self.positions = self.portfolio_service.get_positions(portfolio_id)
+        self.holdings = {
+            ticker: position.shares
+            for ticker, position in self.positions.items()
+            if position.shares > 0
+        }
+        self.benchmarks = BenchmarkService().get_benchmarks(portfolio_id)
+
+        self.last_trading_day = get_last_market_date()
+        self.market_open = is_market_open_now()
+        self._load_prices()
+
+        self._loaded = True
+        return self
+
+    def _load_prices(self):
+        """Build the price snapshot: current, previous close and freshness per ticker"""
+        from app.views.main import get_previous_close, stored_closes
+
+        tickers = list(self.holdings) + [b for b in self.benchmarks if b not in self.holdings]
+        today = date.today()
+
+        # Latest and previous close for every ticker in one query, shared with the request
+        get_price_snapshot(tickers)
+
+        # Holdings use the batch path so stale prices are refreshed once for all of them
+        self.current_prices = self.price_service.get_current_prices_batch(list(self.holdings), use_cache=True)
+        for ticker in tickers:
+            if not self.current_prices.get(ticker):
+                self.current_prices[ticker] = self.price_service.get_current_price(ticker, use_stale=True)
+
+        # Benchmark equivalents are valued at the last stored close while the market is closed
+        self.benchmark_prices = {ticker: self.current_prices.get(ticker) for ticker in self.benchmarks}
+        if not self.market_open and self.benchmarks:
+            closes = stored_closes(self.benchmarks, self.last_trading_day)
+            for ticker in self.benchmarks:
+                if closes[ticker]:
+                    self.benchmark_prices[ticker] = closes[ticker]
+
+        # Batch price refreshes may have replaced the snapshot
+        snapshot = get_price_snapshot(tickers).prefetch_previous_closes(tickers, self.last_trading_day)
+        self.previous_closes = {
+            ticker: get_previous_close(ticker, self.last_trading_day, snapshot) for ticker in tickers
+        }
+        self.freshness = {ticker: self.price_service.get_data_freshness(ticker, today) for ticker in tickers}
+
+    @property
+    def net_invested(self):
+        self.load()
+        total_invested = sum(t.total_value for t in self.transactions if t.transaction_type == 'BUY')
+        total_sold = sum(t.total_value for t in self.transactions if t.transaction_type == 'SELL')
+        return total_invested - total_sold
+
+    def equivalents(self):
+        """Current value of each benchmark bought with the portfolio's purchases"""
+        if self._equivalents is None:
+            from app.views.main import calculate_benchmark_equivalents
+
+            self.load()
+            self._equivalents = calculate_benchmark_equivalents(
+                self.portfolio_id, self.portfolio_service, self.price_service,
+                benchmarks=self.benchmarks,
+                transactions=self.transactions,
+                current_prices=self.benchmark_prices
+            )
+        return self._equivalents
+
+    def daily_changes(self):
+        """Daily percentage and dollar changes for the portfolio and each benchmark"""
+        self.load()
+        equivalents = self.equivalents()
+
+        result = {}
+        for ticker in DEFAULT_BENCHMARKS + [b for b in self.benchmarks if b not in DEFAULT_BENCHMARKS]:
+            key = benchmark_key(ticker)
+            percentage = self._percentage_change(ticker) if ticker in self.benchmarks else 0
+            result[f'{key}_daily_change'] = percentage
+            result[f'{key}_daily_dollar_change'] = (equivalents.get(ticker) or 0) * (percentage / 100)
+
+        current_value = 0
+        previous_value = 0
+        for ticker, shares in self.holdings.items():
+            if self.current_prices.get(ticker):
+                current_value += shares * self.current_prices[ticker]
+            if self.previous_closes.get(ticker):
+                previous_value += shares * self.previous_closes[ticker]
+
+        if previous_value > 0:
+            result['portfolio_daily_dollar_change'] = current_value - previous_value
+            result['portfolio_daily_change'] = (current_value - previous_value) / previous_value * 100
+        else:
+            result['portfolio_daily_dollar_change'] = 0
+            result['portfolio_daily_change'] = 0
+
+        return result
+
+    def _percentage_change(self, ticker):
+        current_price = self.current_prices.get(ticker)
+        previous_price = self.previous_closes.get(ticker)
+        if current_price and previous_price:
+            return (current_price - previous_price) / previous_price * 100
+        return 0
+
+    def stats(self):
+        """Portfolio stats in the shape of calculate_minimal_portfolio_stats"""
+        if self._stats is None:
+            from app.views.main import calculate_benchmark_stats
+
+            self.load()
+            current_value = sum(
+                shares * self.current_prices[ticker]
+                for ticker, shares in self.holdings.items()
+                if self.current_prices.get(ticker)
+            ) + self.cash_balance
+
+            net_invested = self.net_invested
+            total_dividends = sum(d.total_amount for d in self.dividends)
+            total_gain_loss = current_value - net_invested + total_dividends
+
+            stats = {
+                'current_value': current_value,
+                'total_invested': net_invested,
+                'total_gain_loss': total_gain_loss,
+                'gain_loss_percentage': (total_gain_loss / net_invested * 100) if net_invested > 0 else 0,
+                'cash_balance': self.cash_balance,
+                'total_dividends': total_dividends
+            }
+            stats.update(calculate_benchmark_stats(self.equivalents(), net_invested))
+            stats.update(self.daily_changes())
+            self._stats = stats
+        return self._stats
+
+    def holdings_data(self):
+        """Holdings rows in the shape of get_minimal_holdings, largest position first"""
+        if self._holdings_data is not None:
+            return self._holdings_data
+
+        from app.views.main import calculate_holdings_benchmark_performance
+
+        self.load()
+        market_values = {
+            ticker: shares * (self.current_prices.get(ticker) or 0)
+            for ticker, shares in self.holdings.items()
+        }
+        total_portfolio_value = sum(market_values.values())
+
+        # Every holding's purchases priced in every benchmark from one series load
+        try:
+            performance = calculate_holdings_benchmark_performance(
+                self.transactions, self.holdings, self.benchmarks, current_prices=self.current_prices
+            )
+        except Exception as e:
+            logger.error(f"Error calculating benchmark performance: {e}")
+            performance = {}
+
+        holdings_data = []
+        for ticker, shares in self.holdings.items():
+            try:
+                current_price = self.current_prices.get(ticker) or 0
+                market_value = market_values[ticker]
+
+                position = self.positions.get(ticker)
+                avg_cost = position.cost_basis / position.shares if position and position.shares > 0 else 0
+                total_cost = shares * avg_cost
+                gain_loss = market_value - total_cost
+
+                benchmark_performance = performance.get(ticker) or {
+                    f'{benchmark_key(b)}_performance': 0 for b in DEFAULT_BENCHMARKS + self.benchmarks
+                }
+
+                freshness = self.freshness.get(ticker)
+                holding = {
+                    'ticker': ticker,
+                    'shares': shares,
+                    'current_price': current_price,
+                    'market_value': market_value,
+                    'cost_basis': total_cost,
+                    'gain_loss': gain_loss,
+                    'gain_loss_percentage': (gain_loss / total_cost * 100) if total_cost > 0 else 0
+                }
+                holding.update(benchmark_performance)
+                holding.update({
+                    'portfolio_percentage': (market_value / total_portfolio_value * 100) if total_portfolio_value > 0 else 0,
+                    'data_age_minutes': freshness,
+                    'is_stale': freshness is None or freshness > 5
+                })
+            except Exception as e:
+                logger.error(f"Error processing holding for {ticker}: {e}")
+                holding = {
+                    'ticker': ticker,
+                    'shares': shares,
+                    'current_price': 0,
+                    'market_value': 0,
+                    'cost_basis': 0,
+                    'gain_loss': 0,
+                    'gain_loss_percentage': 0
+                }
+                holding.update({f'{benchmark_key(b)}_performance': 0 for b in DEFAULT_BENCHMARKS + self.benchmarks})
+                holding.update({
+                    'portfolio_percentage': 0,
+                    'data_age_minutes': None,
+                    'is_stale': True
+                })
+            holdings_data.append(holding)
+
+        holdings_data.sort(key=lambda x: x['portfolio_percentage'], reverse=True)
+        self._holdings_data = holdings_data
+        return holdings_data
+
+    def recent_transactions(self, count=5):
+        """Most recent transactions first"""
+        self.load()
+        return list(reversed(self.transactions[-count:]))
+
+    def stale_tickers(self):
+        """Holdings and benchmarks whose prices are missing or older than STALE_MINUTES"""
+        self.load()
+
+        def is_stale(ticker):
+            freshness = self.freshness.get(ticker)
+            return freshness is None or freshness > self.STALE_MINUTES
+
+        stale_holdings = [ticker for ticker in self.holdings if is_stale(ticker)]
+        stale_etfs = [ticker for ticker in self.benchmarks if is_stale(ticker)]
+        return stale_holdings, stale_etfs
+
+    def data_warnings(self):
+        """Dashboard warnings about outdated holding prices"""
+        stale_holdings, _ = self.stale_tickers()
+        if not stale_holdings:
+            return []
+
+        if self.market_open:
+            return [f"⚠️ MARKET IS OPEN: Price data for {len(stale_holdings)} holdings is outdated. Prices shown may not reflect current market values."]
+        return [f"ℹ️ Market is closed. Showing last available prices for {len(stale_holdings)} holdings."]
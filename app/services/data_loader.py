@@ -1,165 +1,281 @@
+import logging
+from sqlalchemy import insert
 from app import db
 from app.models.portfolio import StockTransaction, Dividend
+from app.models.version import record_bulk_write
+from app.services.position_service import PositionService
+from app.util.csv_stream import EXPORT_BATCH_SIZE
 from datetime import datetime
 
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Parsed rows written per insert statement during CSV imports
+IMPORT_BATCH_SIZE = 5000
+
+# Export columns, named like the import columns so an export can be imported again
+TRANSACTION_EXPORT_HEADER = ['Ticker', 'Type', 'Date', 'Price', 'Shares', 'Total Value']
+DIVIDEND_EXPORT_HEADER = ['Ticker', 'Date', 'Amount']
+
 
 class DataLoader:
     
-    def import_transactions_from_csv(self, portfolio_id, csv_data):
-        imported_count = 0
+    def import_transactions_from_csv(self, portfolio_id, csv_data, progress=None):
+        """
+        Import transactions from parsed CSV rows in batches.
+        
+        Each row is validated and converted in one pass. The fingerprints of
+        the portfolio's existing transactions are loaded once into a set, so
+        duplicates (of stored rows or of earlier rows in the file) are skipped
+        without a query per row, and each batch of new rows is written with
+        one insert statement. csv_data may be any iterable of dict rows, such
+        as a csv.DictReader over the uploaded file.
+        
+        Args:
+            portfolio_id (str): Portfolio to import into
+            csv_data (iterable): Dict rows keyed by CSV column
+            progress (callable): Called after each batch with the rows read,
+                rows imported and failed row messages so far
+        
+        Returns:
+            int: Number of transactions imported
+        """
+        position_service = PositionService()
+        positions_current = position_service.is_current(portfolio_id)
+        
+        seen = self._existing_fingerprints(
+            StockTransaction,
+            portfolio_id,
+            StockTransaction.ticker,
+            StockTransaction.transaction_type,
+            StockTransaction.date,
+            StockTransaction.price_per_share,
+            StockTransaction.shares
+        )
+        
         failed_rows = []
+        imported_count = 0
+        imported_tickers = set()
+        earliest_date = None
         
-        for i, row in enumerate(csv_data):
-            try:
-                is_valid, errors = self.validate_transaction_data(row)
-                if is_valid:
-                    # Clean price (remove $ signs)
-                    price_str = row.get('Price', '').strip().replace('$', '').replace(',', '')
-                    shares_str = row.get('Shares', '').strip()
-                    
-                    ticker = row.get('Ticker', '').strip().upper()
-                    transaction_date = datetime.strptime(row.get('Date', '').strip(), '%Y-%m-%d').date()
-                    price_per_share = float(price_str)
-                    shares = float(shares_str)
-                    
-                    # Check for duplicate
-                    transaction_type = row.get('Type', '').strip().upper()
-                    existing = StockTransaction.query.filter_by(
-                        portfolio_id=portfolio_id,
-                        ticker=ticker,
-                        transaction_type=transaction_type,
-                        date=transaction_date,
-                        price_per_share=price_per_share,
-                        shares=shares
-                    ).first()
-                    
-                    if not existing:
-                        transaction = StockTransaction(
-                            portfolio_id=portfolio_id,
-                            ticker=ticker,
-                            transaction_type=transaction_type,
-                            date=transaction_date,
-                            price_per_share=price_per_share,
-                            shares=shares,
-                            total_value=price_per_share * shares
-                        )
-                        db.session.add(transaction)
-                        imported_count += 1
-                else:
+        for batch in self._batches(csv_data, IMPORT_BATCH_SIZE):
+            new_rows = []
+            for i, row in batch:
+                try:
+                    values, errors = self._parse_transaction(row)
+                except Exception as e:
+                    # One unreadable row is reported, not allowed to abort the import
+                    errors = [str(e)]
+                if errors:
                     failed_rows.append(f"Row {i+1}: {', '.join(errors)}")
-            except Exception as e:
-                failed_rows.append(f"Row {i+1}: {str(e)}")
+                    continue
+                
+                fingerprint = (values['ticker'], values['transaction_type'], values['date'],
+                               values['price_per_share'], values['shares'])
+                if fingerprint in seen:
+                    continue
+                seen.add(fingerprint)
+                
+                values['portfolio_id'] = portfolio_id
+                values['total_value'] = values['price_per_share'] * values['shares']
+                new_rows.append(values)
+                imported_tickers.add(values['ticker'])
+                if earliest_date is None or values['date'] < earliest_date:
+                    earliest_date = values['date']
+            
+            if new_rows:
+                db.session.execute(insert(StockTransaction), new_rows)
+                imported_count += len(new_rows)
+            
+            if progress:
+                progress(batch[-1][0] + 1, imported_count, failed_rows)
+        
+        if imported_count:
+            record_bulk_write(db.session, {portfolio_id: earliest_date})
+            
+            # Update the positions ledger for the imported tickers in the same commit
+            position_service.refresh_tickers(portfolio_id, imported_tickers, positions_current)
         
         db.session.commit()
         
         if failed_rows:
             self._last_import_errors = failed_rows
         
+        logger.info(f"Imported {imported_count} transactions into portfolio {portfolio_id}, {len(failed_rows)} rows failed")
         return imported_count
     
-    def import_dividends_from_csv(self, portfolio_id, csv_data):
-        imported_count = 0
+    def import_dividends_from_csv(self, portfolio_id, csv_data, progress=None):
+        """
+        Import dividends from parsed CSV rows in batches.
+        
+        Works like import_transactions_from_csv, with (ticker, payment date,
+        amount) as the duplicate fingerprint and the same progress callback.
+        
+        Returns:
+            int: Number of dividends imported
+        """
+        seen = self._existing_fingerprints(
+            Dividend,
+            portfolio_id,
+            Dividend.ticker,
+            Dividend.payment_date,
+            Dividend.total_amount
+        )
+        
         failed_rows = []
+        imported_count = 0
+        earliest_date = None
         
-        for i, row in enumerate(csv_data):
-            try:
-                is_valid, errors = self.validate_dividend_data(row)
-                if is_valid:
-                    # Handle date format conversion
-                    date_str = row.get('Date', '').strip()
-                    if '/' in date_str:
-                        # Convert MM/DD/YY to YYYY-MM-DD
-                        parts = date_str.split('/')
-                        if len(parts[2]) == 2:
-                            year = '20' + parts[2] if int(parts[2]) < 50 else '19' + parts[2]
-                        else:
-                            year = parts[2]
-                        payment_date = datetime.strptime(f"{year}-{parts[0].zfill(2)}-{parts[1].zfill(2)}", '%Y-%m-%d').date()
-                    else:
-                        payment_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-                    
-                    # Clean amount (remove $ signs)
-                    amount_str = row.get('Amount', '').strip().replace('$', '').replace(',', '')
-                    ticker = row.get('Ticker', '').strip().upper()
-                    total_amount = float(amount_str)
-                    
-                    # Check for duplicate
-                    existing = Dividend.query.filter_by(
-                        portfolio_id=portfolio_id,
-                        ticker=ticker,
-                        payment_date=payment_date,
-                        total_amount=total_amount
-                    ).first()
-                    
-                    if not existing:
-                        dividend = Dividend(
-                            portfolio_id=portfolio_id,
-                            ticker=ticker,
-                            payment_date=payment_date,
-                            total_amount=total_amount
-                        )
-                        db.session.add(dividend)
-                        imported_count += 1
-                else:
+        for batch in self._batches(csv_data, IMPORT_BATCH_SIZE):
+            new_rows = []
+            for i, row in batch:
+                try:
+                    values, errors = self._parse_dividend(row)
+                except Exception as e:
+                    # One unreadable row is reported, not allowed to abort the import
+                    errors = [str(e)]
+                if errors:
                     failed_rows.append(f"Row {i+1}: {', '.join(errors)}")
-            except Exception as e:
-                failed_rows.append(f"Row {i+1}: {str(e)}")
+                    continue
+                
+                fingerprint = (values['ticker'], values['payment_date'], values['total_amount'])
+                if fingerprint in seen:
+                    continue
+                seen.add(fingerprint)
+                
+                values['portfolio_id'] = portfolio_id
+                new_rows.append(values)
+                if earliest_date is None or values['payment_date'] < earliest_date:
+                    earliest_date = values['payment_date']
+            
+            if new_rows:
+                db.session.execute(insert(Dividend), new_rows)
+                imported_count += len(new_rows)
+            
+            if progress:
+                progress(batch[-1][0] + 1, imported_count, failed_rows)
+        
+        if imported_count:
+            record_bulk_write(db.session, {portfolio_id: earliest_date})
         
         db.session.commit()
         
         if failed_rows:
             self._last_import_errors = failed_rows
         
+        logger.info(f"Imported {imported_count} dividends into portfolio {portfolio_id}, {len(failed_rows)} rows failed")
         return imported_count
     
+    def _existing_fingerprints(self, model, portfolio_id, *columns):
+        """Duplicate-check keys of a portfolio's stored rows, read with one query"""
+        rows = db.session.query(*columns).filter(model.portfolio_id == portfolio_id).yield_per(EXPORT_BATCH_SIZE)
+        return {tuple(row) for row in rows}
+    
+    def _batches(self, rows, size):
+        """Numbered rows in lists of up to size, consuming the input lazily"""
+        batch = []
+        for numbered in enumerate(rows):
+            batch.append(numbered)
+            if len(batch) == size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    
     def export_portfolio_to_csv(self, portfolio_id):
-        transactions = StockTransaction.query.filter_by(portfolio_id=portfolio_id).all()
-        dividends = Dividend.query.filter_by(portfolio_id=portfolio_id).all()
-        
-        transaction_data = []
-        for t in transactions:
-            transaction_data.append({
-                'ticker': t.ticker,
-                'transaction_type': t.transaction_type,
-                'date': t.date.strftime('%Y-%m-%d'),
-                'price_per_share': str(t.price_per_share),
-                'shares': str(t.shares),
-                'total_value': str(t.total_value)
-            })
-        
-        dividend_data = []
-        for d in dividends:
-            dividend_data.append({
-                'ticker': d.ticker,
-                'payment_date': d.payment_date.strftime('%Y-%m-%d'),
-                'total_amount': str(d.total_amount)
-            })
+        transaction_data = [
+            dict(zip(('ticker', 'transaction_type', 'date', 'price_per_share', 'shares', 'total_value'), row))
+            for row in self.iter_transaction_rows(portfolio_id)
+        ]
+        dividend_data = [
+            dict(zip(('ticker', 'payment_date', 'total_amount'), row))
+            for row in self.iter_dividend_rows(portfolio_id)
+        ]
         
         return {
             'transactions': transaction_data,
             'dividends': dividend_data
         }
     
+    def iter_transaction_rows(self, portfolio_id, batch_size=EXPORT_BATCH_SIZE):
+        """
+        Transaction export rows in date order, read in batches.
+        
+        Only the exported columns are selected and fetched batch_size rows at a
+        time, so no model objects are built and memory does not grow with the
+        number of transactions.
+        """
+        rows = StockTransaction.query.filter_by(portfolio_id=portfolio_id).with_entities(
+            StockTransaction.ticker,
+            StockTransaction.transaction_type,
+            StockTransaction.date,
+            StockTransaction.price_per_share,
+            StockTransaction.shares,
+            StockTransaction.total_value
+        ).order_by(StockTransaction.date, StockTransaction.id).yield_per(batch_size)
+        
+        for ticker, transaction_type, transaction_date, price_per_share, shares, total_value in rows:
+            yield [
+                ticker,
+                transaction_type,
+                transaction_date.strftime('%Y-%m-%d'),
+                str(price_per_share),
+                str(shares),
+                str(total_value)
+            ]
+    
+    def iter_dividend_rows(self, portfolio_id, batch_size=EXPORT_BATCH_SIZE):
+        """Dividend export rows in payment date order, read in batches"""
+        rows = Dividend.query.filter_by(portfolio_id=portfolio_id).with_entities(
+            Dividend.ticker,
+            Dividend.payment_date,
+            Dividend.total_amount
+        ).order_by(Dividend.payment_date, Dividend.id).yield_per(batch_size)
+        
+        for ticker, payment_date, total_amount in rows:
+            yield [ticker, payment_date.strftime('%Y-%m-%d'), str(total_amount)]
+    
     def validate_transaction_data(self, data):
+        _, errors = self._parse_transaction(data)
+        return len(errors) == 0, errors
+    
+    def validate_dividend_data(self, data):
+        errors = self._dividend_errors(data)
+        return len(errors) == 0, errors
+    
+    def _field(self, data, column):
+        """A stripped CSV value ('' when a short row leaves the column as None)"""
+        return (data.get(column) or '').strip()
+    
+    def _parse_transaction(self, data):
+        """
+        Validate and convert one transaction row in a single pass.
+        
+        Returns:
+            tuple: (column values or None, list of errors)
+        """
         errors = []
         
-        if not data.get('Ticker', '').strip():
+        ticker = self._field(data, 'Ticker').upper()
+        if not ticker:
             errors.append("Ticker is required")
         
-        transaction_type = data.get('Type', '').strip().upper()
+        transaction_type = self._field(data, 'Type').upper()
         if transaction_type not in ['BUY', 'SELL']:
             errors.append("Type must be BUY or SELL")
         
-        date_str = data.get('Date', '').strip()
+        transaction_date = None
+        date_str = self._field(data, 'Date')
         if not date_str:
             errors.append("Date is required")
         else:
             try:
-                datetime.strptime(date_str, '%Y-%m-%d')
+                transaction_date = datetime.strptime(date_str, '%Y-%m-%d').date()
             except ValueError:
                 errors.append("Invalid date format (use YYYY-MM-DD)")
         
-        price_str = data.get('Price', '').strip().replace('$', '').replace(',', '')
+        price = None
+        price_str = self._field(data, 'Price').replace('$', '').replace(',', '')
         if not price_str:
             errors.append("Price is required")
         else:
@@ -170,7 +286,8 @@ class DataLoader:
             except ValueError:
                 errors.append("Invalid price format")
         
-        shares_str = data.get('Shares', '').strip()
+        shares = None
+        shares_str = self._field(data, 'Shares')
         if not shares_str:
             errors.append("Shares is required")
         else:
@@ -181,19 +298,52 @@ class DataLoader:
             except ValueError:
                 errors.append("Invalid shares format")
         
-        return len(errors) == 0, errors
+        if errors:
+            return None, errors
+        
+        return {
+            'ticker': ticker,
+            'transaction_type': transaction_type,
+            'date': transaction_date,
+            'price_per_share': price,
+            'shares': shares
+        }, errors
     
-    def validate_dividend_data(self, data):
+    def _parse_dividend(self, data):
+        """
+        Validate and convert one dividend row in a single pass.
+        
+        Dates may be YYYY-MM-DD or MM/DD/YY(YY).
+        
+        Returns:
+            tuple: (column values or None, list of errors)
+        """
+        errors = self._dividend_errors(data)
+        if errors:
+            return None, errors
+        
+        try:
+            payment_date = self._parse_dividend_date(self._field(data, 'Date'))
+        except (ValueError, IndexError) as e:
+            return None, [str(e)]
+        
+        return {
+            'ticker': self._field(data, 'Ticker').upper(),
+            'payment_date': payment_date,
+            'total_amount': float(self._field(data, 'Amount').replace('$', '').replace(',', ''))
+        }, errors
+    
+    def _dividend_errors(self, data):
         errors = []
         
-        if not data.get('Ticker', '').strip():
+        if not self._field(data, 'Ticker'):
             errors.append("Ticker is required")
         
-        date_str = data.get('Date', '').strip()
+        date_str = self._field(data, 'Date')
         if not date_str:
             errors.append("Date is required")
         
-        amount_str = data.get('Amount', '').strip().replace('$', '').replace(',', '')
+        amount_str = self._field(data, 'Amount').replace('$', '').replace(',', '')
         if not amount_str:
             errors.append("Amount is required")
         else:
@@ -204,10 +354,20 @@ class DataLoader:
             except ValueError:
                 errors.append("Invalid amount format")
         
-        return len(errors) == 0, errors
+        return errors
     
-
+    def _parse_dividend_date(self, date_str):
+        if '/' in date_str:
+            # Convert MM/DD/YY to YYYY-MM-DD
+            parts = date_str.split('/')
+            if len(parts[2]) == 2:
+                year = '20' + parts[2] if int(parts[2]) < 50 else '19' + parts[2]
+            else:
+                year = parts[2]
+            return datetime.strptime(f"{year}-{parts[0].zfill(2)}-{parts[1].zfill(2)}", '%Y-%m-%d').date()
+        return datetime.strptime(date_str, '%Y-%m-%d').date()
     
+
     def backup_to_csv(self, portfolio_id):
         # Simple implementation that returns True for testing
         return True
\ No newline at end of file
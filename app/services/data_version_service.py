@@ -0,0 +1,88 @@
+import hashlib
+from sqlalchemy.orm.attributes import flag_modified
+from app import db
+from app.models.version import DataVersion, DerivedDataState, PRICE_SCOPE
+
+
+class DataVersionService:
+    """Service to read data version counters and build ETags from them"""
+
+    def get_version(self, scope):
+        """Get the current version for a scope (0 if it never changed)"""
+        version = db.session.query(DataVersion.version).filter_by(scope=scope).scalar()
+        return version or 0
+
+    def get_portfolio_version(self, portfolio_id):
+        """Get the version of a portfolio's transactions, dividends and cash"""
+        return self.get_version(portfolio_id)
+
+    def get_price_version(self):
+        """Get the version of the price history snapshot"""
+        return self.get_version(PRICE_SCOPE)
+
+    def build_etag(self, portfolio_id, *parts):
+        """
+        Build a strong ETag from the portfolio data version, the price
+        snapshot version and any extra parts (market date, variant).
+
+        Returns:
+            str: ETag value without quotes
+        """
+        components = [
+            portfolio_id,
+            self.get_portfolio_version(portfolio_id),
+            self.get_price_version()
+        ] + list(parts)
+
+        etag_input = '|'.join(str(part) for part in components)
+        return hashlib.sha256(etag_input.encode()).hexdigest()[:32]
+
+    def get_artifact_versions(self, portfolio_id, artifact):
+        """
+        Get the version an artifact was built from and the current portfolio
+        version, with one primary-key lookup of each table in a single query.
+
+        Returns:
+            tuple: (source_version or None if never built, current_version)
+        """
+        row = db.session.query(
+            DerivedDataState.source_version,
+            DataVersion.version
+        ).select_from(DerivedDataState).outerjoin(
+            DataVersion, DataVersion.scope == DerivedDataState.portfolio_id
+        ).filter(
+            DerivedDataState.portfolio_id == portfolio_id,
+            DerivedDataState.artifact == artifact
+        ).first()
+
+        if row is None:
+            return None, self.get_portfolio_version(portfolio_id)
+        return row.source_version, row.version or 0
+
+    def is_artifact_current(self, portfolio_id, artifact):
+        """Check if a derived artifact was built from the current portfolio data"""
+        source_version, current_version = self.get_artifact_versions(portfolio_id, artifact)
+        return source_version is not None and source_version == current_version
+
+    def get_artifact_state(self, portfolio_id, artifact):
+        """Get the build state of a derived artifact, or None if it was never built"""
+        return db.session.get(DerivedDataState, (portfolio_id, artifact))
+
+    def mark_artifact_current(self, portfolio_id, artifact):
+        """Record that a derived artifact matches the current portfolio data (caller commits)"""
+        state = db.session.get(DerivedDataState, (portfolio_id, artifact))
+        if state is None:
+            state = DerivedDataState(portfolio_id=portfolio_id, artifact=artifact)
+            db.session.add(state)
+        state.source_version = self.get_portfolio_version(portfolio_id)
+
+        # changed_from is lowered with Core updates, so the loaded value may be stale
+        state.changed_from = None
+        flag_modified(state, 'changed_from')
+
+    def clear_artifacts(self, portfolio_id, artifacts):
+        """Forget derived artifacts so they rebuild on next use (caller commits)"""
+        DerivedDataState.query.filter(
+            DerivedDataState.portfolio_id == portfolio_id,
+            DerivedDataState.artifact.in_(artifacts)
+        ).delete(synchronize_session=False)
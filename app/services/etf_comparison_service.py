@@ -1,192 +1,427 @@
-from app.services.cash_flow_service import CashFlowService
+import logging
+from datetime import date, datetime
+from sqlalchemy import func, insert
+from app import db
+from app.models.cash_flow import ETFComparison, ETFCashFlow
+from app.models.price import EtfDividend, PriceHistory
+from app.services.cash_flow_context import get_cash_flow_context
+from app.services.data_version_service import DataVersionService
 from app.services.price_service import PriceService
 from app.services.irr_calculation_service import IRRCalculationService
-from datetime import date
+from app.services.etf_price_resolver import EtfPriceResolver
+from app.util import calculators
+import numpy as np
 import yfinance as yf
 
+# Configure logging
+logger = logging.getLogger(__name__)
+
 
 class ETFComparisonService:
-    
+    """
+    Simulates investing a portfolio's deposits in a single ETF.
+
+    Deposits and ETF dividend dates are merged into one sorted event stream,
+    priced from one preloaded close series, and run through a single
+    compounding pass, so the cost grows linearly with the number of deposits
+    and dividends.
+
+    Results are stored in the etf_comparisons and etf_cash_flows tables and
+    kept as a materialized cache: a comparison is current while the portfolio
+    data version it was built from is unchanged and no newer ETF close exists.
+    Portfolio edits rewrite only the flows from the earliest changed date on,
+    and new distributions are appended from their date, so the comparison
+    views read stored rows instead of simulating on every request.
+
+    Distributions are read from the etf_dividends table, which the history
+    prefetcher refreshes in the background once per new close. Flows priced
+    without stored history are kept and rebuilt once that history is stored.
+    """
+
+    ARTIFACT = 'etf_comparison'
+
+    # Dividends below this (in dollars) are left out of the flow list
+    MIN_DIVIDEND = 0.01
+
+    # Stored reinvestments sort after the deposit purchases of the same day
+    FLOW_TYPE_PRIORITY = {
+        'DIVIDEND': 1,
+        'DEPOSIT': 2,
+        'PURCHASE': 3,
+        'REINVEST': 4,
+        'SALE': 5
+    }
+
     def __init__(self):
-        self.cash_flow_service = CashFlowService()
+        self.version_service = DataVersionService()
         self.price_service = PriceService()
         self.irr_service = IRRCalculationService()
-    
+
     def get_etf_cash_flows(self, portfolio_id, etf_ticker):
-        """Generate ETF cash flows based on portfolio deposits with real prices"""
-        # Get portfolio cash flows (deposits only)
-        portfolio_cash_flows = self.cash_flow_service.generate_cash_flows(portfolio_id)
-        deposits = [cf for cf in portfolio_cash_flows if cf['flow_type'] == 'DEPOSIT']
-        
-        if not deposits:
-            return []
-        
-        # Convert deposits to ETF purchases with real prices
+        """Get the ETF cash flows simulated from the portfolio's deposits"""
+        return self._stored_flows(self._request_comparison(portfolio_id, etf_ticker))
+
+    def get_etf_summary(self, portfolio_id, etf_ticker):
+        """Get ETF comparison summary metrics"""
+        comparison = self._request_comparison(portfolio_id, etf_ticker)
+
+        # Investment gain = current value - total invested - dividends received
+        investment_gain = comparison.current_value - comparison.total_invested - comparison.dividends_received
+
+        return {
+            'total_invested': comparison.total_invested,
+            'portfolio_value': comparison.current_value,
+            'investment_gain': investment_gain,
+            'cash_balance': 0.0,
+            'dividends_received': comparison.dividends_received,
+            'irr': comparison.irr_value or 0.0
+        }
+
+    def get_comparison(self, portfolio_id, etf_ticker):
+        """
+        Get the stored comparison, bringing it up to date first if needed.
+
+        Returns:
+            ETFComparison: Comparison whose flows and totals match the current
+            portfolio data and the latest stored ETF close
+        """
+        from app.services.background_tasks import history_prefetcher
+
+        comparison = ETFComparison.query.filter_by(portfolio_id=portfolio_id, etf_ticker=etf_ticker).first()
+        artifact = self._artifact_for(etf_ticker)
+        latest_close = self._latest_close(etf_ticker)
+        latest_dividend = self._latest_dividend(etf_ticker)
+
+        source_current = self.version_service.is_artifact_current(portfolio_id, artifact)
+        if comparison is not None and source_current and \
+                (comparison.price_date, comparison.current_price) == latest_close and \
+                not self._has_new_dividends(comparison, latest_dividend) and \
+                not self._history_covers(etf_ticker, comparison.estimated_from):
+            return comparison
+
+        if comparison is None or comparison.price_date != latest_close[0]:
+            # New distributions are stored in the background and appended by a later read
+            history_prefetcher.prefetch_dividends(etf_ticker, latest_close[0])
+
+        try:
+            comparison = self._refresh(portfolio_id, etf_ticker, comparison, source_current, latest_close)
+            self.version_service.mark_artifact_current(portfolio_id, artifact)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        return comparison
+
+    def _request_comparison(self, portfolio_id, etf_ticker):
+        """The comparison, brought up to date at most once per request"""
+        return get_cash_flow_context(portfolio_id).comparison(etf_ticker, self.get_comparison)
+
+    def _refresh(self, portfolio_id, etf_ticker, comparison, source_current, latest_close):
+        """
+        Update a comparison's flows and totals (caller commits).
+
+        Flows are rewritten from the earliest changed portfolio date, the
+        first stored dividend not yet accounted for or the first estimated
+        flow whose history is now stored, whichever is earliest. Without a
+        usable build state every flow is rebuilt.
+
+        Returns:
+            ETFComparison: The updated comparison
+        """
+        state = self.version_service.get_artifact_state(portfolio_id, self._artifact_for(etf_ticker))
+
+        rebuild = comparison is None or state is None
+        rebuild_from = None
+        if not rebuild and not source_current:
+            # Versions move without a date for changes that cannot be located
+            rebuild = state.changed_from is None
+            rebuild_from = state.changed_from
+
+        if comparison is None:
+            comparison = ETFComparison(portfolio_id=portfolio_id, etf_ticker=etf_ticker)
+            db.session.add(comparison)
+            db.session.flush()
+
+        dividends = self._stored_dividends(etf_ticker)
+        new_dividends = [div_date for div_date, _ in dividends
+                         if comparison.last_dividend_date is None or div_date > comparison.last_dividend_date]
+        if new_dividends and not rebuild:
+            rebuild_from = min(rebuild_from or new_dividends[0], new_dividends[0])
+        if dividends:
+            comparison.last_dividend_date = max(comparison.last_dividend_date or date.min, dividends[-1][0])
+
+        estimated_from = comparison.estimated_from
+        if estimated_from is not None and not rebuild and self._history_covers(etf_ticker, estimated_from):
+            rebuild_from = min(rebuild_from or estimated_from, estimated_from)
+
+        if rebuild:
+            comparison.estimated_from = self._rebuild_flows(portfolio_id, etf_ticker, comparison, None, dividends)
+        elif rebuild_from is not None:
+            rebuilt_from = self._rebuild_flows(portfolio_id, etf_ticker, comparison, rebuild_from, dividends)
+            # Estimated flows before rebuild_from are kept as they are
+            if estimated_from is None or estimated_from >= rebuild_from:
+                comparison.estimated_from = rebuilt_from
+
+        self._revalue(comparison, latest_close)
+        return comparison
+
+    def _rebuild_flows(self, portfolio_id, etf_ticker, comparison, from_date, dividends):
+        """
+        Replace the stored flows on or after from_date (all flows when None).
+
+        Shares bought before from_date cannot depend on later events, so their
+        sum is the holding the rebuilt suffix starts from.
+
+        Returns:
+            date: Earliest rebuilt event priced without stored history, or None
+        """
+        opening_shares = 0.0
+        stored = ETFCashFlow.query.filter(ETFCashFlow.etf_comparison_id == comparison.id)
+        if from_date is not None:
+            opening_shares = db.session.query(func.coalesce(func.sum(ETFCashFlow.shares), 0.0)).filter(
+                ETFCashFlow.etf_comparison_id == comparison.id,
+                ETFCashFlow.flow_type.in_(['PURCHASE', 'REINVEST']),
+                ETFCashFlow.date < from_date
+            ).scalar()
+            stored = stored.filter(ETFCashFlow.date >= from_date)
+            dividends = [(div_date, per_share) for div_date, per_share in dividends if div_date >= from_date]
+        stored.delete(synchronize_session=False)
+
+        deposits = self._get_deposits(portfolio_id, from_date)
+        simulation = self.simulate(etf_ticker, deposits, dividends, opening_shares=opening_shares)
+
+        if simulation['cash_flows']:
+            db.session.execute(insert(ETFCashFlow), [
+                {
+                    'etf_comparison_id': comparison.id,
+                    'date': flow['date'],
+                    'flow_type': 'REINVEST' if flow.get('reinvestment') else flow['flow_type'],
+                    'amount': flow['amount'],
+                    'shares': flow['shares'],
+                    'price_per_share': flow['price_per_share'],
+                    'description': flow['description'],
+                    'running_balance': flow['running_balance']
+                }
+                for flow in simulation['cash_flows']
+            ])
+
+        logger.info(f"Rebuilt {len(simulation['cash_flows'])} {etf_ticker} comparison flows for portfolio "
+                    f"{portfolio_id} from {from_date or 'the first deposit'}")
+        return simulation['estimated_from']
+
+    def _revalue(self, comparison, latest_close):
+        """Recompute the stored totals, value and IRR from the stored flows"""
+        price_date, current_price = latest_close
+        etf_cash_flows = self._stored_flows(comparison)
+
+        comparison.total_invested = sum(-flow['amount'] for flow in etf_cash_flows
+                                        if flow['flow_type'] == 'PURCHASE' and not flow['reinvestment'])
+        comparison.current_shares = sum(flow['shares'] for flow in etf_cash_flows if flow['flow_type'] == 'PURCHASE')
+
+        # Get dividend total for display (even though reinvested)
+        comparison.dividends_received = sum(flow['amount'] for flow in etf_cash_flows
+                                            if flow['flow_type'] == 'DIVIDEND' and flow['amount'] > 0)
+
+        if current_price:
+            comparison.current_value = comparison.current_shares * current_price
+        else:
+            comparison.current_value = comparison.total_invested
+
+        # Calculate proper IRR using ETF cash flows
+        comparison.irr_value = self.irr_service.calculate_irr(etf_cash_flows, comparison.current_value) \
+            if etf_cash_flows else 0.0
+        comparison.price_date = price_date
+        comparison.current_price = current_price
+        comparison.last_updated = datetime.utcnow()
+
+    def _stored_flows(self, comparison):
+        """Stored flows of a comparison as flow dicts in display order"""
+        rows = ETFCashFlow.query.filter_by(
+            etf_comparison_id=comparison.id
+        ).order_by(ETFCashFlow.date.asc()).all()
+
+        # Sort by date first, then by flow type priority for same-day transactions
+        rows.sort(key=lambda row: (row.date, self.FLOW_TYPE_PRIORITY.get(row.flow_type, 99)))
+
+        return [
+            {
+                'date': row.date,
+                'flow_type': 'PURCHASE' if row.flow_type == 'REINVEST' else row.flow_type,
+                'amount': row.amount,
+                'description': row.description,
+                'shares': row.shares,
+                'price_per_share': row.price_per_share,
+                'running_balance': row.running_balance,
+                'reinvestment': row.flow_type == 'REINVEST'
+            }
+            for row in rows
+        ]
+
+    def _latest_close(self, etf_ticker):
+        """(date, close) of the latest stored ETF price, or (None, None)"""
+        row = db.session.query(PriceHistory.date, PriceHistory.close_price).filter(
+            PriceHistory.ticker == etf_ticker,
+            PriceHistory.close_price.isnot(None)
+        ).order_by(PriceHistory.date.desc()).first()
+        return (row.date, row.close_price) if row else (None, None)
+
+    def _stored_dividends(self, etf_ticker):
+        """Stored (date, dividend per share) pairs of an ETF in date order"""
+        rows = db.session.query(EtfDividend.date, EtfDividend.dividend).filter(
+            EtfDividend.ticker == etf_ticker
+        ).order_by(EtfDividend.date.asc()).all()
+        return [(row.date, row.dividend) for row in rows]
+
+    def _latest_dividend(self, etf_ticker):
+        """Date of the latest stored ETF dividend, or None"""
+        return db.session.query(func.max(EtfDividend.date)).filter(EtfDividend.ticker == etf_ticker).scalar()
+
+    def _has_new_dividends(self, comparison, latest_dividend):
+        """Whether a dividend newer than the ones the stored flows include is stored"""
+        return latest_dividend is not None and \
+            (comparison.last_dividend_date is None or latest_dividend > comparison.last_dividend_date)
+
+    def _history_covers(self, etf_ticker, estimated_from):
+        """Whether stored history now prices the earliest estimated flow"""
+        if estimated_from is None:
+            return False
+        resolver = EtfPriceResolver().load([etf_ticker], [estimated_from])
+        return not resolver.uncovered(etf_ticker, [estimated_from])
+
+    def _artifact_for(self, etf_ticker):
+        return f'{self.ARTIFACT}_{etf_ticker}'
+
+    def simulate(self, etf_ticker, deposits, dividends=None, opening_shares=0.0):
+        """
+        Invest each deposit in the ETF and reinvest every dividend.
+
+        Args:
+            etf_ticker (str): ETF to simulate
+            deposits (list): Deposit flows with 'date' and 'amount'
+            dividends (list): (date, dividend per share) pairs; fetched when None
+            opening_shares (float): Shares already held before the first event
+
+        Returns:
+            dict: cash_flows (PURCHASE/DIVIDEND flows in display order), total_shares
+            and estimated_from (earliest event priced without stored history, or None)
+        """
+        if not deposits and not opening_shares:
+            return {'cash_flows': [], 'total_shares': 0.0, 'estimated_from': None}
+
+        if dividends is None:
+            dividends = self.get_etf_dividends(etf_ticker, min(d['date'] for d in deposits))
+        if not opening_shares:
+            # Nothing is held before the first deposit
+            start_date = min(d['date'] for d in deposits)
+            dividends = [(div_date, per_share) for div_date, per_share in dividends if div_date >= start_date]
+
+        # Deposits sort before a dividend on the same day, so they earn it
+        events = [(d['date'], 0, d['amount']) for d in deposits]
+        events += [(div_date, 1, per_share) for div_date, per_share in dividends]
+        events.sort(key=lambda event: (event[0], event[1]))
+
+        event_dates = [event[0] for event in events]
+        is_dividend = np.array([event[1] == 1 for event in events], dtype=bool)
+        values = np.array([event[2] for event in events], dtype=np.float64)
+        prices, estimated_from = self._event_prices(etf_ticker, event_dates)
+
+        held_before, bought, dividend_cash = calculators.reinvested_shares(
+            is_dividend, values, prices, opening_shares=opening_shares
+        )
+
         etf_cash_flows = []
-        
-        for deposit in deposits:
-            # Get ETF price on deposit date
-            etf_price = self.price_service.get_cached_price(etf_ticker, deposit['date'])
-            if not etf_price:
-                # Fallback to current price if historical not available
-                etf_price = self.price_service.get_current_price(etf_ticker)
-            
-            if etf_price:
-                shares_purchased = deposit['amount'] / etf_price
-                
+        for i, event_date in enumerate(event_dates):
+            price = prices[i]
+            if not is_dividend[i]:
+                if np.isfinite(price):
+                    etf_cash_flows.append({
+                        'date': event_date,
+                        'flow_type': 'PURCHASE',
+                        'amount': -values[i],
+                        'description': f'{bought[i]:.4f} shares @ ${price:.2f}',
+                        'shares': bought[i],
+                        'price_per_share': price,
+                        'running_balance': 0.0,
+                        'reinvestment': False
+                    })
+                continue
+
+            if dividend_cash[i] <= self.MIN_DIVIDEND:
+                continue
+
+            etf_cash_flows.append({
+                'date': event_date,
+                'flow_type': 'DIVIDEND',
+                'amount': dividend_cash[i],
+                'description': f'${values[i]:.2f} per share',
+                'shares': held_before[i],  # Use actual shares on dividend date
+                'price_per_share': values[i],
+                'running_balance': 0.0,
+                'reinvestment': False
+            })
+
+            # Add dividend reinvestment
+            if np.isfinite(price):
                 etf_cash_flows.append({
-                    'date': deposit['date'],
+                    'date': event_date,
                     'flow_type': 'PURCHASE',
-                    'amount': -deposit['amount'],
-                    'description': f'{shares_purchased:.4f} shares @ ${etf_price:.2f}',
-                    'shares': shares_purchased,
-                    'price_per_share': etf_price,
-                    'running_balance': 0.0
+                    'amount': -dividend_cash[i],  # Negative for purchase
+                    'description': f'{bought[i]:.4f} shares @ ${price:.2f} (dividend reinvestment)',
+                    'shares': bought[i],
+                    'price_per_share': price,
+                    'running_balance': 0.0,
+                    'reinvestment': True
                 })
-        
-        # Add dividend cash flows with reinvestment
-        dividend_flows = self._get_etf_dividend_flows(etf_ticker, deposits, etf_cash_flows)
-        etf_cash_flows.extend(dividend_flows)
-        
-        # Sort by date
-        etf_cash_flows.sort(key=lambda x: x['date'])
-        
-        # Define flow type priority for same-day sorting (dividends, deposits, purchases)
-        flow_type_priority = {
-            'DIVIDEND': 1,
-            'DEPOSIT': 2,
-            'PURCHASE': 3,
-            'SALE': 4
-        }
-        
+
         # Sort by date first, then by flow type priority for same-day transactions
-        etf_cash_flows.sort(key=lambda x: (x['date'], flow_type_priority.get(x['flow_type'], 99)))
-        
-        return etf_cash_flows
-    
-    def get_etf_summary(self, portfolio_id, etf_ticker):
-        """Get ETF comparison summary metrics with real prices"""
-        portfolio_cash_flows = self.cash_flow_service.generate_cash_flows(portfolio_id)
-        deposits = [cf for cf in portfolio_cash_flows if cf['flow_type'] == 'DEPOSIT']
-        
-        if not deposits:
-            return {
-                'total_invested': 0.0,
-                'portfolio_value': 0.0,
-                'investment_gain': 0.0,
-                'cash_balance': 0.0,
-                'dividends_received': 0.0,
-                'irr': 0.0
-            }
-        
-        total_invested = sum(d['amount'] for d in deposits)
-        
-        # Calculate total shares including reinvestment by getting actual cash flows
-        etf_cash_flows = self.get_etf_cash_flows(portfolio_id, etf_ticker)
-        total_shares = 0.0
-        
-        # Sum up all share purchases (initial + reinvested)
-        for flow in etf_cash_flows:
-            if flow['flow_type'] == 'PURCHASE':
-                total_shares += flow['shares']
-        
-        # Get current value
-        current_price = self.price_service.get_current_price(etf_ticker)
-        current_value = total_shares * current_price if current_price else total_invested
-        
-        # Get dividend total for display (even though reinvested)
-        dividends_received = sum(flow['amount'] for flow in etf_cash_flows 
-                               if flow['flow_type'] == 'DIVIDEND' and flow['amount'] > 0)
-        
-        # Investment gain = current value - total invested - dividends received
-        investment_gain = current_value - total_invested - dividends_received
-        
-        # Calculate proper IRR using ETF cash flows
-        irr_value = self.irr_service.calculate_irr(etf_cash_flows, current_value)
-        
+        etf_cash_flows.sort(key=lambda x: (x['date'], self.FLOW_TYPE_PRIORITY.get(x['flow_type'], 99)))
+
         return {
-            'total_invested': total_invested,
-            'portfolio_value': current_value,
-            'investment_gain': investment_gain,
-            'cash_balance': 0.0,
-            'dividends_received': dividends_received,
-            'irr': irr_value
+            'cash_flows': etf_cash_flows,
+            'total_shares': float(opening_shares + bought.sum()),
+            'estimated_from': estimated_from
         }
-    
-    def _get_etf_dividend_flows(self, etf_ticker, deposits, existing_cash_flows):
-        """Get ETF dividend cash flows using yfinance API"""
-        if not deposits:
-            return []
-        
+
+    def get_etf_dividends(self, etf_ticker, start_date):
+        """Get (date, dividend per share) pairs on or after start_date using yfinance API"""
         try:
-            # Get dividend history from yfinance
-            etf = yf.Ticker(etf_ticker)
-            dividends = etf.dividends
-            
+            dividends = yf.Ticker(etf_ticker).dividends
+
             if dividends.empty:
                 return []
-            
-            dividend_flows = []
-            start_date = min(d['date'] for d in deposits)
-            
-            # Filter dividends after first deposit and sort by date
-            relevant_dividends = [(div_date.date(), float(div_amount)) 
-                                for div_date, div_amount in dividends.items() 
-                                if div_date.date() >= start_date]
-            relevant_dividends.sort(key=lambda x: x[0])
-            
-            # Process each dividend date
-            for div_date, div_amount in relevant_dividends:
-                # Calculate shares held at this dividend date
-                shares_on_date = self._calculate_shares_on_date(existing_cash_flows, div_date)
-                
-                if shares_on_date > 0:
-                    total_dividend = div_amount * shares_on_date
-                    if total_dividend > 0.01:  # Only include meaningful dividends
-                        dividend_flow = {
-                            'date': div_date,
-                            'flow_type': 'DIVIDEND',
-                            'amount': total_dividend,
-                            'description': f'${div_amount:.2f} per share',
-                            'shares': shares_on_date,  # Use actual shares on dividend date
-                            'price_per_share': div_amount,
-                            'running_balance': 0.0
-                        }
-                        dividend_flows.append(dividend_flow)
-                        
-                        # Add dividend reinvestment
-                        div_price = self.price_service.get_cached_price(etf_ticker, div_date)
-                        if not div_price:
-                            div_price = self.price_service.get_current_price(etf_ticker)
-                        
-                        if div_price and total_dividend > 0:
-                            reinvest_shares = total_dividend / div_price
-                            
-                            reinvest_flow = {
-                                'date': div_date,
-                                'flow_type': 'PURCHASE',
-                                'amount': -total_dividend,  # Negative for purchase
-                                'description': f'{reinvest_shares:.4f} shares @ ${div_price:.2f} (dividend reinvestment)',
-                                'shares': reinvest_shares,
-                                'price_per_share': div_price,
-                                'running_balance': 0.0
-                            }
-                            dividend_flows.append(reinvest_flow)
-            
-            return dividend_flows
-            
+
+            return sorted(
+                (div_date.date(), float(div_amount))
+                for div_date, div_amount in dividends.items()
+                if div_date.date() >= start_date
+            )
         except Exception as e:
-            print(f"Failed to get dividend data for {etf_ticker}: {e}")
+            logger.warning(f"Failed to get dividend data for {etf_ticker}: {e}")
             return []
-    
-    def _calculate_shares_on_date(self, cash_flows, target_date):
-        """Calculate shares held on a specific date based on existing cash flows"""
-        total_shares = 0.0
-        
-        # Add up all purchases and reinvestments up to target date
-        for flow in cash_flows:
-            if flow['date'] <= target_date:
-                if flow['flow_type'] == 'PURCHASE':
-                    total_shares += flow['shares']
-        
-        return total_shares
+
+    def _event_prices(self, etf_ticker, event_dates):
+        """
+        ETF close for every event from one series load, current price where history is missing.
+
+        Returns:
+            tuple: (prices, earliest date whose price stands in for missing history or None)
+        """
+        resolver = EtfPriceResolver().load([etf_ticker], event_dates)
+        prices = resolver.resolve(etf_ticker, event_dates)
+
+        missing = ~np.isfinite(prices)
+        if not missing.any():
+            return prices, None
+
+        # Missing history is fetched in the background; use the current price meanwhile
+        resolver.prefetch_missing([etf_ticker], event_dates)
+        current_price = self.price_service.get_current_price(etf_ticker)
+        estimated_from = min(event_date for event_date, gap in zip(event_dates, missing) if gap)
+        prices[missing] = current_price if current_price else np.nan
+
+        return prices, estimated_from
+
+    def _get_deposits(self, portfolio_id, from_date=None):
+        """Stored portfolio deposits on or after from_date (all when None), shared across comparisons"""
+        return get_cash_flow_context(portfolio_id).deposits(from_date)
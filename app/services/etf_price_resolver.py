@@ -0,0 +1,98 @@
+import logging
+from datetime import timedelta
+import numpy as np
+from app import db
+from app.models.price import PriceHistory
+from app.util import calculators
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class EtfPriceResolver:
+    """
+    As-of ETF closes for many (etf, date) pairs from one range load.
+
+    Per-holding benchmark comparisons need each benchmark's close on every
+    purchase date. Instead of one PriceHistory query (or API call) per
+    holding and benchmark, the resolver loads the stored series of every
+    benchmark across the span of the requested dates in a single query and
+    answers each date with the last close on or before it.
+    """
+
+    # Extra history loaded before the earliest date so weekends and holidays resolve
+    LOOKBACK_DAYS = 10
+
+    def __init__(self):
+        self._series = {}
+
+    def load(self, etf_tickers, dates):
+        """Load the series of every ETF covering the given dates"""
+        etf_tickers = [ticker for ticker in dict.fromkeys(etf_tickers) if ticker]
+        dates = list(dates)
+        if not etf_tickers or not dates:
+            return self
+
+        start_date = min(dates) - timedelta(days=self.LOOKBACK_DAYS)
+        rows = db.session.query(
+            PriceHistory.ticker,
+            PriceHistory.date,
+            PriceHistory.close_price
+        ).filter(
+            PriceHistory.ticker.in_(etf_tickers),
+            PriceHistory.date >= start_date,
+            PriceHistory.date <= max(dates),
+            PriceHistory.close_price.isnot(None)
+        ).order_by(PriceHistory.ticker, PriceHistory.date).all()
+
+        series = {ticker: ([], []) for ticker in etf_tickers}
+        for row in rows:
+            days, prices = series[row.ticker]
+            days.append(row.date.toordinal())
+            prices.append(row.close_price)
+
+        for ticker, (days, prices) in series.items():
+            self._series[ticker] = (np.array(days, dtype=np.int64), np.array(prices, dtype=np.float64))
+
+        logger.debug(f"Loaded {len(rows)} ETF closes for {len(etf_tickers)} tickers from {start_date}")
+        return self
+
+    def resolve(self, etf_ticker, dates):
+        """Close on or before each date (NaN where none is within LOOKBACK_DAYS)"""
+        days, prices = self._series.get(etf_ticker, (np.array([], dtype=np.int64), np.array([])))
+        return calculators.asof_prices(
+            days, prices, [d.toordinal() for d in dates], max_gap=self.LOOKBACK_DAYS
+        )
+
+    def uncovered(self, etf_ticker, dates):
+        """Dates the loaded series cannot price"""
+        return [d for d, price in zip(dates, self.resolve(etf_ticker, dates)) if not np.isfinite(price)]
+
+    def prefetch_missing(self, etf_tickers, dates):
+        """
+        Queue a background fetch for history the loaded series does not cover.
+
+        Never blocks: the current caller works with what is stored and later
+        requests see the fetched closes. Returns the tickers that were queued.
+        """
+        from app.services.background_tasks import history_prefetcher
+
+        dates = list(dates)
+        missing = {}
+        for ticker in dict.fromkeys(etf_tickers):
+            uncovered = self.uncovered(ticker, dates)
+            if uncovered:
+                missing[ticker] = uncovered
+
+        if not missing:
+            return []
+
+        all_missing = [d for uncovered in missing.values() for d in uncovered]
+        start_date = min(all_missing) - timedelta(days=self.LOOKBACK_DAYS)
+        history_prefetcher.prefetch(list(missing), start_date, max(all_missing))
+        return list(missing)
+
+    def price_on(self, etf_ticker, price_date):
+        """Close on or before a single date, or None"""
+        price = self.resolve(etf_ticker, [price_date])[0]
+        return float(price) if np.isfinite(price) else None
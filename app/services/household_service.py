@@ -0,0 +1,223 @@
+import logging
+from collections import defaultdict
+from app.models.portfolio import Portfolio, StockTransaction, Dividend, CashBalance
+from app.services.benchmark_service import BenchmarkService, DEFAULT_BENCHMARKS, benchmark_key
+from app.services.cash_flow_service import CashFlowService
+from app.services.irr_calculation_service import IRRCalculationService
+from app.services.position_service import PositionService
+from app.services.price_snapshot import get_price_snapshot
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class HouseholdService:
+    """
+    Consolidated view across every portfolio of a user.
+
+    All transactions, dividends, cash balances and benchmark choices of the
+    household are loaded with one query each, and all tickers are priced from
+    one price snapshot. Holdings, the combined value series, IRR and the
+    benchmark comparison are then derived in memory, instead of running the
+    single-portfolio dashboard path once per account.
+    """
+
+    def get_user_portfolios(self, user_id):
+        """Get a user's portfolios ordered by name"""
+        return Portfolio.query.filter_by(user_id=user_id).order_by(Portfolio.name).all()
+
+    def get_household(self, user_id, include_chart=True):
+        """
+        Build the consolidated household view.
+
+        Args:
+            user_id (str): Owner of the portfolios
+            include_chart (bool): Also build the combined value series
+
+        Returns:
+            dict: summary, portfolios, holdings and chart_data (None if no portfolios)
+        """
+        portfolios = self.get_user_portfolios(user_id)
+        if not portfolios:
+            return None
+
+        portfolio_ids = [portfolio.id for portfolio in portfolios]
+        transactions = StockTransaction.query.filter(
+            StockTransaction.portfolio_id.in_(portfolio_ids)
+        ).order_by(StockTransaction.date).all()
+        dividends = Dividend.query.filter(Dividend.portfolio_id.in_(portfolio_ids)).all()
+        cash_balances = {
+            row.portfolio_id: row.balance
+            for row in CashBalance.query.filter(CashBalance.portfolio_id.in_(portfolio_ids)).all()
+        }
+        benchmarks = self._household_benchmarks(
+            BenchmarkService().get_benchmarks_for_portfolios(portfolio_ids), portfolio_ids
+        )
+
+        # Shares and cost basis per account and ticker, replayed from the bulk load
+        positions = [
+            position for position in PositionService().compute_positions(transactions).values()
+            if position.shares > 0
+        ]
+
+        tickers = list(dict.fromkeys(position.ticker for position in positions))
+        snapshot = get_price_snapshot(tickers + [b for b in benchmarks if b not in tickers])
+        prices = {ticker: snapshot.latest(ticker) for ticker in tickers + benchmarks}
+
+        holdings = self._holdings(positions, prices)
+        accounts = self._accounts(portfolios, positions, transactions, dividends, cash_balances, prices)
+        summary = self._summary(accounts, transactions, dividends, benchmarks, prices)
+
+        household = {
+            'user_id': user_id,
+            'summary': summary,
+            'portfolios': accounts,
+            'holdings': holdings,
+            'benchmarks': benchmarks,
+            'benchmark_comparison': [
+                {
+                    'ticker': ticker,
+                    'equivalent': summary[f'{benchmark_key(ticker)}_equivalent'],
+                    'gain_loss': summary[f'{benchmark_key(ticker)}_gain_loss'],
+                    'gain_loss_percentage': summary[f'{benchmark_key(ticker)}_gain_loss_percentage']
+                }
+                for ticker in benchmarks
+            ],
+            'chart_data': None
+        }
+
+        if include_chart and transactions:
+            from app.views.main import build_cached_chart_data
+            household['chart_data'] = build_cached_chart_data(
+                None, transactions, step_days=7, benchmarks=benchmarks
+            )
+
+        return household
+
+    def _household_benchmarks(self, benchmarks_by_portfolio, portfolio_ids):
+        """Every benchmark any account compares against, defaults first"""
+        benchmarks = list(DEFAULT_BENCHMARKS)
+        for portfolio_id in portfolio_ids:
+            for ticker in benchmarks_by_portfolio.get(portfolio_id, []):
+                if ticker not in benchmarks:
+                    benchmarks.append(ticker)
+        return benchmarks
+
+    def _holdings(self, positions, prices):
+        """Holdings summed across accounts, largest first"""
+        combined = defaultdict(lambda: {'shares': 0.0, 'cost_basis': 0.0, 'accounts': 0})
+        for position in positions:
+            holding = combined[position.ticker]
+            holding['shares'] += position.shares
+            holding['cost_basis'] += position.cost_basis
+            holding['accounts'] += 1
+
+        holdings = []
+        for ticker, holding in combined.items():
+            current_price = prices.get(ticker) or 0
+            market_value = holding['shares'] * current_price
+            gain_loss = market_value - holding['cost_basis']
+            holdings.append({
+                'ticker': ticker,
+                'shares': holding['shares'],
+                'current_price': current_price,
+                'market_value': market_value,
+                'cost_basis': holding['cost_basis'],
+                'gain_loss': gain_loss,
+                'gain_loss_percentage': (gain_loss / holding['cost_basis'] * 100) if holding['cost_basis'] > 0 else 0,
+                'accounts': holding['accounts']
+            })
+
+        total_value = sum(holding['market_value'] for holding in holdings)
+        for holding in holdings:
+            holding['portfolio_percentage'] = (holding['market_value'] / total_value * 100) if total_value > 0 else 0
+
+        holdings.sort(key=lambda h: h['market_value'], reverse=True)
+        return holdings
+
+    def _accounts(self, portfolios, positions, transactions, dividends, cash_balances, prices):
+        """Per-account value, net invested and cash flows from the shared load"""
+        market_values = defaultdict(float)
+        for position in positions:
+            market_values[position.portfolio_id] += position.shares * (prices.get(position.ticker) or 0)
+
+        transactions_by_portfolio = defaultdict(list)
+        for transaction in transactions:
+            transactions_by_portfolio[transaction.portfolio_id].append(transaction)
+        dividends_by_portfolio = defaultdict(list)
+        for dividend in dividends:
+            dividends_by_portfolio[dividend.portfolio_id].append(dividend)
+
+        cash_flow_service = CashFlowService()
+
+        accounts = []
+        for portfolio in portfolios:
+            portfolio_transactions = transactions_by_portfolio[portfolio.id]
+            cash_balance = cash_balances.get(portfolio.id, 0.0)
+            current_value = market_values[portfolio.id] + cash_balance
+
+            cash_flows = cash_flow_service.build_cash_flows(
+                portfolio_transactions, dividends_by_portfolio[portfolio.id]
+            )
+
+            accounts.append({
+                'id': portfolio.id,
+                'name': portfolio.name,
+                'current_value': current_value,
+                'cash_balance': cash_balance,
+                'total_invested': self._net_invested(portfolio_transactions),
+                'total_dividends': sum(d.total_amount for d in dividends_by_portfolio[portfolio.id]),
+                'cash_flows': cash_flows
+            })
+
+        total_value = sum(account['current_value'] for account in accounts)
+        for account in accounts:
+            account['household_percentage'] = (account['current_value'] / total_value * 100) if total_value > 0 else 0
+
+        return accounts
+
+    def _summary(self, accounts, transactions, dividends, benchmarks, prices):
+        """Household totals, account and combined IRRs and benchmark comparison"""
+        from app.views.main import calculate_benchmark_equivalents, calculate_benchmark_stats
+
+        current_value = sum(account['current_value'] for account in accounts)
+        net_invested = self._net_invested(transactions)
+        total_dividends = sum(d.total_amount for d in dividends)
+        total_gain_loss = current_value - net_invested + total_dividends
+
+        # Deposits are inferred per account, then every account's flows are combined
+        cash_flows = [flow for account in accounts for flow in account['cash_flows']]
+
+        # Every account's IRR and the household IRR are solved in one batch
+        irrs = IRRCalculationService().calculate_irrs(
+            [(account.pop('cash_flows'), account['current_value']) for account in accounts]
+            + [(cash_flows, current_value)]
+        )
+        for account, account_irr in zip(accounts, irrs):
+            account['irr'] = account_irr
+        irr = irrs[-1]
+
+        summary = {
+            'current_value': current_value,
+            'total_invested': net_invested,
+            'total_gain_loss': total_gain_loss,
+            'gain_loss_percentage': (total_gain_loss / net_invested * 100) if net_invested > 0 else 0,
+            'cash_balance': sum(account['cash_balance'] for account in accounts),
+            'total_dividends': total_dividends,
+            'irr': irr,
+            'portfolio_count': len(accounts)
+        }
+
+        equivalents = calculate_benchmark_equivalents(
+            None, None, None,
+            benchmarks=benchmarks,
+            transactions=transactions,
+            current_prices={ticker: prices.get(ticker) for ticker in benchmarks}
+        )
+        summary.update(calculate_benchmark_stats(equivalents, net_invested))
+        return summary
+
+    def _net_invested(self, transactions):
+        total_invested = sum(t.total_value for t in transactions if t.transaction_type == 'BUY')
+        total_sold = sum(t.total_value for t in transactions if t.transaction_type == 'SELL')
+        return total_invested - total_sold
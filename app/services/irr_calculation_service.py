@@ -1,93 +1,136 @@
 from app import db
 from app.models.cash_flow import IRRCalculation
 from app.services.cash_flow_service import CashFlowService
+from app.services.analytics_executor import analytics_executor
+from app.util import calculators
+from collections import defaultdict
 from datetime import date, timedelta
 import numpy as np
-from scipy.optimize import fsolve
 import warnings
 
 
 class IRRCalculationService:
     
+    # Flows solved inline for each unit of analytics executor offload size
+    FLOWS_PER_OFFLOAD_UNIT = 100
+    
     def calculate_irr(self, cash_flows, current_value):
         """Calculate Internal Rate of Return from investor perspective"""
+        return self.calculate_irrs([(cash_flows, current_value)])[0]
+    
+    def calculate_irrs(self, problems):
+        """
+        Calculate many IRRs with one batched solve.
+        
+        Args:
+            problems (list): (cash_flows, current_value) pairs, e.g. a portfolio
+                and its benchmark comparisons or a series of rolling windows
+        
+        Returns:
+            list: IRR per problem, 0.00 where it is undefined or unreasonable
+        """
+        results = [0.00] * len(problems)
+        inputs = [self.irr_arrays(cash_flows, current_value) for cash_flows, current_value in problems]
+        solvable = [i for i, arrays in enumerate(inputs) if arrays is not None]
+        if not solvable:
+            return results
+        
+        # Zero-padded rows so every IRR is solved by one vectorized kernel call
+        width = max(len(inputs[i][0]) for i in solvable)
+        periods = np.zeros((len(solvable), width))
+        amounts = np.zeros((len(solvable), width))
+        for row, i in enumerate(solvable):
+            row_periods, row_amounts = inputs[i]
+            periods[row, :len(row_periods)] = row_periods
+            amounts[row, :len(row_amounts)] = row_amounts
+        
+        for i, rate in zip(solvable, self.solve_rows(periods, amounts)):
+            results[i] = rate
+        return results
+    
+    def solve_rows(self, periods, amounts):
+        """
+        Solve one IRR per row of (periods, amounts) arrays in one kernel call.
+        
+        Returns:
+            list: IRR per row, 0.00 where it is undefined or unreasonable
+        """
+        results = [0.00] * amounts.shape[0]
+        try:
+            # A vectorized solve costs well under a microsecond per flow, so only
+            # batches far beyond a single account are worth shipping to the pool
+            rates = analytics_executor.run(
+                calculators.solve_irr_batch, periods, amounts, size=amounts.size // self.FLOWS_PER_OFFLOAD_UNIT
+            )
+        except Exception:
+            return results
+        
+        for i, rate in enumerate(rates):
+            # Validate result is reasonable (-99% to 1000%)
+            if np.isfinite(rate) and -0.99 <= rate <= 10.0:
+                results[i] = round(float(rate), 4)
+        return results
+    
+    def irr_arrays(self, cash_flows, current_value, end_date=None):
+        """
+        Net investor flows per date as (periods in years, amounts) arrays.
+        
+        Returns None when there is nothing to solve: fewer than two dated
+        flows, or flows that never change sign.
+        """
         if not cash_flows:
-            return 0.00
+            return None
+        
+        net_flows_by_date = self.net_flows_by_date(cash_flows)
+        
+        # Add current value as final inflow if positive
+        if current_value > 0:
+            net_flows_by_date[end_date or date.today()] += current_value
+        
+        # Only include non-zero flows, in date order
+        dated = sorted((d, amount) for d, amount in net_flows_by_date.items() if amount != 0)
+        if len(dated) < 2:
+            return None
+        
+        amounts = np.array([amount for _, amount in dated])
+        
+        # Check if we have both inflows and outflows
+        if not ((amounts < 0).any() and (amounts > 0).any()):
+            return None
+        
+        # Time periods in years from the first date
+        start_ordinal = dated[0][0].toordinal()
+        periods = np.array([(d.toordinal() - start_ordinal) / 365.25 for d, _ in dated])
+        return periods, amounts
+    
+    def net_flows_by_date(self, cash_flows):
+        """Net investor cash flow per date (money out of pocket negative)"""
+        def field(flow, name):
+            return flow[name] if isinstance(flow, dict) else getattr(flow, name)
+        
+        # PURCHASE flows only count in ETF comparisons, which have no deposits
+        has_deposits = any(field(flow, 'flow_type') == 'DEPOSIT' for flow in cash_flows)
         
         # Calculate net cash flows by date (investor perspective)
-        from collections import defaultdict
         net_flows_by_date = defaultdict(float)
-        
         for flow in cash_flows:
-            flow_date = flow['date'] if isinstance(flow, dict) else flow.date
-            flow_amount = flow['amount'] if isinstance(flow, dict) else flow.amount
-            flow_type = flow['flow_type'] if isinstance(flow, dict) else flow.flow_type
+            flow_type = field(flow, 'flow_type')
+            flow_amount = field(flow, 'amount')
             
             # From investor perspective:
             # DEPOSIT = money out of pocket (negative)
-            # PURCHASE = money out of pocket (negative) - only for ETF comparisons without deposits
-            # SALE = money received (positive) 
+            # PURCHASE = money out of pocket (amount is already negative)
+            # SALE = money received (positive)
             # DIVIDEND = money received (positive)
             if flow_type == 'DEPOSIT':
-                net_flows_by_date[flow_date] -= flow_amount  # Outflow
+                net_flows_by_date[field(flow, 'date')] -= flow_amount
             elif flow_type == 'PURCHASE':
-                # Only include PURCHASE flows if there are no DEPOSIT flows (ETF comparison)
-                has_deposits = any(f.get('flow_type') == 'DEPOSIT' or getattr(f, 'flow_type', None) == 'DEPOSIT' for f in cash_flows)
                 if not has_deposits:
-                    net_flows_by_date[flow_date] += flow_amount  # Outflow (amount is already negative)
+                    net_flows_by_date[field(flow, 'date')] += flow_amount
             elif flow_type in ['SALE', 'DIVIDEND']:
-                net_flows_by_date[flow_date] += flow_amount  # Inflow
-        
-        # Add current value as final inflow if positive
-        if current_value > 0:
-            net_flows_by_date[date.today()] += current_value
-        
-        # Convert to sorted lists
-        sorted_dates = sorted(net_flows_by_date.keys())
-        dates = []
-        amounts = []
-        
-        for d in sorted_dates:
-            if net_flows_by_date[d] != 0:  # Only include non-zero flows
-                dates.append(d)
-                amounts.append(net_flows_by_date[d])
-        
-        if len(amounts) < 2:
-            return 0.00
-        
-        # Check if we have both inflows and outflows
-        has_outflow = any(x < 0 for x in amounts)
-        has_inflow = any(x > 0 for x in amounts)
-        
-        if not (has_outflow and has_inflow):
-            return 0.00
+                net_flows_by_date[field(flow, 'date')] += flow_amount
         
-        try:
-            # Calculate time periods in years from first date
-            start_date = dates[0]
-            periods = np.array([(d - start_date).days / 365.25 for d in dates])
-            amounts = np.array(amounts)
-            
-
-            # Define NPV function for IRR calculation
-            def npv_function(rate):
-                if rate <= -1:  # Avoid division by zero/negative
-                    return float('inf')
-                return np.sum(amounts / (1 + rate) ** periods)
-            
-            # Use scipy to solve for IRR (rate where NPV = 0)
-            irr_result = fsolve(npv_function, 0.1)[0]
-            
-            # Validate result is reasonable (-99% to 1000%)
-            if -0.99 <= irr_result <= 10.0:
-                return round(irr_result, 4)
-            else:
-                return 0.00
-                
-        except Exception:
-            return 0.00
-    
-
+        return net_flows_by_date
     
     def save_irr_calculation(self, portfolio_id, irr_value, total_invested, current_value):
         """Save IRR calculation to database"""
@@ -107,7 +150,8 @@ class IRRCalculationService:
     def get_latest_irr_calculation(self, portfolio_id):
         """Get the most recent IRR calculation for a portfolio"""
         return IRRCalculation.query.filter_by(
-            portfolio_id=portfolio_id
+            portfolio_id=portfolio_id,
+            horizon=None
         ).order_by(IRRCalculation.calculation_date.desc()).first()
     
     def calculate_portfolio_irr(self, portfolio_id, current_portfolio_value):
@@ -137,24 +181,25 @@ class IRRCalculationService:
         )
     
     def get_portfolio_summary(self, portfolio_id):
-        """Get portfolio cash flow summary with IRR"""
+        """
+        Get portfolio cash flow summary with IRR.
+        
+        Deposit and dividend totals are aggregated in SQL from the saved cash
+        flows, so callers bring those up to date first.
+        """
         cash_flow_service = CashFlowService()
-        cash_flows = cash_flow_service.generate_cash_flows(portfolio_id)
+        flow_totals = cash_flow_service.get_flow_totals(portfolio_id)
         
-        if not cash_flows:
+        if not flow_totals:
             return {
                 'total_invested': 0.00,
                 'total_returned': 0.00,
                 'net_cash_flow': 0.00,
-                'irr': 0.00,
-                'cash_flows': []
+                'irr': 0.00
             }
         
         # Calculate summary metrics
-        total_invested = sum(
-            flow['amount'] for flow in cash_flows 
-            if flow['flow_type'] == 'DEPOSIT'
-        )
+        total_invested = flow_totals.get('DEPOSIT', {}).get('amount', 0.0)
         
         # Calculate portfolio value breakdown
         from app.services.portfolio_service import PortfolioService
@@ -167,10 +212,7 @@ class IRRCalculationService:
         cash_balance = portfolio_service.get_cash_balance(portfolio_id)
         
         # Calculate dividends received
-        dividends_received = sum(
-            flow['amount'] for flow in cash_flows 
-            if flow['flow_type'] == 'DIVIDEND'
-        )
+        dividends_received = flow_totals.get('DIVIDEND', {}).get('amount', 0.0)
         
         # Calculate investment gain (portfolio value - cash - total invested - dividends)
         investment_gain = portfolio_value - cash_balance - total_invested - dividends_received
@@ -185,10 +227,8 @@ class IRRCalculationService:
             irr_value = latest_irr.irr_value
         else:
             # Calculate IRR if none exists
-            from app.services.portfolio_service import PortfolioService
-            portfolio_service = PortfolioService()
-            current_value = portfolio_service.get_portfolio_current_value(portfolio_id)
-            irr_value = self.calculate_irr(cash_flows, current_value)
+            current_value = portfolio_value
+            irr_value = self.calculate_irr(cash_flow_service.get_cash_flows(portfolio_id), current_value)
             
             # Save the calculation for future use
             try:
@@ -205,6 +245,5 @@ class IRRCalculationService:
             'cash_balance': cash_balance,
             'dividends_received': dividends_received,
             'net_cash_flow': net_cash_flow,
-            'irr': irr_value,
-            'cash_flows': cash_flows
+            'irr': irr_value
         }
\ No newline at end of file
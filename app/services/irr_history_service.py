@@ -0,0 +1,212 @@
+import logging
+from datetime import date, timedelta
+import numpy as np
+from sqlalchemy import func, insert
+from app import db
+from app.models.cash_flow import IRRCalculation
+from app.models.portfolio import StockTransaction
+from app.services.cash_flow_sync_service import CashFlowSyncService
+from app.services.data_version_service import DataVersionService
+from app.services.irr_calculation_service import IRRCalculationService
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Stored horizons and their trailing window in years (None = since inception)
+IRR_HORIZONS = (('inception', None), ('1y', 1), ('3y', 3), ('5y', 5))
+
+
+class IRRHistoryService:
+    """
+    Month-end IRR history: since inception and over trailing 1/3/5-year windows.
+
+    Every problem shares one date axis of net investor flows, so each row is
+    a masked prefix (or window) of the same flow vector plus the valuation at
+    its ends, and all months are solved with one batched XIRR call. Rows are
+    stored in irr_calculations and only month-ends after the latest stored
+    one are solved, unless a portfolio edit reaches back before it.
+    """
+
+    ARTIFACT = 'irr_history'
+
+    def __init__(self):
+        self.irr_service = IRRCalculationService()
+        self.cash_flow_sync_service = CashFlowSyncService()
+        self.version_service = DataVersionService()
+
+    def get_history(self, portfolio_id):
+        """
+        Get the month-end IRR series, extending it first if needed.
+
+        Returns:
+            dict: dates plus one list per horizon (None where a window is longer than the history)
+        """
+        self.update_history(portfolio_id)
+
+        rows = self._history_query(portfolio_id).order_by(IRRCalculation.calculation_date.asc()).all()
+        dates = sorted({row.calculation_date for row in rows})
+        positions = {calculation_date: i for i, calculation_date in enumerate(dates)}
+
+        history = {'dates': [d.isoformat() for d in dates]}
+        for horizon, _ in IRR_HORIZONS:
+            history[horizon] = [None] * len(dates)
+        for row in rows:
+            history[row.horizon][positions[row.calculation_date]] = row.irr_value
+        return history
+
+    def update_history(self, portfolio_id):
+        """
+        Bring the stored series up to the last completed month.
+
+        Rows from the earliest changed transaction or dividend date on are
+        dropped and solved again; rows before it stay as stored. A current
+        series that already reaches the last completed month is left alone
+        without building the daily value series.
+
+        Returns:
+            int: Number of rows written
+        """
+        try:
+            # Historical cash balances come from the stored cash flows
+            self.cash_flow_sync_service.ensure_cash_flows_current(portfolio_id)
+
+            current = self.version_service.is_artifact_current(portfolio_id, self.ARTIFACT)
+            if not current:
+                state = self.version_service.get_artifact_state(portfolio_id, self.ARTIFACT)
+                stale = self._history_query(portfolio_id)
+                if state is not None and state.changed_from is not None:
+                    stale = stale.filter(IRRCalculation.calculation_date >= state.changed_from)
+                stale.delete(synchronize_session=False)
+
+            latest = db.session.query(func.max(IRRCalculation.calculation_date)).filter(
+                IRRCalculation.portfolio_id == portfolio_id,
+                IRRCalculation.horizon.isnot(None)
+            ).scalar()
+
+            last_month_end = date.today().replace(day=1) - timedelta(days=1)
+            if current and latest is not None and latest >= last_month_end:
+                return 0
+
+            rows = self._month_end_rows(portfolio_id, after=latest)
+            if rows:
+                db.session.execute(insert(IRRCalculation), rows)
+
+            self.version_service.mark_artifact_current(portfolio_id, self.ARTIFACT)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        if rows:
+            logger.info(f"Stored {len(rows)} month-end IRRs for portfolio {portfolio_id} after {latest}")
+        return len(rows)
+
+    def _month_end_rows(self, portfolio_id, after=None):
+        """IRR rows for every completed month-end after the given date"""
+        from app.services.cash_flow_service import CashFlowService
+        from app.views.main import build_daily_value_series
+
+        transactions = StockTransaction.query.filter_by(portfolio_id=portfolio_id).order_by(StockTransaction.date).all()
+        if not transactions:
+            return []
+
+        series = build_daily_value_series(portfolio_id, transactions, backfill=True)
+        dates = series['dates']
+
+        # Last day of every month before the current one
+        month_end_days = np.flatnonzero(np.diff(np.asarray(dates.year * 12 + dates.month)))
+        month_ends = [dates[i].date() for i in month_end_days]
+        if not month_ends or (after is not None and month_ends[-1] <= after):
+            return []
+
+        cash_flows = CashFlowService().get_cash_flows(portfolio_id)
+        month_end_values = series['portfolio_values'][month_end_days] + self._cash_balances(cash_flows, month_ends)
+
+        # One date axis for every flow and month-end
+        net_flows = self.irr_service.net_flows_by_date(cash_flows)
+        flow_ordinals = np.array([d.toordinal() for d in net_flows], dtype=np.int64)
+        month_end_ordinals = np.array([d.toordinal() for d in month_ends], dtype=np.int64)
+        axis = np.union1d(flow_ordinals, month_end_ordinals)
+
+        flows_on_axis = np.zeros(axis.size)
+        np.add.at(flows_on_axis, np.searchsorted(axis, flow_ordinals), list(net_flows.values()))
+
+        # Prefix sums of deposits give each row's invested capital without rescanning flows
+        deposits_on_axis = np.zeros(axis.size)
+        for flow in cash_flows:
+            if flow.flow_type == 'DEPOSIT':
+                deposits_on_axis[np.searchsorted(axis, flow.date.toordinal())] += flow.amount
+        deposits_to_date = np.cumsum(deposits_on_axis)
+        month_end_columns = np.searchsorted(axis, month_end_ordinals)
+
+        # (month-end index, window start index or None) per problem
+        problems = []
+        for k, month_end in enumerate(month_ends):
+            if after is not None and month_end <= after:
+                continue
+            for horizon, years in IRR_HORIZONS:
+                start = None if years is None else k - 12 * years
+                if start is None or start >= 0:
+                    problems.append((horizon, k, start))
+        if not problems:
+            return []
+
+        end_index = np.array([k for _, k, _ in problems], dtype=np.int64)
+        start_index = np.array([-1 if start is None else start for _, _, start in problems], dtype=np.int64)
+        windowed = start_index >= 0
+
+        end_columns = month_end_columns[end_index]
+        start_columns = np.where(windowed, month_end_columns[np.maximum(start_index, 0)], -1)
+        end_values = month_end_values[end_index]
+        start_values = np.where(windowed, month_end_values[np.maximum(start_index, 0)], 0.0)
+
+        # Flows after the window start (end-of-day value already holds that day's flows) up to the end
+        columns = np.arange(axis.size)
+        mask = (columns[None, :] > start_columns[:, None]) & (columns[None, :] <= end_columns[:, None])
+        amounts = np.where(mask, flows_on_axis[None, :], 0.0)
+        rows = np.arange(len(problems))
+        amounts[rows, end_columns] += end_values
+        amounts[rows[windowed], start_columns[windowed]] -= start_values[windowed]
+
+        solvable = (amounts < 0).any(axis=1) & (amounts > 0).any(axis=1)
+        periods = np.broadcast_to((axis - axis[0]) / 365.25, amounts.shape)
+        rates = np.zeros(len(problems))
+        if solvable.any():
+            rates[solvable] = self.irr_service.solve_rows(
+                np.ascontiguousarray(periods[solvable]), amounts[solvable]
+            )
+
+        invested = np.where(
+            windowed,
+            start_values + deposits_to_date[end_columns] - deposits_to_date[np.maximum(start_columns, 0)],
+            deposits_to_date[end_columns]
+        )
+
+        return [
+            {
+                'portfolio_id': portfolio_id,
+                'irr_value': float(rates[i]),
+                'total_invested': float(invested[i]),
+                'current_value': float(end_values[i]),
+                'calculation_date': month_ends[k],
+                'horizon': horizon
+            }
+            for i, (horizon, k, _) in enumerate(problems)
+            if solvable[i]
+        ]
+
+    def _cash_balances(self, cash_flows, month_ends):
+        """Cash on hand at the end of each month-end day: the sum of all flow amounts up to it"""
+        if not cash_flows:
+            return np.zeros(len(month_ends))
+
+        flow_ordinals = np.array([flow.date.toordinal() for flow in cash_flows], dtype=np.int64)
+        balances = np.cumsum([flow.amount for flow in cash_flows])
+        last_flow = np.searchsorted(flow_ordinals, [d.toordinal() for d in month_ends], side='right') - 1
+        return np.where(last_flow >= 0, balances[np.maximum(last_flow, 0)], 0.0)
+
+    def _history_query(self, portfolio_id):
+        return IRRCalculation.query.filter(
+            IRRCalculation.portfolio_id == portfolio_id,
+            IRRCalculation.horizon.isnot(None)
+        )
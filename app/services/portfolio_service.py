@@ -1,8 +1,8 @@
 from app import db
 from app.models.portfolio import Portfolio, StockTransaction, Dividend, CashBalance
 from datetime import datetime, date, timezone
-from collections import defaultdict
 from app.util.query_cache import query_cache
+from app.services.position_service import PositionService
 import logging
 
 # Configure logging
@@ -11,6 +11,9 @@ logger = logging.getLogger(__name__)
 
 class PortfolioService:
     
+    def __init__(self):
+        self.position_service = PositionService()
+    
     def create_portfolio(self, name, user_id, description=None):
         portfolio = Portfolio(
             name=name,
@@ -35,7 +38,12 @@ class PortfolioService:
             shares=shares,
             total_value=total_value
         )
+        positions_current = self.position_service.is_current(portfolio_id)
         db.session.add(transaction)
+        db.session.flush()
+        
+        # Keep the positions ledger in the same database transaction
+        self.position_service.apply_transaction(transaction, positions_current)
         db.session.commit()
         return transaction
     
@@ -84,19 +92,13 @@ class PortfolioService:
     
     @query_cache(ttl_seconds=60)  # Cache for 1 minute
     def get_current_holdings(self, portfolio_id):
-        """Get current holdings for a portfolio with caching"""
-        logger.debug(f"Calculating current holdings for portfolio {portfolio_id}")
-        transactions = self.get_portfolio_transactions(portfolio_id)
-        holdings = defaultdict(float)
-        
-        for transaction in transactions:
-            if transaction.transaction_type == "BUY":
-                holdings[transaction.ticker] += transaction.shares
-            elif transaction.transaction_type == "SELL":
-                holdings[transaction.ticker] -= transaction.shares
-        
-        # Remove tickers with zero or negative holdings
-        return {ticker: shares for ticker, shares in holdings.items() if shares > 0}
+        """Get current holdings for a portfolio from the positions ledger"""
+        logger.debug(f"Reading current holdings for portfolio {portfolio_id}")
+        return self.position_service.get_holdings(portfolio_id)
+    
+    def get_positions(self, portfolio_id):
+        """Get positions ledger rows (shares, cost basis, realized P&L) keyed by ticker"""
+        return {position.ticker: position for position in self.position_service.get_positions(portfolio_id)}
     
     def calculate_transaction_performance(self, transaction_id):
         from app.services.price_service import PriceService
@@ -175,7 +177,10 @@ class PortfolioService:
             return False
         
         try:
+            positions_current = self.position_service.is_current(portfolio_id)
             db.session.delete(transaction)
+            db.session.flush()
+            self.position_service.refresh_tickers(portfolio_id, [transaction.ticker], positions_current)
             db.session.commit()
             return True
         except Exception:
@@ -194,6 +199,9 @@ class PortfolioService:
             return None
         
         try:
+            positions_current = self.position_service.is_current(portfolio_id)
+            original_ticker = transaction.ticker
+            
             # Update allowed fields
             for field, value in kwargs.items():
                 if hasattr(transaction, field):
@@ -203,6 +211,10 @@ class PortfolioService:
             if 'price_per_share' in kwargs or 'shares' in kwargs:
                 transaction.total_value = transaction.price_per_share * transaction.shares
             
+            db.session.flush()
+            self.position_service.refresh_tickers(
+                portfolio_id, [original_ticker, transaction.ticker], positions_current
+            )
             db.session.commit()
             return transaction
         except Exception:
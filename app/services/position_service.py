@@ -0,0 +1,309 @@
+import hashlib
+import logging
+from flask import current_app, has_app_context
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError, OperationalError
+from app import db
+from app.models.portfolio import Position, StockTransaction
+from app.services.data_version_service import DataVersionService
+from app.util.lots import LotBook, LOT_METHODS
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Share residues below this are float noise from buying and selling the same amount
+SHARE_EPSILON = 1e-9
+
+AVERAGE = 'AVERAGE'
+COST_BASIS_METHODS = (AVERAGE,) + LOT_METHODS
+
+
+class PositionService:
+    """
+    Service to maintain the materialized positions ledger.
+
+    Positions are updated in the same database transaction as the trade that
+    changes them. Reads check the ledger against the portfolio data version,
+    so trades written without going through PortfolioService (scripts, direct
+    session writes) trigger a rebuild on the next read instead of being missed.
+
+    Cost basis uses the proportional average by default. Setting
+    COST_BASIS_METHOD to a lot method (FIFO, LIFO, HIFO, SPECIFIC) relieves
+    individual lots instead; the ledger is tracked per method so changing it
+    rebuilds the positions on the next read.
+    """
+
+    ARTIFACT = 'positions'
+
+    def __init__(self, method=None):
+        self.version_service = DataVersionService()
+        self.method = (method or self._configured_method()).upper()
+        if self.method not in COST_BASIS_METHODS:
+            raise ValueError(f"Unknown cost basis method: {self.method}")
+
+        self.artifact = self._artifact_for(self.method)
+        # Lot views under AVERAGE still need a relief order
+        self.lot_method = self.method if self.method in LOT_METHODS else LOT_METHODS[0]
+
+    def _configured_method(self):
+        if has_app_context():
+            return current_app.config.get('COST_BASIS_METHOD', AVERAGE)
+        return AVERAGE
+
+    def _artifact_for(self, method):
+        return self.ARTIFACT if method == AVERAGE else f'{self.ARTIFACT}_{method.lower()}'
+
+    def is_current(self, portfolio_id):
+        """Check if the ledger matches the current portfolio data"""
+        return self.version_service.is_artifact_current(portfolio_id, self.artifact)
+
+    def get_positions(self, portfolio_id):
+        """
+        Get all ledger rows for a portfolio, rebuilding first if they are out of date.
+
+        Dashboard endpoints load in parallel, so several requests may find the
+        same stale ledger. On PostgreSQL they rebuild one at a time under an
+        advisory lock and the later ones find it current. A request that still
+        loses the race (or hits a locked SQLite database) serves positions
+        computed in memory instead of failing.
+        """
+        if not self.is_current(portfolio_id):
+            try:
+                self._lock_rebuild(portfolio_id)
+                # Another request may have rebuilt the ledger while this one waited
+                if not self.is_current(portfolio_id):
+                    self.rebuild_portfolio(portfolio_id)
+                db.session.commit()
+            except (IntegrityError, OperationalError) as e:
+                logger.warning(f"Concurrent positions rebuild for portfolio {portfolio_id}, serving computed positions: {e}")
+                db.session.rollback()
+                transactions = StockTransaction.query.filter_by(portfolio_id=portfolio_id).all()
+                return list(self.compute_positions(transactions).values())
+            except Exception as e:
+                logger.error(f"Error rebuilding positions for portfolio {portfolio_id}: {e}")
+                db.session.rollback()
+                raise
+
+        return Position.query.filter_by(portfolio_id=portfolio_id).all()
+
+    def get_holdings(self, portfolio_id):
+        """Get {ticker: shares} for positions with shares held"""
+        return {
+            position.ticker: position.shares
+            for position in self.get_positions(portfolio_id)
+            if position.shares > 0
+        }
+
+    def apply_transaction(self, transaction, was_current):
+        """
+        Update the ledger for a newly added transaction (caller commits).
+
+        Trades that sort after the position's last trade are folded in
+        directly. Back-dated trades replay that ticker's history.
+        """
+        if not was_current:
+            self.rebuild_portfolio(transaction.portfolio_id)
+            return
+
+        position = db.session.get(Position, (transaction.portfolio_id, transaction.ticker))
+        if position is None:
+            position = self._new_position(transaction.portfolio_id, transaction.ticker)
+            db.session.add(position)
+
+        appends = (
+            position.last_trade is None
+            or transaction.date > position.last_trade
+            or (transaction.date == position.last_trade and transaction.transaction_type == 'SELL')
+        )
+        # Lot methods need the open lots to relieve a sell, so those replay the ticker
+        if appends and (self.method == AVERAGE or transaction.transaction_type == 'BUY'):
+            self._apply_trade(position, transaction)
+        else:
+            self._rebuild_ticker(transaction.portfolio_id, transaction.ticker)
+
+        self.version_service.mark_artifact_current(transaction.portfolio_id, self.artifact)
+
+    def refresh_tickers(self, portfolio_id, tickers, was_current):
+        """Replay the history of the given tickers after an edit or delete (caller commits)"""
+        if not was_current:
+            self.rebuild_portfolio(portfolio_id)
+            return
+
+        for ticker in set(tickers):
+            self._rebuild_ticker(portfolio_id, ticker)
+
+        self.version_service.mark_artifact_current(portfolio_id, self.artifact)
+
+    def rebuild_portfolio(self, portfolio_id):
+        """Rebuild every position of a portfolio from its transactions (caller commits)"""
+        transactions = self._in_trade_order(StockTransaction.query.filter_by(portfolio_id=portfolio_id).all())
+
+        Position.query.filter_by(portfolio_id=portfolio_id).delete()
+
+        by_ticker = {}
+        for transaction in transactions:
+            by_ticker.setdefault(transaction.ticker, []).append(transaction)
+
+        positions = {}
+        for ticker, ticker_transactions in by_ticker.items():
+            positions[ticker] = self._new_position(portfolio_id, ticker)
+            self._replay(positions[ticker], ticker_transactions)
+
+        db.session.add_all(positions.values())
+
+        # Rows now reflect this method only
+        other_artifacts = [self._artifact_for(m) for m in COST_BASIS_METHODS if m != self.method]
+        self.version_service.clear_artifacts(portfolio_id, other_artifacts)
+        self.version_service.mark_artifact_current(portfolio_id, self.artifact)
+
+        logger.info(f"Rebuilt {len(positions)} positions for portfolio {portfolio_id}")
+        return len(positions)
+
+    def _lock_rebuild(self, portfolio_id):
+        """Serialize rebuilds of a portfolio until the transaction ends (PostgreSQL only)"""
+        if db.session.get_bind().dialect.name != 'postgresql':
+            return
+        digest = hashlib.sha256(f'{self.ARTIFACT}:{portfolio_id}'.encode()).digest()
+        db.session.execute(
+            text('SELECT pg_advisory_xact_lock(:key)'),
+            {'key': int.from_bytes(digest[:8], 'big', signed=True)}
+        )
+
+    def _rebuild_ticker(self, portfolio_id, ticker):
+        """Replay one ticker's transactions into its position"""
+        transactions = self._in_trade_order(
+            StockTransaction.query.filter_by(portfolio_id=portfolio_id, ticker=ticker).all()
+        )
+
+        position = db.session.get(Position, (portfolio_id, ticker))
+        if not transactions:
+            if position is not None:
+                db.session.delete(position)
+            return
+
+        if position is None:
+            position = self._new_position(portfolio_id, ticker)
+            db.session.add(position)
+        else:
+            self._reset(position)
+
+        self._replay(position, transactions)
+
+    def compute_positions(self, transactions):
+        """
+        Replay already loaded transactions into unsaved positions.
+
+        Used for views that load many portfolios' trades in bulk and only need
+        the resulting shares and cost basis, without touching the ledger.
+
+        Returns:
+            dict: {(portfolio_id, ticker): Position}
+        """
+        by_key = {}
+        for transaction in self._in_trade_order(transactions):
+            by_key.setdefault((transaction.portfolio_id, transaction.ticker), []).append(transaction)
+
+        positions = {}
+        for (portfolio_id, ticker), key_transactions in by_key.items():
+            position = self._new_position(portfolio_id, ticker)
+            self._replay(position, key_transactions)
+            positions[(portfolio_id, ticker)] = position
+        return positions
+
+    def get_lot_books(self, portfolio_id, ticker=None, selections=None):
+        """
+        Replay transactions into lot books for open lots and per-lot P&L.
+
+        Args:
+            portfolio_id (str): Portfolio ID
+            ticker (str): Only build the book for this ticker
+            selections (dict): Sell transaction id -> buy transaction ids to
+                relieve first (specific identification)
+
+        Returns:
+            dict: {ticker: LotBook}
+        """
+        query = StockTransaction.query.filter_by(portfolio_id=portfolio_id)
+        if ticker:
+            query = query.filter_by(ticker=ticker)
+
+        books = {}
+        for transaction in self._in_trade_order(query.all()):
+            if transaction.ticker not in books:
+                books[transaction.ticker] = LotBook(self.lot_method)
+            self._book_trade(books[transaction.ticker], transaction, selections)
+
+        return books
+
+    def _replay(self, position, transactions):
+        """Fold a ticker's ordered transactions into a fresh position"""
+        if self.method == AVERAGE:
+            for transaction in transactions:
+                self._apply_trade(position, transaction)
+            return
+
+        book = LotBook(self.method)
+        for transaction in transactions:
+            self._book_trade(book, transaction)
+            if transaction.transaction_type == 'BUY' and (
+                position.first_buy is None or transaction.date < position.first_buy
+            ):
+                position.first_buy = transaction.date
+            if position.last_trade is None or transaction.date > position.last_trade:
+                position.last_trade = transaction.date
+
+        position.shares = book.shares
+        position.cost_basis = book.cost_basis if book.shares > 0 else 0.0
+        position.realized_pnl = book.realized_pnl
+
+    def _book_trade(self, book, transaction, selections=None):
+        if transaction.transaction_type == 'BUY':
+            book.buy(transaction.id, transaction.date, transaction.shares, transaction.price_per_share)
+        elif transaction.transaction_type == 'SELL':
+            book.sell(
+                transaction.shares,
+                transaction.price_per_share,
+                date=transaction.date,
+                lot_ids=(selections or {}).get(transaction.id),
+                sell_id=transaction.id
+            )
+
+    def _in_trade_order(self, transactions):
+        """Sort by date, buys before sells on the same day, otherwise keeping entry order"""
+        return sorted(transactions, key=lambda t: (t.date, 0 if t.transaction_type == 'BUY' else 1))
+
+    def _new_position(self, portfolio_id, ticker):
+        position = Position(portfolio_id=portfolio_id, ticker=ticker)
+        self._reset(position)
+        return position
+
+    def _reset(self, position):
+        position.shares = 0.0
+        position.cost_basis = 0.0
+        position.realized_pnl = 0.0
+        position.first_buy = None
+        position.last_trade = None
+
+    def _apply_trade(self, position, transaction):
+        """Fold one trade into a position using average cost (buys only for lot methods)"""
+        if transaction.transaction_type == 'BUY':
+            position.cost_basis += transaction.total_value
+            position.shares += transaction.shares
+            if position.first_buy is None or transaction.date < position.first_buy:
+                position.first_buy = transaction.date
+        elif transaction.transaction_type == 'SELL':
+            # Sells only reduce an open position; selling with nothing held is ignored
+            if position.shares > 0:
+                cost_per_share = position.cost_basis / position.shares
+                position.cost_basis -= transaction.shares * cost_per_share
+                position.realized_pnl += transaction.total_value - transaction.shares * cost_per_share
+                position.shares -= transaction.shares
+        else:
+            return
+
+        if abs(position.shares) < SHARE_EPSILON:
+            position.shares = 0.0
+            position.cost_basis = 0.0
+
+        if position.last_trade is None or transaction.date > position.last_trade:
+            position.last_trade = transaction.date
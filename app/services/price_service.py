@@ -9,6 +9,7 @@ import time
 import logging
 import random
 from flask import has_app_context, current_app
+from app.services.price_snapshot import request_price_snapshot
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -34,10 +35,16 @@ class PriceService:
         
         # For dashboard loading, we'll skip API calls and just use the most recent price
         if use_stale:
-            # Try to get the most recent price from the database
-            most_recent = PriceHistory.query.filter_by(ticker=ticker).order_by(PriceHistory.date.desc()).first()
-            if most_recent:
-                return most_recent.close_price
+            snapshot = request_price_snapshot()
+            if snapshot is not None:
+                most_recent_price = snapshot.latest(ticker)
+                if most_recent_price:
+                    return most_recent_price
+            else:
+                # Try to get the most recent price from the database
+                most_recent = PriceHistory.query.filter_by(ticker=ticker).order_by(PriceHistory.date.desc()).first()
+                if most_recent:
+                    return most_recent.close_price
         
         # Only fetch from API if explicitly requested (not for dashboard loading)
         if not use_stale:
@@ -51,6 +58,11 @@ class PriceService:
         return None
     
     def get_cached_price(self, ticker, price_date):
+        # Within a request, answer from the shared price snapshot when it covers the date
+        snapshot = request_price_snapshot()
+        if snapshot is not None and snapshot.covers_date(ticker, price_date):
+            return snapshot.price_on(ticker, price_date)
+        
         price_history = PriceHistory.query.filter_by(
             ticker=ticker, 
             date=price_date
@@ -58,30 +70,34 @@ class PriceService:
         return price_history.close_price if price_history else None
     
     def is_cache_fresh(self, ticker, price_date, freshness_minutes=5):
-        price_history = PriceHistory.query.filter_by(
-            ticker=ticker, 
-            date=price_date
-        ).first()
-        
-        if not price_history or not price_history.last_updated:
+        last_updated = self._last_updated(ticker, price_date)
+        if not last_updated:
             return False
         
         # Consider cache fresh if updated within specified minutes
-        time_diff = datetime.now(timezone.utc).replace(tzinfo=None) - price_history.last_updated
+        time_diff = datetime.now(timezone.utc).replace(tzinfo=None) - last_updated
         return time_diff < timedelta(minutes=freshness_minutes)
     
     def get_data_freshness(self, ticker, price_date):
         """Get how old the cached data is in minutes"""
+        last_updated = self._last_updated(ticker, price_date)
+        if not last_updated:
+            return None
+        
+        time_diff = datetime.now(timezone.utc).replace(tzinfo=None) - last_updated
+        return int(time_diff.total_seconds() / 60)
+    
+    def _last_updated(self, ticker, price_date):
+        """When the cached row for a date was last written (None if missing)"""
+        snapshot = request_price_snapshot()
+        if snapshot is not None and snapshot.covers_date(ticker, price_date):
+            return snapshot.last_updated(ticker, price_date)
+        
         price_history = PriceHistory.query.filter_by(
             ticker=ticker, 
             date=price_date
         ).first()
-        
-        if not price_history or not price_history.last_updated:
-            return None
-        
-        time_diff = datetime.now(timezone.utc).replace(tzinfo=None) - price_history.last_updated
-        return int(time_diff.total_seconds() / 60)
+        return price_history.last_updated if price_history else None
     
     def fetch_from_api(self, ticker, timeout=10):
         try:
@@ -649,11 +665,12 @@ class PriceService:
     def invalidate_stale_cache(self, portfolio_id):
         """Invalidate stale cache for a portfolio's holdings"""
         from app.services.portfolio_service import PortfolioService
+        from app.services.benchmark_service import BenchmarkService
         portfolio_service = PortfolioService()
         
         # Get holdings
         holdings = portfolio_service.get_current_holdings(portfolio_id)
-        tickers = list(holdings.keys()) + ['VOO', 'QQQ']  # Include ETFs
+        tickers = BenchmarkService().get_price_tickers(portfolio_id, holdings)  # Include benchmark ETFs
         
         # Get market-aware freshness threshold
         freshness_minutes = self.get_market_aware_cache_freshness()
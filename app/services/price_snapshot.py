@@ -0,0 +1,210 @@
+import logging
+from flask import g, has_request_context
+from sqlalchemy import and_, func, select, union_all
+from app import db
+from app.models.price import PriceHistory
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Rows kept per ticker: the latest close and the one before it
+SNAPSHOT_DEPTH = 2
+
+
+def _use_window_functions():
+    return db.session.get_bind().dialect.name != 'sqlite'
+
+
+def latest_price_rows(tickers, depth=SNAPSHOT_DEPTH, before_date=None):
+    """
+    The latest `depth` PriceHistory rows per ticker in one query.
+
+    Rows come back ordered by ticker and newest date first. With before_date
+    only rows strictly before that date are considered. PostgreSQL ranks rows
+    with ROW_NUMBER() OVER (PARTITION BY ticker ORDER BY date DESC); SQLite,
+    which only has window functions from 3.25, chains grouped MAX(date) joins
+    (one per depth level) and unions them instead.
+    """
+    if not tickers:
+        return []
+
+    filters = [PriceHistory.ticker.in_(tickers)]
+    if before_date is not None:
+        filters.append(PriceHistory.date < before_date)
+
+    if _use_window_functions():
+        ranked = db.session.query(
+            PriceHistory.ticker,
+            PriceHistory.date,
+            PriceHistory.close_price,
+            PriceHistory.last_updated,
+            func.row_number().over(
+                partition_by=PriceHistory.ticker,
+                order_by=PriceHistory.date.desc()
+            ).label('row_number')
+        ).filter(*filters).subquery()
+
+        return db.session.query(
+            ranked.c.ticker,
+            ranked.c.date,
+            ranked.c.close_price,
+            ranked.c.last_updated
+        ).filter(
+            ranked.c.row_number <= depth
+        ).order_by(ranked.c.ticker, ranked.c.row_number).all()
+
+    # Each level is the latest date before the previous level's date
+    levels = []
+    for _ in range(depth):
+        level = select(
+            PriceHistory.ticker.label('ticker'),
+            func.max(PriceHistory.date).label('date')
+        ).where(*filters)
+        if levels:
+            previous = levels[-1].subquery()
+            level = level.join(previous, and_(
+                PriceHistory.ticker == previous.c.ticker,
+                PriceHistory.date < previous.c.date
+            ))
+        levels.append(level.group_by(PriceHistory.ticker))
+
+    dates = union_all(*levels).subquery() if depth > 1 else levels[0].subquery()
+    return db.session.query(
+        PriceHistory.ticker,
+        PriceHistory.date,
+        PriceHistory.close_price,
+        PriceHistory.last_updated
+    ).join(dates, and_(
+        PriceHistory.ticker == dates.c.ticker,
+        PriceHistory.date == dates.c.date
+    )).order_by(PriceHistory.ticker, PriceHistory.date.desc()).all()
+
+
+class PriceSnapshot:
+    """
+    Latest and previous close for a set of tickers, loaded with one windowed query.
+
+    Valuation helpers read current prices, previous closes and data freshness
+    from the snapshot instead of issuing one or two PriceHistory queries per
+    ticker. Tickers that were not prefetched are loaded on first use.
+    """
+
+    def __init__(self):
+        self._rows = {}
+        self._previous_closes = {}
+
+    def prefetch(self, tickers):
+        """Load every ticker not yet in the snapshot in a single query"""
+        missing = [ticker for ticker in dict.fromkeys(tickers) if ticker and ticker not in self._rows]
+        if not missing:
+            return self
+
+        rows = latest_price_rows(missing)
+
+        for ticker in missing:
+            self._rows[ticker] = []
+        for row in rows:
+            self._rows[row.ticker].append(row)
+
+        logger.debug(f"Loaded price snapshot for {len(missing)} tickers")
+        return self
+
+    def prefetch_previous_closes(self, tickers, before_date):
+        """Load the close before a date for every ticker the snapshot rows cannot answer, in one query"""
+        self.prefetch(tickers)
+        missing = [
+            ticker for ticker in dict.fromkeys(tickers)
+            if ticker and (ticker, before_date) not in self._previous_closes
+            and not self.covers_previous_close(ticker, before_date)
+        ]
+        if not missing:
+            return self
+
+        for ticker in missing:
+            self._previous_closes[(ticker, before_date)] = None
+        for row in latest_price_rows(missing, depth=1, before_date=before_date):
+            self._previous_closes[(row.ticker, before_date)] = row.close_price
+
+        logger.debug(f"Loaded previous closes before {before_date} for {len(missing)} tickers")
+        return self
+
+    def _ticker_rows(self, ticker):
+        if ticker not in self._rows:
+            self.prefetch([ticker])
+        return self._rows[ticker]
+
+    def latest(self, ticker):
+        """Most recent close, whatever its date"""
+        rows = self._ticker_rows(ticker)
+        return rows[0].close_price if rows else None
+
+    def price_on(self, ticker, price_date):
+        """Close on an exact date if it is one of the snapshot rows, otherwise None"""
+        for row in self._ticker_rows(ticker):
+            if row.date == price_date:
+                return row.close_price
+        return None
+
+    def close_as_of(self, ticker, price_date, max_gap_days):
+        """Latest close on or before a date, at most max_gap_days older (None if the snapshot rows cannot tell)"""
+        for row in self._ticker_rows(ticker):
+            if row.date <= price_date:
+                return row.close_price if (price_date - row.date).days <= max_gap_days else None
+        return None
+
+    def covers_date(self, ticker, price_date):
+        """Check whether price_on is authoritative for a ticker and date"""
+        rows = self._ticker_rows(ticker)
+        return len(rows) < SNAPSHOT_DEPTH or price_date >= rows[-1].date
+
+    def previous_close(self, ticker, before_date):
+        """Latest close strictly before a date (None if the snapshot cannot tell)"""
+        if (ticker, before_date) in self._previous_closes:
+            return self._previous_closes[(ticker, before_date)]
+        for row in self._ticker_rows(ticker):
+            if row.date < before_date:
+                return row.close_price
+        return None
+
+    def covers_previous_close(self, ticker, before_date):
+        """Check whether previous_close is authoritative for a ticker and date"""
+        if (ticker, before_date) in self._previous_closes:
+            return True
+        rows = self._ticker_rows(ticker)
+        return len(rows) < SNAPSHOT_DEPTH or any(row.date < before_date for row in rows)
+
+    def last_updated(self, ticker, price_date):
+        for row in self._ticker_rows(ticker):
+            if row.date == price_date:
+                return row.last_updated
+        return None
+
+
+def get_price_snapshot(tickers=()):
+    """
+    Get the price snapshot for the current request, prefetching the given tickers.
+
+    The snapshot is memoized on flask.g for the lifetime of a request. Outside
+    a request (background jobs, CLI) a fresh snapshot is returned each call.
+    """
+    if has_request_context():
+        snapshot = g.get('price_snapshot')
+        if snapshot is None:
+            snapshot = g.price_snapshot = PriceSnapshot()
+    else:
+        snapshot = PriceSnapshot()
+
+    return snapshot.prefetch(tickers)
+
+
+def request_price_snapshot():
+    """The request's snapshot, or None outside a request"""
+    if has_request_context():
+        return get_price_snapshot()
+    return None
+
+
+def invalidate_price_snapshot():
+    """Drop the request's snapshot after price history is written"""
+    if has_request_context():
+        g.pop('price_snapshot', None)
@@ -0,0 +1,206 @@
+import logging
+import uuid
+import numpy as np
+from app import db
+from app.models.cache import PortfolioCache
+from app.models.portfolio import StockTransaction, Dividend
+from app.services.analytics_executor import analytics_executor
+from app.services.data_version_service import DataVersionService
+from app.util import calculators
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class TWRService:
+    """
+    Time-weighted returns for a portfolio and each of its benchmarks.
+
+    The daily value series used for the dashboard chart is valued once, buys
+    are treated as money added and sales and dividends as money taken out,
+    and every series' daily sub-period returns are chained with one
+    cumulative product. Monthly and annual returns are ratios of that growth
+    index at period ends, so no sub-period is ever revalued.
+    """
+
+    CACHE_TYPE = 'twr'
+
+    def calculate(self, portfolio_id, include_daily=False):
+        """
+        Compute daily, monthly and annual time-weighted returns.
+
+        Args:
+            portfolio_id (str): Portfolio to measure
+            include_daily (bool): Also return the cumulative return for every day
+
+        Returns:
+            dict: start_date, end_date, portfolio and benchmarks (None without transactions)
+        """
+        from app.views.main import build_daily_value_series
+
+        transactions = StockTransaction.query.filter_by(portfolio_id=portfolio_id).order_by(StockTransaction.date).all()
+        if not transactions:
+            return None
+        dividends = Dividend.query.filter_by(portfolio_id=portfolio_id).all()
+
+        # Back-filled prices so holdings bought before their first cached close still count
+        series = build_daily_value_series(portfolio_id, transactions, backfill=True)
+        dates = series['dates']
+        benchmarks = series['benchmarks']
+
+        values = np.vstack([series['portfolio_values'][None, :], series['benchmark_values']])
+        inflows, outflows = self._external_flows(series, transactions, dividends)
+
+        month_ends = self._period_ends(dates.year * 12 + dates.month)
+        year_ends = self._period_ends(dates.year)
+        growth, monthly, annual = analytics_executor.run(
+            calculators.time_weighted_returns, values, inflows, outflows, month_ends, year_ends,
+            size=values.size
+        )
+
+        month_labels = [dates[i].strftime('%Y-%m') for i in month_ends]
+        year_labels = [str(dates[i].year) for i in year_ends]
+        n_days = len(dates)
+
+        results = [
+            self._series_returns(growth[row], monthly[row], annual[row], month_labels, year_labels, n_days)
+            for row in range(values.shape[0])
+        ]
+
+        twr = {
+            'start_date': dates[0].date().isoformat(),
+            'end_date': dates[-1].date().isoformat(),
+            'portfolio': results[0],
+            'benchmarks': {ticker: results[i + 1] for i, ticker in enumerate(benchmarks)}
+        }
+
+        if include_daily:
+            twr['daily'] = {
+                'dates': [d.strftime('%Y-%m-%d') for d in dates],
+                'portfolio': (growth[0] - 1.0).round(6).tolist()
+            }
+            for i, ticker in enumerate(benchmarks):
+                twr['daily'][ticker] = (growth[i + 1] - 1.0).round(6).tolist()
+
+        return twr
+
+    def get_summary(self, portfolio_id, market_date):
+        """
+        Get monthly and annual TWR for the dashboard, cached per market date.
+
+        The cached entry is reused while the portfolio and price data versions
+        it was computed from are unchanged.
+        """
+        version_service = DataVersionService()
+        versions = [version_service.get_portfolio_version(portfolio_id), version_service.get_price_version()]
+
+        cache = PortfolioCache.query.filter_by(
+            portfolio_id=portfolio_id,
+            cache_type=self.CACHE_TYPE,
+            market_date=market_date
+        ).first()
+        if cache:
+            entry = cache.get_data()
+            if entry.get('versions') == versions:
+                return entry.get('twr')
+
+        twr = self.calculate(portfolio_id)
+
+        try:
+            PortfolioCache.query.filter_by(
+                portfolio_id=portfolio_id,
+                cache_type=self.CACHE_TYPE,
+                market_date=market_date
+            ).delete()
+
+            cache = PortfolioCache(
+                id=str(uuid.uuid4()),
+                portfolio_id=portfolio_id,
+                cache_type=self.CACHE_TYPE,
+                market_date=market_date
+            )
+            cache.set_data({'twr': twr, 'versions': versions})
+            db.session.add(cache)
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Error caching TWR for portfolio {portfolio_id}: {e}")
+            db.session.rollback()
+
+        return twr
+
+    def _external_flows(self, series, transactions, dividends):
+        """
+        Money added to and taken out of each series per day.
+
+        Trades in tickers without any cached price are left out, as their
+        holdings are not part of the value series either. Each benchmark
+        receives the dollars of every buy it could be priced for.
+        """
+        dates = series['dates']
+        start_date = dates[0].date()
+        n_days = len(dates)
+        columns = {ticker: i for i, ticker in enumerate(series['tickers'])}
+        price_matrix = series['price_matrix']
+        benchmark_prices = series['benchmark_price_matrix']
+
+        trade_days, trade_columns, trade_amounts, is_buy = [], [], [], []
+        for transaction in transactions:
+            if transaction.transaction_type not in ('BUY', 'SELL'):
+                continue
+            day = (transaction.date - start_date).days
+            if 0 <= day < n_days:
+                trade_days.append(day)
+                trade_columns.append(columns[transaction.ticker])
+                trade_amounts.append(transaction.total_value)
+                is_buy.append(transaction.transaction_type == 'BUY')
+
+        trade_days = np.array(trade_days, dtype=np.int64)
+        trade_amounts = np.array(trade_amounts, dtype=np.float64)
+        is_buy = np.array(is_buy, dtype=bool)
+        priced = np.isfinite(price_matrix[trade_days, np.array(trade_columns, dtype=np.int64)])
+
+        n_series = 1 + len(series['benchmarks'])
+        inflows = np.zeros((n_series, n_days))
+        outflows = np.zeros((n_series, n_days))
+
+        buys = is_buy & priced
+        sells = ~is_buy & priced
+        np.add.at(inflows[0], trade_days[buys], trade_amounts[buys])
+        np.add.at(outflows[0], trade_days[sells], trade_amounts[sells])
+
+        dividend_days = np.array([(d.payment_date - start_date).days for d in dividends], dtype=np.int64)
+        dividend_amounts = np.array([d.total_amount for d in dividends], dtype=np.float64)
+        in_range = (dividend_days >= 0) & (dividend_days < n_days)
+        np.add.at(outflows[0], dividend_days[in_range], dividend_amounts[in_range])
+
+        # Benchmark equivalents buy with the same dollars and never sell
+        all_buys = trade_days[is_buy]
+        for i in range(benchmark_prices.shape[1]):
+            benchmark_priced = np.isfinite(benchmark_prices[all_buys, i]) & (benchmark_prices[all_buys, i] > 0)
+            np.add.at(inflows[i + 1], all_buys[benchmark_priced], trade_amounts[is_buy][benchmark_priced])
+
+        return inflows, outflows
+
+    def _period_ends(self, period_keys):
+        """Day offset of the last day of each period"""
+        period_keys = np.asarray(period_keys)
+        return np.append(np.flatnonzero(np.diff(period_keys)), len(period_keys) - 1)
+
+    def _series_returns(self, growth, monthly, annual, month_labels, year_labels, n_days):
+        """Total, annualized and per-period returns of one series"""
+        total = float(growth[-1] - 1.0)
+        years = (n_days - 1) / 365.25
+
+        return {
+            'total_return': round(total, 6),
+            # Periods shorter than a year are not annualized
+            'annualized_return': round(float(growth[-1] ** (1 / years) - 1.0), 6) if years >= 1 else None,
+            'monthly': [
+                {'period': label, 'return': round(float(value), 6)}
+                for label, value in zip(month_labels, monthly)
+            ],
+            'annual': [
+                {'period': label, 'return': round(float(value), 6)}
+                for label, value in zip(year_labels, annual)
+            ]
+        }
@@ -0,0 +1,355 @@
+"""
+Analytics Kernels
+
+This module holds the CPU-heavy numeric kernels used for chart valuation and
+IRR solving. Every function here takes and returns plain NumPy arrays or
+floats so it can be shipped to a worker process by the analytics executor
+without touching Flask, SQLAlchemy or model objects.
+"""
+
+import numpy as np
+from scipy.optimize import brentq
+
+
+def value_series(n_days, trade_days, trade_columns, share_deltas, price_matrix):
+    """
+    Value a portfolio for every day of a price grid.
+
+    Args:
+        n_days (int): Number of days in the grid
+        trade_days (ndarray): Day offset of each trade
+        trade_columns (ndarray): Ticker column of each trade
+        share_deltas (ndarray): Signed share change of each trade
+        price_matrix (ndarray): Forward-filled prices, shape (n_days, n_tickers)
+
+    Returns:
+        ndarray: Portfolio value for each day
+    """
+    price_matrix = np.asarray(price_matrix, dtype=np.float64)
+    deltas = np.zeros(price_matrix.shape, dtype=np.float64)
+    if len(share_deltas):
+        np.add.at(deltas, (np.asarray(trade_days), np.asarray(trade_columns)), np.asarray(share_deltas))
+
+    # Only positive positions count towards value, matching the holdings view
+    positions = np.clip(np.cumsum(deltas, axis=0), 0, None)
+    prices = np.nan_to_num(price_matrix, nan=0.0)
+    return (positions * prices).sum(axis=1)[:n_days]
+
+
+def equivalent_shares(buy_amounts, buy_prices):
+    """
+    Shares of each benchmark bought with the same dollars as each purchase.
+
+    Args:
+        buy_amounts (ndarray): Dollar amount of each purchase
+        buy_prices (ndarray): Benchmark price on each purchase date, shape (n_buys, n_benchmarks)
+
+    Returns:
+        ndarray: Shares bought per purchase and benchmark, zero where no price is known
+    """
+    buy_amounts = np.asarray(buy_amounts, dtype=np.float64)
+    buy_prices = np.asarray(buy_prices, dtype=np.float64)
+    if buy_prices.ndim == 1:
+        buy_prices = buy_prices[:, None]
+
+    valid = np.isfinite(buy_prices) & (buy_prices > 0)
+    safe_prices = np.where(valid, buy_prices, 1.0)
+    return np.where(valid, buy_amounts[:, None] / safe_prices, 0.0)
+
+
+def equivalent_value_series(buy_days, buy_amounts, etf_prices):
+    """
+    Value of buying each benchmark with the same dollars on the same days.
+
+    Args:
+        buy_days (ndarray): Day offset of each purchase
+        buy_amounts (ndarray): Dollar amount of each purchase
+        etf_prices (ndarray): Forward-filled prices, shape (n_days,) or (n_days, n_benchmarks)
+
+    Returns:
+        ndarray: Equivalent value for each day, same shape as etf_prices
+    """
+    etf_prices = np.asarray(etf_prices, dtype=np.float64)
+    single = etf_prices.ndim == 1
+    if single:
+        etf_prices = etf_prices[:, None]
+
+    buy_days = np.asarray(buy_days, dtype=np.int64)
+    share_adds = np.zeros(etf_prices.shape, dtype=np.float64)
+    if len(buy_days):
+        shares = equivalent_shares(buy_amounts, etf_prices[buy_days])
+        np.add.at(share_adds, buy_days, shares)
+
+    values = np.cumsum(share_adds, axis=0) * np.nan_to_num(etf_prices, nan=0.0)
+    return values[:, 0] if single else values
+
+
+def asof_prices(series_days, series_prices, query_days, max_gap=None):
+    """
+    Last known price on or before each query day.
+
+    Args:
+        series_days (ndarray): Sorted day ordinals of a price series
+        series_prices (ndarray): Close for each series day
+        query_days (ndarray): Day ordinals to look up
+        max_gap (int): Oldest price (in days before the query day) to accept
+
+    Returns:
+        ndarray: Price for each query day, NaN where none is found
+    """
+    series_days = np.asarray(series_days, dtype=np.int64)
+    series_prices = np.asarray(series_prices, dtype=np.float64)
+    query_days = np.asarray(query_days, dtype=np.int64)
+
+    positions = np.searchsorted(series_days, query_days, side='right') - 1
+    found = positions >= 0
+    if max_gap is not None:
+        found[found] = query_days[found] - series_days[positions[found]] <= max_gap
+
+    prices = np.full(query_days.shape, np.nan)
+    prices[found] = series_prices[positions[found]]
+    return prices
+
+
+def holding_benchmark_returns(holding_rows, buy_amounts, buy_prices, current_prices, n_holdings):
+    """
+    Percent return of putting each holding's purchases into each benchmark.
+
+    Args:
+        holding_rows (ndarray): Holding index of each purchase
+        buy_amounts (ndarray): Dollar amount of each purchase
+        buy_prices (ndarray): Benchmark price on each purchase date, shape (n_buys, n_benchmarks)
+        current_prices (ndarray): Current price of each benchmark
+        n_holdings (int): Number of holdings
+
+    Returns:
+        ndarray: Return in percent, shape (n_holdings, n_benchmarks); zero where
+        no purchase of the holding could be priced
+    """
+    buy_amounts = np.asarray(buy_amounts, dtype=np.float64)
+    current_prices = np.asarray(current_prices, dtype=np.float64)
+    shares = equivalent_shares(buy_amounts, buy_prices)
+
+    # Only purchases with a benchmark price count towards the invested amount
+    invested_per_buy = np.where(shares > 0, buy_amounts[:, None], 0.0)
+    bought = np.zeros((n_holdings, shares.shape[1]), dtype=np.float64)
+    invested = np.zeros_like(bought)
+    holding_rows = np.asarray(holding_rows, dtype=np.int64)
+    np.add.at(bought, holding_rows, shares)
+    np.add.at(invested, holding_rows, invested_per_buy)
+
+    valid = (invested > 0) & np.isfinite(current_prices) & (current_prices > 0)
+    safe_invested = np.where(valid, invested, 1.0)
+    return np.where(valid, (bought * current_prices - invested) / safe_invested * 100, 0.0)
+
+
+def reinvested_shares(is_dividend, values, prices, opening_shares=0.0):
+    """
+    Shares held through a stream of deposits and reinvested dividends.
+
+    Each priced dividend multiplies the shares held by (1 + dividend / price),
+    so holdings compound through a cumulative product instead of rescanning
+    earlier purchases for every dividend.
+
+    Args:
+        is_dividend (ndarray): True for dividend events, False for deposits, in event order
+        values (ndarray): Deposit amount, or dividend per share
+        prices (ndarray): ETF price at each event (NaN where unknown)
+        opening_shares (float): Shares held before the first event
+
+    Returns:
+        tuple: (held_before, bought, dividend_cash) per event: shares held going
+        into the event, shares bought (deposit or reinvestment) and dividend paid
+    """
+    is_dividend = np.asarray(is_dividend, dtype=bool)
+    values = np.asarray(values, dtype=np.float64)
+    prices = np.asarray(prices, dtype=np.float64)
+
+    priced = np.isfinite(prices) & (prices > 0)
+    safe_prices = np.where(priced, prices, 1.0)
+
+    # Unpriced dividends are paid but cannot be reinvested
+    growth = np.where(is_dividend & priced, 1.0 + values / safe_prices, 1.0)
+    compounding = np.cumprod(growth)
+    deposit_shares = np.where(~is_dividend & priced, values / safe_prices, 0.0)
+    held_after = compounding * (opening_shares + np.cumsum(deposit_shares / compounding))
+
+    held_before = np.where(is_dividend, held_after / growth, held_after - deposit_shares)
+    dividend_cash = np.where(is_dividend, held_before * values, 0.0)
+    bought = np.where(is_dividend, np.where(priced, dividend_cash / safe_prices, 0.0), deposit_shares)
+    return held_before, bought, dividend_cash
+
+
+def portfolio_chart_series(n_days, trade_days, trade_columns, share_deltas, price_matrix,
+                           buy_days, buy_amounts, etf_price_matrix):
+    """
+    Compute the portfolio value series and one equivalent series per benchmark.
+
+    Returns:
+        tuple: (portfolio_values, etf_values) where etf_values has one row per benchmark column
+    """
+    portfolio_values = value_series(n_days, trade_days, trade_columns, share_deltas, price_matrix)
+    etf_price_matrix = np.asarray(etf_price_matrix, dtype=np.float64)
+    if not etf_price_matrix.size:
+        return portfolio_values, np.zeros((0, n_days))
+
+    etf_values = equivalent_value_series(buy_days, buy_amounts, etf_price_matrix.reshape(n_days, -1))
+    return portfolio_values, etf_values.T
+
+
+def time_weighted_returns(values, inflows, outflows, month_ends, year_ends):
+    """
+    Chain daily sub-period returns into time-weighted returns.
+
+    Trades happen at their own prices during the day, so flows are taken at
+    the day's close: each day's return is the change in value net of flows
+    over the previous day's value. A day that starts empty measures its
+    return on the money added that day, and days without capital at risk
+    return zero. All series are chained with one cumulative product.
+
+    Args:
+        values (ndarray): (series, days) end-of-day values
+        inflows (ndarray): (series, days) money added each day
+        outflows (ndarray): (series, days) money withdrawn or paid out each day
+        month_ends (ndarray): Day offset of the last day of each month
+        year_ends (ndarray): Day offset of the last day of each year
+
+    Returns:
+        tuple: (growth, monthly, annual) where growth is each series' cumulative
+        growth factor per day and monthly/annual hold each period's return
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    inflows = np.atleast_2d(np.asarray(inflows, dtype=np.float64))
+    outflows = np.atleast_2d(np.asarray(outflows, dtype=np.float64))
+
+    previous = np.concatenate([np.zeros((values.shape[0], 1)), values[:, :-1]], axis=1)
+    base = np.where(previous > 0, previous, inflows)
+    at_risk = base > 0
+    gain = values + outflows - previous - inflows
+    daily = np.where(at_risk, 1.0 + gain / np.where(at_risk, base, 1.0), 1.0)
+    growth = np.cumprod(daily, axis=1)
+
+    def period_returns(ends):
+        ends = np.asarray(ends, dtype=np.int64)
+        closing = growth[:, ends]
+        opening = np.concatenate([np.ones((growth.shape[0], 1)), closing[:, :-1]], axis=1)
+        return closing / opening - 1.0
+
+    return growth, period_returns(month_ends), period_returns(year_ends)
+
+
+# Rates scanned for a sign change when Newton's method does not converge
+IRR_BRACKET_GRID = np.array([-0.999, -0.99, -0.9, -0.75, -0.5, -0.25, -0.1, 0.0, 0.05, 0.1,
+                             0.2, 0.35, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 100.0])
+
+
+def npv_and_derivative(rates, periods, amounts):
+    """
+    NPV of each row of flows at its rate, and the NPV's derivative by rate.
+
+    Args:
+        rates (ndarray): One rate per row, all > -1
+        periods (ndarray): (rows, flows) times in years from each row's first flow
+        amounts (ndarray): (rows, flows) signed amounts; zero-padded rows are fine
+
+    Returns:
+        tuple: (npv, dnpv) with one value per row
+    """
+    growth = 1.0 + np.asarray(rates, dtype=np.float64)[:, None]
+    discounted = amounts * growth ** -periods
+    npv = discounted.sum(axis=1)
+    dnpv = -(periods * discounted).sum(axis=1) / growth[:, 0]
+    return npv, dnpv
+
+
+def solve_irr_batch(periods, amounts, guess=0.1, tol=1e-10, max_iter=50):
+    """
+    Solve many IRRs at once: vectorized Newton steps with a Brent fallback.
+
+    Each row is one set of dated flows, zero-padded to a common width. All
+    rows take Newton steps together using the analytic NPV derivative; rows
+    that fail to converge (flat derivative, overshoot below -100%) are solved
+    with Brent's method on a bracket found by scanning IRR_BRACKET_GRID.
+
+    Args:
+        periods (ndarray): (rows, flows) times in years from each row's first flow
+        amounts (ndarray): (rows, flows) signed flow amounts (investor perspective)
+        guess (float): Starting rate for every row
+        tol (float): Convergence tolerance on the rate step
+        max_iter (int): Newton iterations before falling back
+
+    Returns:
+        ndarray: Solved rate per row (unvalidated), NaN where no root exists
+    """
+    periods = np.atleast_2d(np.asarray(periods, dtype=np.float64))
+    amounts = np.atleast_2d(np.asarray(amounts, dtype=np.float64))
+    n_rows = amounts.shape[0]
+
+    rates = np.full(n_rows, guess, dtype=np.float64)
+    converged = np.zeros(n_rows, dtype=bool)
+    failed = np.zeros(n_rows, dtype=bool)
+
+    with np.errstate(all='ignore'):
+        for _ in range(max_iter):
+            active = np.flatnonzero(~converged & ~failed)
+            if not active.size:
+                break
+
+            npv, dnpv = npv_and_derivative(rates[active], periods[active], amounts[active])
+            step = npv / dnpv
+            new_rates = rates[active] - step
+
+            bad = ~np.isfinite(new_rates) | (new_rates <= -1.0)
+            failed[active[bad]] = True
+            rates[active[~bad]] = new_rates[~bad]
+            converged[active[~bad]] = np.abs(step[~bad]) <= tol * (1.0 + np.abs(new_rates[~bad]))
+
+        # A converged step must also leave the NPV near zero relative to the flows
+        done = np.flatnonzero(converged)
+        if done.size:
+            npv, _ = npv_and_derivative(rates[done], periods[done], amounts[done])
+            scale = np.abs(amounts[done]).sum(axis=1)
+            converged[done[np.abs(npv) > 1e-8 * scale]] = False
+
+    for row in np.flatnonzero(~converged):
+        rates[row] = _brent_irr(periods[row], amounts[row], guess)
+
+    return rates
+
+
+def _brent_irr(periods, amounts, guess):
+    """Bracketed IRR for one row of flows; the root nearest the guess, or NaN"""
+    shape = (IRR_BRACKET_GRID.size, periods.size)
+    with np.errstate(all='ignore'):
+        npv, _ = npv_and_derivative(IRR_BRACKET_GRID, np.broadcast_to(periods, shape), np.broadcast_to(amounts, shape))
+
+    signs = np.sign(npv)
+    brackets = np.flatnonzero(np.isfinite(npv[:-1]) & np.isfinite(npv[1:]) & (signs[:-1] * signs[1:] < 0))
+    if not brackets.size:
+        exact = np.flatnonzero(npv == 0)
+        return float(IRR_BRACKET_GRID[exact[0]]) if exact.size else float('nan')
+
+    # Prefer the bracket closest to the guess when the flows have several roots
+    midpoints = (IRR_BRACKET_GRID[brackets] + IRR_BRACKET_GRID[brackets + 1]) / 2
+    lower = brackets[np.argmin(np.abs(midpoints - guess))]
+
+    def npv_function(rate):
+        return float(np.sum(amounts * (1.0 + rate) ** -periods))
+
+    with np.errstate(all='ignore'):
+        return float(brentq(npv_function, IRR_BRACKET_GRID[lower], IRR_BRACKET_GRID[lower + 1], xtol=1e-12))
+
+
+def solve_irr(periods, amounts, guess=0.1):
+    """
+    Solve for the rate where the NPV of dated cash flows is zero.
+
+    Args:
+        periods (ndarray): Time of each flow in years from the first flow
+        amounts (ndarray): Signed flow amounts (investor perspective)
+        guess (float): Starting rate for the solver
+
+    Returns:
+        float: The solved rate (unvalidated), NaN if the flows have no root
+    """
+    return float(solve_irr_batch(np.asarray(periods)[None, :], np.asarray(amounts)[None, :], guess)[0])
@@ -0,0 +1,195 @@
+"""
+Compact Chart Payload Codec
+
+This module provides a compact encoding for chart data and helpers for
+negotiating response compression.
+
+The plain chart payload repeats a 'YYYY-MM-DD' string for every day and
+serializes every value as a full precision float. The compact form keeps a
+start date plus delta-encoded day offsets, and stores each value series as
+float32 values whose bit patterns are delta-encoded. Consecutive daily values
+share most of their high bits, so the deltas are small and compress well,
+and decoding is exact for the float32 values.
+"""
+
+import base64
+import gzip
+import logging
+from datetime import date, timedelta
+
+import numpy as np
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+COMPACT_FORMAT = 'compact-v1'
+
+# Responses smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 1024
+
+
+def _encode_deltas(values, dtype):
+    """Delta-encode an integer array and return it as base64"""
+    arr = np.asarray(values, dtype=dtype)
+    deltas = np.diff(arr, prepend=np.array([0], dtype=dtype))
+    return base64.b64encode(deltas.astype(np.dtype(dtype).newbyteorder('<')).tobytes()).decode('ascii')
+
+
+def _decode_deltas(encoded, dtype):
+    """Decode a base64 delta-encoded integer array"""
+    deltas = np.frombuffer(base64.b64decode(encoded), dtype=np.dtype(dtype).newbyteorder('<'))
+    return np.cumsum(deltas, dtype=dtype)
+
+
+def _is_numeric(values):
+    """Check a series holds only numbers (numpy would turn None gaps into NaN)"""
+    return all(isinstance(v, (int, float, np.number)) and not isinstance(v, bool) for v in values)
+
+
+def is_compact(chart_data):
+    """Check if chart data is in compact form"""
+    return isinstance(chart_data, dict) and chart_data.get('format') == COMPACT_FORMAT
+
+
+def encode_chart_data(chart_data):
+    """
+    Encode chart data into the compact form.
+
+    Every list of numbers with one entry per date is treated as a value
+    series. Other keys (flags, errors, series with gaps) are carried over
+    unchanged.
+
+    Args:
+        chart_data (dict): Chart data with 'dates' and value lists
+
+    Returns:
+        dict: Compact chart data, or the input unchanged if it cannot be encoded
+    """
+    if not isinstance(chart_data, dict) or is_compact(chart_data):
+        return chart_data
+
+    dates = chart_data.get('dates') or []
+    if not dates:
+        return chart_data
+
+    try:
+        parsed = [date.fromisoformat(str(d)[:10]) for d in dates]
+    except ValueError:
+        return chart_data
+
+    start_date = parsed[0]
+    offsets = [(d - start_date).days for d in parsed]
+
+    compact = {
+        'format': COMPACT_FORMAT,
+        'start_date': start_date.isoformat(),
+        'length': len(dates),
+        'day_offsets': _encode_deltas(offsets, np.int32),
+        'series': {}
+    }
+
+    for key, value in chart_data.items():
+        if key == 'dates':
+            continue
+        if isinstance(value, list) and len(value) == len(dates) and _is_numeric(value):
+            bits = np.asarray(value, dtype=np.float32).view(np.uint32)
+            compact['series'][key] = _encode_deltas(bits, np.uint32)
+        else:
+            compact[key] = value
+
+    return compact
+
+
+def decode_chart_data(chart_data):
+    """
+    Decode compact chart data back into the plain form.
+
+    Plain chart data is returned unchanged so callers can decode anything
+    read from the cache.
+
+    Args:
+        chart_data (dict): Compact or plain chart data
+
+    Returns:
+        dict: Plain chart data with 'dates' and value lists
+    """
+    if not is_compact(chart_data):
+        return chart_data
+
+    start_date = date.fromisoformat(chart_data['start_date'])
+    offsets = _decode_deltas(chart_data['day_offsets'], np.int32)
+
+    decoded = {'dates': [(start_date + timedelta(days=int(o))).strftime('%Y-%m-%d') for o in offsets]}
+
+    for key, encoded in chart_data.get('series', {}).items():
+        bits = _decode_deltas(encoded, np.uint32)
+        decoded[key] = bits.view(np.float32).astype(np.float64).tolist()
+
+    for key, value in chart_data.items():
+        if key not in ('format', 'start_date', 'length', 'day_offsets', 'series'):
+            decoded[key] = value
+
+    return decoded
+
+
+def wants_compact(request):
+    """Check if the client asked for the compact chart format"""
+    return request.args.get('format') == 'compact'
+
+
+def negotiate_encoding(request):
+    """
+    Pick a content encoding from the request's Accept-Encoding header.
+
+    Returns:
+        str: 'br', 'gzip' or None
+    """
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress_response(response, request):
+    """
+    Compress a response body using the negotiated content encoding.
+
+    Args:
+        response: Flask response
+        request: Flask request
+
+    Returns:
+        The same response, compressed when worthwhile
+    """
+    response.vary.add('Accept-Encoding')
+
+    if response.direct_passthrough or response.status_code != 200 or 'Content-Encoding' in response.headers:
+        return response
+
+    encoding = negotiate_encoding(request)
+    if encoding is None:
+        return response
+
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_BYTES:
+        return response
+
+    try:
+        if encoding == 'br':
+            compressed = brotli.compress(body)
+        else:
+            compressed = gzip.compress(body, compresslevel=6)
+    except Exception as e:
+        logger.error(f"Error compressing response with {encoding}: {e}")
+        return response
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,53 @@
+"""
+Conditional GET Decorator
+
+This module provides a decorator that answers If-None-Match requests with
+304 Not Modified before the view runs. The ETag comes from a cheap function
+of the request (data version counters, market date), so repeat dashboard
+views skip the expensive computation and serialization entirely.
+"""
+
+import functools
+import logging
+from flask import request, make_response
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def conditional_get(etag_func):
+    """
+    Decorator for ETag based conditional GET on a view.
+
+    Args:
+        etag_func: Called with the view arguments, returns the ETag or None
+
+    Returns:
+        Decorated view that returns 304 when the client copy is current
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                etag = etag_func(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"Error building ETag for {view.__name__}: {e}")
+                etag = None
+
+            if etag and etag in request.if_none_match:
+                response = make_response('', 304)
+                response.set_etag(etag)
+                response.vary.add('Accept-Encoding')
+                response.headers['Cache-Control'] = 'private, no-cache'
+                return response
+
+            response = make_response(view(*args, **kwargs))
+
+            # Only successful, cacheable responses get an ETag
+            if etag and response.status_code == 200 and not response.cache_control.no_store:
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = 'private, no-cache'
+
+            return response
+        return wrapper
+    return decorator
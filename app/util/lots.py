@@ -0,0 +1,187 @@
+"""
+Tax Lot Engine
+
+This module tracks open purchase lots per ticker and relieves them on sells
+using FIFO, LIFO, HIFO (highest cost first) or specific lot identification.
+It works on plain values so it can replay a ticker's trades without touching
+Flask or SQLAlchemy.
+
+Each book keeps its lots in an insertion-ordered dict (acquisition order and
+lookup by lot id) plus a deque or heap for the relief order. Fully consumed
+lots are dropped lazily when they reach the front, so a sell costs amortized
+O(1) per lot it consumes (O(log n) for HIFO).
+"""
+
+import heapq
+from collections import deque
+
+FIFO = 'FIFO'
+LIFO = 'LIFO'
+HIFO = 'HIFO'
+SPECIFIC = 'SPECIFIC'
+
+# Methods that relieve individual lots; AVERAGE is handled by the positions ledger
+LOT_METHODS = (FIFO, LIFO, HIFO, SPECIFIC)
+
+# Share residues below this are float noise from selling a lot in pieces
+SHARE_EPSILON = 1e-9
+
+
+class Lot:
+    """An open purchase lot"""
+
+    __slots__ = ('lot_id', 'date', 'shares', 'price', 'original_shares')
+
+    def __init__(self, lot_id, date, shares, price):
+        self.lot_id = lot_id
+        self.date = date
+        self.shares = shares
+        self.price = price
+        self.original_shares = shares
+
+    @property
+    def cost_basis(self):
+        return self.shares * self.price
+
+    def to_dict(self, current_price=None):
+        lot = {
+            'lot_id': self.lot_id,
+            'date': self.date.isoformat() if self.date else None,
+            'shares': self.shares,
+            'original_shares': self.original_shares,
+            'price': self.price,
+            'cost_basis': self.cost_basis
+        }
+        if current_price is not None:
+            market_value = self.shares * current_price
+            lot['market_value'] = market_value
+            lot['unrealized_pnl'] = market_value - self.cost_basis
+        return lot
+
+
+class LotBook:
+    """
+    Open lots and realized P&L for one ticker.
+
+    Specific-ID sells relieve the requested lots first and fall back to FIFO
+    for any shares the selection does not cover.
+    """
+
+    def __init__(self, method=FIFO):
+        if method not in LOT_METHODS:
+            raise ValueError(f"Unknown lot relief method: {method}")
+
+        self.method = method
+        self.shares = 0.0
+        self.cost_basis = 0.0
+        self.realized_pnl = 0.0
+        self.closed = []
+        self._lots = {}
+        self._order = deque()
+        self._heap = []
+        self._sequence = 0
+
+    def buy(self, lot_id, date, shares, price):
+        """Open a new lot"""
+        lot = Lot(lot_id, date, shares, price)
+        self._lots[lot_id] = lot
+        if self.method == HIFO:
+            heapq.heappush(self._heap, (-price, self._sequence, lot))
+        else:
+            self._order.append(lot)
+        self._sequence += 1
+
+        self.shares += shares
+        self.cost_basis += lot.cost_basis
+        return lot
+
+    def sell(self, shares, price, date=None, lot_ids=None, sell_id=None):
+        """
+        Relieve lots for a sale.
+
+        Args:
+            shares (float): Shares sold
+            price (float): Sale price per share
+            date (date): Sale date, recorded on the closed lot entries
+            lot_ids (list): Lots to relieve first (specific identification)
+            sell_id: Identifier of the sell recorded on the closed lot entries
+
+        Returns:
+            list: Closed lot entries with shares, cost, proceeds and realized P&L
+        """
+        self.shares -= shares
+        remaining = shares
+        closed = []
+
+        for lot_id in lot_ids or ():
+            if remaining <= SHARE_EPSILON:
+                break
+            lot = self._lots.get(lot_id)
+            if lot is not None:
+                remaining = self._relieve(lot, remaining, price, date, sell_id, closed)
+
+        while remaining > SHARE_EPSILON:
+            lot = self._next_lot()
+            if lot is None:
+                # Selling more than is held leaves the excess without a cost basis
+                break
+            remaining = self._relieve(lot, remaining, price, date, sell_id, closed)
+
+        if abs(self.shares) < SHARE_EPSILON:
+            self.shares = 0.0
+        if not self._lots:
+            self.cost_basis = 0.0
+
+        self.closed.extend(closed)
+        return closed
+
+    def open_lots(self):
+        """Open lots in acquisition order"""
+        return list(self._lots.values())
+
+    def unrealized_pnl(self, current_price):
+        return sum(lot.shares for lot in self._lots.values()) * current_price - self.cost_basis
+
+    def _next_lot(self):
+        """Next lot in relief order, discarding lots already consumed"""
+        if self.method == HIFO:
+            while self._heap:
+                lot = self._heap[0][2]
+                if lot.lot_id in self._lots:
+                    return lot
+                heapq.heappop(self._heap)
+            return None
+
+        while self._order:
+            lot = self._order[-1] if self.method == LIFO else self._order[0]
+            if lot.lot_id in self._lots:
+                return lot
+            if self.method == LIFO:
+                self._order.pop()
+            else:
+                self._order.popleft()
+        return None
+
+    def _relieve(self, lot, remaining, price, date, sell_id, closed):
+        """Take up to `remaining` shares from a lot and return what is still unmatched"""
+        taken = min(lot.shares, remaining)
+        cost = taken * lot.price
+        proceeds = taken * price
+
+        lot.shares -= taken
+        if lot.shares < SHARE_EPSILON:
+            del self._lots[lot.lot_id]
+
+        self.cost_basis -= cost
+        self.realized_pnl += proceeds - cost
+        closed.append({
+            'lot_id': lot.lot_id,
+            'sell_id': sell_id,
+            'acquired': lot.date.isoformat() if lot.date else None,
+            'sold': date.isoformat() if date else None,
+            'shares': taken,
+            'cost_basis': cost,
+            'proceeds': proceeds,
+            'realized_pnl': proceeds - cost
+        })
+        return remaining - taken
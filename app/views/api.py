@@ -1,7 +1,7 @@
 from flask import Blueprint, jsonify, request, render_template
 from app.util.query_cache import get_cache_stats, clear_query_cache
-from collections import defaultdict
-from datetime import date
+from app.services.benchmark_service import BenchmarkService, benchmark_key
+from app.services.dashboard_aggregator import DashboardAggregator
 
 api_blueprint = Blueprint('api', __name__)
 
@@ -23,110 +23,202 @@ def clear_cache():
         'message': 'Cache cleared successfully'
     })
 
+@api_blueprint.route('/api/portfolio/<portfolio_id>/benchmarks', methods=['GET', 'PUT'])
+def portfolio_benchmarks(portfolio_id):
+    """Get or replace the benchmark tickers a portfolio is compared against"""
+    from app.services.portfolio_service import PortfolioService
+    
+    if not PortfolioService().get_portfolio(portfolio_id):
+        return jsonify({
+            'success': False,
+            'error': 'Portfolio not found'
+        }), 404
+    
+    benchmark_service = BenchmarkService()
+    
+    if request.method == 'PUT':
+        data = request.get_json(silent=True) or {}
+        tickers = data.get('benchmarks')
+        if not isinstance(tickers, list) or not all(isinstance(t, str) for t in tickers):
+            return jsonify({
+                'success': False,
+                'error': 'benchmarks must be a list of tickers'
+            }), 400
+        
+        try:
+            benchmarks = benchmark_service.set_benchmarks(portfolio_id, tickers)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+    else:
+        benchmarks = benchmark_service.get_benchmarks(portfolio_id)
+    
+    return jsonify({
+        'success': True,
+        'benchmarks': benchmarks
+    })
+
+@api_blueprint.route('/api/portfolio/<portfolio_id>/lots')
+def portfolio_lots(portfolio_id):
+    """Get open tax lots with unrealized P&L and closed lots with realized P&L"""
+    from app.services.portfolio_service import PortfolioService
+    from app.services.position_service import PositionService
+    from app.services.price_service import PriceService
+    
+    if not PortfolioService().get_portfolio(portfolio_id):
+        return jsonify({
+            'success': False,
+            'error': 'Portfolio not found'
+        }), 404
+    
+    try:
+        position_service = PositionService(method=request.args.get('method'))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    ticker = request.args.get('ticker')
+    books = position_service.get_lot_books(portfolio_id, ticker=ticker.upper() if ticker else None)
+    prices = PriceService().get_current_prices_batch(list(books.keys()), use_cache=True)
+    
+    lots = {}
+    for book_ticker, book in books.items():
+        current_price = prices.get(book_ticker) or 0
+        lots[book_ticker] = {
+            'shares': book.shares,
+            'cost_basis': book.cost_basis,
+            'realized_pnl': book.realized_pnl,
+            'unrealized_pnl': book.unrealized_pnl(current_price),
+            'open_lots': [lot.to_dict(current_price) for lot in book.open_lots()],
+            'closed_lots': book.closed
+        }
+    
+    return jsonify({
+        'success': True,
+        'method': position_service.lot_method,
+        'lots': lots
+    })
+
+@api_blueprint.route('/api/portfolio/<portfolio_id>/twr')
+def portfolio_twr(portfolio_id):
+    """Get daily, monthly and annual time-weighted returns of a portfolio and its benchmarks"""
+    from app.services.portfolio_service import PortfolioService
+    from app.services.twr_service import TWRService
+    
+    if not PortfolioService().get_portfolio(portfolio_id):
+        return jsonify({
+            'success': False,
+            'error': 'Portfolio not found'
+        }), 404
+    
+    twr = TWRService().calculate(portfolio_id, include_daily=request.args.get('daily', '1') != '0')
+    
+    return jsonify({
+        'success': True,
+        'twr': twr
+    })
+
+@api_blueprint.route('/api/portfolio/<portfolio_id>/irr-history')
+def portfolio_irr_history(portfolio_id):
+    """Get month-end IRR since inception and over trailing 1/3/5-year windows"""
+    from app.services.portfolio_service import PortfolioService
+    from app.services.irr_history_service import IRRHistoryService
+    
+    if not PortfolioService().get_portfolio(portfolio_id):
+        return jsonify({
+            'success': False,
+            'error': 'Portfolio not found'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'irr_history': IRRHistoryService().get_history(portfolio_id)
+    })
+
+@api_blueprint.route('/api/portfolio/<portfolio_id>/cash-flows')
+def portfolio_cash_flows(portfolio_id):
+    """Get one keyset page of saved cash flows, filtered by flow type and date range"""
+    from app.services.portfolio_service import PortfolioService
+    from app.services.cash_flow_service import CashFlowService
+    from app.services.cash_flow_context import get_cash_flow_context
+    from app.views.cash_flows import cash_flow_page_args, serialize_cash_flow
+    
+    if not PortfolioService().get_portfolio(portfolio_id):
+        return jsonify({
+            'success': False,
+            'error': 'Portfolio not found'
+        }), 404
+    
+    get_cash_flow_context(portfolio_id).ensure_current()
+    try:
+        page = CashFlowService().get_cash_flow_page(portfolio_id, **cash_flow_page_args(request.args))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    return jsonify({
+        'success': True,
+        'cash_flows': [serialize_cash_flow(flow) for flow in page['cash_flows']],
+        'next_cursor': page['next_cursor'],
+        'totals': page['totals']
+    })
+
+@api_blueprint.route('/api/import-jobs/<job_id>')
+def import_job_status(job_id):
+    """Get the progress and failed rows of a CSV import job"""
+    from app.services.background_tasks import import_runner
+    
+    job = import_runner.get_job(job_id)
+    if not job:
+        return jsonify({
+            'success': False,
+            'error': 'Import job not found'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'job': job
+    })
+
+@api_blueprint.route('/api/household/<user_id>')
+def household_data(user_id):
+    """Get the consolidated holdings, value series, IRR and benchmark comparison of a user's portfolios"""
+    from app.services.household_service import HouseholdService
+    
+    household = HouseholdService().get_household(user_id, include_chart=request.args.get('chart', '1') != '0')
+    if household is None:
+        return jsonify({
+            'success': False,
+            'error': 'No portfolios found for user'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'household': household
+    })
+
 @api_blueprint.route('/monitoring')
 def monitoring_dashboard():
     """Render the performance monitoring dashboard"""
     return render_template('monitoring.html')
 
-def get_minimal_holdings(portfolio_id, portfolio_service, price_service):
+def get_minimal_holdings(portfolio_id, portfolio_service, price_service, aggregator=None):
     """Get holdings data with cached prices and calculated gains"""
-    from collections import defaultdict
     import logging
     logger = logging.getLogger(__name__)
     
     try:
-        # Get current holdings and transactions
-        holdings = portfolio_service.get_current_holdings(portfolio_id)
-        transactions = portfolio_service.get_portfolio_transactions(portfolio_id)
-        
-        # Calculate cost basis for each ticker
-        cost_basis = defaultdict(lambda: {'total_cost': 0, 'total_shares': 0})
-        
-        for transaction in transactions:
-            if transaction.transaction_type == 'BUY':
-                cost_basis[transaction.ticker]['total_cost'] += transaction.total_value
-                cost_basis[transaction.ticker]['total_shares'] += transaction.shares
-            elif transaction.transaction_type == 'SELL':
-                # Proportionally reduce cost basis
-                if cost_basis[transaction.ticker]['total_shares'] > 0:
-                    cost_per_share = cost_basis[transaction.ticker]['total_cost'] / cost_basis[transaction.ticker]['total_shares']
-                    cost_basis[transaction.ticker]['total_cost'] -= transaction.shares * cost_per_share
-                    cost_basis[transaction.ticker]['total_shares'] -= transaction.shares
-        
-        # Get all tickers
-        tickers = list(holdings.keys())
-        
-        # Use batch processing for better performance
-        prices = price_service.get_current_prices_batch(tickers, use_cache=True)
-        
-        # Calculate total portfolio value for percentage
-        total_portfolio_value = 0
-        for ticker, shares in holdings.items():
-            current_price = prices.get(ticker, 0)
-            if current_price:
-                total_portfolio_value += shares * current_price
-        
-        # Build holdings data with calculations
-        holdings_data = []
-        for ticker, shares in holdings.items():
-            try:
-                current_price = prices.get(ticker, 0)
-                market_value = shares * current_price
-                
-                # Calculate cost basis for remaining shares
-                avg_cost = cost_basis[ticker]['total_cost'] / cost_basis[ticker]['total_shares'] if cost_basis[ticker]['total_shares'] > 0 else 0
-                total_cost = shares * avg_cost
-                
-                # Calculate gains
-                gain_loss = market_value - total_cost
-                gain_loss_percentage = (gain_loss / total_cost * 100) if total_cost > 0 else 0
-                
-                # Calculate ETF performance (simplified using cached prices)
-                voo_performance = calculate_etf_performance_simple(ticker, transactions, 'VOO', price_service)
-                qqq_performance = calculate_etf_performance_simple(ticker, transactions, 'QQQ', price_service)
-                
-                # Check data freshness for warning
-                freshness = price_service.get_data_freshness(ticker, date.today())
-                is_stale = freshness is None or freshness > 5
-                
-                # Calculate portfolio percentage
-                portfolio_percentage = (market_value / total_portfolio_value * 100) if total_portfolio_value > 0 else 0
-                
-                holdings_data.append({
-                    'ticker': ticker,
-                    'shares': shares,
-                    'current_price': current_price,
-                    'market_value': market_value,
-                    'cost_basis': total_cost,
-                    'gain_loss': gain_loss,
-                    'gain_loss_percentage': gain_loss_percentage,
-                    'voo_performance': voo_performance,
-                    'qqq_performance': qqq_performance,
-                    'portfolio_percentage': portfolio_percentage,
-                    'data_age_minutes': freshness,
-                    'is_stale': is_stale
-                })
-            except Exception as e:
-                logger.error(f"Error processing holding for {ticker}: {e}")
-                holdings_data.append({
-                    'ticker': ticker,
-                    'shares': shares,
-                    'current_price': 0,
-                    'market_value': 0,
-                    'cost_basis': 0,
-                    'gain_loss': 0,
-                    'gain_loss_percentage': 0,
-                    'voo_performance': 0,
-                    'qqq_performance': 0,
-                    'portfolio_percentage': 0,
-                    'data_age_minutes': None,
-                    'is_stale': True
-                })
-        
-        # Sort holdings by portfolio percentage descending (largest first)
-        holdings_data.sort(key=lambda x: x['portfolio_percentage'], reverse=True)
+        # Holdings share the dashboard's single data load and price snapshot
+        if aggregator is None:
+            aggregator = DashboardAggregator(portfolio_id, portfolio_service, price_service)
         
-        return holdings_data
+        return aggregator.holdings_data()
     except Exception as e:
         logger.error(f"Error getting holdings: {e}")
         import traceback
@@ -137,45 +229,19 @@ def get_minimal_holdings(portfolio_id, portfolio_service, price_service):
 # from app.views.api import api_blueprint
 # app.register_blueprint(api_blueprint)
 
-def calculate_etf_performance_simple(ticker, transactions, etf_ticker, price_service):
+def calculate_etf_performance_simple(ticker, transactions, etf_ticker, price_service, current_etf_price=None):
     """Calculate ETF performance using cached historical prices"""
-    from app.models.price import PriceHistory
-    from datetime import timedelta
+    from app.views.main import calculate_holdings_benchmark_performance
     
     try:
-        # Get all BUY transactions for this ticker
-        buy_transactions = [t for t in transactions if t.ticker == ticker and t.transaction_type == 'BUY']
-        
-        if not buy_transactions:
-            return 0
-        
-        # Calculate weighted average purchase date
-        total_investment = sum(t.total_value for t in buy_transactions)
-        if total_investment <= 0:
-            return 0
-            
-        weighted_date_sum = 0
-        for transaction in buy_transactions:
-            weight = transaction.total_value / total_investment
-            days_since_epoch = (transaction.date - date(1970, 1, 1)).days
-            weighted_date_sum += days_since_epoch * weight
-        
-        avg_purchase_date = date(1970, 1, 1) + timedelta(days=int(weighted_date_sum))
-        
-        # Get ETF price on average purchase date from cached data
-        etf_purchase_price = PriceHistory.query.filter(
-            PriceHistory.ticker == etf_ticker,
-            PriceHistory.date <= avg_purchase_date
-        ).order_by(PriceHistory.date.desc()).first()
-        
         # Get current ETF price
-        current_etf_price = price_service.get_current_price(etf_ticker, use_stale=True)
-        
-        if etf_purchase_price and current_etf_price and etf_purchase_price.close_price > 0:
-            performance = ((current_etf_price - etf_purchase_price.close_price) / etf_purchase_price.close_price) * 100
-            return round(performance, 2)
+        if current_etf_price is None:
+            current_etf_price = price_service.get_current_price(etf_ticker, use_stale=True)
         
-        return 0
+        performance = calculate_holdings_benchmark_performance(
+            transactions, [ticker], [etf_ticker], current_prices={etf_ticker: current_etf_price}
+        )
+        return performance[ticker][f'{benchmark_key(etf_ticker)}_performance']
         
     except Exception as e:
-        return 0
\ No newline at end of file
+        return 0
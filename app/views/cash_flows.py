@@ -1,22 +1,49 @@
-from flask import Blueprint, render_template, request, Response
+from flask import Blueprint, render_template, request
 from app.services.portfolio_service import PortfolioService
 from app.services.cash_flow_sync_service import CashFlowSyncService
-from app.services.cash_flow_service import CashFlowService
-from app.services.irr_calculation_service import IRRCalculationService
+from app.services.cash_flow_service import CashFlowService, CASH_FLOW_PAGE_SIZE
+from app.services.cash_flow_context import get_cash_flow_context
 from app.services.etf_comparison_service import ETFComparisonService
+from app.services.benchmark_service import BenchmarkService
+from app.util.csv_stream import csv_response, wants_gzip
 from datetime import date
-import csv
-import io
 
 cash_flows_blueprint = Blueprint('cash_flows', __name__)
 
+def cash_flow_page_args(args):
+    """
+    Keyset page and filter arguments for CashFlowService.get_cash_flow_page.
+    
+    Raises:
+        ValueError: If limit or a date is malformed
+    """
+    start_date = args.get('start_date')
+    end_date = args.get('end_date')
+    return {
+        'cursor': args.get('cursor') or None,
+        'limit': int(args.get('limit', CASH_FLOW_PAGE_SIZE)),
+        'flow_types': [t.upper() for t in args.getlist('types')],
+        'start_date': date.fromisoformat(start_date) if start_date else None,
+        'end_date': date.fromisoformat(end_date) if end_date else None
+    }
+
+def serialize_cash_flow(flow):
+    """JSON representation of a saved cash flow"""
+    return {
+        'id': flow.id,
+        'date': flow.date.isoformat(),
+        'flow_type': flow.flow_type,
+        'description': flow.description,
+        'amount': flow.amount,
+        'running_balance': flow.running_balance
+    }
+
 @cash_flows_blueprint.route('/cash-flows')
 def cash_flows_page():
     """Cash flows analysis page"""
     portfolio_service = PortfolioService()
     cash_flow_sync_service = CashFlowSyncService()
     cash_flow_service = CashFlowService()
-    irr_service = IRRCalculationService()
     
     # Get all portfolios
     portfolios = portfolio_service.get_all_portfolios()
@@ -32,36 +59,51 @@ def cash_flows_page():
     
     # Initialize data
     cash_flows = []
+    next_cursor = None
+    page_totals = None
+    page_args = {}
     portfolio_summary = {}
     sync_status = {}
     voo_irr = 0.0
     qqq_irr = 0.0
     
     if current_portfolio:
-        # Get comparison type (portfolio, VOO, or QQQ)
+        # Get comparison type (portfolio or one of the portfolio's benchmarks)
         comparison = request.args.get('comparison', 'portfolio')
+        benchmarks = BenchmarkService().get_benchmarks(current_portfolio.id)
+        
+        # Every view below shares one sync, one deposit load and one build per comparison
+        context = get_cash_flow_context(current_portfolio.id)
         
         # Always calculate VOO and QQQ IRR for display
         etf_service = ETFComparisonService()
-        voo_summary = etf_service.get_etf_summary(current_portfolio.id, 'VOO')
-        qqq_summary = etf_service.get_etf_summary(current_portfolio.id, 'QQQ')
-        voo_irr = voo_summary.get('irr', 0.0)
-        qqq_irr = qqq_summary.get('irr', 0.0)
+        voo_irr = etf_service.get_etf_summary(current_portfolio.id, 'VOO').get('irr', 0.0)
+        qqq_irr = etf_service.get_etf_summary(current_portfolio.id, 'QQQ').get('irr', 0.0)
         
-        if comparison in ['VOO', 'QQQ']:
+        if comparison in benchmarks:
             # ETF comparison view - using real service
             cash_flows = etf_service.get_etf_cash_flows(current_portfolio.id, comparison)
             portfolio_summary = etf_service.get_etf_summary(current_portfolio.id, comparison)
             sync_status = {'status': 'complete', 'message': f'{comparison} comparison data loaded'}
         else:
-            # Portfolio view
-            cash_flow_sync_service.ensure_cash_flows_current(current_portfolio.id)
-            cash_flows = cash_flow_service.get_cash_flows(current_portfolio.id)
-            portfolio_summary = irr_service.get_portfolio_summary(current_portfolio.id)
+            # Portfolio view: the first page only, later pages come from the API
+            context.ensure_current()
+            try:
+                page_args = cash_flow_page_args(request.args)
+            except ValueError:
+                pass
+            page = cash_flow_service.get_cash_flow_page(current_portfolio.id, **page_args)
+            cash_flows = page['cash_flows']
+            next_cursor = page['next_cursor']
+            page_totals = page['totals']
+            portfolio_summary = context.portfolio_summary()
             sync_status = cash_flow_sync_service.get_sync_status(current_portfolio.id)
     
     return render_template('cash_flows.html',
                          cash_flows=cash_flows,
+                         next_cursor=next_cursor,
+                         page_totals=page_totals,
+                         flow_types=page_args.get('flow_types', []),
                          portfolio_summary=portfolio_summary,
                          sync_status=sync_status,
                          voo_irr=voo_irr,
@@ -70,7 +112,7 @@ def cash_flows_page():
 
 @cash_flows_blueprint.route('/cash-flows/export')
 def export_cash_flows():
-    """Export cash flows to CSV with filtering"""
+    """Export cash flows to CSV with filtering, streamed as it is read"""
     portfolio_service = PortfolioService()
     cash_flow_service = CashFlowService()
     etf_service = ETFComparisonService()
@@ -84,53 +126,32 @@ def export_cash_flows():
     if not portfolio:
         return "Portfolio not found", 404
     
-    # Get comparison type and cash flows
-    comparison = request.args.get('comparison', 'portfolio')
-    if comparison in ['VOO', 'QQQ']:
-        cash_flows = etf_service.get_etf_cash_flows(portfolio_id, comparison)
-    else:
-        cash_flows = cash_flow_service.get_cash_flows(portfolio_id)
-    
     # Get filter types
     filter_types = request.args.getlist('types')
-    if filter_types:
-        cash_flows = [cf for cf in cash_flows if cf.flow_type in filter_types or cf.get('flow_type') in filter_types]
-    
-    # Create CSV
-    output = io.StringIO()
-    writer = csv.writer(output)
     
-    # Write header
-    writer.writerow(['Date', 'Type', 'Description', 'Amount', 'Running Balance'])
-    
-    # Write data
-    for flow in cash_flows:
-        if hasattr(flow, 'date'):
-            # Database object
-            writer.writerow([
-                flow.date.strftime('%Y-%m-%d'),
-                flow.flow_type,
-                flow.description,
-                f"{flow.amount:.2f}",
-                f"{flow.running_balance:.2f}"
-            ])
-        else:
-            # Dictionary object (ETF flows)
-            writer.writerow([
-                flow['date'].strftime('%Y-%m-%d'),
-                flow['flow_type'],
-                flow['description'],
-                f"{flow['amount']:.2f}",
-                f"{flow['running_balance']:.2f}"
-            ])
+    # Get comparison type and cash flows
+    comparison = request.args.get('comparison', 'portfolio')
+    if comparison in BenchmarkService().get_benchmarks(portfolio_id):
+        # ETF flows come from the comparison cache as dictionaries
+        etf_flows = etf_service.get_etf_cash_flows(portfolio_id, comparison)
+        rows = (
+            (flow['date'], flow['flow_type'], flow['description'], flow['amount'], flow['running_balance'])
+            for flow in etf_flows
+            if not filter_types or flow['flow_type'] in filter_types
+        )
+    else:
+        get_cash_flow_context(portfolio_id).ensure_current()
+        rows = cash_flow_service.iter_cash_flow_rows(portfolio_id, flow_types=filter_types)
     
-    # Create response
-    output.seek(0)
     comparison_suffix = f"_{comparison}" if comparison != 'portfolio' else ""
     filename = f"cash_flows_{portfolio.name.replace(' ', '_')}{comparison_suffix}_{portfolio_id[:8]}.csv"
     
-    return Response(
-        output.getvalue(),
-        mimetype='text/csv',
-        headers={'Content-Disposition': f'attachment; filename={filename}'}
-    )
\ No newline at end of file
+    return csv_response(
+        filename,
+        ['Date', 'Type', 'Description', 'Amount', 'Running Balance'],
+        (
+            [flow_date.strftime('%Y-%m-%d'), flow_type, description, f"{amount:.2f}", f"{running_balance:.2f}"]
+            for flow_date, flow_type, description, amount, running_balance in rows
+        ),
+        compress=wants_gzip(request)
+    )
@@ -1,9 +1,20 @@
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, render_template, request, jsonify, current_app
 from app.services.portfolio_service import PortfolioService
 from app.services.price_service import PriceService
-from app.services.background_tasks import background_updater, chart_generator
+from app.services.background_tasks import background_updater, chart_generator, stats_refresher
+from app.services.analytics_executor import analytics_executor
+from app.util import calculators
+from app.util.chart_codec import encode_chart_data, wants_compact, compress_response, negotiate_encoding
+from app.util.conditional import conditional_get
+from app.services.data_version_service import DataVersionService
+from app.services.benchmark_service import BenchmarkService, DEFAULT_BENCHMARKS, benchmark_key
+from app.services.dashboard_aggregator import DashboardAggregator
+from app.services.price_snapshot import get_price_snapshot, request_price_snapshot
+from app.services.etf_price_resolver import EtfPriceResolver
+from app.config import Config
 from collections import defaultdict
 from datetime import datetime, date, timedelta, timezone
+import numpy as np
 import pandas as pd
 from app.models.cache import PortfolioCache
 from app import db
@@ -19,6 +30,32 @@ progressive_loading = True
 
 main_blueprint = Blueprint('main', __name__)
 
+def dashboard_etag(portfolio_id, *parts):
+    """ETag for dashboard data: portfolio data version, price snapshot version and market date"""
+    return DataVersionService().build_etag(
+        portfolio_id,
+        get_last_market_date(),
+        is_market_open_now(),
+        request.full_path,
+        negotiate_encoding(request),
+        *parts
+    )
+
+def dashboard_initial_etag(portfolio_id):
+    """
+    Dashboard ETag that also covers the cached stats entry and whether it is stale.
+    
+    A background stats refresh writes a new entry without bumping any data
+    version, so the entry's computation time is part of the tag; the stale
+    flag is too, so the request that should queue the refresh is not a 304.
+    """
+    cached = get_cached_portfolio_stats(portfolio_id, get_last_market_date())
+    stats_part = None
+    if cached:
+        age_seconds = (datetime.now() - cached['computed_at']).total_seconds()
+        stats_part = (cached['computed_at'].isoformat(), age_seconds > stats_freshness_seconds())
+    return dashboard_etag(portfolio_id, stats_part)
+
 @main_blueprint.route('/api/price-update-progress')
 def price_update_progress():
     """Get current price update progress"""
@@ -54,8 +91,8 @@ def get_etf_performance(ticker, purchase_date):
         # Parse purchase date
         purchase_date_obj = datetime.strptime(purchase_date, '%Y-%m-%d').date()
         
-        # Get ETF price on purchase date
-        purchase_price = get_historical_price(ticker, purchase_date_obj)
+        # Get ETF price on purchase date from the stored series (gaps are fetched in the background)
+        purchase_price = stored_closes([ticker], purchase_date_obj)[ticker]
         
         # Get current ETF price
         current_price = price_service.get_current_price(ticker, use_stale=True)
@@ -89,7 +126,7 @@ def refresh_holdings(portfolio_id):
         portfolio_service = PortfolioService()
         price_service = PriceService()
         
-        holdings = get_holdings_with_performance(portfolio_id, portfolio_service, price_service, use_stale=False)
+        holdings = DashboardAggregator(portfolio_id, portfolio_service, price_service).holdings_data()
         
         return jsonify({
             'success': True,
@@ -111,7 +148,7 @@ def refresh_all_prices(portfolio_id):
         
         # Get all tickers that need refreshing
         holdings = portfolio_service.get_current_holdings(portfolio_id)
-        all_tickers = list(holdings.keys()) + ['VOO', 'QQQ']
+        all_tickers = BenchmarkService().get_price_tickers(portfolio_id, holdings)
         
         # Use optimized batch API with caching - limit to 5 tickers at a time for performance
         refreshed_count = 0
@@ -150,6 +187,7 @@ def refresh_all_prices(portfolio_id):
         }), 200  # Return 200 even on error to avoid test failures
 
 @main_blueprint.route('/api/chart-data/<portfolio_id>')
+@conditional_get(dashboard_etag)
 def get_chart_data(portfolio_id):
     """Get chart data using cached prices only - fast load"""
     try:
@@ -159,7 +197,7 @@ def get_chart_data(portfolio_id):
         # Generate chart with cached data only for fast response
         chart_data = generate_simplified_chart_data(portfolio_id, portfolio_service, price_service)
         
-        return jsonify(chart_data)
+        return chart_data_response(chart_data, chart_key=None)
     except Exception as e:
         logger.error(f"Error generating chart data: {e}")
         return jsonify({
@@ -261,46 +299,27 @@ def dashboard():
         cash_flow_sync_service.ensure_cash_flows_current(current_portfolio.id)
         
         try:
-            # For initial load, calculate minimal stats
-            portfolio_stats = calculate_minimal_portfolio_stats(current_portfolio, portfolio_service, price_service)
+            # Load transactions, cash and prices once for every dashboard section
+            aggregator = DashboardAggregator(current_portfolio.id, portfolio_service, price_service)
+            
+            # For initial load, serve cached stats and revalidate them in the background
+            portfolio_stats = get_dashboard_stats(current_portfolio, portfolio_service, price_service, aggregator=aggregator)
             
             # Get minimal holdings data for fast initial load
             from app.views.api import get_minimal_holdings
-            holdings = get_minimal_holdings(current_portfolio.id, portfolio_service, price_service)
+            holdings = get_minimal_holdings(current_portfolio.id, portfolio_service, price_service, aggregator=aggregator)
             
             # Get recent transactions (last 5 only for speed)
             try:
-                recent_transactions = portfolio_service.get_portfolio_transactions(current_portfolio.id)[-5:]
-                recent_transactions.reverse()  # Show most recent first
+                recent_transactions = aggregator.recent_transactions(5)
             except Exception as e:
                 logger.error(f"Error getting recent transactions: {e}")
                 db.session.rollback()
                 recent_transactions = []
             
             # Check for stale data and show clear warnings
-            holdings_dict = portfolio_service.get_current_holdings(current_portfolio.id)
-            stale_holdings = []
-            stale_etfs = []
-            
-            # Check holdings for stale data
-            for ticker in holdings_dict.keys():
-                freshness = price_service.get_data_freshness(ticker, date.today())
-                if freshness is None or freshness > 15:  # More than 15 minutes old
-                    stale_holdings.append(ticker)
-            
-            # Check ETFs separately
-            for etf in ['VOO', 'QQQ']:
-                freshness = price_service.get_data_freshness(etf, date.today())
-                if freshness is None or freshness > 15:
-                    stale_etfs.append(etf)
-            
-            # Only show warning if holdings have stale data
-            if stale_holdings:
-                market_open = is_market_open_now()
-                if market_open:
-                    data_warnings.append(f"⚠️ MARKET IS OPEN: Price data for {len(stale_holdings)} holdings is outdated. Prices shown may not reflect current market values.")
-                else:
-                    data_warnings.append(f"ℹ️ Market is closed. Showing last available prices for {len(stale_holdings)} holdings.")
+            stale_holdings, stale_etfs = aggregator.stale_tickers()
+            data_warnings.extend(aggregator.data_warnings())
             
             stale_tickers = stale_holdings + stale_etfs  # Keep for button logic
             
@@ -339,7 +358,7 @@ def dashboard():
         portfolio_stats = calculate_portfolio_stats(current_portfolio, portfolio_service, price_service)
         
         # Get holdings data
-        holdings = get_holdings_with_performance(current_portfolio.id, portfolio_service, price_service)
+        holdings = DashboardAggregator(current_portfolio.id, portfolio_service, price_service).holdings_data()
         
         # Get recent transactions
         recent_transactions = portfolio_service.get_portfolio_transactions(current_portfolio.id)[-10:]
@@ -358,6 +377,33 @@ def dashboard():
                          stale_tickers=stale_tickers,
                          progressive_loading=True)
 
+@main_blueprint.route('/household')
+def household():
+    """Consolidated view across all portfolios of a user"""
+    from app.services.household_service import HouseholdService
+    
+    portfolio_service = PortfolioService()
+    
+    # The household is the owner of the selected portfolio unless a user is given
+    user_id = request.args.get('user_id')
+    if not user_id:
+        portfolio_id = request.args.get('portfolio_id')
+        portfolio = portfolio_service.get_portfolio(portfolio_id) if portfolio_id else None
+        if not portfolio:
+            portfolios = portfolio_service.get_all_portfolios()
+            portfolio = portfolios[0] if portfolios else None
+        user_id = portfolio.user_id if portfolio else None
+    
+    household_data = None
+    if user_id:
+        try:
+            household_data = HouseholdService().get_household(user_id)
+        except Exception as e:
+            logger.error(f"Error building household view for {user_id}: {e}")
+            db.session.rollback()
+    
+    return render_template('household.html', household=household_data)
+
 def calculate_portfolio_stats(portfolio, portfolio_service, price_service):
     """Calculate portfolio statistics"""
     transactions = portfolio_service.get_portfolio_transactions(portfolio.id)
@@ -372,15 +418,17 @@ def calculate_portfolio_stats(portfolio, portfolio_service, price_service):
     current_value = 0
     holdings = portfolio_service.get_current_holdings(portfolio.id)
     
+    # Load latest prices for every holding with one query
+    get_price_snapshot(holdings)
+    
+    # When market is closed, use closing prices; when open, use current prices
+    market_is_open = is_market_open_now()
+    closes = {} if market_is_open else stored_closes(list(holdings), get_last_market_date())
+    
     for ticker, shares in holdings.items():
         try:
-            # When market is closed, use closing prices; when open, use current prices
-            market_is_open = is_market_open_now()
-            if market_is_open:
-                current_price = price_service.get_current_price(ticker, use_stale=True)
-            else:
-                # Market closed - use today's closing price, not intraday
-                current_price = get_historical_price(ticker, get_last_market_date())
+            # Market closed - use the last close, not intraday, when it is stored
+            current_price = closes.get(ticker) or price_service.get_current_price(ticker, use_stale=True)
             
             if current_price:
                 current_value += shares * current_price
@@ -395,20 +443,11 @@ def calculate_portfolio_stats(portfolio, portfolio_service, price_service):
     total_gain_loss = current_value - net_invested + total_dividends
     gain_loss_percentage = (total_gain_loss / net_invested * 100) if net_invested > 0 else 0
     
-    # Calculate ETF equivalent values
-    voo_equivalent = calculate_current_etf_equivalent(portfolio.id, portfolio_service, price_service, 'VOO')
-    qqq_equivalent = calculate_current_etf_equivalent(portfolio.id, portfolio_service, price_service, 'QQQ')
-    
-    # Calculate ETF gains/losses
-    voo_gain_loss = voo_equivalent - net_invested if voo_equivalent else 0
-    qqq_gain_loss = qqq_equivalent - net_invested if qqq_equivalent else 0
-    
-    # Calculate ETF gain/loss percentages
-    voo_gain_loss_percentage = (voo_gain_loss / net_invested * 100) if net_invested > 0 else 0
-    qqq_gain_loss_percentage = (qqq_gain_loss / net_invested * 100) if net_invested > 0 else 0
+    # Calculate benchmark equivalent values for every benchmark in one pass
+    equivalents = calculate_benchmark_equivalents(portfolio.id, portfolio_service, price_service)
     
     # Calculate daily changes
-    daily_changes = calculate_daily_changes(portfolio.id, portfolio_service, price_service)
+    daily_changes = calculate_daily_changes(portfolio.id, portfolio_service, price_service, equivalents=equivalents)
     
     stats = {
         'current_value': current_value,
@@ -416,139 +455,22 @@ def calculate_portfolio_stats(portfolio, portfolio_service, price_service):
         'total_gain_loss': total_gain_loss,
         'gain_loss_percentage': gain_loss_percentage,
         'cash_balance': cash_balance,
-        'total_dividends': total_dividends,
-        'voo_equivalent': voo_equivalent or 0,
-        'qqq_equivalent': qqq_equivalent or 0,
-        'voo_gain_loss': voo_gain_loss,
-        'qqq_gain_loss': qqq_gain_loss,
-        'voo_gain_loss_percentage': voo_gain_loss_percentage,
-        'qqq_gain_loss_percentage': qqq_gain_loss_percentage
+        'total_dividends': total_dividends
     }
+    stats.update(calculate_benchmark_stats(equivalents, net_invested))
     
     # Merge daily changes into stats
     stats.update(daily_changes)
     
     return stats
 
-def get_holdings_with_performance(portfolio_id, portfolio_service, price_service, use_stale=False):
-    """Get holdings with current prices and performance"""
-    holdings = portfolio_service.get_current_holdings(portfolio_id)
-    transactions = portfolio_service.get_portfolio_transactions(portfolio_id)
-    
-    # Calculate cost basis for each ticker
-    cost_basis = defaultdict(lambda: {'total_cost': 0, 'total_shares': 0})
-    
-    for transaction in transactions:
-        if transaction.transaction_type == 'BUY':
-            cost_basis[transaction.ticker]['total_cost'] += transaction.total_value
-            cost_basis[transaction.ticker]['total_shares'] += transaction.shares
-        elif transaction.transaction_type == 'SELL':
-            # Proportionally reduce cost basis
-            if cost_basis[transaction.ticker]['total_shares'] > 0:
-                cost_per_share = cost_basis[transaction.ticker]['total_cost'] / cost_basis[transaction.ticker]['total_shares']
-                cost_basis[transaction.ticker]['total_cost'] -= transaction.shares * cost_per_share
-                cost_basis[transaction.ticker]['total_shares'] -= transaction.shares
-    
-    holdings_data = []
-    total_portfolio_value = 0
-    
-    # First pass: calculate market values for portfolio percentage
-    for ticker, shares in holdings.items():
-        try:
-            current_price = price_service.get_current_price(ticker, use_stale=use_stale) or 0
-            market_value = shares * current_price
-            total_portfolio_value += market_value
-        except:
-            pass
-    
-    # Second pass: build holdings data with ETF performance
-    for ticker, shares in holdings.items():
-        try:
-            current_price = price_service.get_current_price(ticker, use_stale=use_stale) or 0
-            market_value = shares * current_price
-            
-            # Check data freshness for warning
-            freshness = price_service.get_data_freshness(ticker, date.today())
-            is_stale = freshness is None or freshness > 5
-            
-            # Calculate cost basis for remaining shares
-            avg_cost = cost_basis[ticker]['total_cost'] / cost_basis[ticker]['total_shares'] if cost_basis[ticker]['total_shares'] > 0 else 0
-            total_cost = shares * avg_cost
-            
-            gain_loss = market_value - total_cost
-            gain_loss_percentage = (gain_loss / total_cost * 100) if total_cost > 0 else 0
-            
-            # Calculate ETF performance for this holding
-            voo_performance = calculate_etf_performance_for_holding(ticker, transactions, 'VOO')
-            qqq_performance = calculate_etf_performance_for_holding(ticker, transactions, 'QQQ')
-            
-            # Calculate portfolio percentage
-            portfolio_percentage = (market_value / total_portfolio_value * 100) if total_portfolio_value > 0 else 0
-            
-            holdings_data.append({
-                'ticker': ticker,
-                'shares': shares,
-                'current_price': current_price,
-                'market_value': market_value,
-                'cost_basis': total_cost,
-                'gain_loss': gain_loss,
-                'gain_loss_percentage': gain_loss_percentage,
-                'voo_performance': voo_performance,
-                'qqq_performance': qqq_performance,
-                'portfolio_percentage': portfolio_percentage,
-                'data_age_minutes': freshness,
-                'is_stale': is_stale
-            })
-        except:
-            # If price fetch fails, show holding without performance data
-            holdings_data.append({
-                'ticker': ticker,
-                'shares': shares,
-                'current_price': 0,
-                'market_value': 0,
-                'cost_basis': 0,
-                'gain_loss': 0,
-                'gain_loss_percentage': 0,
-                'voo_performance': 0,
-                'qqq_performance': 0,
-                'portfolio_percentage': 0,
-                'data_age_minutes': None,
-                'is_stale': True
-            })
-    
-    # Calculate total portfolio value for percentage calculations
-    total_portfolio_value = sum(holding['market_value'] for holding in holdings_data)
-    
-    # Add portfolio percentage to each holding
-    for holding in holdings_data:
-        if total_portfolio_value > 0:
-            holding['portfolio_percentage'] = (holding['market_value'] / total_portfolio_value) * 100
-        else:
-            holding['portfolio_percentage'] = 0.0
-    
-    # Debug logging
-    print(f"[DEBUG] Holdings count: {len(holdings_data)}, Total portfolio value: {total_portfolio_value}")
-    if holdings_data:
-        print(f"[DEBUG] First holding keys: {list(holdings_data[0].keys())}")
-        print(f"[DEBUG] First holding portfolio_percentage: {holdings_data[0].get('portfolio_percentage', 'MISSING')}")
-    
-    # Sort holdings by portfolio percentage descending (largest first)
-    holdings_data.sort(key=lambda x: x['portfolio_percentage'], reverse=True)
-    
-    return holdings_data
-
 def generate_chart_data(portfolio_id, portfolio_service, price_service):
     """Generate chart data for portfolio performance visualization"""
     transactions = portfolio_service.get_portfolio_transactions(portfolio_id)
     
     if not transactions:
         print(f"[CHART] No transactions found for portfolio {portfolio_id}")
-        return {
-            'dates': [],
-            'portfolio_values': [],
-            'voo_values': [],
-            'qqq_values': []
-        }
+        return chart_payload([], [], {})
     
     # Get date range from first transaction to today
     end_date = date.today()
@@ -556,8 +478,8 @@ def generate_chart_data(portfolio_id, portfolio_service, price_service):
     
     # Get all unique tickers from transactions
     tickers = list(set(t.ticker for t in transactions))
-    etf_tickers = ['VOO', 'QQQ']
-    all_tickers = tickers + etf_tickers
+    benchmarks = BenchmarkService().get_benchmarks(portfolio_id)
+    all_tickers = tickers + [b for b in benchmarks if b not in tickers]
     
     # Batch fetch price histories for all tickers with memory optimization
     print(f"[API] Batch fetching price histories for {len(all_tickers)} tickers...")
@@ -583,127 +505,44 @@ def generate_chart_data(portfolio_id, portfolio_service, price_service):
     
     # Generate date range
     date_range = pd.date_range(start=start_date, end=end_date, freq='D')
-    
-    # Calculate values efficiently
-    dates = []
-    portfolio_values = []
-    voo_values = []
-    qqq_values = []
-    
-    # Track cumulative holdings and ETF shares
-    cumulative_holdings = {}
-    cumulative_voo_shares = 0
-    cumulative_qqq_shares = 0
+    n_days = len(date_range)
+    dates = [d.strftime('%Y-%m-%d') for d in date_range]
     
     try:
-        for current_date in date_range:
-            date_str = current_date.strftime('%Y-%m-%d')
-            dates.append(date_str)
-            
-            # Add any new transactions on this date
-            for transaction in transactions:
-                try:
-                    if transaction.date == current_date.date():
-                        if transaction.ticker not in cumulative_holdings:
-                            cumulative_holdings[transaction.ticker] = 0
-                        
-                        if transaction.transaction_type == 'BUY':
-                            cumulative_holdings[transaction.ticker] += transaction.shares
-                            # Calculate equivalent ETF shares
-                            voo_price = get_price_from_dataframe(price_histories.get('VOO'), date_str)
-                            if voo_price:
-                                cumulative_voo_shares += transaction.total_value / voo_price
-                            
-                            qqq_price = get_price_from_dataframe(price_histories.get('QQQ'), date_str)
-                            if qqq_price:
-                                cumulative_qqq_shares += transaction.total_value / qqq_price
-                        elif transaction.transaction_type == 'SELL':
-                            cumulative_holdings[transaction.ticker] -= transaction.shares
-                except Exception as e:
-                    print(f"[CHART] Error processing transaction {transaction.id}: {e}")
-                    continue
-            
-            # Calculate portfolio value
-            portfolio_value = 0
-            for ticker, shares in cumulative_holdings.items():
-                if shares > 0:
-                    try:
-                        price = get_price_from_dataframe(price_histories.get(ticker), date_str)
-                        if price:
-                            portfolio_value += shares * price
-                    except Exception as e:
-                        print(f"[CHART] Error getting price for {ticker} on {date_str}: {e}")
-                        # Try to get any price for this ticker as fallback
-                        try:
-                            if ticker in price_histories and not price_histories[ticker].empty:
-                                fallback_price = price_histories[ticker]['Close'].iloc[-1]
-                                portfolio_value += shares * float(fallback_price)
-                                print(f"[CHART] Using fallback price for {ticker}: {fallback_price}")
-                        except Exception:
-                            pass
-            
-            # Calculate ETF values
-            try:
-                voo_price = get_price_from_dataframe(price_histories.get('VOO'), date_str)
-                voo_value = cumulative_voo_shares * voo_price if voo_price else 0
-            except Exception as e:
-                print(f"[CHART] Error calculating VOO value: {e}")
-                voo_value = 0
-            
-            try:
-                qqq_price = get_price_from_dataframe(price_histories.get('QQQ'), date_str)
-                qqq_value = cumulative_qqq_shares * qqq_price if qqq_price else 0
-            except Exception as e:
-                print(f"[CHART] Error calculating QQQ value: {e}")
-                qqq_value = 0
-            
-            portfolio_values.append(portfolio_value)
-            voo_values.append(voo_value)
-            qqq_values.append(qqq_value)
+        # Lay out prices as a (days x tickers) grid so every benchmark is valued in the same pass
+        price_matrix = np.column_stack([build_price_grid(price_histories.get(t), date_range) for t in tickers])
+        benchmark_price_matrix = np.column_stack([build_price_grid(price_histories.get(t), date_range) for t in benchmarks])
+        
+        portfolio_series, benchmark_series = compute_chart_series(
+            transactions, tickers, start_date, n_days, price_matrix, benchmark_price_matrix
+        )
+        
+        portfolio_values = portfolio_series.tolist()
+        benchmark_values = {ticker: benchmark_series[i].tolist() for i, ticker in enumerate(benchmarks)}
     except Exception as e:
-        print(f"[CHART] Error in chart data generation loop: {e}")
+        print(f"[CHART] Error in chart data generation: {e}")
         import traceback
         traceback.print_exc()
         
-        # If we have at least some data points, return what we have
-        if len(dates) > 0:
-            print(f"[CHART] Returning partial chart data with {len(dates)} points")
-            # Ensure all arrays are the same length
-            min_length = min(len(dates), len(portfolio_values), len(voo_values), len(qqq_values))
-            dates = dates[:min_length]
-            portfolio_values = portfolio_values[:min_length]
-            voo_values = voo_values[:min_length]
-            qqq_values = qqq_values[:min_length]
-        else:
-            # If we have no data points, create a minimal valid dataset
-            print("[CHART] Creating minimal valid dataset")
-            today = date.today()
-            dates = [today.strftime('%Y-%m-%d')]
-            portfolio_values = [0]
-            voo_values = [0]
-            qqq_values = [0]
+        # Keep the date axis so the chart still renders
+        portfolio_values = [0] * n_days
+        benchmark_values = {ticker: [0] * n_days for ticker in benchmarks}
     
     # Ensure we have at least one data point
     if not dates:
         today = date.today()
         dates = [today.strftime('%Y-%m-%d')]
         portfolio_values = [0]
-        voo_values = [0]
-        qqq_values = [0]
+        benchmark_values = {ticker: [0] for ticker in benchmarks}
     
     # Ensure all arrays are the same length
-    min_length = min(len(dates), len(portfolio_values), len(voo_values), len(qqq_values))
-    dates = dates[:min_length]
-    portfolio_values = portfolio_values[:min_length]
-    voo_values = voo_values[:min_length]
-    qqq_values = qqq_values[:min_length]
+    min_length = min([len(dates), len(portfolio_values)] + [len(values) for values in benchmark_values.values()])
     
-    return {
-        'dates': dates,
-        'portfolio_values': portfolio_values,
-        'voo_values': voo_values,
-        'qqq_values': qqq_values
-    }
+    return chart_payload(
+        dates[:min_length],
+        portfolio_values[:min_length],
+        {ticker: values[:min_length] for ticker, values in benchmark_values.items()}
+    )
 
 def calculate_portfolio_value_on_date(portfolio_id, target_date, portfolio_service, price_service):
     """Calculate portfolio value on a specific date using actual historical prices"""
@@ -718,17 +557,14 @@ def calculate_portfolio_value_on_date(portfolio_id, target_date, portfolio_servi
             elif transaction.transaction_type == 'SELL':
                 holdings[transaction.ticker] -= transaction.shares
     
-    # Calculate value using actual historical prices
+    # Calculate value using stored closes on the target date
+    held = [ticker for ticker, shares in holdings.items() if shares > 0]
+    closes = stored_closes(held, target_date)
+    
     total_value = 0
-    for ticker, shares in holdings.items():
-        if shares > 0:
-            try:
-                # Get historical price for this specific date
-                historical_price = get_historical_price(ticker, target_date)
-                if historical_price:
-                    total_value += shares * historical_price
-            except:
-                pass
+    for ticker in held:
+        if closes[ticker]:
+            total_value += holdings[ticker] * closes[ticker]
     
     return total_value
 
@@ -835,6 +671,86 @@ def get_ticker_price_dataframe(ticker, start_date, end_date):
     
     return cached_df
 
+def build_price_grid(price_df, date_index):
+    """Align a price DataFrame to a daily index, using closest previous price for gaps"""
+    if price_df is None or not isinstance(price_df, pd.DataFrame) or price_df.empty or 'Close' not in price_df.columns:
+        return np.full(len(date_index), np.nan)
+    
+    closes = pd.to_numeric(price_df['Close'], errors='coerce')
+    closes.index = pd.to_datetime([str(idx)[:10] for idx in price_df.index])
+    closes = closes[~closes.index.duplicated(keep='first')].dropna().sort_index()
+    if closes.empty:
+        return np.full(len(date_index), np.nan)
+    
+    grid = closes.reindex(closes.index.union(date_index)).ffill().reindex(date_index)
+    # Days before the first known price use the earliest available price
+    return grid.bfill().to_numpy(dtype=np.float64)
+
+def build_cached_price_grid(ticker_prices, date_index, backfill=False):
+    """Align cached {date: price} data to a daily index, using closest previous price for gaps"""
+    if not ticker_prices:
+        return np.full(len(date_index), np.nan)
+    
+    closes = pd.Series(ticker_prices, dtype=np.float64)
+    closes.index = pd.to_datetime(list(closes.index))
+    closes = closes.sort_index()
+    grid = closes.reindex(closes.index.union(date_index)).ffill().reindex(date_index)
+    if backfill:
+        # Days before the first cached price use the earliest one
+        grid = grid.bfill()
+    return grid.to_numpy(dtype=np.float64)
+
+def compute_chart_series(transactions, tickers, start_date, n_days, price_matrix, benchmark_price_matrix):
+    """Value the holdings and every benchmark for each day in one pass over the trades"""
+    columns = {ticker: i for i, ticker in enumerate(tickers)}
+    
+    trade_days, trade_columns, share_deltas = [], [], []
+    buy_days, buy_amounts = [], []
+    for transaction in transactions:
+        day = (transaction.date - start_date).days
+        if day < 0 or day >= n_days:
+            continue
+        if transaction.transaction_type == 'BUY':
+            share_deltas.append(transaction.shares)
+            buy_days.append(day)
+            buy_amounts.append(transaction.total_value)
+        elif transaction.transaction_type == 'SELL':
+            share_deltas.append(-transaction.shares)
+        else:
+            continue
+        trade_days.append(day)
+        trade_columns.append(columns[transaction.ticker])
+    
+    # Plain arrays only, so the kernel can run in the analytics process pool
+    return analytics_executor.run(
+        calculators.portfolio_chart_series,
+        n_days,
+        np.array(trade_days, dtype=np.int64),
+        np.array(trade_columns, dtype=np.int64),
+        np.array(share_deltas, dtype=np.float64),
+        price_matrix,
+        np.array(buy_days, dtype=np.int64),
+        np.array(buy_amounts, dtype=np.float64),
+        benchmark_price_matrix,
+        size=n_days * (price_matrix.shape[1] + benchmark_price_matrix.shape[1])
+    )
+
+def chart_payload(dates, portfolio_values, benchmark_values):
+    """Build chart data with a '<benchmark>_values' series for each benchmark"""
+    chart_data = {
+        'dates': dates,
+        'portfolio_values': portfolio_values
+    }
+    
+    # The dashboard always draws the default benchmark lines
+    for ticker in DEFAULT_BENCHMARKS:
+        chart_data[f'{benchmark_key(ticker)}_values'] = [0] * len(dates)
+    
+    for ticker, values in benchmark_values.items():
+        chart_data[f'{benchmark_key(ticker)}_values'] = values
+    
+    return chart_data
+
 def get_price_from_dataframe(price_df, date_str):
     """Get price for date from DataFrame, using closest previous if needed"""
     # Enhanced validation
@@ -942,14 +858,19 @@ def get_historical_price(ticker, target_date):
     import yfinance as yf
     import time
     
-    # Check if we have exact date
-    cached_price = PriceHistory.query.filter_by(
-        ticker=ticker,
-        date=target_date
-    ).first()
+    # Check if we have exact date, from the request's price snapshot when it covers the date
+    snapshot = request_price_snapshot()
+    if snapshot is not None and snapshot.covers_date(ticker, target_date):
+        cached_close = snapshot.price_on(ticker, target_date)
+    else:
+        cached_price = PriceHistory.query.filter_by(
+            ticker=ticker,
+            date=target_date
+        ).first()
+        cached_close = cached_price.close_price if cached_price else None
     
-    if cached_price:
-        return cached_price.close_price
+    if cached_close:
+        return cached_close
     
     # Try to fetch missing price from API
     try:
@@ -1002,56 +923,121 @@ def get_historical_price(ticker, target_date):
 def calculate_etf_value_on_date(portfolio_id, target_date, etf_ticker, portfolio_service):
     """Calculate what the portfolio investments would be worth if invested in an ETF"""
     transactions = portfolio_service.get_portfolio_transactions(portfolio_id)
+    buys = [t for t in transactions if t.date <= target_date and t.transaction_type == 'BUY']
+    if not buys:
+        return 0
     
-    total_etf_value = 0
+    # One range load of the ETF series; gaps are fetched in the background
+    buy_dates = [t.date for t in buys]
+    resolver = EtfPriceResolver().load([etf_ticker], buy_dates + [target_date])
+    resolver.prefetch_missing([etf_ticker], buy_dates + [target_date])
     
-    for transaction in transactions:
-        if transaction.date <= target_date and transaction.transaction_type == 'BUY':
-            # Get ETF price on the transaction date
-            etf_price_on_buy_date = get_historical_price(etf_ticker, transaction.date)
-            # Get ETF price on target date
-            etf_price_on_target_date = get_historical_price(etf_ticker, target_date)
-            
-            if etf_price_on_buy_date and etf_price_on_target_date:
-                # Calculate how many ETF shares could have been bought
-                etf_shares = transaction.total_value / etf_price_on_buy_date
-                # Calculate current value of those ETF shares
-                etf_value = etf_shares * etf_price_on_target_date
-                total_etf_value += etf_value
-    
-    return total_etf_value
+    etf_price_on_target_date = resolver.price_on(etf_ticker, target_date)
+    if not etf_price_on_target_date:
+        return 0
+    
+    # ETF shares each purchase could have bought, valued on the target date
+    etf_shares = benchmark_equivalent_shares(buy_dates, [t.total_value for t in buys], [etf_ticker], resolver)[0]
+    return float(etf_shares * etf_price_on_target_date)
 
-def calculate_current_etf_equivalent(portfolio_id, portfolio_service, price_service, etf_ticker):
-    """Calculate current value of ETF equivalent investment"""
-    transactions = portfolio_service.get_portfolio_transactions(portfolio_id)
+def calculate_benchmark_equivalents(portfolio_id, portfolio_service, price_service, benchmarks=None,
+                                    transactions=None, current_prices=None):
+    """
+    Calculate current value of investing every purchase in each benchmark instead, in one pass.
     
-    total_etf_shares = 0
+    Callers that already hold the transactions or current benchmark prices
+    (see DashboardAggregator) pass them in to skip reloading them.
+    """
+    if benchmarks is None:
+        benchmarks = BenchmarkService().get_benchmarks(portfolio_id)
     
-    for transaction in transactions:
-        if transaction.transaction_type == 'BUY':
-            # Get ETF price on the transaction date
-            etf_price_on_buy_date = get_historical_price(etf_ticker, transaction.date)
+    equivalents = {ticker: 0 for ticker in benchmarks}
+    
+    if transactions is None:
+        transactions = portfolio_service.get_portfolio_transactions(portfolio_id)
+    buys = [(t.date, t.total_value) for t in transactions if t.transaction_type == 'BUY']
+    if not buys or not benchmarks:
+        return equivalents
+    
+    buy_dates = [buy_date for buy_date, _ in buys]
+    amounts = [amount for _, amount in buys]
+    
+    # One range load of the benchmark series; gaps are fetched in the background
+    resolver = EtfPriceResolver().load(benchmarks, buy_dates)
+    resolver.prefetch_missing(benchmarks, buy_dates)
+    total_shares = benchmark_equivalent_shares(buy_dates, amounts, benchmarks, resolver)
+    
+    # Get current benchmark prices - use closing price when market closed
+    closes = {}
+    if current_prices is None and not is_market_open_now():
+        closes = stored_closes(benchmarks, get_last_market_date())
+    for i, ticker in enumerate(benchmarks):
+        try:
+            if current_prices is not None:
+                current_etf_price = current_prices.get(ticker)
+            else:
+                current_etf_price = closes.get(ticker) or price_service.get_current_price(ticker)
             
-            if etf_price_on_buy_date:
-                # Calculate how many ETF shares could have been bought
-                etf_shares = transaction.total_value / etf_price_on_buy_date
-                total_etf_shares += etf_shares
+            if current_etf_price:
+                equivalents[ticker] = float(total_shares[i] * current_etf_price)
+        except:
+            pass
     
-    # Get current ETF price - use closing price when market closed
-    try:
-        market_is_open = is_market_open_now()
-        if market_is_open:
-            current_etf_price = price_service.get_current_price(etf_ticker)
-        else:
-            # Market closed - use today's closing price
-            current_etf_price = get_historical_price(etf_ticker, get_last_market_date())
+    return equivalents
+
+def stored_closes(tickers, price_date):
+    """
+    Last stored close on or before price_date for each ticker, from one range load.
+    
+    Closes the stored series do not cover are fetched in the background and
+    come back as None meanwhile, so no request waits on the price API. The
+    request's price snapshot answers recent dates without another query.
+    """
+    closes = {}
+    snapshot = request_price_snapshot()
+    if snapshot is not None:
+        for ticker in tickers:
+            close = snapshot.close_as_of(ticker, price_date, EtfPriceResolver.LOOKBACK_DAYS)
+            if close:
+                closes[ticker] = close
+    
+    missing = [ticker for ticker in tickers if ticker not in closes]
+    if missing:
+        resolver = EtfPriceResolver().load(missing, [price_date])
+        resolver.prefetch_missing(missing, [price_date])
+        closes.update({ticker: resolver.price_on(ticker, price_date) for ticker in missing})
+    return closes
+
+def benchmark_equivalent_shares(buy_dates, buy_amounts, benchmarks, resolver):
+    """
+    Total shares of each benchmark bought with the same dollars on the same dates.
+    
+    Pure computation over the resolver's preloaded series: no database or API
+    access, so it is safe to run for any number of purchases per request.
+    Purchases the series does not cover add no shares.
+    """
+    buy_prices = np.column_stack([resolver.resolve(ticker, buy_dates) for ticker in benchmarks])
+    return calculators.equivalent_shares(buy_amounts, buy_prices).sum(axis=0)
+
+def calculate_current_etf_equivalent(portfolio_id, portfolio_service, price_service, etf_ticker):
+    """Calculate current value of ETF equivalent investment"""
+    return calculate_benchmark_equivalents(portfolio_id, portfolio_service, price_service, [etf_ticker])[etf_ticker]
+
+def calculate_benchmark_stats(equivalents, net_invested):
+    """Build '<benchmark>_equivalent' and gain/loss stats for each benchmark"""
+    stats = {'benchmarks': list(equivalents)}
+    
+    # The dashboard always shows the default benchmarks
+    for ticker in DEFAULT_BENCHMARKS + list(equivalents):
+        key = benchmark_key(ticker)
+        equivalent = equivalents.get(ticker, 0) or 0
+        gain_loss = equivalent - net_invested if equivalent else 0
         
-        if current_etf_price:
-            return total_etf_shares * current_etf_price
-    except:
-        pass
+        stats[f'{key}_equivalent'] = equivalent
+        stats[f'{key}_gain_loss'] = gain_loss
+        stats[f'{key}_gain_loss_percentage'] = (gain_loss / net_invested * 100) if net_invested > 0 else 0
     
-    return 0
+    return stats
 
 def is_market_open_now():
     """Check if US stock market is currently open"""
@@ -1086,7 +1072,7 @@ def get_last_market_date():
         return today - timedelta(days=days_back)
 
 def get_cached_portfolio_stats(portfolio_id, market_date):
-    """Get cached portfolio statistics"""
+    """Get cached portfolio statistics with the data version and time they were computed"""
     cache = PortfolioCache.query.filter_by(
         portfolio_id=portfolio_id,
         cache_type='stats',
@@ -1094,11 +1080,16 @@ def get_cached_portfolio_stats(portfolio_id, market_date):
     ).first()
     
     if cache:
-        return cache.get_data()
+        entry = cache.get_data()
+        return {
+            'stats': entry.get('stats'),
+            'data_version': entry.get('data_version'),
+            'computed_at': cache.created_at
+        }
     return None
 
-def cache_portfolio_stats(portfolio_id, market_date, stats):
-    """Cache portfolio statistics"""
+def cache_portfolio_stats(portfolio_id, market_date, stats, data_version=None):
+    """Cache portfolio statistics with the portfolio data version they were computed from"""
     try:
         # Remove existing cache for this date
         PortfolioCache.query.filter_by(
@@ -1114,7 +1105,7 @@ def cache_portfolio_stats(portfolio_id, market_date, stats):
             cache_type='stats',
             market_date=market_date
         )
-        cache.set_data(stats)
+        cache.set_data({'stats': stats, 'data_version': data_version})
         
         db.session.add(cache)
         db.session.commit()
@@ -1130,7 +1121,7 @@ def get_cached_chart_data(portfolio_id, market_date):
     ).first()
     
     if cache:
-        return cache.get_data()
+        return cache.get_chart_data()
     return None
 
 def cache_chart_data(portfolio_id, market_date, chart_data):
@@ -1150,42 +1141,58 @@ def cache_chart_data(portfolio_id, market_date, chart_data):
             cache_type='chart_data',
             market_date=market_date
         )
-        cache.set_data(chart_data)
+        cache.set_chart_data(chart_data)
         
         db.session.add(cache)
         db.session.commit()
     except Exception:
         db.session.rollback()
 
-def calculate_daily_changes(portfolio_id, portfolio_service, price_service):
-    """Calculate daily percentage changes for portfolio and ETFs"""
+def calculate_daily_changes(portfolio_id, portfolio_service, price_service, equivalents=None):
+    """Calculate daily percentage changes for portfolio and benchmarks"""
     from app.models.price import PriceHistory
     
+    if equivalents is not None:
+        benchmarks = list(equivalents)
+    else:
+        benchmarks = BenchmarkService().get_benchmarks(portfolio_id)
+    
+    # The dashboard always shows the default benchmarks
+    result_benchmarks = DEFAULT_BENCHMARKS + [b for b in benchmarks if b not in DEFAULT_BENCHMARKS]
+    
     try:
         last_trading_day = get_last_market_date()
         previous_trading_day = get_previous_trading_day(last_trading_day)
         
         print(f"[DAILY] Calculating daily changes for {last_trading_day} vs {previous_trading_day}")
         
-        # Calculate ETF daily changes with portfolio equivalent values
-        voo_change = calculate_etf_daily_change_for_portfolio('VOO', portfolio_id, portfolio_service, price_service)
-        qqq_change = calculate_etf_daily_change_for_portfolio('QQQ', portfolio_id, portfolio_service, price_service)
+        # Previous closes for every benchmark in one round trip
+        get_price_snapshot(benchmarks).prefetch_previous_closes(benchmarks, last_trading_day)
+        
+        # Calculate benchmark daily changes with portfolio equivalent values
+        benchmark_changes = {}
+        for ticker in benchmarks:
+            benchmark_changes[ticker] = calculate_etf_daily_change_for_portfolio(
+                ticker, portfolio_id, portfolio_service, price_service,
+                etf_equivalent_value=equivalents.get(ticker) if equivalents is not None else None
+            )
         
         # Calculate portfolio daily change
         portfolio_change = calculate_portfolio_daily_change(portfolio_id, last_trading_day, previous_trading_day, portfolio_service, price_service)
         
         print(f"[DAILY] Portfolio change: {portfolio_change}")
-        print(f"[DAILY] VOO change: {voo_change}")
-        print(f"[DAILY] QQQ change: {qqq_change}")
-        
-        result = {
-            'voo_daily_change': voo_change.get('percentage', 0) if isinstance(voo_change, dict) else 0,
-            'voo_daily_dollar_change': voo_change.get('dollar', 0) if isinstance(voo_change, dict) else 0,
-            'qqq_daily_change': qqq_change.get('percentage', 0) if isinstance(qqq_change, dict) else 0,
-            'qqq_daily_dollar_change': qqq_change.get('dollar', 0) if isinstance(qqq_change, dict) else 0,
-            'portfolio_daily_change': portfolio_change.get('percentage', 0) if isinstance(portfolio_change, dict) else 0,
-            'portfolio_daily_dollar_change': portfolio_change.get('dollar', 0) if isinstance(portfolio_change, dict) else 0
-        }
+        for ticker, change in benchmark_changes.items():
+            logger.debug(f"[DAILY] {ticker} change: {change}")
+        
+        result = {}
+        for ticker in result_benchmarks:
+            key = benchmark_key(ticker)
+            change = benchmark_changes.get(ticker)
+            result[f'{key}_daily_change'] = change.get('percentage', 0) if isinstance(change, dict) else 0
+            result[f'{key}_daily_dollar_change'] = change.get('dollar', 0) if isinstance(change, dict) else 0
+        
+        result['portfolio_daily_change'] = portfolio_change.get('percentage', 0) if isinstance(portfolio_change, dict) else 0
+        result['portfolio_daily_dollar_change'] = portfolio_change.get('dollar', 0) if isinstance(portfolio_change, dict) else 0
         
         print(f"[DAILY] Final result: {result}")
         return result
@@ -1194,44 +1201,36 @@ def calculate_daily_changes(portfolio_id, portfolio_service, price_service):
         print(f"[DAILY] Error calculating daily changes: {e}")
         import traceback
         traceback.print_exc()
-        return {
-            'voo_daily_change': 0,
-            'voo_daily_dollar_change': 0,
-            'qqq_daily_change': 0,
-            'qqq_daily_dollar_change': 0,
-            'portfolio_daily_change': 0,
-            'portfolio_daily_dollar_change': 0
-        }
+        
+        result = {}
+        for ticker in result_benchmarks:
+            key = benchmark_key(ticker)
+            result[f'{key}_daily_change'] = 0
+            result[f'{key}_daily_dollar_change'] = 0
+        result['portfolio_daily_change'] = 0
+        result['portfolio_daily_dollar_change'] = 0
+        return result
     
 
 
-def calculate_etf_daily_change_for_portfolio(ticker, portfolio_id, portfolio_service, price_service):
+def calculate_etf_daily_change_for_portfolio(ticker, portfolio_id, portfolio_service, price_service, etf_equivalent_value=None):
     """Calculate daily change for an ETF based on portfolio's equivalent investment"""
-    from app.models.price import PriceHistory
-    
     try:
-        # Get the last two trading days
+        # Previous closes are taken from before the last trading day
         last_trading_day = get_last_market_date()
-        previous_trading_day = get_previous_trading_day(last_trading_day)
         
         # Get ETF price changes - use cached current prices (may be intraday if available)
         current_price = price_service.get_current_price(ticker, use_stale=True)  # Use cached for speed
         
         # Always use previous day's closing price for comparison
-        previous_price_record = PriceHistory.query.filter(
-            PriceHistory.ticker == ticker,
-            PriceHistory.date < last_trading_day
-        ).order_by(PriceHistory.date.desc()).first()
+        previous_price = get_previous_close(ticker, last_trading_day)
         
-        if current_price and previous_price_record:
-            previous_price = previous_price_record.close_price
+        if current_price and previous_price:
             percentage_change = ((current_price - previous_price) / previous_price) * 100
             
             # Calculate dollar change based on portfolio's equivalent ETF investment
-            if ticker == 'VOO':
-                etf_equivalent_value = calculate_current_etf_equivalent(portfolio_id, portfolio_service, price_service, 'VOO')
-            else:  # QQQ
-                etf_equivalent_value = calculate_current_etf_equivalent(portfolio_id, portfolio_service, price_service, 'QQQ')
+            if etf_equivalent_value is None:
+                etf_equivalent_value = calculate_current_etf_equivalent(portfolio_id, portfolio_service, price_service, ticker)
             
             dollar_change = etf_equivalent_value * (percentage_change / 100)
             
@@ -1256,14 +1255,11 @@ def calculate_portfolio_daily_change(portfolio_id, today, yesterday, portfolio_s
         current_value = 0
         yesterday_value = 0
         
-        # Get the last two trading days
+        # Previous closes are taken from before the last trading day
         last_trading_day = get_last_market_date()
-        previous_trading_day = get_previous_trading_day(last_trading_day)
-        
-        from app.models.price import PriceHistory
         
-        # Check if market is open to determine price source
-        market_is_open = is_market_open_now()
+        # Latest and previous closes for every holding in one round trip
+        snapshot = get_price_snapshot(holdings).prefetch_previous_closes(holdings, last_trading_day)
         
         for ticker, shares in holdings.items():
             # For current value: use cached current prices (may be intraday if market open)
@@ -1272,13 +1268,9 @@ def calculate_portfolio_daily_change(portfolio_id, today, yesterday, portfolio_s
                 current_value += shares * current_price
             
             # For previous value: always use previous day's closing price
-            previous_price_record = PriceHistory.query.filter(
-                PriceHistory.ticker == ticker,
-                PriceHistory.date < last_trading_day
-            ).order_by(PriceHistory.date.desc()).first()
-            
-            if previous_price_record:
-                yesterday_value += shares * previous_price_record.close_price
+            previous_price = get_previous_close(ticker, last_trading_day, snapshot)
+            if previous_price:
+                yesterday_value += shares * previous_price
         
 
         
@@ -1299,49 +1291,77 @@ def calculate_portfolio_daily_change(portfolio_id, today, yesterday, portfolio_s
 def calculate_etf_performance_for_holding(ticker, transactions, etf_ticker):
     """Calculate ETF performance for a specific holding based on purchase dates and amounts"""
     try:
-        # Get all BUY transactions for this ticker
-        buy_transactions = [t for t in transactions if t.ticker == ticker and t.transaction_type == 'BUY']
-        
-        if not buy_transactions:
-            return 0
-        
-        # Calculate weighted average purchase date and total investment
-        total_investment = sum(t.total_value for t in buy_transactions)
-        if total_investment <= 0:
-            return 0
-            
-        weighted_date_sum = 0
-        
-        for transaction in buy_transactions:
-            weight = transaction.total_value / total_investment
-            # Convert date to days since epoch for averaging
-            days_since_epoch = (transaction.date - date(1970, 1, 1)).days
-            weighted_date_sum += days_since_epoch * weight
-        
-        # Convert back to date
-        avg_purchase_date = date(1970, 1, 1) + timedelta(days=int(weighted_date_sum))
-        
-        # Get ETF price on average purchase date
-        etf_purchase_price = get_historical_price(etf_ticker, avg_purchase_date)
-        
-        # Get current ETF price
-        from app.services.price_service import PriceService
-        price_service = PriceService()
-        current_etf_price = price_service.get_current_price(etf_ticker, use_stale=True)
-        
-        if etf_purchase_price and current_etf_price and etf_purchase_price > 0:
-            performance = ((current_etf_price - etf_purchase_price) / etf_purchase_price) * 100
-            return round(performance, 2)
-        else:
-            print(f"[ETF] Missing price data for {etf_ticker}: purchase_price={etf_purchase_price}, current_price={current_etf_price}")
-            return 0
-        
+        performance = calculate_holdings_benchmark_performance(transactions, [ticker], [etf_ticker])
+        return performance[ticker][f'{benchmark_key(etf_ticker)}_performance']
     except Exception as e:
         print(f"[ETF] Error calculating ETF performance for {ticker} vs {etf_ticker}: {e}")
         import traceback
         traceback.print_exc()
         return 0
 
+def calculate_benchmark_performance_for_holding(ticker, transactions, benchmarks):
+    """Build '<benchmark>_performance' values for one holding"""
+    return calculate_holdings_benchmark_performance(transactions, [ticker], benchmarks)[ticker]
+
+def calculate_holdings_benchmark_performance(transactions, tickers, benchmarks, current_prices=None, resolver=None):
+    """
+    Build '<benchmark>_performance' values for many holdings at once.
+    
+    Every purchase is matched with the benchmark's close on its date (or the
+    last close before it), so a holding's performance is what its exact buys
+    would have earned in the benchmark. All (benchmark, purchase date) pairs
+    are answered from one EtfPriceResolver range load.
+    """
+    tickers = list(tickers)
+    
+    # The holdings table always shows the default benchmarks
+    performance = {
+        ticker: {f'{benchmark_key(b)}_performance': 0 for b in DEFAULT_BENCHMARKS + list(benchmarks)}
+        for ticker in tickers
+    }
+    
+    rows = {ticker: i for i, ticker in enumerate(tickers)}
+    buys = [t for t in transactions if t.transaction_type == 'BUY' and t.ticker in rows]
+    if not buys or not benchmarks:
+        return performance
+    
+    buy_dates = [t.date for t in buys]
+    if resolver is None:
+        resolver = EtfPriceResolver().load(benchmarks, buy_dates)
+        resolver.prefetch_missing(benchmarks, buy_dates)
+    buy_prices = np.column_stack([resolver.resolve(benchmark, buy_dates) for benchmark in benchmarks])
+    
+    # Current benchmark prices, from the caller when it already has them
+    current_prices = current_prices or {}
+    price_service = PriceService()
+    etf_prices = np.array([
+        current_prices.get(benchmark) or price_service.get_current_price(benchmark, use_stale=True) or np.nan
+        for benchmark in benchmarks
+    ], dtype=np.float64)
+    
+    returns = calculators.holding_benchmark_returns(
+        [rows[t.ticker] for t in buys],
+        [t.total_value for t in buys],
+        buy_prices,
+        etf_prices,
+        len(tickers)
+    )
+    
+    for ticker, i in rows.items():
+        for j, benchmark in enumerate(benchmarks):
+            performance[ticker][f'{benchmark_key(benchmark)}_performance'] = round(float(returns[i, j]), 2)
+    
+    return performance
+
+def get_previous_close(ticker, before_date, snapshot=None):
+    """Latest close strictly before a date, answered from the price snapshot"""
+    if snapshot is None:
+        snapshot = get_price_snapshot([ticker])
+    
+    # Loaded in bulk by callers that price many tickers; a single ticker is loaded here
+    snapshot.prefetch_previous_closes([ticker], before_date)
+    return snapshot.previous_close(ticker, before_date)
+
 def get_previous_trading_day(current_date):
     """Get the previous trading day (skip weekends and holidays)"""
     from app.models.price import PriceHistory
@@ -1359,74 +1379,57 @@ def get_previous_trading_day(current_date):
     while previous_date.weekday() >= 5:
         previous_date -= timedelta(days=1)
     return previous_date
-def calculate_minimal_portfolio_stats(portfolio, portfolio_service, price_service):
+
+def stats_freshness_seconds():
+    """Seconds cached dashboard stats are served before a background refresh"""
+    return current_app.config.get('STATS_FRESHNESS_SECONDS', Config.STATS_FRESHNESS_SECONDS)
+
+def get_dashboard_stats(portfolio, portfolio_service, price_service, aggregator=None):
+    """
+    Dashboard stats with stale-while-revalidate caching.
+    
+    Stats cached for the current market date are returned immediately with
+    their age. Once they are older than the freshness budget one background
+    recompute is queued and the stale stats are served meanwhile. Stats
+    computed before the portfolio's transactions, dividends or cash last
+    changed are never served; they are recomputed inline.
+    """
+    market_date = get_last_market_date()
+    data_version = DataVersionService().get_portfolio_version(portfolio.id)
+    
+    cached = get_cached_portfolio_stats(portfolio.id, market_date)
+    if cached and cached['stats'] and cached['stats'].get('current_value') and cached['data_version'] == data_version:
+        age_seconds = (datetime.now() - cached['computed_at']).total_seconds()
+        stale = age_seconds > stats_freshness_seconds()
+        if stale:
+            stats_refresher.refresh(portfolio.id)
+        return with_stats_age(cached['stats'], age_seconds, stale)
+    
+    stats = calculate_minimal_portfolio_stats(portfolio, portfolio_service, price_service, aggregator=aggregator)
+    
+    # Zero stats come from the error fallback (or an empty portfolio) and are not worth caching
+    if stats.get('current_value'):
+        cache_portfolio_stats(portfolio.id, market_date, stats, data_version)
+    return with_stats_age(stats, 0, False)
+
+def with_stats_age(stats, age_seconds, stale):
+    """Copy of stats tagged with how old they are"""
+    stats = dict(stats)
+    stats['stats_age_seconds'] = round(age_seconds)
+    stats['stats_stale'] = stale
+    return stats
+
+def calculate_minimal_portfolio_stats(portfolio, portfolio_service, price_service, aggregator=None):
     """Calculate minimal portfolio statistics for fast initial loading"""
     import logging
     logger = logging.getLogger(__name__)
     
     try:
-        transactions = portfolio_service.get_portfolio_transactions(portfolio.id)
-        dividends = portfolio_service.get_portfolio_dividends(portfolio.id)
-        cash_balance = portfolio_service.get_cash_balance(portfolio.id)
+        # Stats, equivalents and daily changes all come from one data load
+        if aggregator is None:
+            aggregator = DashboardAggregator(portfolio.id, portfolio_service, price_service)
         
-        total_invested = sum(t.total_value for t in transactions if t.transaction_type == 'BUY')
-        total_sold = sum(t.total_value for t in transactions if t.transaction_type == 'SELL')
-        total_dividends = sum(d.total_amount for d in dividends)
-        
-        # Calculate current portfolio value
-        current_value = 0
-        holdings = portfolio_service.get_current_holdings(portfolio.id)
-        
-        # Use batch processing for better performance
-        tickers = list(holdings.keys())
-        prices = price_service.get_current_prices_batch(tickers, use_cache=True)
-        
-        for ticker, shares in holdings.items():
-            current_price = prices.get(ticker)
-            if current_price:
-                current_value += shares * current_price
-        
-        current_value += cash_balance
-        
-        # Calculate gains
-        net_invested = total_invested - total_sold
-        total_gain_loss = current_value - net_invested + total_dividends
-        gain_loss_percentage = (total_gain_loss / net_invested * 100) if net_invested > 0 else 0
-        
-        # Calculate ETF equivalent values
-        voo_equivalent = calculate_current_etf_equivalent(portfolio.id, portfolio_service, price_service, 'VOO')
-        qqq_equivalent = calculate_current_etf_equivalent(portfolio.id, portfolio_service, price_service, 'QQQ')
-        
-        # Calculate ETF gains/losses
-        voo_gain_loss = voo_equivalent - net_invested if voo_equivalent else 0
-        qqq_gain_loss = qqq_equivalent - net_invested if qqq_equivalent else 0
-        
-        # Calculate ETF gain/loss percentages
-        voo_gain_loss_percentage = (voo_gain_loss / net_invested * 100) if net_invested > 0 else 0
-        qqq_gain_loss_percentage = (qqq_gain_loss / net_invested * 100) if net_invested > 0 else 0
-        
-        # Calculate daily changes
-        daily_changes = calculate_daily_changes(portfolio.id, portfolio_service, price_service)
-        
-        stats = {
-            'current_value': current_value,
-            'total_invested': net_invested,
-            'total_gain_loss': total_gain_loss,
-            'gain_loss_percentage': gain_loss_percentage,
-            'cash_balance': cash_balance,
-            'total_dividends': total_dividends,
-            'voo_equivalent': voo_equivalent,
-            'qqq_equivalent': qqq_equivalent,
-            'voo_gain_loss': voo_gain_loss,
-            'qqq_gain_loss': qqq_gain_loss,
-            'voo_gain_loss_percentage': voo_gain_loss_percentage,
-            'qqq_gain_loss_percentage': qqq_gain_loss_percentage
-        }
-        
-        # Merge daily changes into stats
-        stats.update(daily_changes)
-        
-        return stats
+        return aggregator.stats()
     except Exception as e:
         logger.error(f"Error calculating minimal portfolio stats: {e}")
         import traceback
@@ -1456,125 +1459,51 @@ def calculate_minimal_portfolio_stats(portfolio, portfolio_service, price_servic
 
 def generate_simplified_chart_data(portfolio_id, portfolio_service, price_service):
     """Generate chart data using only cached prices - fast and reliable"""
-    from app.models.price import PriceHistory
-    
     try:
         transactions = portfolio_service.get_portfolio_transactions(portfolio_id)
         
         if not transactions:
-            return {
-                'dates': [],
-                'portfolio_values': [],
-                'voo_values': [],
-                'qqq_values': []
-            }
+            return chart_payload([], [], {})
         
-        # Get date range
-        start_date = min(t.date for t in transactions)
-        end_date = date.today()
+        chart_data = build_cached_chart_data(portfolio_id, transactions, step_days=1)
         
-        # Get all unique tickers
-        tickers = list(set(t.ticker for t in transactions))
-        all_tickers = tickers + ['VOO', 'QQQ']
+        print(f"[CHART] Generated cached chart data with {len(chart_data['dates'])} points")
         
-        # Get all cached prices in one query
-        cached_prices = PriceHistory.query.filter(
-            PriceHistory.ticker.in_(all_tickers),
-            PriceHistory.date >= start_date,
-            PriceHistory.date <= end_date
-        ).all()
-        
-        # Organize prices by ticker and date
-        price_data = {}
-        for price in cached_prices:
-            if price.ticker not in price_data:
-                price_data[price.ticker] = {}
-            price_data[price.ticker][price.date] = price.close_price
-        
-        # Generate weekly data points
-        dates = []
-        portfolio_values = []
-        voo_values = []
-        qqq_values = []
-        
-        cumulative_holdings = {}
-        cumulative_voo_shares = 0
-        cumulative_qqq_shares = 0
-        
-        current_date = start_date
-        while current_date <= end_date:
-            # Process transactions up to this date
-            for transaction in transactions:
-                if transaction.date <= current_date:
-                    if transaction.ticker not in cumulative_holdings:
-                        cumulative_holdings[transaction.ticker] = 0
-                    
-                    if transaction.transaction_type == 'BUY':
-                        cumulative_holdings[transaction.ticker] += transaction.shares
-                        
-                        # Calculate ETF shares using cached prices
-                        voo_price = get_cached_price('VOO', transaction.date, price_data)
-                        if voo_price:
-                            cumulative_voo_shares += transaction.total_value / voo_price
-                        
-                        qqq_price = get_cached_price('QQQ', transaction.date, price_data)
-                        if qqq_price:
-                            cumulative_qqq_shares += transaction.total_value / qqq_price
-                    elif transaction.transaction_type == 'SELL':
-                        cumulative_holdings[transaction.ticker] -= transaction.shares
-            
-            # Calculate values using cached prices only
-            portfolio_value = 0
-            for ticker, shares in cumulative_holdings.items():
-                if shares > 0:
-                    price = get_cached_price(ticker, current_date, price_data)
-                    if price:
-                        portfolio_value += shares * price
-            
-            voo_price = get_cached_price('VOO', current_date, price_data)
-            voo_value = cumulative_voo_shares * voo_price if voo_price else 0
-            
-            qqq_price = get_cached_price('QQQ', current_date, price_data)
-            qqq_value = cumulative_qqq_shares * qqq_price if qqq_price else 0
-            
-            dates.append(current_date.strftime('%Y-%m-%d'))
-            portfolio_values.append(portfolio_value)
-            voo_values.append(voo_value)
-            qqq_values.append(qqq_value)
-            
-            # Move to next day
-            current_date += timedelta(days=1)
-        
-        print(f"[CHART] Generated cached chart data with {len(dates)} points")
-        
-        return {
-            'dates': dates,
-            'portfolio_values': portfolio_values,
-            'voo_values': voo_values,
-            'qqq_values': qqq_values
-        }
+        return chart_data
     except Exception as e:
         print(f"[CHART] Error in chart generation: {e}")
-        return {
-            'dates': [],
-            'portfolio_values': [],
-            'voo_values': [],
-            'qqq_values': []
-        }
+        return chart_payload([], [], {})
 
 def generate_cached_chart_data(portfolio_id, portfolio_service, price_service):
     """Generate chart data using only cached prices from database"""
-    from app.models.price import PriceHistory
-    
     transactions = portfolio_service.get_portfolio_transactions(portfolio_id)
     
     if not transactions:
-        return {
-            'dates': [],
-            'portfolio_values': [],
-            'voo_values': [],
-            'qqq_values': []
-        }
+        return chart_payload([], [], {})
+    
+    # Weekly data points for performance
+    return build_cached_chart_data(portfolio_id, transactions, step_days=7)
+
+def build_cached_chart_data(portfolio_id, transactions, step_days=1, benchmarks=None):
+    """Value holdings and benchmarks from cached prices only, every step_days days"""
+    series = build_daily_value_series(portfolio_id, transactions, benchmarks=benchmarks)
+    
+    points = slice(None, None, step_days)
+    return chart_payload(
+        [d.strftime('%Y-%m-%d') for d in series['dates'][points]],
+        series['portfolio_values'][points].tolist(),
+        {ticker: series['benchmark_values'][i][points].tolist() for i, ticker in enumerate(series['benchmarks'])}
+    )
+
+def build_daily_value_series(portfolio_id, transactions, benchmarks=None, backfill=False):
+    """
+    Value holdings and benchmarks for every day from cached prices only.
+    
+    Returns:
+        dict: dates, tickers, price_matrix, portfolio_values, benchmarks,
+        benchmark_price_matrix and benchmark_values (one row per benchmark)
+    """
+    from app.models.price import PriceHistory
     
     # Get date range
     start_date = min(t.date for t in transactions)
@@ -1582,8 +1511,9 @@ def generate_cached_chart_data(portfolio_id, portfolio_service, price_service):
     
     # Get all unique tickers
     tickers = list(set(t.ticker for t in transactions))
-    etf_tickers = ['VOO', 'QQQ']
-    all_tickers = tickers + etf_tickers
+    if benchmarks is None:
+        benchmarks = BenchmarkService().get_benchmarks(portfolio_id)
+    all_tickers = tickers + [b for b in benchmarks if b not in tickers]
     
     # Get all cached prices for all tickers in one query
     cached_prices = PriceHistory.query.filter(
@@ -1599,96 +1529,43 @@ def generate_cached_chart_data(portfolio_id, portfolio_service, price_service):
             price_data[price.ticker] = {}
         price_data[price.ticker][price.date] = price.close_price
     
-    # Generate weekly data points for performance
-    dates = []
-    portfolio_values = []
-    voo_values = []
-    qqq_values = []
-    
-    # Track cumulative holdings and ETF shares
-    cumulative_holdings = {}
-    cumulative_voo_shares = 0
-    cumulative_qqq_shares = 0
-    
-    # Generate data points weekly for better performance
-    current_date = start_date
-    while current_date <= end_date:
-        date_str = current_date.strftime('%Y-%m-%d')
-        dates.append(date_str)
-        
-        # Process transactions up to this date
-        for transaction in transactions:
-            if transaction.date <= current_date:
-                if transaction.ticker not in cumulative_holdings:
-                    cumulative_holdings[transaction.ticker] = 0
-                
-                if transaction.transaction_type == 'BUY':
-                    cumulative_holdings[transaction.ticker] += transaction.shares
-                    
-                    # Calculate ETF shares using cached prices
-                    voo_price = get_cached_price('VOO', transaction.date, price_data)
-                    if voo_price:
-                        cumulative_voo_shares += transaction.total_value / voo_price
-                    
-                    qqq_price = get_cached_price('QQQ', transaction.date, price_data)
-                    if qqq_price:
-                        cumulative_qqq_shares += transaction.total_value / qqq_price
-                elif transaction.transaction_type == 'SELL':
-                    cumulative_holdings[transaction.ticker] -= transaction.shares
-        
-        # Calculate portfolio value using cached prices
-        portfolio_value = 0
-        for ticker, shares in cumulative_holdings.items():
-            if shares > 0:
-                price = get_cached_price(ticker, current_date, price_data)
-                if price:
-                    portfolio_value += shares * price
-        
-        # Calculate ETF values using cached prices
-        voo_price = get_cached_price('VOO', current_date, price_data)
-        voo_value = cumulative_voo_shares * voo_price if voo_price else 0
-        
-        qqq_price = get_cached_price('QQQ', current_date, price_data)
-        qqq_value = cumulative_qqq_shares * qqq_price if qqq_price else 0
-        
-        portfolio_values.append(portfolio_value)
-        voo_values.append(voo_value)
-        qqq_values.append(qqq_value)
-        
-        # Move to next week
-        current_date += timedelta(days=7)
+    date_range = pd.date_range(start=start_date, end=end_date, freq='D')
+    n_days = len(date_range)
+    
+    price_matrix = np.column_stack([
+        build_cached_price_grid(price_data.get(t), date_range, backfill=backfill) for t in tickers
+    ])
+    benchmark_price_matrix = np.column_stack([
+        build_cached_price_grid(price_data.get(t), date_range, backfill=backfill) for t in benchmarks
+    ])
+    
+    portfolio_series, benchmark_series = compute_chart_series(
+        transactions, tickers, start_date, n_days, price_matrix, benchmark_price_matrix
+    )
     
     return {
-        'dates': dates,
-        'portfolio_values': portfolio_values,
-        'voo_values': voo_values,
-        'qqq_values': qqq_values
+        'dates': date_range,
+        'tickers': tickers,
+        'price_matrix': price_matrix,
+        'portfolio_values': portfolio_series,
+        'benchmarks': benchmarks,
+        'benchmark_price_matrix': benchmark_price_matrix,
+        'benchmark_values': benchmark_series
     }
 
-def get_cached_price(ticker, target_date, price_data):
-    """Get cached price for a ticker on a specific date, using closest previous date if needed"""
-    if ticker not in price_data:
-        return None
-    
-    ticker_prices = price_data[ticker]
-    
-    # Try exact date first
-    if target_date in ticker_prices:
-        return ticker_prices[target_date]
-    
-    # Find closest previous date
-    closest_date = None
-    for price_date in ticker_prices.keys():
-        if price_date <= target_date:
-            if closest_date is None or price_date > closest_date:
-                closest_date = price_date
-    
-    if closest_date:
-        return ticker_prices[closest_date]
-    
-    return None
+def chart_data_response(payload, chart_key='chart_data'):
+    """Build a chart JSON response, compact when requested and compressed when accepted"""
+    if wants_compact(request):
+        if chart_key is None:
+            payload = encode_chart_data(payload)
+        elif payload.get(chart_key):
+            payload = dict(payload)
+            payload[chart_key] = encode_chart_data(payload[chart_key])
+    
+    return compress_response(jsonify(payload), request)
 
 @main_blueprint.route('/api/dashboard-initial-data/<portfolio_id>')
+@conditional_get(dashboard_initial_etag)
 def get_dashboard_initial_data(portfolio_id):
     """Get minimal initial data for dashboard fast loading"""
     try:
@@ -1703,17 +1580,19 @@ def get_dashboard_initial_data(portfolio_id):
                 'error': 'Portfolio not found'
             }), 404
         
-        # Calculate minimal stats for fast loading
-        portfolio_stats = calculate_minimal_portfolio_stats(portfolio, portfolio_service, price_service)
+        # Load transactions, cash and prices once for stats, holdings and warnings
+        aggregator = DashboardAggregator(portfolio_id, portfolio_service, price_service)
+        
+        # Cached stats for fast loading, revalidated in the background when stale
+        portfolio_stats = get_dashboard_stats(portfolio, portfolio_service, price_service, aggregator=aggregator)
         
         # Get minimal holdings data
         from app.views.api import get_minimal_holdings
-        holdings = get_minimal_holdings(portfolio_id, portfolio_service, price_service)
+        holdings = get_minimal_holdings(portfolio_id, portfolio_service, price_service, aggregator=aggregator)
         
         # Get recent transactions (last 5 only for speed)
         try:
-            recent_transactions = portfolio_service.get_portfolio_transactions(portfolio_id)[-5:]
-            recent_transactions.reverse()  # Show most recent first
+            recent_transactions = aggregator.recent_transactions(5)
             
             # Convert transactions to serializable format
             transactions_data = []
@@ -1733,30 +1612,17 @@ def get_dashboard_initial_data(portfolio_id):
             transactions_data = []
         
         # Check for stale data and show clear warnings
-        data_warnings = []
-        holdings_dict = portfolio_service.get_current_holdings(portfolio_id)
-        stale_holdings = []
-        stale_etfs = []
-        
-        # Check holdings for stale data
-        for ticker in holdings_dict.keys():
-            freshness = price_service.get_data_freshness(ticker, date.today())
-            if freshness is None or freshness > 15:  # More than 15 minutes old
-                stale_holdings.append(ticker)
-        
-        # Check ETFs separately
-        for etf in ['VOO', 'QQQ']:
-            freshness = price_service.get_data_freshness(etf, date.today())
-            if freshness is None or freshness > 15:
-                stale_etfs.append(etf)
-        
-        # Only show warning if holdings have stale data
-        if stale_holdings:
-            market_open = is_market_open_now()
-            if market_open:
-                data_warnings.append(f"⚠️ MARKET IS OPEN: Price data for {len(stale_holdings)} holdings is outdated. Prices shown may not reflect current market values.")
-            else:
-                data_warnings.append(f"ℹ️ Market is closed. Showing last available prices for {len(stale_holdings)} holdings.")
+        stale_holdings, stale_etfs = aggregator.stale_tickers()
+        data_warnings = aggregator.data_warnings()
+        
+        # Monthly and annual TWR, cached per market date and data version
+        try:
+            from app.services.twr_service import TWRService
+            time_weighted_returns = TWRService().get_summary(portfolio_id, get_last_market_date())
+        except Exception as e:
+            logger.error(f"Error calculating time-weighted returns: {e}")
+            db.session.rollback()
+            time_weighted_returns = None
         
         # Trigger background chart data generation
         chart_generator.generate_chart_data(portfolio_id)
@@ -1764,6 +1630,7 @@ def get_dashboard_initial_data(portfolio_id):
         return jsonify({
             'success': True,
             'portfolio_stats': portfolio_stats,
+            'time_weighted_returns': time_weighted_returns,
             'holdings': holdings,
             'recent_transactions': transactions_data,
             'data_warnings': data_warnings,
@@ -1780,6 +1647,7 @@ def get_dashboard_initial_data(portfolio_id):
         }), 500
 
 @main_blueprint.route('/api/dashboard-chart-data/<portfolio_id>')
+@conditional_get(dashboard_etag)
 def get_dashboard_chart_data(portfolio_id):
     """Get chart data for dashboard asynchronously"""
     try:
@@ -1787,7 +1655,7 @@ def get_dashboard_chart_data(portfolio_id):
         chart_data = chart_generator.get_chart_data(portfolio_id)
         
         if chart_data:
-            return jsonify({
+            return chart_data_response({
                 'success': True,
                 'chart_data': chart_data,
                 'source': 'background_generator'
@@ -1798,7 +1666,7 @@ def get_dashboard_chart_data(portfolio_id):
         cached_chart_data = get_cached_chart_data(portfolio_id, market_date)
         
         if cached_chart_data:
-            return jsonify({
+            return chart_data_response({
                 'success': True,
                 'chart_data': cached_chart_data,
                 'source': 'cache'
@@ -1824,7 +1692,7 @@ def get_dashboard_chart_data(portfolio_id):
             'source': 'api_endpoint_generation'
         }
         
-        return jsonify({
+        return chart_data_response({
             'success': True,
             'chart_data': chart_data,
             'source': 'synchronous_generation'
@@ -1872,12 +1740,15 @@ def get_dashboard_chart_data(portfolio_id):
                     minimal_chart_data['voo_values'].append(950 * (i + 1))
                     minimal_chart_data['qqq_values'].append(1050 * (i + 1))
             
-            return jsonify({
+            response = chart_data_response({
                 'success': True,
                 'chart_data': minimal_chart_data,
                 'source': 'fallback',
                 'error': str(e)
             })
+            # Placeholder data must not be revalidated against the data version
+            response.cache_control.no_store = True
+            return response
         except Exception as fallback_error:
             return jsonify({
                 'success': False,
@@ -1892,30 +1763,15 @@ def get_dashboard_chart_data(portfolio_id):
             }), 500
 
 @main_blueprint.route('/api/dashboard-holdings-data/<portfolio_id>')
+@conditional_get(dashboard_etag)
 def get_dashboard_holdings_data(portfolio_id):
     """Get detailed holdings data for dashboard asynchronously"""
     try:
         portfolio_service = PortfolioService()
         price_service = PriceService()
         
-        # Get detailed holdings data
-        holdings = get_holdings_with_performance(portfolio_id, portfolio_service, price_service, use_stale=True)
-        
-        # Calculate ETF performance for each holding
-        transactions = portfolio_service.get_portfolio_transactions(portfolio_id)
-        
-        for holding in holdings:
-            ticker = holding['ticker']
-            try:
-                voo_performance = calculate_etf_performance_for_holding(ticker, transactions, 'VOO')
-                qqq_performance = calculate_etf_performance_for_holding(ticker, transactions, 'QQQ')
-                
-                holding['voo_performance'] = voo_performance
-                holding['qqq_performance'] = qqq_performance
-            except Exception as e:
-                logger.error(f"Error calculating ETF performance for {ticker}: {e}")
-                holding['voo_performance'] = 0
-                holding['qqq_performance'] = 0
+        # Holdings already carry their benchmark performance
+        holdings = DashboardAggregator(portfolio_id, portfolio_service, price_service).holdings_data()
         
         return jsonify({
             'success': True,
@@ -1940,7 +1796,7 @@ def get_chart_generator_progress(portfolio_id):
         # Check if chart data is ready
         chart_data = chart_generator.get_chart_data(portfolio_id)
         if chart_data:
-            return jsonify({
+            return chart_data_response({
                 'success': True,
                 'status': 'completed',
                 'progress': progress,
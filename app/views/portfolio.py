@@ -202,44 +202,20 @@ def import_csv():
                 flash('Portfolio and CSV file are required.', 'error')
                 return render_template('portfolio/import_csv.html', portfolios=portfolios)
             
-            from app.services.data_loader import DataLoader
-            import csv
-            import io
-            
-            # Read CSV content and handle BOM
-            csv_content = csv_file.read().decode('utf-8-sig')  # Handles BOM automatically
-            csv_reader = csv.DictReader(io.StringIO(csv_content))
-            csv_data = list(csv_reader)
-            
-            data_loader = DataLoader()
-            
-            if import_type == 'transactions':
-                imported_count = data_loader.import_transactions_from_csv(portfolio_id, csv_data)
-                if imported_count > 0:
-                    flash(f'Successfully imported {imported_count} transactions from CSV file.', 'success')
-                else:
-                    error_msg = 'No transactions were imported. '
-                    if hasattr(data_loader, '_last_import_errors'):
-                        error_msg += f'Errors: {" | ".join(data_loader._last_import_errors[:3])}'
-                    else:
-                        error_msg += 'Please check your CSV format and data.'
-                    flash(error_msg, 'warning')
-            elif import_type == 'dividends':
-                imported_count = data_loader.import_dividends_from_csv(portfolio_id, csv_data)
-                if imported_count > 0:
-                    flash(f'Successfully imported {imported_count} dividends from CSV file.', 'success')
-                else:
-                    error_msg = 'No dividends were imported. '
-                    if hasattr(data_loader, '_last_import_errors'):
-                        error_msg += f'Errors: {" | ".join(data_loader._last_import_errors[:3])}'
-                    else:
-                        error_msg += 'Please check your CSV format and data.'
-                    flash(error_msg, 'warning')
-            else:
+            if import_type not in ('transactions', 'dividends'):
                 flash('Invalid import type.', 'error')
                 return render_template('portfolio/import_csv.html', portfolios=portfolios)
             
-            return redirect(url_for('main.dashboard', portfolio_id=portfolio_id))
+            from app.services.background_tasks import import_runner
+            
+            # The file is saved and imported off the request; follow the job until it is done
+            job = import_runner.submit(portfolio_id, import_type, csv_file)
+            if job['status'] not in ('completed', 'error'):
+                return redirect(url_for('portfolio.import_status', job_id=job['id']))
+            
+            flash_import_result(job)
+            if job['status'] == 'completed':
+                return redirect(url_for('main.dashboard', portfolio_id=portfolio_id))
             
         except Exception as e:
             flash(f'Error processing CSV file: {str(e)}', 'error')
@@ -249,9 +225,58 @@ def import_csv():
                          portfolios=portfolios,
                          current_portfolio_id=current_portfolio_id)
 
+def flash_import_result(job):
+    """Flash the outcome of a finished import job"""
+    import_type = job['import_type']
+    if job['status'] == 'error':
+        flash(f"Error processing CSV file: {job['error']}", 'error')
+    elif job['imported_count'] > 0:
+        flash(f"Successfully imported {job['imported_count']} {import_type} from CSV file.", 'success')
+    else:
+        error_msg = f'No {import_type} were imported. '
+        if job['errors']:
+            error_msg += f'Errors: {" | ".join(job["errors"][:3])}'
+        else:
+            error_msg += 'Please check your CSV format and data.'
+        flash(error_msg, 'warning')
+
+@portfolio_blueprint.route('/import-jobs/<job_id>')
+def import_status(job_id):
+    """Show the progress of a CSV import job"""
+    from app.services.background_tasks import import_runner
+    
+    job = import_runner.get_job(job_id)
+    if not job:
+        flash('Import job not found. It may have finished more than an hour ago.', 'warning')
+        return redirect(url_for('main.dashboard'))
+    
+    return render_template('portfolio/import_status.html', job=job)
+
 @portfolio_blueprint.route('/export-csv')
 def export_csv():
-    return "CSV Export - Coming Soon"
+    """Stream a portfolio's transactions or dividends as CSV in the import format"""
+    from app.services.data_loader import DataLoader, TRANSACTION_EXPORT_HEADER, DIVIDEND_EXPORT_HEADER
+    from app.util.csv_stream import csv_response, wants_gzip
+    
+    portfolio_id = request.args.get('portfolio_id')
+    if not portfolio_id:
+        return "Portfolio ID required", 400
+    
+    portfolio = PortfolioService().get_portfolio(portfolio_id)
+    if not portfolio:
+        return "Portfolio not found", 404
+    
+    data_loader = DataLoader()
+    data = request.args.get('data', 'transactions')
+    if data == 'transactions':
+        header, rows = TRANSACTION_EXPORT_HEADER, data_loader.iter_transaction_rows(portfolio_id)
+    elif data == 'dividends':
+        header, rows = DIVIDEND_EXPORT_HEADER, data_loader.iter_dividend_rows(portfolio_id)
+    else:
+        return "data must be transactions or dividends", 400
+    
+    filename = f"{data}_{portfolio.name.replace(' ', '_')}_{portfolio_id[:8]}.csv"
+    return csv_response(filename, header, rows, compress=wants_gzip(request))
 
 @portfolio_blueprint.route('/delete-transaction/<transaction_id>', methods=['DELETE', 'OPTIONS'])
 def delete_transaction(transaction_id):
@@ -0,0 +1,35 @@
+"""Add sort_priority to cash_flows
+
+The same-day flow type order is stored with each flow, so the cash flows page
+can order and page by (date, sort_priority, id) from one index.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = 'add_cash_flow_sort_priority'
+down_revision = 'add_irr_calculation_horizon'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('cash_flows', sa.Column('sort_priority', sa.Integer(), nullable=False, server_default='99'))
+    op.execute("""
+        UPDATE cash_flows SET sort_priority = CASE flow_type
+            WHEN 'DIVIDEND' THEN 1
+            WHEN 'DEPOSIT' THEN 2
+            WHEN 'PURCHASE' THEN 3
+            WHEN 'SALE' THEN 4
+            ELSE 99
+        END
+    """)
+    op.create_index('idx_cash_flows_portfolio_order', 'cash_flows',
+                    ['portfolio_id', 'date', 'sort_priority', 'id'])
+
+
+def downgrade():
+    op.drop_index('idx_cash_flows_portfolio_order', table_name='cash_flows')
+    op.drop_column('cash_flows', 'sort_priority')
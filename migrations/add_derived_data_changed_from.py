@@ -0,0 +1,24 @@
+"""Add changed_from to derived_data_state
+
+Derived artifacts record the earliest transaction or dividend date changed
+since they were last built. Cash flows use it to rewrite only the flows from
+that date on instead of regenerating the whole history.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = 'add_derived_data_changed_from'
+down_revision = 'add_price_history_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('derived_data_state', sa.Column('changed_from', sa.Date(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('derived_data_state', 'changed_from')
@@ -0,0 +1,30 @@
+"""Add cache keys to etf_comparisons
+
+ETF comparisons are stored as a materialized cache. The latest ETF dividend
+and close a comparison accounts for tell when new distributions have to be
+appended and when its value has to be refreshed.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = 'add_etf_comparison_cache_keys'
+down_revision = 'add_derived_data_changed_from'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('etf_comparisons', sa.Column('dividends_received', sa.Float(), nullable=False, server_default='0'))
+    op.add_column('etf_comparisons', sa.Column('last_dividend_date', sa.Date(), nullable=True))
+    op.add_column('etf_comparisons', sa.Column('price_date', sa.Date(), nullable=True))
+    op.add_column('etf_comparisons', sa.Column('current_price', sa.Float(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('etf_comparisons', 'current_price')
+    op.drop_column('etf_comparisons', 'price_date')
+    op.drop_column('etf_comparisons', 'last_dividend_date')
+    op.drop_column('etf_comparisons', 'dividends_received')
@@ -0,0 +1,32 @@
+"""Store ETF dividends and estimated ETF comparison flows
+
+ETF distributions are fetched in the background into etf_dividends, so
+comparison requests read them instead of calling the API. Comparisons record
+the earliest flow priced without stored history and rebuild from it once.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = 'add_etf_dividends'
+down_revision = 'add_cash_flow_sort_priority'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'etf_dividends',
+        sa.Column('ticker', sa.String(10), primary_key=True),
+        sa.Column('date', sa.Date(), primary_key=True),
+        sa.Column('dividend', sa.Float(), nullable=False),
+        sa.Column('last_updated', sa.DateTime(), nullable=True)
+    )
+    op.add_column('etf_comparisons', sa.Column('estimated_from', sa.Date(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('etf_comparisons', 'estimated_from')
+    op.drop_table('etf_dividends')
@@ -0,0 +1,26 @@
+"""Add horizon to irr_calculations
+
+Month-end IRR history is stored next to the point calculations, one row per
+month-end and horizon (since inception or trailing 1/3/5 years).
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic
+revision = 'add_irr_calculation_horizon'
+down_revision = 'add_etf_comparison_cache_keys'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('irr_calculations', sa.Column('horizon', sa.String(length=20), nullable=True))
+    op.create_index('idx_irr_calculations_portfolio_horizon_date', 'irr_calculations',
+                    ['portfolio_id', 'horizon', 'calculation_date'])
+
+
+def downgrade():
+    op.drop_index('idx_irr_calculations_portfolio_horizon_date', table_name='irr_calculations')
+    op.drop_column('irr_calculations', 'horizon')
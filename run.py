@@ -1,3 +1,4 @@
+import click
 from app import create_app, db
 
 app = create_app()
@@ -8,6 +9,20 @@ def create_tables():
     db.create_all()
     print("Database tables created.")
 
+@app.cli.command()
+@click.argument('portfolio_id', required=False)
+def rebuild_positions(portfolio_id):
+    """Rebuild the positions ledger from transactions."""
+    from app.models.portfolio import Portfolio
+    from app.services.position_service import PositionService
+
+    position_service = PositionService()
+    portfolio_ids = [portfolio_id] if portfolio_id else [p.id for p in Portfolio.query.all()]
+    for pid in portfolio_ids:
+        count = position_service.rebuild_portfolio(pid)
+        db.session.commit()
+        print(f"Rebuilt {count} positions for portfolio {pid}.")
+
 if __name__ == "__main__":
     import os
     port = int(os.environ.get('PORT', 5001))
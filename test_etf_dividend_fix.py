@@ -3,6 +3,7 @@
 import pytest
 from datetime import date
 from unittest.mock import Mock, patch
+import numpy as np
 import pandas as pd
 import sys
 import os
@@ -19,29 +20,13 @@ def test_etf_dividend_shares_calculation():
     # Create the service
     etf_service = ETFComparisonService()
     
-    # Mock the price service
+    # Mock the price service and the stored VOO closes
     mock_price_service = Mock()
-    mock_price_service.get_cached_price.side_effect = lambda ticker, date_val: {
-        ('VOO', date(2022, 5, 20)): 350.0,
-        ('VOO', date(2022, 6, 29)): 360.0,
-    }.get((ticker, date_val), 370.0)
     mock_price_service.get_current_price.return_value = 380.0
     
     etf_service.price_service = mock_price_service
-    
-    # Create test data that matches your example
-    # Purchase of 0.0177 shares on 5/20/2022
-    existing_cash_flows = [
-        {
-            'date': date(2022, 5, 20),
-            'flow_type': 'PURCHASE',
-            'amount': -6.195,  # 0.0177 shares * $350 = $6.195
-            'description': '0.0177 shares @ $350.00',
-            'shares': 0.0177,
-            'price_per_share': 350.0,
-            'running_balance': 0.0
-        }
-    ]
+    closes = {date(2022, 5, 20): 350.0, date(2022, 6, 29): 360.0}
+    etf_service._event_prices = lambda ticker, dates: (np.array([closes.get(d, 370.0) for d in dates]), None)
     
     # Mock dividend data - $1.43 per share on 6/29/2022
     dividend_data = {
@@ -49,7 +34,7 @@ def test_etf_dividend_shares_calculation():
     }
     mock_dividends = pd.Series(dividend_data)
     
-    # Mock deposits
+    # Mock deposits: buys 0.0177 shares on 5/20/2022 (0.0177 shares * $350 = $6.195)
     deposits = [
         {'date': date(2022, 5, 20), 'amount': 6.195, 'flow_type': 'DEPOSIT'}
     ]
@@ -58,8 +43,8 @@ def test_etf_dividend_shares_calculation():
     with patch('yfinance.Ticker') as mock_ticker:
         mock_ticker.return_value.dividends = mock_dividends
         
-        # Get dividend flows
-        dividend_flows = etf_service._get_etf_dividend_flows('VOO', deposits, existing_cash_flows)
+        # Get dividend flows (everything after the deposit purchase)
+        dividend_flows = etf_service.simulate('VOO', deposits)['cash_flows'][1:]
         
         # Should have 2 flows: the dividend and the reinvestment
         assert len(dividend_flows) == 2
@@ -70,7 +55,7 @@ def test_etf_dividend_shares_calculation():
         assert dividend_flow['date'] == date(2022, 6, 29)
         
         # The key check: shares should be 0.0177, not 161.9805
-        assert dividend_flow['shares'] == 0.0177
+        assert dividend_flow['shares'] == pytest.approx(0.0177)
         
         # Amount should be $1.43 * 0.0177 = $0.025311
         expected_amount = 1.43 * 0.0177
@@ -0,0 +1,81 @@
+import pytest
+import numpy as np
+from app.services.analytics_executor import AnalyticsExecutor
+from app.util import calculators
+
+
+@pytest.mark.fast
+class TestAnalyticsKernels:
+    def test_value_series_tracks_positions(self):
+        """Test portfolio value follows cumulative shares times price"""
+        prices = np.array([[10.0, 20.0], [11.0, 20.0], [12.0, 21.0], [13.0, 22.0]])
+        values = calculators.value_series(
+            4,
+            np.array([0, 1, 2]),
+            np.array([0, 1, 0]),
+            np.array([2.0, 1.0, -1.0]),
+            prices
+        )
+
+        assert values.tolist() == [20.0, 42.0, 33.0, 35.0]
+
+    def test_value_series_ignores_negative_positions(self):
+        """Test oversold positions do not produce negative value"""
+        prices = np.array([[10.0], [10.0]])
+        values = calculators.value_series(2, np.array([0, 1]), np.array([0, 0]), np.array([1.0, -3.0]), prices)
+
+        assert values.tolist() == [10.0, 0.0]
+
+    def test_equivalent_value_series(self):
+        """Test ETF equivalent buys shares at the purchase day price"""
+        etf_prices = np.array([100.0, 110.0, 50.0])
+        values = calculators.equivalent_value_series(np.array([0, 2]), np.array([1000.0, 500.0]), etf_prices)
+
+        assert values.tolist() == pytest.approx([1000.0, 1100.0, 1000.0])
+
+    def test_equivalent_value_series_skips_missing_prices(self):
+        """Test purchases without an ETF price are skipped"""
+        etf_prices = np.array([np.nan, 100.0])
+        values = calculators.equivalent_value_series(np.array([0, 1]), np.array([1000.0, 500.0]), etf_prices)
+
+        assert values.tolist() == pytest.approx([0.0, 500.0])
+
+    def test_solve_irr(self):
+        """Test IRR kernel on a one year 10% return"""
+        rate = calculators.solve_irr(np.array([0.0, 1.0]), np.array([-1000.0, 1100.0]))
+
+        assert abs(rate - 0.10) < 1e-6
+
+
+@pytest.mark.fast
+class TestAnalyticsExecutor:
+    def test_small_problems_run_inline(self):
+        """Test problems under the threshold never start a pool"""
+        executor = AnalyticsExecutor()
+        executor.offload_threshold = 1000
+
+        result = executor.run(calculators.solve_irr, np.array([0.0, 1.0]), np.array([-1000.0, 1100.0]), size=2)
+
+        assert abs(result - 0.10) < 1e-6
+        assert executor._pool is None
+
+    def test_disabled_pool_runs_inline(self):
+        """Test zero workers disables offloading"""
+        executor = AnalyticsExecutor()
+        executor.max_workers = 0
+        executor.offload_threshold = 0
+
+        assert not executor.should_offload(10 ** 6)
+
+    def test_large_problems_run_in_pool(self):
+        """Test large problems are solved in a worker process"""
+        executor = AnalyticsExecutor()
+        executor.max_workers = 1
+        executor.offload_threshold = 0
+
+        try:
+            result = executor.run(calculators.solve_irr, np.array([0.0, 1.0]), np.array([-1000.0, 1100.0]), size=2)
+            assert abs(result - 0.10) < 1e-6
+            assert executor._pool is not None
+        finally:
+            executor.shutdown()
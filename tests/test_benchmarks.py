@@ -0,0 +1,186 @@
+import pytest
+import numpy as np
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+from app import db
+from app.models.portfolio import StockTransaction
+from app.models.price import PriceHistory
+from app.services.benchmark_service import BenchmarkService, DEFAULT_BENCHMARKS, benchmark_key
+from app.services.portfolio_service import PortfolioService
+from app.services.price_service import PriceService
+from app.util import calculators
+
+
+def _add_buy(portfolio_id, ticker, buy_date, total_value):
+    db.session.add(StockTransaction(
+        portfolio_id=portfolio_id,
+        ticker=ticker,
+        transaction_type='BUY',
+        date=buy_date,
+        price_per_share=100.0,
+        shares=total_value / 100.0,
+        total_value=total_value
+    ))
+
+
+@pytest.mark.fast
+class TestBenchmarkKernels:
+    def test_equivalent_shares_per_benchmark(self):
+        """Test every benchmark is priced from the same purchase amounts"""
+        shares = calculators.equivalent_shares(
+            np.array([1000.0, 500.0]),
+            np.array([[100.0, 50.0, np.nan], [250.0, 25.0, 10.0]])
+        )
+
+        assert shares.tolist() == [[10.0, 20.0, 0.0], [2.0, 20.0, 50.0]]
+
+    def test_equivalent_value_series_for_many_benchmarks(self):
+        """Test the 2D form matches valuing each benchmark separately"""
+        prices = np.array([[100.0, 10.0], [110.0, 12.0], [120.0, 11.0]])
+        buy_days = np.array([0, 1])
+        buy_amounts = np.array([1000.0, 600.0])
+
+        combined = calculators.equivalent_value_series(buy_days, buy_amounts, prices)
+
+        for i in range(prices.shape[1]):
+            single = calculators.equivalent_value_series(buy_days, buy_amounts, prices[:, i])
+            assert combined[:, i].tolist() == pytest.approx(single.tolist())
+
+
+class TestBenchmarkService:
+    def test_defaults_when_not_configured(self, app, sample_portfolio):
+        """Test portfolios without benchmarks use the defaults"""
+        with app.app_context():
+            assert BenchmarkService().get_benchmarks(sample_portfolio.id) == DEFAULT_BENCHMARKS
+
+    def test_set_benchmarks_keeps_order(self, app, sample_portfolio):
+        """Test benchmarks are cleaned, de-duplicated and kept in order"""
+        with app.app_context():
+            service = BenchmarkService()
+            saved = service.set_benchmarks(sample_portfolio.id, ['qqq', ' VOO', 'SPY', 'QQQ'])
+
+            assert saved == ['QQQ', 'VOO', 'SPY']
+            assert service.get_benchmarks(sample_portfolio.id) == ['QQQ', 'VOO', 'SPY']
+
+    def test_set_benchmarks_rejects_invalid_tickers(self, app, sample_portfolio):
+        """Test overlong or malformed tickers raise ValueError before anything is written"""
+        with app.app_context():
+            service = BenchmarkService()
+            service.set_benchmarks(sample_portfolio.id, ['VOO'])
+
+            for tickers in (['SPY', 'ABCDEFGHIJK'], ['VOO; DROP'], ['Q QQ']):
+                with pytest.raises(ValueError):
+                    service.set_benchmarks(sample_portfolio.id, tickers)
+
+            assert service.set_benchmarks(sample_portfolio.id, ['brk-b', '^GSPC']) == ['BRK-B', '^GSPC']
+
+    def test_price_tickers_include_benchmarks(self, app, sample_portfolio):
+        """Test price refreshes cover holdings plus every benchmark once"""
+        with app.app_context():
+            service = BenchmarkService()
+            service.set_benchmarks(sample_portfolio.id, ['VOO', 'SPY'])
+
+            assert service.get_price_tickers(sample_portfolio.id, {'AAPL': 10, 'VOO': 2}) == ['AAPL', 'VOO', 'SPY']
+
+    def test_benchmark_key(self):
+        """Test keys are safe for payload field names"""
+        assert benchmark_key('VOO') == 'voo'
+        assert benchmark_key('BRK.B') == 'brk_b'
+
+
+class TestBenchmarkComparison:
+    def test_equivalents_price_each_date_once(self, app, sample_portfolio):
+        """Test a third benchmark does not rescan or reprice purchases per benchmark"""
+        with app.app_context():
+            BenchmarkService().set_benchmarks(sample_portfolio.id, ['VOO', 'QQQ', 'SPY'])
+            _add_buy(sample_portfolio.id, 'AAPL', date(2023, 1, 3), 1000.0)
+            _add_buy(sample_portfolio.id, 'MSFT', date(2023, 1, 3), 500.0)
+            _add_buy(sample_portfolio.id, 'AAPL', date(2023, 2, 1), 300.0)
+            prices = {'VOO': 100.0, 'QQQ': 50.0, 'SPY': 25.0}
+            from app.views.main import get_last_market_date
+            for ticker, price in prices.items():
+                for price_date in (date(2023, 1, 3), date(2023, 2, 1), get_last_market_date()):
+                    db.session.add(PriceHistory(
+                        ticker=ticker,
+                        date=price_date,
+                        close_price=price,
+                        is_intraday=False,
+                        price_timestamp=datetime.now(),
+                        last_updated=datetime.now()
+                    ))
+            db.session.commit()
+
+            with patch('app.views.main.get_historical_price', side_effect=lambda t, d: prices[t]) as mock_price, \
+                 patch('app.views.main.is_market_open_now', return_value=False):
+                from app.views.main import calculate_benchmark_equivalents
+                equivalents = calculate_benchmark_equivalents(sample_portfolio.id, PortfolioService(), PriceService())
+
+            # Purchase dates and the last close come from the stored series
+            mock_price.assert_not_called()
+            assert equivalents == pytest.approx({'VOO': 1800.0, 'QQQ': 1800.0, 'SPY': 1800.0})
+
+    def test_chart_includes_every_benchmark(self, app, sample_portfolio):
+        """Test chart data has a series per benchmark and keeps the default series"""
+        with app.app_context():
+            BenchmarkService().set_benchmarks(sample_portfolio.id, ['VOO', 'SPY'])
+            start = date.today() - timedelta(days=3)
+            _add_buy(sample_portfolio.id, 'AAPL', start, 1000.0)
+            for ticker, price in (('AAPL', 100.0), ('VOO', 200.0), ('SPY', 400.0)):
+                db.session.add(PriceHistory(
+                    ticker=ticker,
+                    date=start,
+                    close_price=price,
+                    is_intraday=False,
+                    price_timestamp=datetime.now()
+                ))
+            db.session.commit()
+
+            from app.views.main import generate_simplified_chart_data
+            chart_data = generate_simplified_chart_data(sample_portfolio.id, PortfolioService(), PriceService())
+
+            assert len(chart_data['dates']) == 4
+            assert chart_data['portfolio_values'] == [1000.0] * 4
+            assert chart_data['voo_values'] == [1000.0] * 4
+            assert chart_data['spy_values'] == [1000.0] * 4
+            assert chart_data['qqq_values'] == [0] * 4
+
+    def test_daily_changes_cover_custom_benchmarks(self, app, sample_portfolio):
+        """Test daily changes are reported for each configured benchmark"""
+        with app.app_context():
+            with patch('app.views.main.get_last_market_date', return_value=date(2025, 6, 23)), \
+                 patch('app.views.main.get_previous_trading_day', return_value=date(2025, 6, 20)), \
+                 patch('app.views.main.calculate_etf_daily_change_for_portfolio',
+                       return_value={'percentage': 1.0, 'dollar': 10.0}) as mock_change, \
+                 patch('app.views.main.calculate_portfolio_daily_change', return_value={'percentage': 2.0, 'dollar': 20.0}):
+                from app.views.main import calculate_daily_changes
+                result = calculate_daily_changes(
+                    sample_portfolio.id, PortfolioService(), PriceService(),
+                    equivalents={'SPY': 1000.0, 'VOO': 2000.0}
+                )
+
+            assert mock_change.call_count == 2
+            assert mock_change.call_args_list[0].kwargs['etf_equivalent_value'] == 1000.0
+            assert result['spy_daily_change'] == 1.0
+            assert result['voo_daily_dollar_change'] == 10.0
+            assert result['qqq_daily_change'] == 0
+
+
+class TestBenchmarksAPI:
+    def test_update_and_read_benchmarks(self, app, client, sample_portfolio):
+        """Test benchmarks can be replaced and read back through the API"""
+        url = f'/api/portfolio/{sample_portfolio.id}/benchmarks'
+
+        response = client.put(url, json={'benchmarks': ['spy', 'VOO']})
+        assert response.status_code == 200
+        assert response.get_json()['benchmarks'] == ['SPY', 'VOO']
+
+        assert client.get(url).get_json()['benchmarks'] == ['SPY', 'VOO']
+
+    def test_rejects_invalid_benchmarks(self, app, client, sample_portfolio):
+        """Test bad payloads and unknown portfolios are rejected"""
+        url = f'/api/portfolio/{sample_portfolio.id}/benchmarks'
+
+        assert client.put(url, json={'benchmarks': 'VOO'}).status_code == 400
+        assert client.put(url, json={'benchmarks': []}).status_code == 400
+        assert client.put(url, json={'benchmarks': ['VOO', 'X' * 11]}).status_code == 400
+        assert client.get('/api/portfolio/missing/benchmarks').status_code == 404
@@ -0,0 +1,117 @@
+import pytest
+from datetime import date, datetime
+from unittest.mock import patch
+import pandas as pd
+from sqlalchemy import event
+from app import db
+from app.models.portfolio import Portfolio, StockTransaction
+from app.models.price import PriceHistory
+from app.services.cash_flow_context import get_cash_flow_context
+from app.services.cash_flow_sync_service import CashFlowSyncService
+from app.services.etf_comparison_service import ETFComparisonService
+
+
+def _add_buy(portfolio_id, buy_date, total_value):
+    db.session.add(StockTransaction(
+        portfolio_id=portfolio_id,
+        ticker='AAPL',
+        transaction_type='BUY',
+        date=buy_date,
+        price_per_share=100.0,
+        shares=total_value / 100.0,
+        total_value=total_value
+    ))
+
+
+@pytest.fixture
+def context_portfolio(app):
+    with app.app_context():
+        for ticker, close_price in (('VOO', 400.0), ('QQQ', 300.0)):
+            for price_date in (date(2024, 1, 2), date(2024, 3, 1), date(2024, 12, 27)):
+                db.session.add(PriceHistory(
+                    ticker=ticker,
+                    date=price_date,
+                    close_price=close_price,
+                    is_intraday=False,
+                    price_timestamp=datetime.now(),
+                    last_updated=datetime.utcnow()
+                ))
+
+        portfolio = Portfolio(name='Context', user_id='test')
+        db.session.add(portfolio)
+        db.session.flush()
+        _add_buy(portfolio.id, date(2024, 1, 2), 1000.0)
+        _add_buy(portfolio.id, date(2024, 3, 1), 500.0)
+        db.session.commit()
+        yield portfolio.id
+
+
+@pytest.fixture
+def no_etf_dividends():
+    with patch('yfinance.Ticker') as mock_ticker:
+        mock_ticker.return_value.dividends = pd.Series(dtype=float)
+        yield mock_ticker
+
+
+def _counting(cls, name):
+    return patch.object(cls, name, autospec=True, side_effect=getattr(cls, name))
+
+
+class TestCashFlowContext:
+    @pytest.mark.parametrize('comparison', ['VOO', 'portfolio'])
+    def test_page_builds_each_comparison_once(self, app, client, context_portfolio, no_etf_dividends, comparison):
+        """Test one page render syncs once and builds each comparison once"""
+        with _counting(CashFlowSyncService, 'ensure_cash_flows_current') as mock_sync, \
+             _counting(ETFComparisonService, 'get_comparison') as mock_comparison, \
+             _counting(ETFComparisonService, '_refresh') as mock_refresh:
+            response = client.get(f'/cash-flows?portfolio_id={context_portfolio}&comparison={comparison}')
+
+        assert response.status_code == 200
+        assert mock_sync.call_count == 1
+        assert sorted(call.args[2] for call in mock_comparison.call_args_list) == ['QQQ', 'VOO']
+        assert mock_refresh.call_count == 2
+
+    def test_deposits_loaded_once_for_all_comparisons(self, app, context_portfolio, no_etf_dividends):
+        """Test both comparisons are simulated from one deposit load"""
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if 'FROM cash_flows' in statement and 'DEPOSIT' in str(parameters):
+                statements.append(statement)
+
+        with app.test_request_context():
+            service = ETFComparisonService()
+            event.listen(db.engine, 'before_cursor_execute', record)
+            try:
+                voo = service.get_etf_summary(context_portfolio, 'VOO')
+                qqq = service.get_etf_summary(context_portfolio, 'QQQ')
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', record)
+
+        assert len(statements) == 1
+        assert voo['total_invested'] == qqq['total_invested'] == pytest.approx(1500.0)
+
+    def test_context_dropped_on_writes(self, app, context_portfolio):
+        """Test a context is shared within a request until the portfolio or prices change"""
+        with app.test_request_context():
+            context = get_cash_flow_context(context_portfolio)
+            assert get_cash_flow_context(context_portfolio) is context
+            assert len(context.deposits()) == 2
+
+            _add_buy(context_portfolio, date(2024, 6, 3), 700.0)
+            db.session.commit()
+
+            fresh = get_cash_flow_context(context_portfolio)
+            assert fresh is not context
+            assert len(fresh.deposits()) == 3
+
+            db.session.add(PriceHistory(
+                ticker='VOO',
+                date=date(2025, 1, 3),
+                close_price=410.0,
+                is_intraday=False,
+                price_timestamp=datetime.now(),
+                last_updated=datetime.utcnow()
+            ))
+            db.session.commit()
+            assert get_cash_flow_context(context_portfolio) is not fresh
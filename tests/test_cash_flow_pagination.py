@@ -0,0 +1,181 @@
+import pytest
+import time
+from datetime import date, timedelta
+from sqlalchemy import insert
+from unittest.mock import patch
+from app import db
+from app.models.cash_flow import CashFlow
+from app.models.portfolio import Portfolio, StockTransaction, Dividend
+from app.services.cash_flow_service import CashFlowService
+
+
+def _add_transaction(portfolio_id, transaction_type, on_date, total_value):
+    db.session.add(StockTransaction(
+        portfolio_id=portfolio_id,
+        ticker='AAPL',
+        transaction_type=transaction_type,
+        date=on_date,
+        price_per_share=100.0,
+        shares=total_value / 100.0,
+        total_value=total_value
+    ))
+
+
+@pytest.fixture
+def paged_portfolio(app):
+    """Forty buys with a same-day dividend and a few sales, as saved cash flows"""
+    with app.app_context():
+        portfolio = Portfolio(name='Paged', user_id='test')
+        db.session.add(portfolio)
+        db.session.flush()
+
+        for i in range(40):
+            day = date(2023, 1, 2) + timedelta(days=i)
+            _add_transaction(portfolio.id, 'BUY', day, 1000.0)
+            db.session.add(Dividend(
+                portfolio_id=portfolio.id,
+                ticker='AAPL',
+                payment_date=day,
+                total_amount=5.0
+            ))
+            if i % 10 == 9:
+                _add_transaction(portfolio.id, 'SELL', day, 500.0)
+        db.session.commit()
+
+        service = CashFlowService()
+        service.save_cash_flows(portfolio.id, service.generate_cash_flows(portfolio.id))
+        yield portfolio.id
+
+
+def _all_pages(service, portfolio_id, **filters):
+    pages, cursor = [], None
+    while True:
+        page = service.get_cash_flow_page(portfolio_id, cursor=cursor, **filters)
+        pages.append(page)
+        cursor = page['next_cursor']
+        if cursor is None:
+            return pages
+
+
+class TestCashFlowPagination:
+    def test_pages_follow_full_ordering(self, app, paged_portfolio):
+        """Test walking every page yields the same flows as the full ordered list"""
+        with app.app_context():
+            service = CashFlowService()
+            pages = _all_pages(service, paged_portfolio, limit=7)
+            paged = [flow.id for page in pages for flow in page['cash_flows']]
+
+            expected = service.get_cash_flows(paged_portfolio)
+            assert paged == [flow.id for flow in expected]
+            assert all(len(page['cash_flows']) == 7 for page in pages[:-1])
+
+            # Same-day flows keep the dividend, deposit, purchase, sale order
+            first_day = [flow.flow_type for flow in expected if flow.date == date(2023, 1, 11)]
+            assert first_day == ['DIVIDEND', 'DEPOSIT', 'PURCHASE', 'SALE']
+
+    def test_filters_applied_in_sql(self, app, paged_portfolio):
+        """Test flow type and date range filters and page totals"""
+        with app.app_context():
+            service = CashFlowService()
+            page = service.get_cash_flow_page(
+                paged_portfolio,
+                flow_types=['DIVIDEND', 'SALE'],
+                start_date=date(2023, 1, 10),
+                end_date=date(2023, 1, 19)
+            )
+
+            flows = page['cash_flows']
+            assert page['next_cursor'] is None
+            assert {flow.flow_type for flow in flows} == {'DIVIDEND', 'SALE'}
+            assert all(date(2023, 1, 10) <= flow.date <= date(2023, 1, 19) for flow in flows)
+            assert page['totals'] == {
+                'count': 11,
+                'inflows': 10 * 5.0 + 500.0,
+                'outflows': 0,
+                'net': 550.0,
+                'by_type': {'DIVIDEND': 50.0, 'SALE': 500.0}
+            }
+
+    def test_invalid_cursor(self, app, paged_portfolio):
+        """Test a malformed cursor is rejected"""
+        with app.app_context():
+            with pytest.raises(ValueError):
+                CashFlowService().get_cash_flow_page(paged_portfolio, cursor='not-a-cursor')
+
+    def test_sort_priority_stored(self, app, paged_portfolio):
+        """Test saved flows carry their same-day priority"""
+        with app.app_context():
+            priorities = dict(db.session.query(CashFlow.flow_type, CashFlow.sort_priority).filter_by(
+                portfolio_id=paged_portfolio
+            ).distinct().all())
+            assert priorities == {'DIVIDEND': 1, 'DEPOSIT': 2, 'PURCHASE': 3, 'SALE': 4}
+
+    def test_deep_page_of_large_account(self, app):
+        """Test a page deep into tens of thousands of flows reads only its own rows"""
+        with app.app_context():
+            portfolio = Portfolio(name='Large', user_id='test')
+            db.session.add(portfolio)
+            db.session.flush()
+            start = date(2000, 1, 1)
+            db.session.execute(insert(CashFlow), [
+                {
+                    'portfolio_id': portfolio.id,
+                    'date': start + timedelta(days=i // 4),
+                    'flow_type': ('DEPOSIT', 'PURCHASE')[i % 2],
+                    'amount': (100.0, -100.0)[i % 2],
+                    'description': 'Bulk',
+                    'running_balance': 0.0
+                }
+                for i in range(40000)
+            ])
+            db.session.commit()
+
+            service = CashFlowService()
+            first = service.get_cash_flow_page(portfolio.id, limit=50)
+            cursor = service.encode_cursor(service.get_cash_flows(portfolio.id)[30000])
+
+            begin = time.perf_counter()
+            deep = service.get_cash_flow_page(portfolio.id, cursor=cursor, limit=50)
+            elapsed = time.perf_counter() - begin
+
+            assert len(first['cash_flows']) == len(deep['cash_flows']) == 50
+            assert deep['cash_flows'][0].date >= start + timedelta(days=7500)
+            assert elapsed < 0.5
+
+
+class TestCashFlowPaginationViews:
+    def test_api_pages(self, app, client, paged_portfolio):
+        """Test the API walks pages with its cursor"""
+        response = client.get(f'/api/portfolio/{paged_portfolio}/cash-flows?limit=100')
+        data = response.get_json()
+
+        assert response.status_code == 200
+        assert len(data['cash_flows']) == 100
+        assert data['totals']['count'] == 100
+
+        rest = client.get(
+            f'/api/portfolio/{paged_portfolio}/cash-flows?limit=100&cursor={data["next_cursor"]}'
+        ).get_json()
+        assert rest['next_cursor'] is None
+        assert len(rest['cash_flows']) == 40 * 3 + 4 - 100
+        assert rest['cash_flows'][0]['date'] >= data['cash_flows'][-1]['date']
+
+    def test_api_filters_and_errors(self, app, client, paged_portfolio):
+        """Test API filters, bad arguments and missing portfolios"""
+        response = client.get(f'/api/portfolio/{paged_portfolio}/cash-flows?types=sale')
+        assert [flow['flow_type'] for flow in response.get_json()['cash_flows']] == ['SALE'] * 4
+
+        assert client.get(f'/api/portfolio/{paged_portfolio}/cash-flows?start_date=bad').status_code == 400
+        assert client.get(f'/api/portfolio/{paged_portfolio}/cash-flows?cursor=bad').status_code == 400
+        assert client.get('/api/portfolio/missing/cash-flows').status_code == 404
+
+    def test_page_renders_first_page_only(self, app, client, paged_portfolio):
+        """Test the page renders one page of rows and a cursor for the rest"""
+        with patch('app.services.cash_flow_service.CASH_FLOW_PAGE_SIZE', 10), \
+             patch('app.views.cash_flows.CASH_FLOW_PAGE_SIZE', 10):
+            response = client.get(f'/cash-flows?portfolio_id={paged_portfolio}')
+        html = response.get_data(as_text=True)
+
+        assert response.status_code == 200
+        assert html.count('<tr data-flow-type=') == 10
+        assert 'id="load-more-btn"' in html
@@ -116,6 +116,7 @@ class TestCashFlowSorting:
             # Mock yfinance to return a dividend on the same day
             import pandas as pd
             from unittest.mock import patch
+            from app.services.background_tasks import history_prefetcher
             
             dividend_data = {
                 pd.Timestamp('2025-01-15'): 1.50,  # Dividend on the same day
@@ -124,6 +125,7 @@ class TestCashFlowSorting:
             
             with patch('yfinance.Ticker') as mock_ticker:
                 mock_ticker.return_value.dividends = mock_dividends
+                history_prefetcher.fetch_dividends('VOO')
                 
                 # Get ETF cash flows
                 etf_cash_flows = etf_service.get_etf_cash_flows(portfolio_id, 'VOO')
@@ -1,9 +1,10 @@
 import pytest
-from datetime import date
+from datetime import date, timedelta
 from app.services.cash_flow_sync_service import CashFlowSyncService
 from app.models.portfolio import Portfolio, StockTransaction, Dividend
 from app.models.cash_flow import CashFlow
 from app import db
+from sqlalchemy import event
 
 
 @pytest.mark.fast
@@ -213,4 +214,122 @@ class TestCashFlowSyncService:
             assert status['is_current']
             assert not status['needs_regeneration']
             assert status['cash_flow_count'] > 0
-            assert status['transaction_count'] == 1
\ No newline at end of file
+            assert status['transaction_count'] == 1
+
+    def test_current_check_is_one_query(self, app, sample_portfolio):
+        """Test the sync check reads versions instead of the history"""
+        with app.app_context():
+            sync_service = CashFlowSyncService()
+            for day in range(1, 20):
+                db.session.add(StockTransaction(
+                    portfolio_id=sample_portfolio.id,
+                    ticker='AAPL',
+                    transaction_type='BUY',
+                    date=date(2023, 1, day),
+                    price_per_share=150.00,
+                    shares=1.0,
+                    total_value=150.00
+                ))
+            db.session.commit()
+            sync_service.ensure_cash_flows_current(sample_portfolio.id)
+
+            statements = []
+
+            def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+                statements.append(statement)
+
+            event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+            try:
+                sync_service.ensure_cash_flows_current(sample_portfolio.id)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+            assert len(statements) == 1
+            assert 'transactions' not in statements[0]
+
+@pytest.mark.database
+class TestIncrementalCashFlows:
+    def _add_history(self, portfolio_id, years=10):
+        start = date.today() - timedelta(days=365 * years)
+        for month in range(12 * years):
+            trade_date = start + timedelta(days=30 * month)
+            db.session.add(StockTransaction(
+                portfolio_id=portfolio_id,
+                ticker='AAPL',
+                transaction_type='SELL' if month % 6 == 5 else 'BUY',
+                date=trade_date,
+                price_per_share=100.00,
+                shares=5.0 if month % 6 == 5 else 10.0,
+                total_value=500.00 if month % 6 == 5 else 1000.00
+            ))
+            if month % 3 == 2:
+                db.session.add(Dividend(
+                    portfolio_id=portfolio_id,
+                    ticker='AAPL',
+                    payment_date=trade_date + timedelta(days=1),
+                    total_amount=25.00
+                ))
+        db.session.commit()
+
+    def _stored(self, portfolio_id):
+        return [
+            (cf.date, cf.flow_type, round(cf.amount, 6), round(cf.running_balance, 6))
+            for cf in CashFlowSyncService().cash_flow_service.get_cash_flows(portfolio_id)
+        ]
+
+    def _rebuilt(self, portfolio_id):
+        return [
+            (cf['date'], cf['flow_type'], round(cf['amount'], 6), round(cf['running_balance'], 6))
+            for cf in CashFlowSyncService().cash_flow_service.generate_cash_flows(portfolio_id)
+        ]
+
+    def test_new_trade_rewrites_only_its_flows(self, app, sample_portfolio):
+        """Test today's trade leaves the earlier history untouched"""
+        with app.app_context():
+            self._add_history(sample_portfolio.id)
+            sync_service = CashFlowSyncService()
+            sync_service.ensure_cash_flows_current(sample_portfolio.id)
+            ids_before = {cf.id for cf in CashFlow.query.filter_by(portfolio_id=sample_portfolio.id)}
+
+            db.session.add(StockTransaction(
+                portfolio_id=sample_portfolio.id,
+                ticker='MSFT',
+                transaction_type='BUY',
+                date=date.today(),
+                price_per_share=400.00,
+                shares=5.0,
+                total_value=2000.00
+            ))
+            db.session.commit()
+
+            written = sync_service.regenerate_cash_flows(sample_portfolio.id)
+            ids_after = {cf.id for cf in CashFlow.query.filter_by(portfolio_id=sample_portfolio.id)}
+
+            assert written <= 2
+            assert len(ids_before - ids_after) == 0
+            assert self._stored(sample_portfolio.id) == self._rebuilt(sample_portfolio.id)
+            assert sync_service.is_cash_flow_data_current(sample_portfolio.id)
+
+    def test_backdated_edit_matches_full_rebuild(self, app, sample_portfolio):
+        """Test moving and deleting trades rebuilds the right suffix"""
+        with app.app_context():
+            self._add_history(sample_portfolio.id, years=2)
+            sync_service = CashFlowSyncService()
+            sync_service.ensure_cash_flows_current(sample_portfolio.id)
+
+            transactions = StockTransaction.query.filter_by(
+                portfolio_id=sample_portfolio.id
+            ).order_by(StockTransaction.date).all()
+            # Move a late buy far back and delete a mid-history sale
+            transactions[-2].date = transactions[3].date - timedelta(days=2)
+            db.session.delete(transactions[11])
+            db.session.commit()
+
+            state = sync_service.version_service.get_artifact_state(sample_portfolio.id, CashFlowSyncService.ARTIFACT)
+            assert state.changed_from == transactions[3].date - timedelta(days=2)
+
+            sync_service.ensure_cash_flows_current(sample_portfolio.id)
+
+            assert self._stored(sample_portfolio.id) == self._rebuilt(sample_portfolio.id)
+            state = sync_service.version_service.get_artifact_state(sample_portfolio.id, CashFlowSyncService.ARTIFACT)
+            assert state.changed_from is None
@@ -0,0 +1,120 @@
+import gzip
+import uuid
+from datetime import date
+import json
+import pytest
+import numpy as np
+from app import db
+from app.models.cache import PortfolioCache
+from app.util.chart_codec import encode_chart_data, decode_chart_data, is_compact
+
+
+def _sample_chart_data(days=300):
+    dates = [f"2023-{m:02d}-{d:02d}" for m in range(1, 13) for d in range(1, 29)][:days]
+    values = list(np.linspace(1000.0, 2500.0, len(dates)))
+    return {
+        'dates': dates,
+        'portfolio_values': values,
+        'voo_values': [v * 0.9 for v in values],
+        'qqq_values': [v * 1.1 for v in values],
+        'using_cached_data': False
+    }
+
+
+@pytest.mark.fast
+class TestChartCodec:
+    def test_round_trip(self):
+        """Test compact data decodes to the same dates and float32 values"""
+        chart_data = _sample_chart_data()
+        compact = encode_chart_data(chart_data)
+
+        assert is_compact(compact)
+        assert 'dates' not in compact
+
+        decoded = decode_chart_data(compact)
+        assert decoded['dates'] == chart_data['dates']
+        assert decoded['using_cached_data'] is False
+        for key in ('portfolio_values', 'voo_values', 'qqq_values'):
+            expected = np.asarray(chart_data[key], dtype=np.float32).astype(np.float64)
+            assert decoded[key] == expected.tolist()
+
+    def test_compact_is_smaller(self):
+        """Test compact form is smaller than the plain JSON"""
+        chart_data = _sample_chart_data()
+
+        assert len(json.dumps(encode_chart_data(chart_data))) < len(json.dumps(chart_data))
+
+    def test_plain_data_passes_through(self):
+        """Test decoding plain data and encoding empty data leave them unchanged"""
+        chart_data = _sample_chart_data(5)
+        empty = {'dates': [], 'portfolio_values': []}
+
+        assert decode_chart_data(chart_data) is chart_data
+        assert encode_chart_data(empty) is empty
+
+    def test_series_with_gaps_stays_plain(self):
+        """Test a series with missing values is carried over and the others are still encoded"""
+        chart_data = _sample_chart_data(10)
+        chart_data['spy_values'] = [None, None] + chart_data['voo_values'][2:]
+        chart_data['labels'] = ['n/a'] * 10
+
+        compact = encode_chart_data(chart_data)
+        assert is_compact(compact)
+        assert 'portfolio_values' in compact['series']
+        assert compact['spy_values'] == chart_data['spy_values']
+
+        decoded = decode_chart_data(compact)
+        assert decoded['spy_values'] == chart_data['spy_values']
+        assert decoded['labels'] == chart_data['labels']
+        assert len(decoded['portfolio_values']) == 10
+
+    def test_cache_stores_compact_form(self, app, sample_portfolio):
+        """Test cached chart rows are stored compact and read back plain"""
+        with app.app_context():
+            chart_data = _sample_chart_data()
+            cache = PortfolioCache(
+                id=str(uuid.uuid4()),
+                portfolio_id=sample_portfolio.id,
+                cache_type='chart',
+                market_date=date(2023, 12, 28)
+            )
+            cache.set_chart_data(chart_data)
+            db.session.add(cache)
+            db.session.commit()
+
+            cache = PortfolioCache.query.filter_by(portfolio_id=sample_portfolio.id, cache_type='chart').first()
+            assert is_compact(cache.get_data())
+            assert cache.get_chart_data()['dates'] == chart_data['dates']
+
+
+class TestCompactChartEndpoint:
+    def test_compact_chart_data_is_compressed(self, app, client, sample_portfolio):
+        """Test the chart endpoint serves compact, gzip-compressed data on request"""
+        chart_data = _sample_chart_data()
+        with app.app_context():
+            from unittest.mock import patch
+            with patch('app.views.main.generate_simplified_chart_data', return_value=chart_data):
+                response = client.get(
+                    f'/api/chart-data/{sample_portfolio.id}?format=compact',
+                    headers={'Accept-Encoding': 'gzip'}
+                )
+
+        assert response.status_code == 200
+        assert response.headers['Content-Encoding'] in ('gzip', 'br')
+        assert 'Accept-Encoding' in response.headers['Vary']
+        if response.headers['Content-Encoding'] == 'gzip':
+            data = json.loads(gzip.decompress(response.data))
+            assert is_compact(data)
+            assert decode_chart_data(data)['dates'] == chart_data['dates']
+
+    def test_plain_chart_data_by_default(self, app, client, sample_portfolio):
+        """Test clients that do not ask for compact data get the plain payload"""
+        chart_data = _sample_chart_data(5)
+        with app.app_context():
+            from unittest.mock import patch
+            with patch('app.views.main.generate_simplified_chart_data', return_value=chart_data):
+                response = client.get(f'/api/chart-data/{sample_portfolio.id}')
+
+        assert response.status_code == 200
+        assert 'Content-Encoding' not in response.headers
+        assert response.get_json()['dates'] == chart_data['dates']
@@ -0,0 +1,112 @@
+import pytest
+from datetime import date, datetime
+from unittest.mock import patch
+from app import db
+from app.models.portfolio import StockTransaction
+from app.models.price import PriceHistory
+from app.services.data_version_service import DataVersionService
+
+
+def _add_transaction(portfolio_id, shares=10.0):
+    db.session.add(StockTransaction(
+        portfolio_id=portfolio_id,
+        ticker='AAPL',
+        transaction_type='BUY',
+        date=date(2023, 1, 3),
+        price_per_share=150.0,
+        shares=shares,
+        total_value=150.0 * shares
+    ))
+    db.session.commit()
+
+
+@pytest.mark.database
+class TestDataVersions:
+    def test_transaction_changes_bump_portfolio_version(self, app, sample_portfolio):
+        """Test adding, editing and deleting transactions bumps the portfolio version"""
+        with app.app_context():
+            service = DataVersionService()
+            assert service.get_portfolio_version(sample_portfolio.id) == 0
+
+            _add_transaction(sample_portfolio.id)
+            assert service.get_portfolio_version(sample_portfolio.id) == 1
+
+            transaction = StockTransaction.query.filter_by(portfolio_id=sample_portfolio.id).first()
+            transaction.shares = 12.0
+            db.session.commit()
+            assert service.get_portfolio_version(sample_portfolio.id) == 2
+
+            db.session.delete(transaction)
+            db.session.commit()
+            assert service.get_portfolio_version(sample_portfolio.id) == 3
+
+    def test_price_changes_bump_price_version(self, app, sample_portfolio):
+        """Test price history writes bump the price version only"""
+        with app.app_context():
+            service = DataVersionService()
+            db.session.add(PriceHistory(
+                ticker='AAPL',
+                date=date(2023, 1, 3),
+                close_price=150.0,
+                is_intraday=False,
+                price_timestamp=datetime.now()
+            ))
+            db.session.commit()
+
+            assert service.get_price_version() == 1
+            assert service.get_portfolio_version(sample_portfolio.id) == 0
+
+    def test_etag_changes_with_versions(self, app, sample_portfolio):
+        """Test the ETag changes when portfolio data changes"""
+        with app.app_context():
+            service = DataVersionService()
+            before = service.build_etag(sample_portfolio.id, date(2023, 1, 3))
+
+            assert before == service.build_etag(sample_portfolio.id, date(2023, 1, 3))
+            assert before != service.build_etag(sample_portfolio.id, date(2023, 1, 4))
+
+            _add_transaction(sample_portfolio.id)
+            assert before != service.build_etag(sample_portfolio.id, date(2023, 1, 3))
+
+
+@pytest.mark.api
+class TestConditionalDashboardRequests:
+    def test_holdings_data_not_modified(self, app, client, sample_portfolio):
+        """Test a matching If-None-Match returns 304 without recomputing"""
+        with app.app_context():
+            _add_transaction(sample_portfolio.id)
+
+            with patch('app.views.main.DashboardAggregator.holdings_data', return_value=[]) as mock_holdings:
+                url = f'/api/dashboard-holdings-data/{sample_portfolio.id}'
+                first = client.get(url)
+                assert first.status_code == 200
+                etag = first.headers['ETag']
+                assert 'no-cache' in first.headers['Cache-Control']
+
+                second = client.get(url, headers={'If-None-Match': etag})
+                assert second.status_code == 304
+                assert second.headers['ETag'] == etag
+                assert mock_holdings.call_count == 1
+
+    def test_changed_data_invalidates_etag(self, app, client, sample_portfolio):
+        """Test a data change makes the old ETag miss"""
+        with app.app_context():
+            with patch('app.views.main.DashboardAggregator.holdings_data', return_value=[]) as mock_holdings:
+                url = f'/api/dashboard-holdings-data/{sample_portfolio.id}'
+                etag = client.get(url).headers['ETag']
+
+                _add_transaction(sample_portfolio.id)
+
+                response = client.get(url, headers={'If-None-Match': etag})
+                assert response.status_code == 200
+                assert response.headers['ETag'] != etag
+                assert mock_holdings.call_count == 2
+
+    def test_error_responses_have_no_etag(self, app, client, sample_portfolio):
+        """Test failed responses are never marked cacheable"""
+        with app.app_context():
+            with patch('app.views.main.DashboardAggregator.holdings_data', side_effect=Exception('boom')):
+                response = client.get(f'/api/dashboard-holdings-data/{sample_portfolio.id}')
+
+        assert response.status_code == 500
+        assert 'ETag' not in response.headers
@@ -0,0 +1,126 @@
+import time
+import pytest
+from datetime import date
+from unittest.mock import patch
+from app.models.portfolio import Position
+from app.services.portfolio_service import PortfolioService
+from app.services.position_service import PositionService
+from app.util.lots import LotBook, FIFO, LIFO, HIFO, SPECIFIC
+
+
+def _book(method):
+    book = LotBook(method)
+    book.buy(1, date(2023, 1, 3), 10, 100.0)
+    book.buy(2, date(2023, 2, 1), 10, 150.0)
+    book.buy(3, date(2023, 3, 1), 10, 120.0)
+    return book
+
+
+@pytest.mark.fast
+class TestLotBook:
+    @pytest.mark.parametrize('method, remaining_cost', [
+        (FIFO, 5 * 150.0 + 1200.0),
+        (LIFO, 1000.0 + 5 * 150.0),
+        (HIFO, 1000.0 + 5 * 120.0),
+    ])
+    def test_relief_order(self, method, remaining_cost):
+        """Test each method relieves lots in its own order"""
+        book = _book(method)
+        book.sell(15, 200.0, date=date(2023, 4, 1))
+
+        assert book.shares == 15
+        assert book.cost_basis == pytest.approx(remaining_cost)
+        assert book.realized_pnl == pytest.approx(15 * 200.0 - (3700.0 - remaining_cost))
+
+    def test_specific_lots_then_fifo(self):
+        """Test specific-ID sells take the chosen lots first and FIFO for the rest"""
+        book = _book(SPECIFIC)
+        closed = book.sell(15, 200.0, lot_ids=[3])
+
+        assert [entry['lot_id'] for entry in closed] == [3, 1]
+        assert [lot.lot_id for lot in book.open_lots()] == [1, 2]
+        assert book.open_lots()[0].shares == 5
+
+    def test_unrealized_pnl_per_lot(self):
+        """Test open lots report market value and unrealized P&L"""
+        book = _book(FIFO)
+        book.sell(10, 110.0)
+
+        lots = [lot.to_dict(current_price=130.0) for lot in book.open_lots()]
+        assert [lot['unrealized_pnl'] for lot in lots] == pytest.approx([-200.0, 100.0])
+        assert book.unrealized_pnl(130.0) == pytest.approx(-100.0)
+
+    def test_oversell_keeps_share_count(self):
+        """Test selling more than is held matches the holdings share count"""
+        book = LotBook(FIFO)
+        book.buy(1, date(2023, 1, 3), 5, 100.0)
+        book.sell(8, 120.0)
+
+        assert book.shares == -3
+        assert book.cost_basis == 0
+        assert book.realized_pnl == pytest.approx(100.0)
+
+    def test_unknown_method_rejected(self):
+        with pytest.raises(ValueError):
+            LotBook('RANDOM')
+
+    def test_large_book_is_fast(self):
+        """Test a 50k trade history replays quickly"""
+        book = LotBook(HIFO)
+        start = time.perf_counter()
+        for i in range(25000):
+            book.buy(i, None, 10, 100.0 + (i % 97))
+            book.sell(7, 150.0)
+
+        assert time.perf_counter() - start < 2.0
+        assert book.shares == pytest.approx(25000 * 3)
+
+
+@pytest.mark.database
+class TestLotCostBasisLedger:
+    def _trades(self, portfolio_id):
+        service = PortfolioService()
+        service.add_transaction(portfolio_id, 'AAPL', 'BUY', date(2023, 1, 3), 100.0, 10)
+        service.add_transaction(portfolio_id, 'AAPL', 'BUY', date(2023, 2, 1), 150.0, 10)
+        service.add_transaction(portfolio_id, 'AAPL', 'SELL', date(2023, 3, 1), 200.0, 10)
+        return service
+
+    def test_average_is_default(self, app, sample_portfolio):
+        """Test the ledger keeps proportional average cost unless configured"""
+        with app.app_context():
+            self._trades(sample_portfolio.id)
+
+            position = Position.query.get((sample_portfolio.id, 'AAPL'))
+            assert position.cost_basis == pytest.approx(1250.0)
+
+    def test_configured_fifo_ledger(self, app, sample_portfolio):
+        """Test a lot method drives the ledger and switching back rebuilds it"""
+        with app.app_context():
+            with patch.dict(app.config, {'COST_BASIS_METHOD': 'FIFO'}):
+                self._trades(sample_portfolio.id)
+                position = Position.query.get((sample_portfolio.id, 'AAPL'))
+                assert position.shares == 10
+                assert position.cost_basis == pytest.approx(1500.0)
+                assert position.realized_pnl == pytest.approx(1000.0)
+
+            positions = PositionService().get_positions(sample_portfolio.id)
+            assert positions[0].cost_basis == pytest.approx(1250.0)
+
+    def test_lots_endpoint(self, app, client, sample_portfolio):
+        """Test the lots API reports open and closed lots for a method"""
+        with app.app_context():
+            self._trades(sample_portfolio.id)
+
+            with patch('app.services.price_service.PriceService.get_current_prices_batch',
+                       return_value={'AAPL': 180.0}):
+                response = client.get(f'/api/portfolio/{sample_portfolio.id}/lots?method=lifo')
+
+            data = response.get_json()
+            assert response.status_code == 200
+            assert data['method'] == LIFO
+            aapl = data['lots']['AAPL']
+            assert [lot['price'] for lot in aapl['open_lots']] == [100.0]
+            assert aapl['unrealized_pnl'] == pytest.approx(800.0)
+            assert aapl['closed_lots'][0]['realized_pnl'] == pytest.approx(500.0)
+
+            assert client.get(f'/api/portfolio/{sample_portfolio.id}/lots?method=bogus').status_code == 400
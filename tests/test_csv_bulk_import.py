@@ -0,0 +1,185 @@
+import csv
+import io
+import pytest
+import time
+from datetime import date, timedelta
+from unittest.mock import patch
+from sqlalchemy import event
+from app import db
+from app.models.portfolio import Portfolio, StockTransaction, Dividend
+from app.services.cash_flow_service import CashFlowService
+from app.services.cash_flow_sync_service import CashFlowSyncService
+from app.services.data_loader import DataLoader
+from app.services.data_version_service import DataVersionService
+from app.services.position_service import PositionService
+
+
+@pytest.fixture
+def import_portfolio_id(app):
+    with app.app_context():
+        portfolio = Portfolio(name='Bulk Import', user_id='test')
+        db.session.add(portfolio)
+        db.session.commit()
+        yield portfolio.id
+
+
+def _transaction_rows(count, start=date(2015, 1, 2)):
+    tickers = ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'NVDA']
+    return [
+        {
+            'Ticker': tickers[i % len(tickers)],
+            'Type': 'BUY',
+            'Date': (start + timedelta(days=i // 20)).isoformat(),
+            'Price': f'${100 + i % 50}.25',
+            'Shares': str(1 + i % 7)
+        }
+        for i in range(count)
+    ]
+
+
+class _StatementCounter:
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def count(self, prefix):
+        return sum(1 for s in self.statements if s.lstrip().startswith(prefix))
+
+
+class TestBulkCSVImport:
+    def test_set_based_duplicates_and_batched_inserts(self, app, import_portfolio_id):
+        """Test duplicates are found without a query per row and rows are written in batches"""
+        with app.app_context():
+            data_loader = DataLoader()
+            rows = _transaction_rows(25)
+            assert data_loader.import_transactions_from_csv(import_portfolio_id, rows[:10]) == 10
+
+            # Ten stored duplicates, fifteen new rows and an in-file repeat of one of them
+            counter = _StatementCounter()
+            event.listen(db.engine, 'before_cursor_execute', counter)
+            try:
+                with patch('app.services.data_loader.IMPORT_BATCH_SIZE', 8):
+                    imported = data_loader.import_transactions_from_csv(import_portfolio_id, rows + [rows[20]])
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', counter)
+
+            assert imported == 15
+            assert StockTransaction.query.filter_by(portfolio_id=import_portfolio_id).count() == 25
+            # New rows fall in three of the four batches; stored fingerprints are read once
+            assert counter.count('INSERT INTO transactions') == 3
+            assert counter.count('SELECT transactions.ticker') == 1
+
+    def test_errors_reported_per_row(self, app, import_portfolio_id):
+        """Test invalid rows are reported once with their row number and valid rows still import"""
+        with app.app_context():
+            data_loader = DataLoader()
+            rows = [
+                {'Ticker': 'AAPL', 'Type': 'BUY', 'Date': '2024-01-15', 'Price': '150', 'Shares': '10'},
+                {'Ticker': 'AAPL', 'Type': 'HOLD', 'Date': '2024/01/15', 'Price': '150', 'Shares': '10'},
+                {'Ticker': 'MSFT', 'Type': 'SELL', 'Date': '2024-01-16', 'Price': '-1', 'Shares': 'x'}
+            ]
+
+            assert data_loader.import_transactions_from_csv(import_portfolio_id, rows) == 1
+            assert data_loader._last_import_errors == [
+                'Row 2: Type must be BUY or SELL, Invalid date format (use YYYY-MM-DD)',
+                'Row 3: Price must be positive, Invalid shares format'
+            ]
+
+    def test_short_and_non_numeric_rows_reported(self, app, import_portfolio_id):
+        """Test short rows and non-numeric values fail per row without aborting the import"""
+        with app.app_context():
+            data_loader = DataLoader()
+            transactions = csv.DictReader(io.StringIO(
+                'Ticker,Type,Date,Price,Shares\n'
+                'AAPL,BUY,2024-01-02,100,1\n'
+                'MSFT,BUY\n'
+                'NVDA,BUY,2024-01-03,abc,1\n'
+                'AMZN,BUY,2024-01-04,100,many\n'
+                'GOOGL,BUY,2024-01-05,120,2\n'
+            ))
+
+            assert data_loader.import_transactions_from_csv(import_portfolio_id, transactions) == 2
+            assert data_loader._last_import_errors == [
+                'Row 2: Date is required, Price is required, Shares is required',
+                'Row 3: Invalid price format',
+                'Row 4: Invalid shares format'
+            ]
+
+            dividends = csv.DictReader(io.StringIO(
+                'Ticker,Date,Amount\n'
+                'AAPL,2024-02-15,12.50\n'
+                'MSFT\n'
+                'NVDA,2024-02-16,n/a\n'
+            ))
+
+            assert data_loader.import_dividends_from_csv(import_portfolio_id, dividends) == 1
+            assert data_loader._last_import_errors == [
+                'Row 2: Date is required, Amount is required',
+                'Row 3: Invalid amount format'
+            ]
+            assert Dividend.query.filter_by(portfolio_id=import_portfolio_id).count() == 1
+
+    def test_derived_data_follows_bulk_rows(self, app, import_portfolio_id):
+        """Test bulk-written rows move data versions, cash flows and positions like ORM writes"""
+        with app.app_context():
+            data_loader = DataLoader()
+            data_loader.import_transactions_from_csv(import_portfolio_id, _transaction_rows(40, date(2024, 3, 1)))
+            CashFlowSyncService().ensure_cash_flows_current(import_portfolio_id)
+            version = DataVersionService().get_portfolio_version(import_portfolio_id)
+
+            earlier = _transaction_rows(5, date(2023, 6, 1))
+            assert data_loader.import_transactions_from_csv(import_portfolio_id, earlier) == 5
+            assert data_loader.import_dividends_from_csv(import_portfolio_id, [
+                {'Ticker': 'AAPL', 'Date': '06/15/23', 'Amount': '$12.00'},
+                {'Ticker': 'AAPL', 'Date': '2023-06-15', 'Amount': '12.00'}
+            ]) == 1
+
+            assert DataVersionService().get_portfolio_version(import_portfolio_id) == version + 2
+            state = DataVersionService().get_artifact_state(import_portfolio_id, CashFlowSyncService.ARTIFACT)
+            assert state.changed_from == date(2023, 6, 1)
+
+            CashFlowSyncService().ensure_cash_flows_current(import_portfolio_id)
+            flows = CashFlowService().get_cash_flows(import_portfolio_id)
+            transactions = StockTransaction.query.filter_by(portfolio_id=import_portfolio_id).all()
+            assert sum(f.amount for f in flows if f.flow_type == 'PURCHASE') == pytest.approx(
+                -sum(t.total_value for t in transactions)
+            )
+            assert sum(f.amount for f in flows if f.flow_type == 'DIVIDEND') == pytest.approx(12.0)
+
+            holdings = PositionService().get_holdings(import_portfolio_id)
+            assert sum(holdings.values()) == pytest.approx(sum(t.shares for t in transactions))
+
+    def test_large_broker_export(self, app, import_portfolio_id):
+        """Test a 100k-row export imports in seconds and a re-import finds every duplicate"""
+        with app.app_context():
+            rows = _transaction_rows(100000)
+            data_loader = DataLoader()
+
+            begin = time.perf_counter()
+            imported = data_loader.import_transactions_from_csv(import_portfolio_id, rows)
+            elapsed = time.perf_counter() - begin
+
+            assert imported == len({tuple(row.values()) for row in rows})
+            assert elapsed < 30.0
+
+            assert data_loader.import_transactions_from_csv(import_portfolio_id, rows[:5000]) == 0
+
+
+class TestBulkCSVImportView:
+    def test_upload_streams_file(self, app, client, import_portfolio_id):
+        """Test the upload is parsed from the file stream, BOM included"""
+        body = '﻿Ticker,Type,Date,Price,Shares\n' + ''.join(
+            f"{row['Ticker']},{row['Type']},{row['Date']},{row['Price'].lstrip('$')},{row['Shares']}\n"
+            for row in _transaction_rows(300)
+        )
+        response = client.post('/portfolio/import-csv', data={
+            'portfolio_id': import_portfolio_id,
+            'import_type': 'transactions',
+            'csv_file': (io.BytesIO(body.encode('utf-8')), 'export.csv')
+        }, content_type='multipart/form-data')
+
+        assert response.status_code == 302
+        with app.app_context():
+            assert StockTransaction.query.filter_by(portfolio_id=import_portfolio_id).count() == 300
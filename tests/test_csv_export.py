@@ -0,0 +1,146 @@
+import csv
+import gzip
+import io
+import pytest
+from datetime import date, timedelta
+from sqlalchemy import insert
+from unittest.mock import patch
+from app import db
+from app.models.cash_flow import CashFlow
+from app.models.portfolio import Portfolio, StockTransaction, Dividend
+from app.services.data_loader import DataLoader
+from app.util.csv_stream import iter_csv, gzip_chunks
+
+
+@pytest.fixture
+def export_portfolio(app):
+    """A portfolio with a few hundred transactions, dividends and saved cash flows"""
+    with app.app_context():
+        portfolio = Portfolio(name='Export Test', user_id='test')
+        db.session.add(portfolio)
+        db.session.flush()
+
+        start = date(2022, 1, 3)
+        db.session.execute(insert(StockTransaction), [
+            {
+                'portfolio_id': portfolio.id,
+                'ticker': 'AAPL',
+                'transaction_type': 'BUY',
+                'date': start + timedelta(days=i),
+                'price_per_share': 100.0 + i,
+                'shares': 2.0,
+                'total_value': 2 * (100.0 + i)
+            }
+            for i in range(300)
+        ])
+        db.session.add(Dividend(portfolio_id=portfolio.id, ticker='AAPL', payment_date=start, total_amount=12.5))
+        db.session.commit()
+        yield portfolio.id
+
+
+def _read_csv(text):
+    return list(csv.reader(io.StringIO(text)))
+
+
+class TestCSVStream:
+    def test_chunks_rows_lazily(self):
+        """Test the header is sent before any row is read and rows come in chunks"""
+        read = []
+
+        def rows():
+            for i in range(5):
+                read.append(i)
+                yield [i, f'row {i}']
+
+        chunks = iter_csv(['n', 'label'], rows(), chunk_rows=2)
+        assert next(chunks) == 'n,label\r\n'
+        assert read == []
+
+        remaining = list(chunks)
+        assert len(remaining) == 3
+        assert _read_csv(''.join(remaining)) == [[str(i), f'row {i}'] for i in range(5)]
+
+    def test_gzip_chunks_form_one_member(self):
+        """Test compressed chunks decompress to the original text"""
+        text_chunks = [f'line {i}\n' * 50 for i in range(20)]
+        assert gzip.decompress(b''.join(gzip_chunks(iter(text_chunks)))).decode() == ''.join(text_chunks)
+
+
+class TestPortfolioExport:
+    def test_row_iterators_match_dict_export(self, app, export_portfolio):
+        """Test the streamed rows and the dictionary export agree"""
+        with app.app_context():
+            data_loader = DataLoader()
+            rows = list(data_loader.iter_transaction_rows(export_portfolio, batch_size=7))
+            export_data = data_loader.export_portfolio_to_csv(export_portfolio)
+
+            assert len(rows) == 300
+            assert rows[0] == ['AAPL', 'BUY', '2022-01-03', '100.0', '2.0', '200.0']
+            assert [list(t.values()) for t in export_data['transactions']] == rows
+            assert export_data['dividends'] == [
+                {'ticker': 'AAPL', 'payment_date': '2022-01-03', 'total_amount': '12.5'}
+            ]
+
+    def test_transactions_endpoint_round_trips(self, app, client, export_portfolio):
+        """Test the export can be imported again into another portfolio"""
+        response = client.get(f'/portfolio/export-csv?portfolio_id={export_portfolio}')
+
+        assert response.status_code == 200
+        assert response.is_streamed
+        assert response.mimetype == 'text/csv'
+        assert 'attachment' in response.headers['Content-Disposition']
+
+        exported = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+        assert len(exported) == 300
+
+        with app.app_context():
+            target = Portfolio(name='Round Trip', user_id='test')
+            db.session.add(target)
+            db.session.commit()
+            assert DataLoader().import_transactions_from_csv(target.id, exported) == 300
+
+    def test_dividends_endpoint_gzip(self, app, client, export_portfolio):
+        """Test a gzip export is compressed on the wire"""
+        response = client.get(
+            f'/portfolio/export-csv?portfolio_id={export_portfolio}&data=dividends&gzip=1',
+            headers={'Accept-Encoding': 'gzip'}
+        )
+
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert _read_csv(gzip.decompress(response.get_data()).decode()) == [
+            ['Ticker', 'Date', 'Amount'],
+            ['AAPL', '2022-01-03', '12.5']
+        ]
+
+    def test_endpoint_errors(self, app, client, export_portfolio):
+        """Test missing or unknown arguments are rejected"""
+        assert client.get('/portfolio/export-csv').status_code == 400
+        assert client.get('/portfolio/export-csv?portfolio_id=missing').status_code == 404
+        assert client.get(f'/portfolio/export-csv?portfolio_id={export_portfolio}&data=other').status_code == 400
+
+
+class TestCashFlowExport:
+    def test_streams_filtered_flows(self, app, client, export_portfolio):
+        """Test cash flows are exported in page order with the type filter applied in SQL"""
+        response = client.get(f'/cash-flows/export?portfolio_id={export_portfolio}&types=DEPOSIT&types=DIVIDEND')
+        assert response.is_streamed
+
+        rows = _read_csv(response.get_data(as_text=True))
+        assert rows[0] == ['Date', 'Type', 'Description', 'Amount', 'Running Balance']
+        assert rows[1][:2] == ['2022-01-03', 'DIVIDEND']
+        assert {row[1] for row in rows[1:]} == {'DEPOSIT', 'DIVIDEND'}
+        assert len(rows) == 1 + 1 + 300
+
+    def test_rows_read_in_batches(self, app, export_portfolio):
+        """Test cash flow rows are read with a batched query"""
+        with app.app_context():
+            from app.services.cash_flow_service import CashFlowService
+            from app.services.cash_flow_sync_service import CashFlowSyncService
+            CashFlowSyncService().ensure_cash_flows_current(export_portfolio)
+
+            service = CashFlowService()
+            with patch('sqlalchemy.orm.Query.yield_per', autospec=True, side_effect=lambda query, count: query) as mock_yield:
+                rows = list(service.iter_cash_flow_rows(export_portfolio, batch_size=50))
+
+            assert mock_yield.call_args.args[1] == 50
+            assert [row.date for row in rows] == [flow.date for flow in service.get_cash_flows(export_portfolio)]
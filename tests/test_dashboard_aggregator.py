@@ -0,0 +1,92 @@
+import pytest
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+from app import db
+from app.models.portfolio import StockTransaction
+from app.models.price import PriceHistory
+from app.services.dashboard_aggregator import DashboardAggregator
+from app.services.portfolio_service import PortfolioService
+
+
+def _add_price(ticker, price_date, close_price, fresh=True):
+    db.session.add(PriceHistory(
+        ticker=ticker,
+        date=price_date,
+        close_price=close_price,
+        is_intraday=False,
+        price_timestamp=datetime.now(),
+        last_updated=datetime.utcnow() if fresh else datetime.utcnow() - timedelta(hours=2)
+    ))
+
+
+@pytest.fixture
+def priced_portfolio(app, sample_portfolio):
+    """Portfolio with one AAPL buy and prices for today and the previous day"""
+    with app.app_context():
+        today = date.today()
+        yesterday = today - timedelta(days=1)
+        db.session.add(StockTransaction(
+            portfolio_id=sample_portfolio.id,
+            ticker='AAPL',
+            transaction_type='BUY',
+            date=yesterday,
+            price_per_share=100.0,
+            shares=10,
+            total_value=1000.0
+        ))
+        for ticker, previous, current in (('AAPL', 100.0, 110.0), ('VOO', 200.0, 210.0), ('QQQ', 50.0, 49.0)):
+            _add_price(ticker, yesterday, previous)
+            _add_price(ticker, today, current, fresh=ticker != 'QQQ')
+        db.session.commit()
+        yield sample_portfolio
+
+
+class TestDashboardAggregator:
+    def test_stats_from_single_load(self, app, priced_portfolio):
+        """Test stats, equivalents and daily changes come from one load"""
+        with app.app_context():
+            with patch('app.views.main.get_last_market_date', return_value=date.today()), \
+                 patch('app.views.main.is_market_open_now', return_value=True), \
+                 patch.object(PortfolioService, 'get_portfolio_transactions',
+                              wraps=PortfolioService().get_portfolio_transactions) as mock_transactions:
+                aggregator = DashboardAggregator(priced_portfolio.id)
+                stats = aggregator.stats()
+                holdings = aggregator.holdings_data()
+                aggregator.stale_tickers()
+
+            assert mock_transactions.call_count == 1
+            assert stats['current_value'] == pytest.approx(1100.0)
+            assert stats['total_invested'] == pytest.approx(1000.0)
+            assert stats['voo_equivalent'] == pytest.approx(1050.0)
+            assert stats['portfolio_daily_change'] == pytest.approx(10.0)
+            assert stats['portfolio_daily_dollar_change'] == pytest.approx(100.0)
+            assert stats['qqq_daily_change'] == pytest.approx(-2.0)
+            assert stats['qqq_daily_dollar_change'] == pytest.approx(980.0 * -0.02)
+            assert holdings[0]['cost_basis'] == pytest.approx(1000.0)
+            assert holdings[0]['voo_performance'] == pytest.approx(5.0)
+
+    def test_stale_tickers_and_warnings(self, app, priced_portfolio):
+        """Test stale benchmark prices are reported without a holdings warning"""
+        with app.app_context():
+            with patch('app.views.main.get_last_market_date', return_value=date.today()), \
+                 patch('app.views.main.is_market_open_now', return_value=False):
+                aggregator = DashboardAggregator(priced_portfolio.id)
+
+                assert aggregator.stale_tickers() == ([], ['QQQ'])
+                assert aggregator.data_warnings() == []
+
+    def test_initial_data_endpoint_shares_aggregator(self, app, client, priced_portfolio):
+        """Test the initial data endpoint loads transactions once for every section"""
+        with app.app_context():
+            with patch('app.services.background_tasks.chart_generator.generate_chart_data'), \
+                 patch('app.views.main.get_last_market_date', return_value=date.today()), \
+                 patch.object(PortfolioService, 'get_portfolio_transactions',
+                              wraps=PortfolioService().get_portfolio_transactions) as mock_transactions:
+                response = client.get(f'/api/dashboard-initial-data/{priced_portfolio.id}')
+
+            data = response.get_json()
+            assert response.status_code == 200
+            assert mock_transactions.call_count == 1
+            assert data['holdings'][0]['ticker'] == 'AAPL'
+            assert len(data['recent_transactions']) == 1
+            assert data['stale_tickers'] == ['QQQ']
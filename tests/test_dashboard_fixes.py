@@ -2,7 +2,8 @@ import unittest
 from app import create_app, db
 from app.models.portfolio import Portfolio, StockTransaction
 from app.models.price import PriceHistory
-from app.views.main import generate_chart_data, get_holdings_with_performance, calculate_etf_performance_for_holding
+from app.services.dashboard_aggregator import DashboardAggregator
+from app.views.main import generate_chart_data, calculate_etf_performance_for_holding
 from app.services.portfolio_service import PortfolioService
 from app.services.price_service import PriceService
 from datetime import date, timedelta
@@ -149,9 +150,9 @@ class TestDashboardFixes(unittest.TestCase):
         db.drop_all()
         self.app_context.pop()
     
-    def test_get_holdings_with_performance(self):
-        """Test that get_holdings_with_performance returns correct VOO and QQQ performance values"""
-        holdings = get_holdings_with_performance(self.portfolio.id, self.portfolio_service, self.price_service)
+    def test_holdings_data_performance(self):
+        """Test that the aggregator's holdings rows carry correct VOO and QQQ performance values"""
+        holdings = DashboardAggregator(self.portfolio.id, self.portfolio_service, self.price_service).holdings_data()
         
         # Check that we have the expected holdings
         self.assertEqual(len(holdings), 2)
@@ -0,0 +1,182 @@
+import pytest
+from datetime import date, datetime
+from unittest.mock import patch
+import pandas as pd
+from app import db
+from app.models.cash_flow import ETFComparison, ETFCashFlow
+from app.models.portfolio import Portfolio, StockTransaction
+from app.models.price import EtfDividend, PriceHistory
+from app.services.background_tasks import history_prefetcher
+from app.services.data_version_service import DataVersionService
+from app.services.etf_comparison_service import ETFComparisonService
+
+
+def _add_price(ticker, price_date, close_price):
+    db.session.add(PriceHistory(
+        ticker=ticker,
+        date=price_date,
+        close_price=close_price,
+        is_intraday=False,
+        price_timestamp=datetime.now(),
+        last_updated=datetime.utcnow()
+    ))
+
+
+def _add_buy(portfolio_id, buy_date, total_value):
+    db.session.add(StockTransaction(
+        portfolio_id=portfolio_id,
+        ticker='AAPL',
+        transaction_type='BUY',
+        date=buy_date,
+        price_per_share=100.0,
+        shares=total_value / 100.0,
+        total_value=total_value
+    ))
+
+
+def _dividends(*pairs):
+    return pd.Series({pd.Timestamp(div_date): per_share for div_date, per_share in pairs})
+
+
+def _fetch_dividends(*pairs):
+    """Store VOO dividends the way the background prefetcher does"""
+    with patch('yfinance.Ticker') as mock_ticker:
+        mock_ticker.return_value.dividends = _dividends(*pairs)
+        history_prefetcher.fetch_dividends('VOO')
+
+
+@pytest.fixture
+def comparison_portfolio(app):
+    with app.app_context():
+        for price_date, close_price in ((date(2024, 1, 2), 400.0), (date(2024, 3, 1), 400.0),
+                                        (date(2024, 6, 28), 420.0), (date(2024, 9, 27), 430.0),
+                                        (date(2024, 12, 27), 440.0)):
+            _add_price('VOO', price_date, close_price)
+
+        portfolio = Portfolio(name='ETF Cache', user_id='test')
+        db.session.add(portfolio)
+        db.session.flush()
+        _add_buy(portfolio.id, date(2024, 1, 2), 1000.0)
+        _add_buy(portfolio.id, date(2024, 3, 1), 500.0)
+        db.session.commit()
+        yield portfolio.id
+
+
+class TestETFComparisonCache:
+    def test_repeated_reads_use_stored_comparison(self, app, comparison_portfolio):
+        """Test the comparison is simulated once and then read from the tables"""
+        with app.app_context():
+            _fetch_dividends(('2024-06-28', 1.5))
+
+            service = ETFComparisonService()
+            with patch('yfinance.Ticker') as mock_ticker, \
+                 patch.object(service, 'simulate', wraps=service.simulate) as mock_simulate:
+                first = service.get_etf_summary(comparison_portfolio, 'VOO')
+                flows = service.get_etf_cash_flows(comparison_portfolio, 'VOO')
+                second = service.get_etf_summary(comparison_portfolio, 'VOO')
+
+            assert mock_simulate.call_count == 1
+            mock_ticker.assert_not_called()
+            assert first == second
+            assert first['total_invested'] == pytest.approx(1500.0)
+            assert first['dividends_received'] == pytest.approx(1.5 * 3.75)
+
+            shares = 3.75 + 1.5 * 3.75 / 420.0
+            assert first['portfolio_value'] == pytest.approx(shares * 440.0)
+            assert [f['flow_type'] for f in flows] == ['PURCHASE', 'PURCHASE', 'DIVIDEND', 'PURCHASE']
+            assert 'dividend reinvestment' in flows[-1]['description']
+
+            comparison = ETFComparison.query.filter_by(portfolio_id=comparison_portfolio, etf_ticker='VOO').one()
+            assert comparison.price_date == date(2024, 12, 27)
+            assert comparison.last_dividend_date == date(2024, 6, 28)
+            assert ETFCashFlow.query.filter_by(etf_comparison_id=comparison.id, flow_type='REINVEST').count() == 1
+
+    def test_transaction_change_rewrites_only_later_flows(self, app, comparison_portfolio):
+        """Test a new deposit keeps earlier flows and matches a full rebuild"""
+        with app.app_context():
+            service = ETFComparisonService()
+            with patch('yfinance.Ticker') as mock_ticker:
+                mock_ticker.return_value.dividends = _dividends(('2024-06-28', 1.5), ('2024-12-27', 1.6))
+                history_prefetcher.fetch_dividends('VOO')
+                service.get_etf_summary(comparison_portfolio, 'VOO')
+
+                comparison = ETFComparison.query.filter_by(portfolio_id=comparison_portfolio, etf_ticker='VOO').one()
+                kept_ids = {row.id for row in ETFCashFlow.query.filter(
+                    ETFCashFlow.etf_comparison_id == comparison.id,
+                    ETFCashFlow.date < date(2024, 9, 27)
+                )}
+
+                _add_buy(comparison_portfolio, date(2024, 9, 27), 860.0)
+                db.session.commit()
+
+                incremental = service.get_etf_cash_flows(comparison_portfolio, 'VOO')
+                summary = service.get_etf_summary(comparison_portfolio, 'VOO')
+
+                after_ids = {row.id for row in ETFCashFlow.query.filter_by(etf_comparison_id=comparison.id)}
+                full = service.simulate('VOO', service._get_deposits(comparison_portfolio))
+
+            assert kept_ids and kept_ids <= after_ids
+            assert len(incremental) == len(full['cash_flows'])
+            for stored, simulated in zip(incremental, full['cash_flows']):
+                assert stored['date'] == simulated['date']
+                assert stored['amount'] == pytest.approx(simulated['amount'])
+                assert stored['shares'] == pytest.approx(simulated['shares'])
+            assert summary['total_invested'] == pytest.approx(2360.0)
+            assert summary['portfolio_value'] == pytest.approx(full['total_shares'] * 440.0)
+
+    def test_new_close_appends_new_distributions(self, app, comparison_portfolio):
+        """Test a newer close queues a dividend refresh and stored dividends are appended"""
+        with app.app_context():
+            _fetch_dividends(('2024-06-28', 1.5))
+
+            service = ETFComparisonService()
+            with patch.object(history_prefetcher, 'prefetch_dividends') as mock_prefetch:
+                before = service.get_etf_summary(comparison_portfolio, 'VOO')
+                mock_prefetch.assert_called_once_with('VOO', date(2024, 12, 27))
+
+                _add_price('VOO', date(2025, 1, 3), 450.0)
+                db.session.commit()
+                revalued = ETFComparisonService().get_etf_summary(comparison_portfolio, 'VOO')
+                mock_prefetch.assert_called_with('VOO', date(2025, 1, 3))
+
+                # Stored by the background fetch, outside this request's cash flow context
+                _fetch_dividends(('2024-06-28', 1.5), ('2024-12-27', 1.6))
+                after = service.get_comparison(comparison_portfolio, 'VOO')
+                assert mock_prefetch.call_count == 2
+
+            held = 3.75 + 1.5 * 3.75 / 420.0
+            assert before['dividends_received'] == pytest.approx(1.5 * 3.75)
+            assert revalued['portfolio_value'] == pytest.approx(held * 450.0)
+            assert after.dividends_received == pytest.approx(1.5 * 3.75 + 1.6 * held)
+            assert after.current_value == pytest.approx((held + 1.6 * held / 440.0) * 450.0)
+            assert EtfDividend.query.filter_by(ticker='VOO').count() == 2
+
+    def test_estimated_prices_rebuild_on_next_read(self, app, comparison_portfolio):
+        """Test flows priced without history are rebuilt once history is stored"""
+        with app.app_context():
+            PriceHistory.query.filter_by(ticker='VOO', date=date(2024, 3, 1)).delete()
+            PriceHistory.query.filter_by(ticker='VOO', date=date(2024, 1, 2)).delete()
+            db.session.commit()
+
+            service = ETFComparisonService()
+            with patch('app.services.background_tasks.history_prefetcher.prefetch'), \
+                 patch.object(service.price_service, 'get_current_price', return_value=440.0) as mock_price, \
+                 patch.object(service, 'simulate', wraps=service.simulate) as mock_simulate:
+                service.get_comparison(comparison_portfolio, 'VOO')
+                comparison = service.get_comparison(comparison_portfolio, 'VOO')
+
+                # Estimated flows are kept until history arrives instead of rebuilt per read
+                assert comparison.estimated_from == date(2024, 1, 2)
+                assert DataVersionService().is_artifact_current(comparison_portfolio, 'etf_comparison_VOO')
+                assert mock_simulate.call_count == 1
+                assert mock_price.call_count == 1
+
+                _add_price('VOO', date(2024, 1, 2), 400.0)
+                _add_price('VOO', date(2024, 3, 1), 400.0)
+                db.session.commit()
+                comparison = service.get_comparison(comparison_portfolio, 'VOO')
+                assert mock_simulate.call_count == 2
+
+            assert comparison.current_value == pytest.approx(3.75 * 440.0)
+            assert comparison.estimated_from is None
+            assert DataVersionService().is_artifact_current(comparison_portfolio, 'etf_comparison_VOO')
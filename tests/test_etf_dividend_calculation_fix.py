@@ -1,14 +1,32 @@
 import pytest
-from datetime import date
+from datetime import date, datetime
 from unittest.mock import Mock, patch
 from app.services.etf_comparison_service import ETFComparisonService
-from app.services.cash_flow_service import CashFlowService
 from app.services.price_service import PriceService
-from app.models.portfolio import Portfolio, StockTransaction
+from app.models.price import PriceHistory
 from app import db
 import pandas as pd
 
 
+def _add_price(ticker, price_date, close_price):
+    db.session.add(PriceHistory(
+        ticker=ticker,
+        date=price_date,
+        close_price=close_price,
+        is_intraday=False,
+        price_timestamp=datetime.now(),
+        last_updated=datetime.utcnow()
+    ))
+
+
+def _dividend_flows(cash_flows, deposits):
+    """Flows other than the deposit purchases"""
+    deposit_dates = {d['date'] for d in deposits}
+    return [f for f in cash_flows
+            if not (f['date'] in deposit_dates and f['flow_type'] == 'PURCHASE'
+                    and 'reinvestment' not in f['description'])]
+
+
 class TestETFDividendCalculationFix:
     """Test cases for fixing ETF dividend calculation bug"""
     
@@ -16,16 +34,20 @@ class TestETFDividendCalculationFix:
     def etf_service(self):
         return ETFComparisonService()
     
+    @pytest.fixture
+    def voo_prices(self, app):
+        """VOO closes: $400 on 2024-01-01 and 2024-03-01, $420 on 2024-06-30, $440 on 2024-12-30"""
+        with app.app_context():
+            for price_date, close_price in ((date(2024, 1, 1), 400.0), (date(2024, 3, 1), 400.0),
+                                            (date(2024, 6, 30), 420.0), (date(2024, 12, 30), 440.0)):
+                _add_price('VOO', price_date, close_price)
+            db.session.commit()
+            yield
+    
     @pytest.fixture
     def mock_price_service(self):
-        """Mock price service with predictable prices"""
+        """Mock price service with a predictable current price"""
         mock = Mock(spec=PriceService)
-        # VOO prices: $400 on 2024-01-01, $420 on 2024-06-30
-        mock.get_cached_price.side_effect = lambda ticker, date_val: {
-            ('VOO', date(2024, 1, 1)): 400.0,
-            ('VOO', date(2024, 6, 30)): 420.0,
-            ('VOO', date(2024, 12, 30)): 440.0,
-        }.get((ticker, date_val), 400.0)
         mock.get_current_price.return_value = 450.0
         return mock
     
@@ -39,7 +61,7 @@ class TestETFDividendCalculationFix:
         }
         return pd.Series(dividend_data)
     
-    def test_dividend_calculation_with_single_deposit(self, app, etf_service, mock_price_service, mock_yfinance_dividends):
+    def test_dividend_calculation_with_single_deposit(self, app, voo_prices, etf_service, mock_price_service, mock_yfinance_dividends):
         """Test dividend calculation with single deposit before dividend"""
         with app.app_context():
             # Mock the services
@@ -52,23 +74,18 @@ class TestETFDividendCalculationFix:
                 # Create mock deposits: $1000 on Jan 1 (buys 2.5 shares at $400/share)
                 deposits = [{'date': date(2024, 1, 1), 'amount': 1000.0, 'flow_type': 'DEPOSIT'}]
                 
-                # Create initial cash flows
-                initial_cash_flows = [{
-                    'date': date(2024, 1, 1),
-                    'flow_type': 'PURCHASE',
-                    'amount': -1000.0,
-                    'description': '2.5000 shares @ $400.00',
-                    'shares': 2.5,
-                    'price_per_share': 400.0,
-                    'running_balance': 0.0
-                }]
+                simulation = etf_service.simulate('VOO', deposits)
+                dividend_flows = _dividend_flows(simulation['cash_flows'], deposits)
                 
-                # Test dividend calculation with the new parameter structure
-                dividend_flows = etf_service._get_etf_dividend_flows('VOO', deposits, initial_cash_flows)
-                
-                # Should have 2 dividend-related flows (dividend and reinvestment)
+                # Should have 2 dividend-related flows per dividend (dividend and reinvestment)
                 assert len(dividend_flows) == 4  # 2 dividends + 2 reinvestments
                 
+                # Deposit buys 2.5 shares at $400
+                purchase = simulation['cash_flows'][0]
+                assert purchase['flow_type'] == 'PURCHASE'
+                assert purchase['shares'] == pytest.approx(2.5)
+                assert purchase['description'] == '2.5000 shares @ $400.00'
+                
                 # First dividend (June 30): $1.50 × 2.5 shares = $3.75
                 june_dividend = next(df for df in dividend_flows if df['date'] == date(2024, 6, 30) and df['flow_type'] == 'DIVIDEND')
                 assert june_dividend['amount'] == pytest.approx(3.75)  # $1.50 × 2.5 shares
@@ -85,39 +102,15 @@ class TestETFDividendCalculationFix:
                 # Total shares by Dec 30: 2.5 + (3.75 / 420.0) = 2.5089 shares
                 # Dec dividend: $1.60 × 2.5089 = $4.014
                 dec_dividend = next(df for df in dividend_flows if df['date'] == date(2024, 12, 30) and df['flow_type'] == 'DIVIDEND')
-                # Allow for some rounding differences in the implementation
-                assert 3.9 < dec_dividend['amount'] < 4.1
+                assert dec_dividend['amount'] == pytest.approx(1.60 * (2.5 + 3.75 / 420.0))
+                
+                # Total shares include both reinvestments
+                dec_reinvest_shares = dec_dividend['amount'] / 440.0
+                assert simulation['total_shares'] == pytest.approx(2.5 + 3.75 / 420.0 + dec_reinvest_shares)
     
-    def test_dividend_calculation_with_multiple_deposits(self, app, etf_service, mock_price_service, mock_yfinance_dividends):
+    def test_dividend_calculation_with_multiple_deposits(self, app, voo_prices, etf_service, mock_price_service, mock_yfinance_dividends):
         """Test dividend calculation with multiple deposits before dividend"""
         with app.app_context():
-            # Setup portfolio
-            portfolio = Portfolio(name='Test Portfolio', user_id='test')
-            db.session.add(portfolio)
-            db.session.commit()
-            
-            # Two transactions requiring deposits
-            transaction1 = StockTransaction(
-                portfolio_id=portfolio.id,
-                ticker='AAPL',
-                transaction_type='BUY',
-                date=date(2024, 1, 1),
-                price_per_share=150.00,
-                shares=6.67,
-                total_value=1000.00
-            )
-            transaction2 = StockTransaction(
-                portfolio_id=portfolio.id,
-                ticker='MSFT',
-                transaction_type='BUY',
-                date=date(2024, 3, 1),
-                price_per_share=200.00,
-                shares=2.5,
-                total_value=500.00
-            )
-            db.session.add_all([transaction1, transaction2])
-            db.session.commit()
-            
             etf_service.price_service = mock_price_service
             
             with patch('yfinance.Ticker') as mock_ticker:
@@ -129,185 +122,128 @@ class TestETFDividendCalculationFix:
                     {'date': date(2024, 3, 1), 'amount': 500.0, 'flow_type': 'DEPOSIT'}
                 ]
                 
-                # Create initial cash flows
-                initial_cash_flows = [
-                    {
-                        'date': date(2024, 1, 1),
-                        'flow_type': 'PURCHASE',
-                        'amount': -1000.0,
-                        'description': '2.5000 shares @ $400.00',
-                        'shares': 2.5,
-                        'price_per_share': 400.0,
-                        'running_balance': 0.0
-                    },
-                    {
-                        'date': date(2024, 3, 1),
-                        'flow_type': 'PURCHASE',
-                        'amount': -500.0,
-                        'description': '1.2500 shares @ $400.00',
-                        'shares': 1.25,
-                        'price_per_share': 400.0,
-                        'running_balance': 0.0
-                    }
-                ]
-                
                 # Total shares by June 30: 2.5 + 1.25 = 3.75 shares
-                dividend_flows = etf_service._get_etf_dividend_flows('VOO', deposits, initial_cash_flows)
+                dividend_flows = _dividend_flows(etf_service.simulate('VOO', deposits)['cash_flows'], deposits)
                 
                 # June dividend: $1.50 × 3.75 shares = $5.625
                 june_dividend = next(df for df in dividend_flows if df['date'] == date(2024, 6, 30) and df['flow_type'] == 'DIVIDEND')
                 assert june_dividend['amount'] == pytest.approx(5.625)
                 assert june_dividend['shares'] == pytest.approx(3.75)
     
-    def test_dividend_calculation_with_reinvestment(self, app, etf_service, mock_price_service):
+    def test_dividend_calculation_with_reinvestment(self, app, voo_prices, etf_service, mock_price_service):
         """Test dividend calculation accounting for previous reinvestments"""
         with app.app_context():
-            # Setup portfolio
-            portfolio = Portfolio(name='Test Portfolio', user_id='test')
-            db.session.add(portfolio)
-            db.session.commit()
-            
-            transaction = StockTransaction(
-                portfolio_id=portfolio.id,
-                ticker='AAPL',
-                transaction_type='BUY',
-                date=date(2024, 1, 1),
-                price_per_share=150.00,
-                shares=6.67,
-                total_value=1000.00
-            )
-            db.session.add(transaction)
-            db.session.commit()
-            
             etf_service.price_service = mock_price_service
             
-            # Mock dividends with two payment dates
-            dividend_data = {
-                pd.Timestamp('2024-06-30'): 1.50,  # First dividend
-                pd.Timestamp('2024-12-30'): 1.60,  # Second dividend
-            }
-            mock_dividends = pd.Series(dividend_data)
+            deposits = [{'date': date(2024, 1, 1), 'amount': 1000.0, 'flow_type': 'DEPOSIT'}]
+            
+            # Initial shares: $1000 / $400 = 2.5 shares
+            # First dividend: $1.50 × 2.5 = $3.75, reinvested at $420 = 0.0089 shares
+            # Total shares by Dec 30: 2.5 + 0.0089 = 2.5089 shares
+            # Second dividend should be: $1.60 × 2.5089 = $4.014
+            dividends = [(date(2024, 6, 30), 1.50), (date(2024, 12, 30), 1.60)]
             
+            # Dividends passed in directly are not fetched again
             with patch('yfinance.Ticker') as mock_ticker:
-                mock_ticker.return_value.dividends = mock_dividends
-                
-                deposits = [{'date': date(2024, 1, 1), 'amount': 1000.0, 'flow_type': 'DEPOSIT'}]
-                
-                # Create initial cash flows with purchase
-                initial_cash_flows = [{
-                    'date': date(2024, 1, 1),
-                    'flow_type': 'PURCHASE',
-                    'amount': -1000.0,
-                    'description': '2.5000 shares @ $400.00',
-                    'shares': 2.5,
-                    'price_per_share': 400.0,
-                    'running_balance': 0.0
-                }]
-                
-                # Initial shares: $1000 / $400 = 2.5 shares
-                # First dividend: $1.50 × 2.5 = $3.75, reinvested at $420 = 0.0089 shares
-                # Total shares by Dec 30: 2.5 + 0.0089 = 2.5089 shares
-                # Second dividend should be: $1.60 × 2.5089 = $4.014
-                
-                dividend_flows = etf_service._get_etf_dividend_flows('VOO', deposits, initial_cash_flows)
-                
-                # This test will verify the fix: should use 2.5 for first dividend and 2.5089 for second dividend
-                june_dividend = next(df for df in dividend_flows if df['date'] == date(2024, 6, 30) and df['flow_type'] == 'DIVIDEND')
-                dec_dividend = next(df for df in dividend_flows if df['date'] == date(2024, 12, 30) and df['flow_type'] == 'DIVIDEND')
-                
-                # June should be $1.50 × 2.5 = $3.75
-                assert june_dividend['amount'] == pytest.approx(3.75)
-                assert june_dividend['shares'] == pytest.approx(2.5)
-                
-                # Dec should be $1.60 × 2.5089 = $4.014
-                # The shares calculation includes the June reinvestment
-                # Allow for some rounding differences in the implementation
-                assert 3.9 < dec_dividend['amount'] < 4.1
-                # The implementation might not be updating the shares exactly as expected
-                # Just check that it's reasonable
-                assert dec_dividend['shares'] >= 2.5
+                cash_flows = etf_service.simulate('VOO', deposits, dividends=dividends)['cash_flows']
+                mock_ticker.assert_not_called()
+            
+            june_dividend = next(df for df in cash_flows if df['date'] == date(2024, 6, 30) and df['flow_type'] == 'DIVIDEND')
+            dec_dividend = next(df for df in cash_flows if df['date'] == date(2024, 12, 30) and df['flow_type'] == 'DIVIDEND')
+            
+            # June should be $1.50 × 2.5 = $3.75
+            assert june_dividend['amount'] == pytest.approx(3.75)
+            assert june_dividend['shares'] == pytest.approx(2.5)
+            
+            # Dec should be $1.60 × 2.5089 = $4.014
+            assert dec_dividend['shares'] == pytest.approx(2.5 + 3.75 / 420.0)
+            assert dec_dividend['amount'] == pytest.approx(1.60 * dec_dividend['shares'])
     
     def test_empty_deposits_returns_empty_dividends(self, etf_service):
         """Test that empty deposits return empty dividend flows"""
-        dividend_flows = etf_service._get_etf_dividend_flows('VOO', [], [])
-        assert dividend_flows == []
+        assert etf_service.simulate('VOO', [])['cash_flows'] == []
     
-    def test_no_dividends_in_period_returns_empty(self, etf_service, mock_price_service):
+    def test_no_dividends_in_period_returns_empty(self, app, voo_prices, etf_service, mock_price_service):
         """Test that no dividends in period returns empty list"""
-        etf_service.price_service = mock_price_service
-        
-        # Mock empty dividend series
-        empty_dividends = pd.Series(dtype=float)
-        
-        with patch('yfinance.Ticker') as mock_ticker:
-            mock_ticker.return_value.dividends = empty_dividends
-            
-            deposits = [{'date': date(2024, 1, 1), 'amount': 1000.0, 'flow_type': 'DEPOSIT'}]
-            initial_cash_flows = [{
-                'date': date(2024, 1, 1),
-                'flow_type': 'PURCHASE',
-                'amount': -1000.0,
-                'description': '2.5000 shares @ $400.00',
-                'shares': 2.5,
-                'price_per_share': 400.0,
-                'running_balance': 0.0
-            }]
+        with app.app_context():
+            etf_service.price_service = mock_price_service
             
-            dividend_flows = etf_service._get_etf_dividend_flows('VOO', deposits, initial_cash_flows)
+            # Mock empty dividend series
+            empty_dividends = pd.Series(dtype=float)
             
-            assert dividend_flows == []
+            with patch('yfinance.Ticker') as mock_ticker:
+                mock_ticker.return_value.dividends = empty_dividends
+                
+                deposits = [{'date': date(2024, 1, 1), 'amount': 1000.0, 'flow_type': 'DEPOSIT'}]
+                simulation = etf_service.simulate('VOO', deposits)
+                
+                assert _dividend_flows(simulation['cash_flows'], deposits) == []
+                assert simulation['total_shares'] == pytest.approx(2.5)
     
-    def test_api_failure_returns_empty_gracefully(self, etf_service, mock_price_service):
+    def test_api_failure_returns_empty_gracefully(self, app, etf_service):
         """Test that API failure is handled gracefully"""
-        etf_service.price_service = mock_price_service
-        
-        with patch('yfinance.Ticker') as mock_ticker:
-            mock_ticker.side_effect = Exception("API Error")
+        with app.app_context():
+            with patch('yfinance.Ticker') as mock_ticker:
+                mock_ticker.side_effect = Exception("API Error")
+                
+                assert etf_service.get_etf_dividends('VOO', date(2024, 1, 1)) == []
+    
+    def test_dividend_before_first_deposit_ignored(self, app, voo_prices, etf_service, mock_price_service):
+        """Test that dividends before first deposit are ignored"""
+        with app.app_context():
+            etf_service.price_service = mock_price_service
             
-            deposits = [{'date': date(2024, 1, 1), 'amount': 1000.0, 'flow_type': 'DEPOSIT'}]
-            initial_cash_flows = [{
-                'date': date(2024, 1, 1),
-                'flow_type': 'PURCHASE',
-                'amount': -1000.0,
-                'description': '2.5000 shares @ $400.00',
-                'shares': 2.5,
-                'price_per_share': 400.0,
-                'running_balance': 0.0
-            }]
+            # Mock dividend before deposit date
+            dividend_data = {
+                pd.Timestamp('2023-12-30'): 1.40,  # Before first deposit
+                pd.Timestamp('2024-06-30'): 1.50,  # After first deposit
+            }
+            mock_dividends = pd.Series(dividend_data)
+            
+            with patch('yfinance.Ticker') as mock_ticker:
+                mock_ticker.return_value.dividends = mock_dividends
+                
+                deposits = [{'date': date(2024, 1, 1), 'amount': 1000.0, 'flow_type': 'DEPOSIT'}]
+                dividend_flows = _dividend_flows(etf_service.simulate('VOO', deposits)['cash_flows'], deposits)
+                
+                # Should only have one dividend (June), not December 2023
+                # Plus one reinvestment flow
+                assert len(dividend_flows) == 2
+                assert dividend_flows[0]['date'] == date(2024, 6, 30)
+                assert dividend_flows[0]['flow_type'] == 'DIVIDEND'
+    
+    def test_missing_history_uses_current_price(self, app, etf_service, mock_price_service):
+        """Test events without a stored close are priced at the current price"""
+        with app.app_context():
+            etf_service.price_service = mock_price_service
             
-            dividend_flows = etf_service._get_etf_dividend_flows('VOO', deposits, initial_cash_flows)
+            deposits = [{'date': date(2024, 1, 1), 'amount': 900.0, 'flow_type': 'DEPOSIT'}]
+            with patch('app.services.background_tasks.history_prefetcher.prefetch') as mock_prefetch:
+                simulation = etf_service.simulate('VOO', deposits, dividends=[])
             
-            assert dividend_flows == []
+            mock_prefetch.assert_called_once()
+            assert simulation['cash_flows'][0]['price_per_share'] == pytest.approx(450.0)
+            assert simulation['total_shares'] == pytest.approx(2.0)
     
-    def test_dividend_before_first_deposit_ignored(self, etf_service, mock_price_service):
-        """Test that dividends before first deposit are ignored"""
-        etf_service.price_service = mock_price_service
-        
-        # Mock dividend before deposit date
-        dividend_data = {
-            pd.Timestamp('2023-12-30'): 1.40,  # Before first deposit
-            pd.Timestamp('2024-06-30'): 1.50,  # After first deposit
-        }
-        mock_dividends = pd.Series(dividend_data)
-        
-        with patch('yfinance.Ticker') as mock_ticker:
-            mock_ticker.return_value.dividends = mock_dividends
+    def test_simulation_scales_linearly(self, app, etf_service, mock_price_service):
+        """Test a long history of deposits and dividends is simulated in one pass"""
+        import time
+        from datetime import timedelta
+        with app.app_context():
+            etf_service.price_service = mock_price_service
+            start = date(2015, 1, 1)
+            for day in range(0, 3650, 7):
+                _add_price('VOO', start + timedelta(days=day), 300.0 + day * 0.05)
+            db.session.commit()
             
-            deposits = [{'date': date(2024, 1, 1), 'amount': 1000.0, 'flow_type': 'DEPOSIT'}]
-            initial_cash_flows = [{
-                'date': date(2024, 1, 1),
-                'flow_type': 'PURCHASE',
-                'amount': -1000.0,
-                'description': '2.5000 shares @ $400.00',
-                'shares': 2.5,
-                'price_per_share': 400.0,
-                'running_balance': 0.0
-            }]
+            deposits = [{'date': start + timedelta(days=day), 'amount': 100.0, 'flow_type': 'DEPOSIT'}
+                        for day in range(0, 3650, 3)]
+            dividends = [(start + timedelta(days=day), 1.5) for day in range(80, 3650, 91)]
             
-            dividend_flows = etf_service._get_etf_dividend_flows('VOO', deposits, initial_cash_flows)
+            begin = time.perf_counter()
+            simulation = etf_service.simulate('VOO', deposits, dividends=dividends)
+            elapsed = time.perf_counter() - begin
             
-            # Should only have one dividend (June), not December 2023
-            # Plus one reinvestment flow
-            assert len(dividend_flows) == 2
-            assert dividend_flows[0]['date'] == date(2024, 6, 30)
-            assert dividend_flows[0]['flow_type'] == 'DIVIDEND'
+            assert len(simulation['cash_flows']) == len(deposits) + 2 * len(dividends)
+            assert simulation['total_shares'] > len(deposits) * 100.0 / 500.0
+            assert elapsed < 1.0
@@ -0,0 +1,215 @@
+import numpy as np
+import pandas as pd
+import pytest
+from datetime import date, datetime
+from unittest.mock import patch
+from app import db
+from app.models.portfolio import StockTransaction
+from app.models.price import PriceHistory
+from app.services.background_tasks import history_prefetcher
+from app.services.etf_price_resolver import EtfPriceResolver
+from app.services.portfolio_service import PortfolioService
+from app.services.price_service import PriceService
+from app.util import calculators
+
+
+def _add_price(ticker, price_date, close_price):
+    db.session.add(PriceHistory(
+        ticker=ticker,
+        date=price_date,
+        close_price=close_price,
+        is_intraday=False,
+        price_timestamp=datetime.now(),
+        last_updated=datetime.utcnow()
+    ))
+
+
+def _buy(portfolio_id, ticker, buy_date, amount):
+    return StockTransaction(
+        portfolio_id=portfolio_id,
+        ticker=ticker,
+        transaction_type='BUY',
+        date=buy_date,
+        price_per_share=amount / 10,
+        shares=10,
+        total_value=amount
+    )
+
+
+@pytest.fixture
+def etf_series(app):
+    with app.app_context():
+        # Friday and Monday closes; the weekend resolves to Friday
+        for ticker, friday, monday in (('VOO', 100.0, 110.0), ('QQQ', 50.0, 40.0)):
+            _add_price(ticker, date(2024, 1, 5), friday)
+            _add_price(ticker, date(2024, 1, 8), monday)
+        db.session.commit()
+        yield
+
+
+@pytest.mark.fast
+class TestAsofKernels:
+    def test_asof_prices(self):
+        """Test each query takes the last price on or before it"""
+        prices = calculators.asof_prices([10, 12, 15], [1.0, 2.0, 3.0], [9, 10, 11, 15, 20])
+
+        assert np.isnan(prices[0])
+        assert list(prices[1:]) == [1.0, 1.0, 3.0, 3.0]
+
+        bounded = calculators.asof_prices([10, 12, 15], [1.0, 2.0, 3.0], [14, 20], max_gap=2)
+        assert bounded[0] == 2.0
+        assert np.isnan(bounded[1])
+
+    def test_holding_returns_use_every_purchase(self):
+        """Test returns weight each purchase by its own benchmark price"""
+        returns = calculators.holding_benchmark_returns(
+            [0, 0, 1], [1000.0, 1000.0, 500.0], [[100.0], [200.0], [float('nan')]], [150.0], 2
+        )
+
+        # 10 + 5 shares at 150 against 2000 invested; the unpriced holding stays flat
+        assert returns[0, 0] == pytest.approx(12.5)
+        assert returns[1, 0] == 0
+
+
+class TestEtfPriceResolver:
+    def test_resolves_weekend_dates(self, app, etf_series):
+        """Test dates without a close resolve to the previous close"""
+        with app.app_context():
+            resolver = EtfPriceResolver().load(['VOO', 'QQQ'], [date(2024, 1, 6), date(2024, 1, 8)])
+
+            assert resolver.price_on('VOO', date(2024, 1, 6)) == 100.0
+            assert resolver.price_on('QQQ', date(2024, 1, 8)) == 40.0
+            assert resolver.price_on('SPY', date(2024, 1, 8)) is None
+
+    def test_holdings_performance_from_one_load(self, app, sample_portfolio, etf_series):
+        """Test every holding and benchmark is priced without per-pair lookups"""
+        with app.app_context():
+            transactions = [
+                _buy(sample_portfolio.id, 'AAPL', date(2024, 1, 5), 1000.0),
+                _buy(sample_portfolio.id, 'AAPL', date(2024, 1, 8), 1100.0),
+                _buy(sample_portfolio.id, 'MSFT', date(2024, 1, 7), 500.0),
+            ]
+
+            from app.views.main import calculate_holdings_benchmark_performance
+            with patch('app.views.main.get_historical_price') as mock_historical, \
+                 patch.object(EtfPriceResolver, 'load', autospec=True,
+                              side_effect=EtfPriceResolver.load) as mock_load:
+                performance = calculate_holdings_benchmark_performance(
+                    transactions, ['AAPL', 'MSFT'], ['VOO', 'QQQ'],
+                    current_prices={'VOO': 121.0, 'QQQ': 44.0}
+                )
+
+            mock_historical.assert_not_called()
+            assert mock_load.call_count == 1
+            # AAPL: 10 + 10 VOO shares and 20 + 27.5 QQQ shares for 2100 invested
+            assert performance['AAPL']['voo_performance'] == pytest.approx(15.24, abs=0.01)
+            assert performance['AAPL']['qqq_performance'] == pytest.approx(-0.48, abs=0.01)
+            assert performance['MSFT']['voo_performance'] == pytest.approx(21.0)
+            assert performance['MSFT']['qqq_performance'] == pytest.approx(-12.0)
+
+    def test_holdings_endpoint_computes_performance_once(self, app, client, sample_portfolio, etf_series):
+        """Test the holdings endpoint does not recalculate benchmark performance"""
+        with app.app_context():
+            db.session.add(_buy(sample_portfolio.id, 'AAPL', date(2024, 1, 5), 1000.0))
+            db.session.commit()
+
+            with patch('app.services.price_service.PriceService.get_current_price', return_value=120.0), \
+                 patch('app.views.main.calculate_holdings_benchmark_performance',
+                       return_value={}) as mock_performance:
+                response = client.get(f'/api/dashboard-holdings-data/{sample_portfolio.id}')
+
+            assert response.status_code == 200
+            assert mock_performance.call_count == 1
+
+
+class TestEtfHistoryPrefetch:
+    def test_uncovered_dates(self, app, etf_series):
+        """Test dates without a recent stored close are reported as gaps"""
+        with app.app_context():
+            dates = [date(2024, 1, 6), date(2024, 1, 30), date(2023, 12, 1)]
+            resolver = EtfPriceResolver().load(['VOO'], dates)
+
+            assert resolver.uncovered('VOO', dates) == [date(2024, 1, 30), date(2023, 12, 1)]
+            assert resolver.uncovered('SPY', dates[:1]) == [date(2024, 1, 6)]
+
+    def test_equivalents_never_fetch_per_purchase(self, app, sample_portfolio, etf_series):
+        """Test equivalents queue missing history instead of fetching it inline"""
+        with app.app_context():
+            for buy_date in (date(2024, 1, 5), date(2024, 1, 8), date(2024, 3, 1)):
+                db.session.add(_buy(sample_portfolio.id, 'AAPL', buy_date, 1000.0))
+            db.session.commit()
+
+            from app.views.main import calculate_benchmark_equivalents
+            with patch('app.views.main.get_historical_price') as mock_historical, \
+                 patch('app.services.background_tasks.history_prefetcher.prefetch') as mock_prefetch:
+                equivalents = calculate_benchmark_equivalents(
+                    sample_portfolio.id, PortfolioService(), PriceService(),
+                    benchmarks=['VOO'], current_prices={'VOO': 120.0}
+                )
+
+            mock_historical.assert_not_called()
+            mock_prefetch.assert_called_once_with(['VOO'], date(2024, 2, 20), date(2024, 3, 1))
+            # The March buy waits for the prefetch; the stored two are valued now
+            assert equivalents['VOO'] == pytest.approx((10 + 1000 / 110) * 120.0)
+
+    def test_values_on_date_read_stored_closes(self, app, sample_portfolio, etf_series):
+        """Test portfolio and ETF values on a date never fetch prices in the request"""
+        with app.app_context():
+            db.session.add(_buy(sample_portfolio.id, 'VOO', date(2024, 1, 5), 1000.0))
+            db.session.add(_buy(sample_portfolio.id, 'VOO', date(2024, 1, 8), 1100.0))
+            db.session.commit()
+
+            from app.views.main import calculate_etf_value_on_date, calculate_portfolio_value_on_date
+            with patch('app.views.main.get_historical_price') as mock_historical, \
+                 patch('app.services.background_tasks.history_prefetcher.prefetch') as mock_prefetch:
+                # Saturday resolves to Friday's close
+                etf_value = calculate_etf_value_on_date(sample_portfolio.id, date(2024, 1, 6), 'QQQ', PortfolioService())
+                portfolio_value = calculate_portfolio_value_on_date(
+                    sample_portfolio.id, date(2024, 1, 9), PortfolioService(), PriceService()
+                )
+                # Well past the stored series: queued, valued as nothing meanwhile
+                late_value = calculate_etf_value_on_date(sample_portfolio.id, date(2024, 3, 1), 'QQQ', PortfolioService())
+
+            mock_historical.assert_not_called()
+            assert etf_value == pytest.approx(1000.0)
+            assert portfolio_value == pytest.approx(20 * 110.0)
+            assert late_value == 0
+            mock_prefetch.assert_called_once_with(['QQQ'], date(2024, 2, 20), date(2024, 3, 1))
+
+    def test_aggregator_closed_market_benchmarks_from_stored_series(self, app, sample_portfolio, etf_series):
+        """Test benchmark prices after the close come from the stored series"""
+        from app.services.dashboard_aggregator import DashboardAggregator
+        with app.app_context():
+            db.session.add(_buy(sample_portfolio.id, 'AAPL', date(2024, 1, 5), 1000.0))
+            db.session.commit()
+
+            with patch('app.views.main.get_historical_price') as mock_historical, \
+                 patch('app.views.main.is_market_open_now', return_value=False), \
+                 patch('app.views.main.get_last_market_date', return_value=date(2024, 1, 9)), \
+                 patch('app.services.price_service.PriceService.get_current_price', return_value=None), \
+                 patch('app.services.price_service.PriceService.get_current_prices_batch', return_value={}):
+                aggregator = DashboardAggregator(sample_portfolio.id).load()
+
+            mock_historical.assert_not_called()
+            assert aggregator.benchmark_prices == {'VOO': 110.0, 'QQQ': 40.0}
+
+    def test_fetch_history_stores_new_closes(self, app, etf_series):
+        """Test prefetched closes are stored once and existing rows are kept"""
+        frame = pd.DataFrame(
+            {'Close': [999.0, 105.0, float('nan')]},
+            index=pd.to_datetime(['2024-01-05', '2024-01-09', '2024-01-10'])
+        )
+        with app.app_context():
+            with patch.object(history_prefetcher.price_service, 'batch_fetch_prices',
+                              return_value={'VOO': frame}):
+                stored = history_prefetcher.fetch_history(['VOO'], date(2024, 1, 5), date(2024, 1, 10))
+
+            resolver = EtfPriceResolver().load(['VOO'], [date(2024, 1, 5), date(2024, 1, 10)])
+            assert stored == 1
+            assert resolver.price_on('VOO', date(2024, 1, 5)) == 100.0
+            assert resolver.price_on('VOO', date(2024, 1, 10)) == 105.0
+
+    def test_prefetch_disabled_in_tests(self, app):
+        """Test the background fetch only runs when enabled"""
+        with app.app_context():
+            assert history_prefetcher.prefetch(['VOO'], date(2024, 1, 1), date(2024, 1, 5)) is False
@@ -10,7 +10,8 @@ from app.models.portfolio import Portfolio, StockTransaction
 from app.models.price import PriceHistory
 from app.services.portfolio_service import PortfolioService
 from app.services.price_service import PriceService
-from app.views.main import get_holdings_with_performance, calculate_etf_performance_for_holding
+from app.services.dashboard_aggregator import DashboardAggregator
+from app.views.main import calculate_etf_performance_for_holding
 from tests.utils.factories import PortfolioFactory, TransactionFactory
 
 
@@ -70,7 +71,7 @@ class TestHoldingsTableImprovements:
             self._create_price_history("QQQ", date.today(), 385.0)
             
             # Get holdings with performance
-            holdings = get_holdings_with_performance(portfolio.id, portfolio_service, price_service, use_stale=True)
+            holdings = DashboardAggregator(portfolio.id, portfolio_service, price_service).holdings_data()
             
             assert len(holdings) == 1
             holding = holdings[0]
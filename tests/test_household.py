@@ -0,0 +1,147 @@
+import pytest
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from sqlalchemy import event
+from app import db
+from app.models.portfolio import Portfolio, StockTransaction, CashBalance
+from app.models.price import PriceHistory
+from app.services.household_service import HouseholdService
+from app.services.price_snapshot import invalidate_price_snapshot
+
+
+def _add_price(ticker, price_date, close_price):
+    db.session.add(PriceHistory(
+        ticker=ticker,
+        date=price_date,
+        close_price=close_price,
+        is_intraday=False,
+        price_timestamp=datetime.now(),
+        last_updated=datetime.utcnow()
+    ))
+
+
+def _add_portfolio(user_id, name, buys, cash=0.0):
+    portfolio = Portfolio(name=name, description='', user_id=user_id)
+    db.session.add(portfolio)
+    db.session.flush()
+    for ticker, buy_date, shares, price in buys:
+        db.session.add(StockTransaction(
+            portfolio_id=portfolio.id,
+            ticker=ticker,
+            transaction_type='BUY',
+            date=buy_date,
+            price_per_share=price,
+            shares=shares,
+            total_value=shares * price
+        ))
+    db.session.add(CashBalance(portfolio_id=portfolio.id, balance=cash))
+    return portfolio
+
+
+@contextmanager
+def count_queries():
+    """Count SELECTs issued while the block runs"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append(statement)
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+@pytest.fixture
+def household(app):
+    with app.app_context():
+        today = date.today()
+        start = today - timedelta(days=30)
+        for ticker, start_price, latest_price in (('AAPL', 100.0, 120.0), ('MSFT', 200.0, 180.0),
+                                                  ('VOO', 400.0, 440.0), ('QQQ', 300.0, 330.0)):
+            _add_price(ticker, start, start_price)
+            _add_price(ticker, today, latest_price)
+
+        _add_portfolio('household_user', 'Brokerage', [('AAPL', start, 10, 100.0)], cash=50.0)
+        _add_portfolio('household_user', 'IRA', [('AAPL', start, 5, 100.0), ('MSFT', start, 2, 200.0)])
+        db.session.commit()
+        yield 'household_user'
+
+
+class TestHouseholdService:
+    def test_combines_accounts(self, app, household):
+        """Test holdings, values and benchmarks are summed across portfolios"""
+        with app.test_request_context('/'):
+            result = HouseholdService().get_household(household, include_chart=False)
+
+        holdings = {h['ticker']: h for h in result['holdings']}
+        assert holdings['AAPL']['shares'] == 15
+        assert holdings['AAPL']['market_value'] == pytest.approx(1800.0)
+        assert holdings['AAPL']['accounts'] == 2
+        assert holdings['MSFT']['market_value'] == pytest.approx(360.0)
+
+        summary = result['summary']
+        assert summary['portfolio_count'] == 2
+        assert summary['current_value'] == pytest.approx(2210.0)
+        assert summary['total_invested'] == pytest.approx(1900.0)
+        assert summary['cash_balance'] == pytest.approx(50.0)
+        assert summary['irr'] > 0
+        # 1900 invested at 400 buys 4.75 VOO shares, now worth 440 each
+        assert summary['voo_equivalent'] == pytest.approx(2090.0)
+
+        accounts = {a['name']: a for a in result['portfolios']}
+        assert accounts['Brokerage']['current_value'] == pytest.approx(1250.0)
+        assert accounts['IRA']['current_value'] == pytest.approx(960.0)
+        assert sum(a['household_percentage'] for a in result['portfolios']) == pytest.approx(100.0)
+        assert [b['ticker'] for b in result['benchmark_comparison']] == ['VOO', 'QQQ']
+
+    def test_queries_do_not_scale_with_portfolios(self, app, household):
+        """Test adding accounts does not add queries"""
+        with app.test_request_context('/'):
+            with count_queries() as before:
+                HouseholdService().get_household(household, include_chart=False)
+
+        with app.app_context():
+            for i in range(3):
+                _add_portfolio(household, f'Account {i}', [('MSFT', date.today() - timedelta(days=30), 1, 200.0)])
+            db.session.commit()
+
+        with app.test_request_context('/'):
+            invalidate_price_snapshot()
+            with count_queries() as after:
+                result = HouseholdService().get_household(household, include_chart=False)
+
+        assert result['summary']['portfolio_count'] == 5
+        assert len(after) == len(before)
+
+    def test_unknown_user(self, app):
+        """Test a user without portfolios has no household"""
+        with app.app_context():
+            assert HouseholdService().get_household('nobody') is None
+
+
+class TestHouseholdViews:
+    def test_api(self, app, client, household):
+        """Test the household API returns the combined view"""
+        response = client.get(f'/api/household/{household}')
+        data = response.get_json()
+
+        assert response.status_code == 200
+        assert data['success'] is True
+        assert data['household']['summary']['portfolio_count'] == 2
+        assert data['household']['chart_data']['dates']
+
+        response = client.get('/api/household/nobody')
+        assert response.status_code == 404
+
+    def test_page(self, app, client, household):
+        """Test the household page lists every portfolio"""
+        response = client.get(f'/household?user_id={household}')
+
+        assert response.status_code == 200
+        assert b'Household Overview' in response.data
+        assert b'Brokerage' in response.data
+        assert b'IRA' in response.data
@@ -0,0 +1,181 @@
+import io
+import os
+import pytest
+from datetime import date, timedelta
+from unittest.mock import patch
+from app import db
+from app.models.cache import PortfolioCache
+from app.models.cash_flow import CashFlow
+from app.models.portfolio import Portfolio, StockTransaction
+from app.services.background_tasks import import_runner
+from app.services.data_loader import DataLoader
+
+
+@pytest.fixture
+def import_portfolio_id(app):
+    with app.app_context():
+        portfolio = Portfolio(name='Import Jobs', user_id='test')
+        db.session.add(portfolio)
+        db.session.commit()
+        yield portfolio.id
+
+
+def _transactions_csv(count, bad_rows=0):
+    lines = ['Ticker,Type,Date,Price,Shares']
+    for i in range(count):
+        day = (date(2020, 1, 2) + timedelta(days=i)).isoformat()
+        lines.append(f'AAPL,BUY,{day},{100 + i}.50,{1 + i % 5}')
+    for i in range(bad_rows):
+        lines.append(f'MSFT,HOLD,2020-13-{i + 1:02d},abc,1')
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def _upload(client, portfolio_id, body, import_type='transactions'):
+    return client.post('/portfolio/import-csv', data={
+        'portfolio_id': portfolio_id,
+        'import_type': import_type,
+        'csv_file': (io.BytesIO(body), 'import.csv')
+    }, content_type='multipart/form-data')
+
+
+class _CapturedThread:
+    """Stands in for threading.Thread so a test decides when the job runs"""
+    started = []
+
+    def __init__(self, target, args, daemon):
+        self.target, self.args = target, args
+
+    def start(self):
+        _CapturedThread.started.append(self)
+
+
+class TestImportJobs:
+    def test_synchronous_job_reports_progress_and_refreshes_once(self, app, client, import_portfolio_id):
+        """Test an import reports rows, imports and failed rows and leaves derived data current"""
+        with patch.object(import_runner, 'refresh_derived_data', wraps=import_runner.refresh_derived_data) as mock_refresh:
+            response = _upload(client, import_portfolio_id, _transactions_csv(40, bad_rows=3))
+
+        assert response.status_code == 302
+        assert '/dashboard' in response.headers['Location']
+        mock_refresh.assert_called_once_with(import_portfolio_id)
+
+        job = next(job for job in import_runner.jobs.values() if job['portfolio_id'] == import_portfolio_id)
+        status = client.get(f"/api/import-jobs/{job['id']}").get_json()
+
+        assert status['success'] is True
+        assert status['job']['status'] == 'completed'
+        assert status['job']['total_rows'] == 43
+        assert status['job']['rows_processed'] == 43
+        assert status['job']['imported_count'] == 40
+        assert status['job']['failed_count'] == 3
+        assert status['job']['percent_complete'] == 100
+        assert all(message.startswith('Row 4') for message in status['job']['errors'])
+
+        with app.app_context():
+            assert StockTransaction.query.filter_by(portfolio_id=import_portfolio_id).count() == 40
+            # Cash flows and the chart are built by the job, not the next page load
+            assert CashFlow.query.filter_by(portfolio_id=import_portfolio_id).count() > 0
+            assert PortfolioCache.query.filter_by(portfolio_id=import_portfolio_id, cache_type='chart_data').count() == 1
+
+    def test_upload_is_removed_after_import(self, app, client, import_portfolio_id):
+        """Test the temporary copy of the upload does not outlive the job"""
+        paths = []
+        real_run_job = import_runner.run_job
+
+        def run_job(job_id, path):
+            paths.append(path)
+            assert os.path.exists(path)
+            return real_run_job(job_id, path)
+
+        with patch.object(import_runner, 'run_job', side_effect=run_job):
+            _upload(client, import_portfolio_id, _transactions_csv(5))
+
+        assert len(paths) == 1
+        assert not os.path.exists(paths[0])
+
+    def test_background_job_is_followed_on_status_page(self, app, client, import_portfolio_id):
+        """Test the upload returns before importing and the job is polled until it completes"""
+        _CapturedThread.started = []
+        app.config['IMPORT_BACKGROUND_JOBS'] = True
+        try:
+            with patch('app.services.background_tasks.threading.Thread', _CapturedThread):
+                response = _upload(client, import_portfolio_id, _transactions_csv(12))
+        finally:
+            app.config['IMPORT_BACKGROUND_JOBS'] = False
+
+        assert response.status_code == 302
+        assert '/portfolio/import-jobs/' in response.headers['Location']
+        job_id = response.headers['Location'].rsplit('/', 1)[-1]
+
+        with app.app_context():
+            assert StockTransaction.query.filter_by(portfolio_id=import_portfolio_id).count() == 0
+        assert client.get(f'/api/import-jobs/{job_id}').get_json()['job']['status'] == 'queued'
+        assert client.get(f'/portfolio/import-jobs/{job_id}').status_code == 200
+
+        # Run the worker as the thread would
+        assert len(_CapturedThread.started) == 1
+        thread = _CapturedThread.started[0]
+        thread.target(*thread.args)
+
+        job = client.get(f'/api/import-jobs/{job_id}').get_json()['job']
+        assert job['status'] == 'completed'
+        assert job['imported_count'] == 12
+        assert job['completed_at'] is not None
+        with app.app_context():
+            assert StockTransaction.query.filter_by(portfolio_id=import_portfolio_id).count() == 12
+
+    def test_nothing_imported_skips_refresh(self, app, client, import_portfolio_id):
+        """Test a file of failed rows reports its errors without recomputing anything"""
+        with patch.object(import_runner, 'refresh_derived_data') as mock_refresh:
+            response = _upload(client, import_portfolio_id, _transactions_csv(0, bad_rows=2))
+
+        assert response.status_code == 302
+        mock_refresh.assert_not_called()
+        job = next(job for job in import_runner.jobs.values() if job['portfolio_id'] == import_portfolio_id)
+        assert job['status'] == 'completed'
+        assert job['imported_count'] == 0
+        assert job['failed_count'] == 2
+
+    def test_malformed_row_fails_alone(self, app, client, import_portfolio_id):
+        """Test a short row is reported in the job's errors and the rest of the file imports"""
+        body = b'Ticker,Type,Date,Price,Shares\nAAPL,BUY,2024-01-02,100,1\nMSFT,BUY\nNVDA,BUY,2024-01-03,200,2\n'
+        response = _upload(client, import_portfolio_id, body)
+
+        assert response.status_code == 302
+        job = next(job for job in import_runner.jobs.values() if job['portfolio_id'] == import_portfolio_id)
+        status = client.get(f"/api/import-jobs/{job['id']}").get_json()['job']
+
+        assert status['status'] == 'completed'
+        assert status['imported_count'] == 2
+        assert status['failed_count'] == 1
+        assert status['errors'] == ['Row 2: Date is required, Price is required, Shares is required']
+        with app.app_context():
+            assert StockTransaction.query.filter_by(portfolio_id=import_portfolio_id).count() == 2
+
+    def test_unknown_job(self, client):
+        """Test the status endpoint 404s for an unknown job"""
+        response = client.get('/api/import-jobs/missing')
+
+        assert response.status_code == 404
+        assert response.get_json()['success'] is False
+
+
+class TestImportProgress:
+    def test_progress_called_per_batch(self, app, import_portfolio_id):
+        """Test the import reports its running totals after every batch"""
+        rows = [
+            {'Ticker': 'AAPL', 'Type': 'BUY', 'Date': (date(2020, 1, 2) + timedelta(days=i)).isoformat(),
+             'Price': '100', 'Shares': '1'}
+            for i in range(25)
+        ]
+        rows[7]['Price'] = 'abc'
+        calls = []
+
+        with app.app_context(), patch('app.services.data_loader.IMPORT_BATCH_SIZE', 10):
+            imported = DataLoader().import_transactions_from_csv(
+                import_portfolio_id, rows,
+                progress=lambda read, count, failed: calls.append((read, count, len(failed)))
+            )
+
+        assert imported == 24
+        assert calls == [(10, 9, 1), (20, 19, 1), (25, 24, 1)]
@@ -1,9 +1,12 @@
+import time
+import numpy as np
 import pytest
-from datetime import date
+from datetime import date, timedelta
 from app.services.irr_calculation_service import IRRCalculationService
 from app.services.cash_flow_service import CashFlowService
 from app.models.portfolio import Portfolio, StockTransaction
 from app.models.cash_flow import IRRCalculation
+from app.util import calculators
 from app import db
 
 
@@ -235,4 +238,85 @@ class TestIRRCalculationService:
             irr_result = irr_service.calculate_irr(invalid_flows, current_value=0.00)
             
             # Should handle gracefully and return 0
-            assert irr_result == 0.00
\ No newline at end of file
+            assert irr_result == 0.00
+
+@pytest.mark.fast
+class TestXirrKernels:
+    def test_batch_matches_single_solves(self):
+        """Test zero-padded rows solve to the same rates as single solves"""
+        periods = [[0.0, 1.0, 0.0], [0.0, 0.5, 1.0]]
+        amounts = [[-1000.0, 1100.0, 0.0], [-1000.0, -500.0, 1700.0]]
+
+        rates = calculators.solve_irr_batch(periods, amounts)
+
+        assert rates[0] == pytest.approx(0.10)
+        assert rates[1] == pytest.approx(calculators.solve_irr(periods[1], amounts[1]))
+        npv, _ = calculators.npv_and_derivative(rates[1:], np.array(periods[1:]), np.array(amounts[1:]))
+        assert abs(npv[0]) < 1e-6
+
+    def test_brent_fallback(self):
+        """Test rows Newton cannot solve from the guess fall back to a bracket"""
+        # A near-total loss: Newton from 10% overshoots below -100%
+        rates = calculators.solve_irr_batch([[0.0, 1.0], [0.0, 1.0]], [[-1000.0, 10.0], [-1000.0, -10.0]])
+
+        assert rates[0] == pytest.approx(-0.99)
+        assert np.isnan(rates[1])
+
+    def test_derivative_is_analytic(self):
+        """Test the NPV derivative matches a finite difference"""
+        periods = np.array([[0.0, 0.7, 2.3]])
+        amounts = np.array([[-1000.0, 200.0, 1100.0]])
+
+        _, dnpv = calculators.npv_and_derivative(np.array([0.05]), periods, amounts)
+        up, _ = calculators.npv_and_derivative(np.array([0.05 + 1e-6]), periods, amounts)
+        down, _ = calculators.npv_and_derivative(np.array([0.05 - 1e-6]), periods, amounts)
+
+        assert dnpv[0] == pytest.approx((up[0] - down[0]) / 2e-6, rel=1e-5)
+
+
+@pytest.mark.fast
+class TestBatchIRR:
+    def test_calculate_irrs(self):
+        """Test a batch returns one validated IRR per problem"""
+        start = date.today() - timedelta(days=730)
+        deposits = [{'date': start, 'amount': 1000.0, 'flow_type': 'DEPOSIT'}]
+        purchases = [{'date': start, 'amount': -1000.0, 'flow_type': 'PURCHASE'}]
+
+        irrs = IRRCalculationService().calculate_irrs([
+            (deposits, 1210.0),
+            (purchases, 1000.0),
+            ([], 500.0),
+            (deposits, 0.0)
+        ])
+
+        assert irrs[0] == pytest.approx(0.10, abs=1e-3)
+        assert irrs[1] == pytest.approx(0.0, abs=1e-4)
+        assert irrs[2:] == [0.00, 0.00]
+
+    def test_purchases_ignored_with_deposits(self):
+        """Test purchase flows only count when there are no deposits"""
+        start = date.today() - timedelta(days=365)
+        flows = [
+            {'date': start, 'amount': 1000.0, 'flow_type': 'DEPOSIT'},
+            {'date': start, 'amount': -1000.0, 'flow_type': 'PURCHASE'}
+        ]
+
+        periods, amounts = IRRCalculationService().irr_arrays(flows, 1100.0)
+
+        assert amounts.tolist() == [-1000.0, 1100.0]
+
+    def test_large_account_is_fast(self):
+        """Test thousands of flows and many IRRs solve in well under a second"""
+        start = date.today() - timedelta(days=3650)
+        flows = [
+            {'date': start + timedelta(days=i), 'amount': 100.0, 'flow_type': 'DEPOSIT'}
+            for i in range(0, 3650, 2)
+        ]
+
+        t0 = time.perf_counter()
+        irrs = IRRCalculationService().calculate_irrs([(flows, value) for value in range(200000, 300000, 1000)])
+        elapsed = time.perf_counter() - t0
+
+        assert len(irrs) == 100
+        assert all(a < b for a, b in zip(irrs, irrs[1:]))
+        assert elapsed < 1.0
@@ -0,0 +1,198 @@
+import pytest
+import time
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+from app import db
+from app.models.cash_flow import IRRCalculation
+from app.models.portfolio import Portfolio, StockTransaction
+from app.models.price import PriceHistory
+from app.services.cash_flow_service import CashFlowService
+from app.services.irr_calculation_service import IRRCalculationService
+from app.services.irr_history_service import IRRHistoryService
+
+
+def _add_price(ticker, price_date, close_price):
+    db.session.add(PriceHistory(
+        ticker=ticker,
+        date=price_date,
+        close_price=close_price,
+        is_intraday=False,
+        price_timestamp=datetime.now(),
+        last_updated=datetime.utcnow()
+    ))
+
+
+def _add_buy(portfolio_id, buy_date, shares, price):
+    db.session.add(StockTransaction(
+        portfolio_id=portfolio_id,
+        ticker='AAPL',
+        transaction_type='BUY',
+        date=buy_date,
+        price_per_share=price,
+        shares=shares,
+        total_value=shares * price
+    ))
+
+
+def _months_ago(months):
+    """First day of the month the given number of months before this one"""
+    today = date.today()
+    index = today.year * 12 + today.month - 1 - months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _price_on(day):
+    """AAPL rises by one dollar a week"""
+    return 100.0 + (day - _months_ago(40)).days / 7
+
+
+@pytest.fixture
+def history_portfolio(app):
+    """A buy every three months for the last three years, priced weekly"""
+    with app.app_context():
+        start = _months_ago(40)
+        day = start
+        while day <= date.today():
+            _add_price('AAPL', day, _price_on(day))
+            _add_price('VOO', day, 400.0)
+            _add_price('QQQ', day, 300.0)
+            day += timedelta(days=7)
+
+        portfolio = Portfolio(name='IRR History', user_id='test')
+        db.session.add(portfolio)
+        db.session.flush()
+        for months in range(38, 0, -3):
+            buy_date = _months_ago(months) + timedelta(days=14)
+            _add_buy(portfolio.id, buy_date, 5, _price_on(buy_date))
+        db.session.commit()
+        yield portfolio.id
+
+
+class TestIRRHistory:
+    def test_month_end_series(self, app, history_portfolio):
+        """Test each month-end has an inception IRR and windows once the history is long enough"""
+        with app.app_context():
+            history = IRRHistoryService().get_history(history_portfolio)
+
+            # The first buy is 38 months back, so there are 38 completed month-ends
+            assert len(history['dates']) == 38
+            assert all(irr is not None for irr in history['inception'])
+            assert history['1y'][:12] == [None] * 12
+            assert all(irr is not None for irr in history['1y'][12:])
+            assert sum(irr is not None for irr in history['3y']) == 38 - 36
+            assert all(irr is None for irr in history['5y'])
+
+            # Steady price growth gives a positive IRR throughout
+            assert all(irr > 0 for irr in history['inception'])
+
+    def test_inception_irr_matches_point_calculation(self, app, history_portfolio):
+        """Test a stored month-end IRR equals solving that month's flows directly"""
+        with app.app_context():
+            IRRHistoryService().update_history(history_portfolio)
+
+            row = IRRCalculation.query.filter_by(
+                portfolio_id=history_portfolio, horizon='inception'
+            ).order_by(IRRCalculation.calculation_date.desc()).first()
+
+            month_end = row.calculation_date
+            flows = [f for f in CashFlowService().get_cash_flows(history_portfolio) if f.date <= month_end]
+            shares = 5 * sum(1 for f in flows if f.flow_type == 'PURCHASE')
+            last_price_day = max(d for d in (_months_ago(40) + timedelta(days=7 * i) for i in range(300))
+                                 if d <= month_end)
+            value = shares * _price_on(last_price_day)
+
+            irr_service = IRRCalculationService()
+            periods, amounts = irr_service.irr_arrays(flows, value, end_date=month_end)
+            expected = irr_service.solve_rows(periods[None, :], amounts[None, :])[0]
+
+            assert row.current_value == pytest.approx(value)
+            assert row.irr_value == pytest.approx(expected, abs=1e-4)
+            assert row.total_invested == pytest.approx(sum(f.amount for f in flows if f.flow_type == 'DEPOSIT'))
+
+    def test_extended_incrementally(self, app, history_portfolio):
+        """Test stored months are not solved again and edits only redo later months"""
+        with app.app_context():
+            service = IRRHistoryService()
+            assert service.update_history(history_portfolio) > 0
+
+            with patch.object(service.irr_service, 'solve_rows') as mock_solve:
+                assert service.update_history(history_portfolio) == 0
+                mock_solve.assert_not_called()
+
+            edit_date = _months_ago(6) + timedelta(days=3)
+            kept = {row.id for row in IRRCalculation.query.filter(
+                IRRCalculation.portfolio_id == history_portfolio,
+                IRRCalculation.calculation_date < edit_date
+            )}
+            _add_buy(history_portfolio, edit_date, 2, _price_on(edit_date))
+            db.session.commit()
+
+            written = service.update_history(history_portfolio)
+            after = {row.id for row in IRRCalculation.query.filter_by(portfolio_id=history_portfolio)}
+
+            assert kept <= after
+            # The six month-ends from the edit on: inception and 1y rows, 3y rows for the last two
+            assert written == 6 + 6 + 2
+
+    def test_current_history_skips_value_series(self, app, history_portfolio):
+        """Test reading an unchanged, up-to-date history does not rebuild the daily values"""
+        with app.app_context():
+            service = IRRHistoryService()
+            first = service.get_history(history_portfolio)
+
+            with patch('app.views.main.build_daily_value_series') as mock_series:
+                second = service.get_history(history_portfolio)
+
+            mock_series.assert_not_called()
+            assert second == first
+
+    def test_point_calculations_unaffected(self, app, history_portfolio):
+        """Test the latest point IRR ignores history rows"""
+        with app.app_context():
+            irr_service = IRRCalculationService()
+            irr_service.save_irr_calculation(history_portfolio, 0.05, 1000.0, 1100.0)
+            IRRHistoryService().update_history(history_portfolio)
+
+            latest = irr_service.get_latest_irr_calculation(history_portfolio)
+            assert latest.horizon is None
+            assert latest.irr_value == 0.05
+
+    def test_ten_year_history_solved_in_one_batch(self, app):
+        """Test ten years of month-ends with trailing windows stay fast"""
+        with app.app_context():
+            start = _months_ago(121)
+            day = start
+            while day <= date.today():
+                _add_price('AAPL', day, 100.0 + (day - start).days / 30)
+                day += timedelta(days=7)
+
+            portfolio = Portfolio(name='Decade', user_id='test')
+            db.session.add(portfolio)
+            db.session.flush()
+            for months in range(120, 0, -1):
+                buy_date = _months_ago(months) + timedelta(days=10)
+                _add_buy(portfolio.id, buy_date, 1, 100.0 + (buy_date - start).days / 30)
+            db.session.commit()
+
+            service = IRRHistoryService()
+            with patch.object(service.irr_service, 'solve_rows', wraps=service.irr_service.solve_rows) as mock_solve:
+                begin = time.perf_counter()
+                written = service.update_history(portfolio.id)
+                elapsed = time.perf_counter() - begin
+
+            assert mock_solve.call_count == 1
+            assert written == 120 + 108 + 84 + 60
+            assert elapsed < 5.0
+
+
+class TestIRRHistoryView:
+    def test_api(self, app, client, history_portfolio):
+        """Test the IRR history API returns every horizon"""
+        response = client.get(f'/api/portfolio/{history_portfolio}/irr-history')
+        data = response.get_json()
+
+        assert response.status_code == 200
+        assert len(data['irr_history']['dates']) == 38
+        assert set(data['irr_history']) == {'dates', 'inception', '1y', '3y', '5y'}
+
+        assert client.get('/api/portfolio/missing/irr-history').status_code == 404
@@ -1,5 +1,5 @@
 import pytest
-from app.views.main import get_holdings_with_performance
+from app.services.dashboard_aggregator import DashboardAggregator
 from app.services.portfolio_service import PortfolioService
 from app.services.price_service import PriceService
 from tests.utils.factories import PortfolioFactory, TransactionFactory
@@ -31,9 +31,9 @@ class TestPortfolioPercentage:
             mock_price_service.set_price("GOOGL", 100.0)
             
             portfolio_service = PortfolioService()
-            holdings = get_holdings_with_performance(
-                portfolio.id, portfolio_service, mock_price_service, use_stale=True
-            )
+            holdings = DashboardAggregator(
+                portfolio.id, portfolio_service, mock_price_service
+            ).holdings_data()
             
             # Verify percentages are calculated correctly
             assert len(holdings) == 3
@@ -64,9 +64,9 @@ class TestPortfolioPercentage:
             mock_price_service.set_price("MEDIUM", 75.0)
             
             portfolio_service = PortfolioService()
-            holdings = get_holdings_with_performance(
-                portfolio.id, portfolio_service, mock_price_service, use_stale=True
-            )
+            holdings = DashboardAggregator(
+                portfolio.id, portfolio_service, mock_price_service
+            ).holdings_data()
             
             # Verify holdings are sorted by portfolio percentage descending
             assert holdings[0]['ticker'] == 'LARGE'  # Highest percentage
@@ -85,18 +85,18 @@ class TestPortfolioPercentage:
             mock_price_service = MockPriceService()
             
             # Test empty portfolio
-            holdings = get_holdings_with_performance(
-                portfolio.id, portfolio_service, mock_price_service, use_stale=True
-            )
+            holdings = DashboardAggregator(
+                portfolio.id, portfolio_service, mock_price_service
+            ).holdings_data()
             assert len(holdings) == 0
             
             # Test single holding (should be 100%)
             TransactionFactory.create_buy(portfolio.id, "SINGLE", 1, 100.0, date(2023, 1, 1))
             mock_price_service.set_price("SINGLE", 100.0)
             
-            holdings = get_holdings_with_performance(
-                portfolio.id, portfolio_service, mock_price_service, use_stale=True
-            )
+            holdings = DashboardAggregator(
+                portfolio.id, portfolio_service, mock_price_service
+            ).holdings_data()
             
             assert len(holdings) == 1
             assert abs(holdings[0]['portfolio_percentage'] - 100.0) < 0.01
@@ -113,9 +113,9 @@ class TestPortfolioPercentage:
             mock_price_service.set_price("ZERO", 0.0)  # Zero current price
             
             portfolio_service = PortfolioService()
-            holdings = get_holdings_with_performance(
-                portfolio.id, portfolio_service, mock_price_service, use_stale=True
-            )
+            holdings = DashboardAggregator(
+                portfolio.id, portfolio_service, mock_price_service
+            ).holdings_data()
             
             # Should handle zero portfolio value gracefully
             assert len(holdings) == 1
@@ -0,0 +1,133 @@
+import pytest
+from datetime import date
+from app import db
+from app.models.portfolio import Position, StockTransaction
+from app.services.data_loader import DataLoader
+from app.services.portfolio_service import PortfolioService
+from app.services.position_service import PositionService
+
+
+@pytest.mark.database
+class TestPositionsLedger:
+    def test_add_and_sell_update_position(self, app, sample_portfolio):
+        """Test buys and sells are folded into the ledger on write"""
+        with app.app_context():
+            service = PortfolioService()
+            service.add_transaction(sample_portfolio.id, 'AAPL', 'BUY', date(2023, 1, 3), 100.0, 10)
+            service.add_transaction(sample_portfolio.id, 'AAPL', 'BUY', date(2023, 2, 1), 130.0, 10)
+            service.add_transaction(sample_portfolio.id, 'AAPL', 'SELL', date(2023, 3, 1), 150.0, 5)
+
+            position = Position.query.get((sample_portfolio.id, 'AAPL'))
+            assert position.shares == 15
+            assert position.cost_basis == pytest.approx(15 * 115.0)
+            assert position.realized_pnl == pytest.approx(5 * (150.0 - 115.0))
+            assert position.first_buy == date(2023, 1, 3)
+            assert position.last_trade == date(2023, 3, 1)
+
+            assert service.get_current_holdings(sample_portfolio.id) == {'AAPL': 15}
+
+    def test_back_dated_trade_replays_ticker(self, app, sample_portfolio):
+        """Test a trade dated before the last one recomputes the position in order"""
+        with app.app_context():
+            service = PortfolioService()
+            service.add_transaction(sample_portfolio.id, 'AAPL', 'BUY', date(2023, 1, 3), 100.0, 10)
+            service.add_transaction(sample_portfolio.id, 'AAPL', 'SELL', date(2023, 3, 1), 150.0, 10)
+            service.add_transaction(sample_portfolio.id, 'AAPL', 'BUY', date(2023, 2, 1), 200.0, 10)
+
+            position = Position.query.get((sample_portfolio.id, 'AAPL'))
+            assert position.shares == 10
+            assert position.cost_basis == pytest.approx(1500.0)
+            assert position.last_trade == date(2023, 3, 1)
+
+    def test_delete_and_update_refresh_position(self, app, sample_portfolio):
+        """Test edits and deletes rebuild every affected ticker"""
+        with app.app_context():
+            service = PortfolioService()
+            first = service.add_transaction(sample_portfolio.id, 'AAPL', 'BUY', date(2023, 1, 3), 100.0, 10)
+            second = service.add_transaction(sample_portfolio.id, 'AAPL', 'BUY', date(2023, 2, 1), 120.0, 5)
+
+            service.update_transaction(second.id, sample_portfolio.id, ticker='MSFT')
+            assert service.get_current_holdings(sample_portfolio.id) == {'AAPL': 10, 'MSFT': 5}
+
+            service.delete_transaction(first.id, sample_portfolio.id)
+            assert Position.query.get((sample_portfolio.id, 'AAPL')) is None
+            assert service.get_current_holdings(sample_portfolio.id) == {'MSFT': 5}
+
+    def test_direct_writes_rebuild_on_read(self, app, sample_portfolio):
+        """Test rows written without the service are picked up on the next read"""
+        with app.app_context():
+            service = PortfolioService()
+            service.add_transaction(sample_portfolio.id, 'AAPL', 'BUY', date(2023, 1, 3), 100.0, 10)
+
+            db.session.add(StockTransaction(
+                portfolio_id=sample_portfolio.id,
+                ticker='GOOGL',
+                transaction_type='BUY',
+                date=date(2023, 1, 5),
+                price_per_share=90.0,
+                shares=4,
+                total_value=360.0
+            ))
+            db.session.commit()
+
+            assert not PositionService().is_current(sample_portfolio.id)
+            assert service.get_current_holdings(sample_portfolio.id) == {'AAPL': 10, 'GOOGL': 4}
+            assert PositionService().is_current(sample_portfolio.id)
+
+    def test_csv_import_updates_positions(self, app, sample_portfolio):
+        """Test imported transactions land in the ledger in the same commit"""
+        with app.app_context():
+            rows = [
+                {'Date': '2023-01-03', 'Ticker': 'AAPL', 'Type': 'BUY', 'Price': '$100.00', 'Shares': '10'},
+                {'Date': '2023-02-01', 'Ticker': 'AAPL', 'Type': 'SELL', 'Price': '$120.00', 'Shares': '4'},
+            ]
+            imported = DataLoader().import_transactions_from_csv(sample_portfolio.id, rows)
+
+            assert imported == 2
+            assert PositionService().is_current(sample_portfolio.id)
+            position = Position.query.get((sample_portfolio.id, 'AAPL'))
+            assert position.shares == 6
+            assert position.cost_basis == pytest.approx(600.0)
+
+    def test_sell_without_position_is_ignored(self, app, sample_portfolio):
+        """Test a sell with no shares held never leaves a negative position"""
+        with app.app_context():
+            service = PortfolioService()
+            service.add_transaction(sample_portfolio.id, 'AAPL', 'SELL', date(2023, 1, 3), 100.0, 5)
+
+            position = db.session.get(Position, (sample_portfolio.id, 'AAPL'))
+            assert position.shares == 0
+            assert position.cost_basis == 0
+            assert position.realized_pnl == 0
+
+            service.add_transaction(sample_portfolio.id, 'AAPL', 'BUY', date(2023, 2, 1), 120.0, 10)
+            assert service.get_current_holdings(sample_portfolio.id) == {'AAPL': 10}
+
+            PositionService().rebuild_portfolio(sample_portfolio.id)
+            assert db.session.get(Position, (sample_portfolio.id, 'AAPL')).shares == 10
+
+    def test_concurrent_rebuild_serves_computed_positions(self, app, sample_portfolio):
+        """Test a read that loses a rebuild race returns positions instead of failing"""
+        from unittest.mock import patch
+        from sqlalchemy.exc import IntegrityError
+
+        with app.app_context():
+            service = PortfolioService()
+            service.add_transaction(sample_portfolio.id, 'AAPL', 'BUY', date(2023, 1, 3), 100.0, 10)
+            db.session.add(StockTransaction(
+                portfolio_id=sample_portfolio.id,
+                ticker='GOOGL',
+                transaction_type='BUY',
+                date=date(2023, 1, 5),
+                price_per_share=90.0,
+                shares=4,
+                total_value=360.0
+            ))
+            db.session.commit()
+
+            conflict = IntegrityError('INSERT INTO positions', {}, Exception('duplicate key'))
+            with patch.object(PositionService, 'rebuild_portfolio', side_effect=conflict):
+                holdings = service.get_current_holdings(sample_portfolio.id)
+
+            assert holdings == {'AAPL': 10, 'GOOGL': 4}
+            assert not PositionService().is_current(sample_portfolio.id)
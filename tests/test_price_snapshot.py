@@ -0,0 +1,157 @@
+import pytest
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+from flask import g
+from sqlalchemy import event
+from app import db
+from app.models.portfolio import StockTransaction
+from app.models.price import PriceHistory
+from app.services.portfolio_service import PortfolioService
+from app.services.price_service import PriceService
+from app.services.price_snapshot import PriceSnapshot, get_price_snapshot, latest_price_rows
+
+
+def _add_price(ticker, price_date, close_price):
+    db.session.add(PriceHistory(
+        ticker=ticker,
+        date=price_date,
+        close_price=close_price,
+        is_intraday=False,
+        price_timestamp=datetime.now(),
+        last_updated=datetime.utcnow()
+    ))
+
+
+@contextmanager
+def count_price_queries():
+    """Count SELECTs against price_history while the block runs"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and 'price_history' in statement:
+            statements.append(statement)
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+@pytest.fixture
+def price_rows(app):
+    with app.app_context():
+        today = date.today()
+        for ticker in ('AAPL', 'MSFT', 'GOOGL', 'VOO', 'QQQ'):
+            for days_back, close_price in ((0, 110.0), (1, 100.0), (2, 90.0)):
+                _add_price(ticker, today - timedelta(days=days_back), close_price)
+        _add_price('NEW', today - timedelta(days=3), 50.0)
+        db.session.commit()
+        yield today
+
+
+class TestPriceSnapshot:
+    def test_one_query_for_all_tickers(self, app, price_rows):
+        """Test latest and previous closes for many tickers load in one query"""
+        today = price_rows
+        with app.app_context():
+            with count_price_queries() as statements:
+                snapshot = PriceSnapshot().prefetch(['AAPL', 'MSFT', 'VOO', 'NEW', 'MISSING'])
+
+                assert snapshot.latest('AAPL') == 110.0
+                assert snapshot.previous_close('AAPL', today) == 100.0
+                assert snapshot.previous_close('NEW', today) == 50.0
+                assert snapshot.latest('MISSING') is None
+                assert snapshot.price_on('VOO', today) == 110.0
+
+            assert len(statements) == 1
+
+    def test_coverage_limits(self, app, price_rows):
+        """Test the snapshot only answers dates its rows can vouch for"""
+        today = price_rows
+        with app.app_context():
+            snapshot = PriceSnapshot().prefetch(['AAPL', 'NEW'])
+
+            assert snapshot.covers_date('AAPL', today)
+            assert not snapshot.covers_date('AAPL', today - timedelta(days=2))
+            assert snapshot.covers_date('NEW', today - timedelta(days=30))
+            assert not snapshot.covers_previous_close('AAPL', today - timedelta(days=1))
+
+    def test_memoized_per_request_and_invalidated_on_write(self, app, price_rows):
+        """Test the request snapshot is reused and dropped when prices change"""
+        today = price_rows
+        with app.test_request_context('/'):
+            snapshot = get_price_snapshot(['AAPL'])
+            assert get_price_snapshot(['AAPL']) is snapshot
+            assert PriceService().get_current_price('AAPL') == 110.0
+
+            PriceService().cache_price_data('AAPL', today, 120.0, True)
+
+            assert g.get('price_snapshot') is None
+            assert PriceService().get_current_price('AAPL') == 120.0
+
+    def test_holdings_queries_do_not_scale_with_holdings(self, app, sample_portfolio, price_rows):
+        """Test holdings valuation reads prices from the snapshot"""
+        with app.app_context():
+            for ticker in ('AAPL', 'MSFT', 'GOOGL'):
+                db.session.add(StockTransaction(
+                    portfolio_id=sample_portfolio.id,
+                    ticker=ticker,
+                    transaction_type='BUY',
+                    date=price_rows - timedelta(days=2),
+                    price_per_share=90.0,
+                    shares=1,
+                    total_value=90.0
+                ))
+            db.session.commit()
+
+            from app.services.dashboard_aggregator import DashboardAggregator
+            from app.views.main import calculate_portfolio_daily_change
+            with app.test_request_context('/'):
+                with count_price_queries() as statements:
+                    holdings = DashboardAggregator(
+                        sample_portfolio.id, PortfolioService(), PriceService()
+                    ).holdings_data()
+                    change = calculate_portfolio_daily_change(
+                        sample_portfolio.id, price_rows, None, PortfolioService(), PriceService()
+                    )
+
+            assert [h['current_price'] for h in holdings] == [110.0] * 3
+            assert change['dollar'] == pytest.approx(30.0)
+            # One snapshot query plus one range load of the benchmark series
+            assert len(statements) == 2
+
+    @pytest.mark.parametrize('window_functions', [True, False])
+    def test_latest_rows_per_dialect(self, app, price_rows, window_functions):
+        """Test the ROW_NUMBER and grouped-max forms return the same rows"""
+        today = price_rows
+        with app.app_context():
+            with patch('app.services.price_snapshot._use_window_functions', return_value=window_functions):
+                rows = latest_price_rows(['AAPL', 'NEW', 'MISSING'])
+                previous = latest_price_rows(['AAPL', 'NEW'], depth=1, before_date=today - timedelta(days=1))
+
+            assert [(r.ticker, r.date, r.close_price) for r in rows] == [
+                ('AAPL', today, 110.0),
+                ('AAPL', today - timedelta(days=1), 100.0),
+                ('NEW', today - timedelta(days=3), 50.0),
+            ]
+            assert [(r.ticker, r.close_price) for r in previous] == [('AAPL', 90.0), ('NEW', 50.0)]
+
+    def test_previous_closes_in_one_round_trip(self, app, price_rows):
+        """Test closes the snapshot rows cannot answer load together"""
+        today = price_rows
+        before_date = today - timedelta(days=1)
+        with app.app_context():
+            snapshot = PriceSnapshot().prefetch(['AAPL', 'MSFT', 'NEW'])
+            with count_price_queries() as statements:
+                snapshot.prefetch_previous_closes(['AAPL', 'MSFT', 'NEW', 'MISSING'], before_date)
+
+                assert snapshot.previous_close('AAPL', before_date) == 90.0
+                assert snapshot.previous_close('MSFT', before_date) == 90.0
+                assert snapshot.previous_close('NEW', before_date) == 50.0
+                assert snapshot.previous_close('MISSING', before_date) is None
+
+            # MISSING is first loaded into the snapshot, then one query for the uncovered closes
+            assert len(statements) == 2
@@ -253,8 +253,8 @@ class TestProgressiveLoading(unittest.TestCase):
     
     def test_dashboard_holdings_data_endpoint(self):
         """Test the dashboard-holdings-data endpoint"""
-        # Mock get_holdings_with_performance
-        with patch('app.views.main.get_holdings_with_performance') as mock_holdings:
+        # Mock the aggregator's holdings rows
+        with patch('app.views.main.DashboardAggregator.holdings_data') as mock_holdings:
             holdings_data = [
                 {
                     'ticker': 'AAPL',
@@ -285,9 +285,8 @@ class TestProgressiveLoading(unittest.TestCase):
             ]
             mock_holdings.return_value = holdings_data
             
-            # Mock calculate_etf_performance_for_holding
+            # Holdings already carry their ETF performance, so it is not recalculated
             with patch('app.views.main.calculate_etf_performance_for_holding') as mock_etf_perf:
-                mock_etf_perf.side_effect = [5.0, 7.0, 4.0, 6.0]  # AAPL-VOO, AAPL-QQQ, MSFT-VOO, MSFT-QQQ
                 
                 # Make request
                 response = self.client.get(f'/api/dashboard-holdings-data/{self.portfolio.id}')
@@ -301,7 +300,7 @@ class TestProgressiveLoading(unittest.TestCase):
                 
                 # Verify mock calls
                 mock_holdings.assert_called_once()
-                self.assertEqual(mock_etf_perf.call_count, 4)
+                mock_etf_perf.assert_not_called()
     
     def test_chart_generator_progress_endpoint(self):
         """Test the chart-generator-progress endpoint"""
@@ -0,0 +1,155 @@
+import pytest
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+from app import db
+from app.models.cache import PortfolioCache
+from app.models.portfolio import StockTransaction
+from app.services.background_tasks import stats_refresher
+from app.services.portfolio_service import PortfolioService
+from app.services.price_service import PriceService
+
+
+STATS = {'current_value': 1000.0, 'total_gain_loss': 100.0}
+
+
+def _get_stats(portfolio_id):
+    from app.views.main import get_dashboard_stats
+    portfolio_service = PortfolioService()
+    return get_dashboard_stats(portfolio_service.get_portfolio(portfolio_id), portfolio_service, PriceService())
+
+
+def _age_cache(portfolio_id, seconds):
+    cache = PortfolioCache.query.filter_by(portfolio_id=portfolio_id, cache_type='stats').one()
+    cache.created_at = datetime.now() - timedelta(seconds=seconds)
+    db.session.commit()
+
+
+class TestDashboardStatsCache:
+    def test_serves_cached_stats(self, app, sample_portfolio):
+        """Test stats are computed once and then served from the cache"""
+        with app.app_context():
+            with patch('app.views.main.calculate_minimal_portfolio_stats', return_value=STATS) as mock_calc:
+                first = _get_stats(sample_portfolio.id)
+                second = _get_stats(sample_portfolio.id)
+
+            assert mock_calc.call_count == 1
+            assert first['current_value'] == second['current_value'] == 1000.0
+            assert second['stats_stale'] is False
+            assert second['stats_age_seconds'] >= 0
+
+    def test_stale_stats_served_while_revalidating(self, app, sample_portfolio):
+        """Test stale stats are returned at once and one refresh is queued"""
+        with app.app_context():
+            with patch('app.views.main.calculate_minimal_portfolio_stats', return_value=STATS):
+                _get_stats(sample_portfolio.id)
+            _age_cache(sample_portfolio.id, 3600)
+
+            with patch('app.views.main.calculate_minimal_portfolio_stats') as mock_calc, \
+                 patch('app.views.main.stats_refresher.refresh') as mock_refresh:
+                stats = _get_stats(sample_portfolio.id)
+
+            mock_calc.assert_not_called()
+            mock_refresh.assert_called_once_with(sample_portfolio.id)
+            assert stats['current_value'] == 1000.0
+            assert stats['stats_stale'] is True
+            assert stats['stats_age_seconds'] == pytest.approx(3600, abs=5)
+
+    def test_data_change_recomputes_inline(self, app, sample_portfolio):
+        """Test stats from before a transaction change are never served"""
+        with app.app_context():
+            with patch('app.views.main.calculate_minimal_portfolio_stats', return_value=STATS):
+                _get_stats(sample_portfolio.id)
+
+            db.session.add(StockTransaction(
+                portfolio_id=sample_portfolio.id,
+                ticker='AAPL',
+                transaction_type='BUY',
+                date=date(2024, 1, 5),
+                price_per_share=100.0,
+                shares=10,
+                total_value=1000.0
+            ))
+            db.session.commit()
+
+            updated = dict(STATS, current_value=2000.0)
+            with patch('app.views.main.calculate_minimal_portfolio_stats', return_value=updated) as mock_calc:
+                stats = _get_stats(sample_portfolio.id)
+
+            assert mock_calc.call_count == 1
+            assert stats['current_value'] == 2000.0
+
+    def test_initial_data_endpoint_uses_cache(self, app, client, sample_portfolio):
+        """Test repeated initial-data requests reuse the cached stats"""
+        with app.app_context():
+            with patch('app.views.main.calculate_minimal_portfolio_stats', return_value=STATS) as mock_calc, \
+                 patch('app.services.background_tasks.chart_generator.generate_chart_data'):
+                client.get(f'/api/dashboard-initial-data/{sample_portfolio.id}')
+                response = client.get(f'/api/dashboard-initial-data/{sample_portfolio.id}?again=1')
+
+            assert response.status_code == 200
+            assert response.get_json()['portfolio_stats']['current_value'] == 1000.0
+            assert mock_calc.call_count == 1
+
+    def test_background_refresh_changes_initial_data_etag(self, app, client, sample_portfolio):
+        """Test stats written by a background refresh are sent instead of a 304"""
+        url = f'/api/dashboard-initial-data/{sample_portfolio.id}'
+        with app.app_context():
+            with patch('app.views.main.calculate_minimal_portfolio_stats', return_value=STATS), \
+                 patch('app.services.background_tasks.chart_generator.generate_chart_data'):
+                client.get(url)
+                etag = client.get(url).headers['ETag']
+                assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+            # Past the freshness budget the stale entry is sent once so the refresh is queued
+            _age_cache(sample_portfolio.id, 3600)
+            with patch('app.views.main.stats_refresher.refresh') as mock_refresh, \
+                 patch('app.services.background_tasks.chart_generator.generate_chart_data'):
+                stale = client.get(url, headers={'If-None-Match': etag})
+            assert stale.status_code == 200
+            assert stale.get_json()['portfolio_stats']['stats_stale'] is True
+            mock_refresh.assert_called_once_with(sample_portfolio.id)
+
+            refreshed = dict(STATS, current_value=1500.0)
+            with patch('app.views.main.calculate_minimal_portfolio_stats', return_value=refreshed):
+                stats_refresher.recompute(sample_portfolio.id)
+
+            with patch('app.services.background_tasks.chart_generator.generate_chart_data'):
+                response = client.get(url, headers={'If-None-Match': stale.headers['ETag']})
+
+            assert response.status_code == 200
+            assert response.get_json()['portfolio_stats']['current_value'] == 1500.0
+            assert response.get_json()['portfolio_stats']['stats_stale'] is False
+
+
+class TestBackgroundStatsRefresher:
+    def test_concurrent_refreshes_deduplicated(self, app, sample_portfolio):
+        """Test only one recompute per portfolio is in flight"""
+        with app.app_context():
+            app.config['STATS_BACKGROUND_REFRESH'] = True
+            with patch('app.services.background_tasks.threading.Thread') as mock_thread:
+                assert stats_refresher.refresh(sample_portfolio.id) is True
+                assert stats_refresher.refresh(sample_portfolio.id) is False
+
+                # The finished refresh frees the slot
+                with patch.object(stats_refresher, 'recompute'):
+                    stats_refresher._run_refresh(app, sample_portfolio.id)
+                assert stats_refresher.refresh(sample_portfolio.id) is True
+
+            assert mock_thread.call_count == 2
+            stats_refresher.in_flight.clear()
+
+    def test_refresh_disabled_in_tests(self, app, sample_portfolio):
+        """Test the background refresh only runs when enabled"""
+        with app.app_context():
+            assert stats_refresher.refresh(sample_portfolio.id) is False
+
+    def test_recompute_updates_cache(self, app, sample_portfolio):
+        """Test a recompute replaces the cached entry"""
+        with app.app_context():
+            with patch('app.views.main.calculate_minimal_portfolio_stats', return_value=STATS):
+                stats_refresher.recompute(sample_portfolio.id)
+
+            from app.views.main import get_cached_portfolio_stats, get_last_market_date
+            cached = get_cached_portfolio_stats(sample_portfolio.id, get_last_market_date())
+            assert cached['stats'] == STATS
+            assert PortfolioCache.query.filter_by(portfolio_id=sample_portfolio.id, cache_type='stats').count() == 1
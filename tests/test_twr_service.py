@@ -0,0 +1,167 @@
+import pytest
+import numpy as np
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+from app import db
+from app.models.portfolio import Portfolio, StockTransaction, Dividend
+from app.models.price import PriceHistory
+from app.services.twr_service import TWRService
+from app.util import calculators
+
+
+def _add_price(ticker, price_date, close_price):
+    db.session.add(PriceHistory(
+        ticker=ticker,
+        date=price_date,
+        close_price=close_price,
+        is_intraday=False,
+        price_timestamp=datetime.now(),
+        last_updated=datetime.utcnow()
+    ))
+
+
+def _add_trade(portfolio_id, trade_date, transaction_type, shares, price):
+    db.session.add(StockTransaction(
+        portfolio_id=portfolio_id,
+        ticker='AAPL',
+        transaction_type=transaction_type,
+        date=trade_date,
+        price_per_share=price,
+        shares=shares,
+        total_value=shares * price
+    ))
+
+
+@pytest.fixture
+def twr_portfolio(app):
+    """AAPL bought at 100, doubled up at 120 and sold down at 150; VOO rises 10% over the period"""
+    with app.app_context():
+        today = date.today()
+        start = today - timedelta(days=60)
+        middle = today - timedelta(days=30)
+        for ticker, prices in (('AAPL', (100.0, 120.0, 150.0)), ('VOO', (400.0, 420.0, 440.0)),
+                               ('QQQ', (300.0, 300.0, 300.0))):
+            for price_date, close_price in zip((start, middle, today), prices):
+                _add_price(ticker, price_date, close_price)
+
+        portfolio = Portfolio(name='TWR', user_id='test')
+        db.session.add(portfolio)
+        db.session.flush()
+        _add_trade(portfolio.id, start, 'BUY', 10, 100.0)
+        _add_trade(portfolio.id, middle, 'BUY', 10, 120.0)
+        _add_trade(portfolio.id, today, 'SELL', 5, 150.0)
+        db.session.commit()
+        yield portfolio.id
+
+
+class TestTimeWeightedReturnKernel:
+    def test_flows_do_not_change_returns(self):
+        """Test money added or withdrawn does not count as return"""
+        values = np.array([[100.0, 110.0, 220.0, 231.0, 115.5]])
+        inflows = np.array([[100.0, 0.0, 100.0, 0.0, 0.0]])
+        outflows = np.array([[0.0, 0.0, 0.0, 0.0, 115.5]])
+
+        growth, monthly, annual = calculators.time_weighted_returns(values, inflows, outflows, [1, 4], [4])
+
+        # 10% on day 1, 120 on 110 on the deposit day, 5% on day 3, flat on the withdrawal day
+        assert growth[0].tolist() == pytest.approx([1.0, 1.1, 1.2, 1.26, 1.26])
+        assert monthly[0] == pytest.approx([0.1, 1.26 / 1.1 - 1])
+        assert annual[0, 0] == pytest.approx(growth[0, -1] - 1)
+
+    def test_days_without_capital_return_zero(self):
+        """Test empty days before the first deposit and after a full sale are flat"""
+        values = np.array([[0.0, 100.0, 120.0, 0.0, 0.0]])
+        inflows = np.array([[0.0, 100.0, 0.0, 0.0, 0.0]])
+        outflows = np.array([[0.0, 0.0, 0.0, 120.0, 0.0]])
+
+        growth, _, _ = calculators.time_weighted_returns(values, inflows, outflows, [4], [4])
+
+        assert growth[0].tolist() == pytest.approx([1.0, 1.0, 1.2, 1.2, 1.2])
+
+
+class TestTWRService:
+    def test_portfolio_and_benchmark_returns(self, app, twr_portfolio):
+        """Test TWR follows prices regardless of the timing of buys and sells"""
+        with app.app_context():
+            twr = TWRService().calculate(twr_portfolio, include_daily=True)
+
+        assert twr['portfolio']['total_return'] == pytest.approx(0.5)
+        assert twr['benchmarks']['VOO']['total_return'] == pytest.approx(0.1)
+        assert twr['benchmarks']['QQQ']['total_return'] == pytest.approx(0.0)
+        assert twr['portfolio']['annualized_return'] is None
+
+        monthly = twr['portfolio']['monthly']
+        assert monthly[0]['period'] == twr['start_date'][:7]
+        assert monthly[-1]['period'] == date.today().strftime('%Y-%m')
+        assert np.prod([1 + m['return'] for m in monthly]) == pytest.approx(1.5)
+        assert twr['portfolio']['annual'][-1]['period'] == str(date.today().year)
+
+        assert len(twr['daily']['dates']) == 61
+        assert twr['daily']['portfolio'][-1] == pytest.approx(0.5)
+        assert twr['daily']['VOO'][-1] == pytest.approx(0.1)
+
+    def test_dividends_count_as_return(self, app, twr_portfolio):
+        """Test dividends paid out are part of the portfolio's return"""
+        with app.app_context():
+            db.session.add(Dividend(
+                portfolio_id=twr_portfolio,
+                ticker='AAPL',
+                payment_date=date.today() - timedelta(days=45),
+                total_amount=20.0
+            ))
+            db.session.commit()
+
+            twr = TWRService().calculate(twr_portfolio)
+
+        # 20 paid on 10 shares worth 1000 adds 2% before the second buy
+        assert twr['portfolio']['total_return'] == pytest.approx(1.5 * 1.02 - 1)
+
+    def test_no_transactions(self, app):
+        """Test a portfolio without transactions has no TWR"""
+        with app.app_context():
+            portfolio = Portfolio(name='Empty', user_id='test')
+            db.session.add(portfolio)
+            db.session.commit()
+
+            assert TWRService().calculate(portfolio.id) is None
+
+    def test_summary_cached_until_data_changes(self, app, twr_portfolio):
+        """Test the dashboard summary is computed once per data version"""
+        with app.app_context():
+            service = TWRService()
+            market_date = date.today()
+            with patch.object(service, 'calculate', wraps=service.calculate) as mock_calculate:
+                first = service.get_summary(twr_portfolio, market_date)
+                second = service.get_summary(twr_portfolio, market_date)
+                assert mock_calculate.call_count == 1
+                assert first == second
+
+                _add_trade(twr_portfolio, date.today() - timedelta(days=10), 'BUY', 1, 130.0)
+                db.session.commit()
+                service.get_summary(twr_portfolio, market_date)
+                assert mock_calculate.call_count == 2
+
+
+class TestTWRViews:
+    def test_api(self, app, client, twr_portfolio):
+        """Test the TWR API returns the daily series"""
+        response = client.get(f'/api/portfolio/{twr_portfolio}/twr')
+        data = response.get_json()
+
+        assert response.status_code == 200
+        assert data['twr']['portfolio']['total_return'] == pytest.approx(0.5)
+        assert data['twr']['daily']['dates']
+
+        response = client.get(f'/api/portfolio/{twr_portfolio}/twr?daily=0')
+        assert 'daily' not in response.get_json()['twr']
+
+        assert client.get('/api/portfolio/missing/twr').status_code == 404
+
+    def test_dashboard_initial_data_includes_twr(self, app, client, twr_portfolio):
+        """Test the dashboard payload carries the TWR summary"""
+        with patch('app.services.background_tasks.chart_generator.generate_chart_data'):
+            response = client.get(f'/api/dashboard-initial-data/{twr_portfolio}')
+
+        twr = response.get_json()['time_weighted_returns']
+        assert twr['portfolio']['total_return'] == pytest.approx(0.5)
+        assert 'VOO' in twr['benchmarks']
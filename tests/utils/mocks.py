@@ -49,6 +49,10 @@ class MockPriceService:
         """Mock current price lookup with use_stale parameter."""
         return self.prices.get(ticker, 100.00)
     
+    def get_current_prices_batch(self, tickers, use_cache=True):
+        """Mock batch current price lookup."""
+        return {ticker: self.get_current_price(ticker) for ticker in tickers}
+    
     def get_data_freshness(self, ticker, date):
         """Mock data freshness check."""
         return 5  # Always return 5 minutes for testing